@@ -25,6 +25,14 @@ from .schemas import (
 from .dependencies import verify_api_key
 from modules import ProcessingPipeline, RAGRetriever
 from modules.document_workflow import get_document_workflow
+from modules.document_registry import get_document_registry
+from modules.keyword_index import get_keyword_index
+from modules.window_store import get_window_store
+from modules.chapter_index import get_chapter_index
+from modules.question_index import get_question_index
+from modules.llm_cache import get_llm_cache
+from modules.llm_client import get_llm_metrics
+from modules.rag_workflow import run_rag_stream
 from modules.langgraph import run_deep_agent, run_deep_agent_stream
 from config import settings
 
@@ -252,6 +260,26 @@ async def delete_vectors(
         retriever = get_retriever()
         success = retriever.vector_store.delete_by_filter(f"book_id = '{book_id}'")
 
+        registry = get_document_registry()
+        if success and registry is not None:
+            registry.delete_by_book(book_id)
+
+        keyword_index = get_keyword_index()
+        if success and keyword_index is not None:
+            keyword_index.delete_by_filter(f"book_id = '{book_id}'")
+
+        window_store = get_window_store()
+        if success and window_store is not None:
+            window_store.delete_by_filter(f"book_id = '{book_id}'")
+
+        chapter_index = get_chapter_index()
+        if success and chapter_index is not None:
+            chapter_index.delete_by_filter(f"book_id = '{book_id}'")
+
+        question_index = get_question_index()
+        if success and question_index is not None:
+            question_index.delete_by_filter(f"book_id = '{book_id}'")
+
         return {
             "success": success,
             "message": "向量删除成功" if success else "向量删除失败",
@@ -266,6 +294,111 @@ async def delete_vectors(
         )
 
 
+@router.get(
+    "/cache/stats",
+    summary="检索缓存统计",
+    description="查看检索结果缓存、热门教材缓存、语义回答缓存和 LLM 响应缓存的命中率"
+)
+async def cache_stats(_: bool = Depends(verify_api_key)):
+    """检索缓存统计端点"""
+    retriever = get_retriever()
+    vector_store = retriever.vector_store
+    result_cache = getattr(vector_store, "result_cache", None)
+    hot_cache = getattr(vector_store, "hot_cache", None)
+    answer_cache = retriever.answer_cache
+    llm_cache = get_llm_cache()
+    return {
+        "retrieval_cache": result_cache.stats() if result_cache is not None else None,
+        "hot_cache": hot_cache.stats() if hot_cache is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+    }
+
+
+@router.get(
+    "/llm/metrics",
+    summary="LLM 调用统计",
+    description="按调用点查看 LLM 调用次数、失败与重试、延迟分位数、首字延迟、token 用量和响应缓存命中率"
+)
+async def llm_metrics(_: bool = Depends(verify_api_key)):
+    """LLM 调用统计端点（缓存命中的调用不计入 sites）"""
+    llm_cache = get_llm_cache()
+    return {"sites": get_llm_metrics().stats(), "cache": llm_cache.stats() if llm_cache is not None else None}
+
+
+# ==================== RAG 流式问答接口（轻量路径） ====================
+
+@router.post(
+    "/rag/stream",
+    summary="RAG 流式问答",
+    description="检索 -> 构建上下文 -> 流式生成的轻量问答（不经过 Deep Agent），适合简单的知识点问题"
+)
+async def rag_stream(
+    request: ChatRequest,
+    _: bool = Depends(verify_api_key)
+):
+    """
+    RAG 流式问答接口
+
+    未传 filter_expr 时按 book_id 过滤。
+
+    SSE 事件格式:
+    - start: 开始处理
+    - retrieved: 检索完成（来源数量、检索耗时、是否命中回答缓存）
+    - token: LLM token 流式输出
+    - citations: 引用列表（回答结束后发送）
+    - error: 错误信息
+    - done: 完成标记
+    """
+    async def generate_stream():
+        try:
+            logger.info(f"[RAG Stream] 问题: {request.question[:50]}...")
+            yield f"data: {json.dumps({'type': 'start', 'message': '开始检索...'}, ensure_ascii=False)}\n\n"
+
+            history = None
+            if request.history:
+                history = [{"role": msg.role, "content": msg.content} for msg in request.history]
+            filter_expr = request.filter_expr
+            if not filter_expr and request.book_id:
+                filter_expr = f"book_id = '{request.book_id}'"
+
+            async for event in run_rag_stream(
+                query=request.question,
+                top_k=request.top_k,
+                filter_expr=filter_expr,
+                history=history,
+                user_id=request.user_id,
+                book_id=request.book_id,
+                scope=request.scope
+            ):
+                event_type = event.get("event_type", "")
+
+                if event_type == "retrieved":
+                    yield f"data: {json.dumps({'type': 'retrieved', 'sources': event['sources'], 'cached': event['cached'], 'elapsed_ms': event['elapsed_ms']}, ensure_ascii=False)}\n\n"
+
+                elif event_type == "token":
+                    yield f"data: {json.dumps({'type': 'token', 'data': event['content']}, ensure_ascii=False)}\n\n"
+
+                elif event_type == "citations":
+                    yield f"data: {json.dumps({'type': 'citations', 'data': event['citations']}, ensure_ascii=False, default=str)}\n\n"
+
+            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+
+        except Exception as e:
+            logger.error(f"[RAG Stream] 错误: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
 # ==================== 智能问答接口 (LangGraph 多智能体) ====================
 
 @router.post(
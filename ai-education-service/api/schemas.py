@@ -197,6 +197,10 @@ class ChatRequest(BaseModel):
         None,
         description="过滤表达式"
     )
+    scope: Optional[str] = Field(
+        None,
+        description="章节范围（如 第三章、章节 ID），只检索该章节及其子章节；不传时从问题中识别"
+    )
     system_prompt: Optional[str] = Field(
         None,
         description="自定义系统提示词"
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+语义回答缓存基准（离线）
+
+用 bench_hybrid_search.py 的问题集模拟学生提问：问题按 Zipf 分布重复出现，
+每次提问随机带上标点 / 全角 / 空白 / 语气词等改写，一部分请求带对话历史（绕过缓存）。
+改写、检索和生成用固定延迟模拟（同 bench_query_pipeline.py），问题向量用离线哈希向量。
+
+输出：
+    no-cache / cache 两种模式的 p50 / p95 延迟
+    命中率、绕过率、错误命中数（命中的缓存问题与实际问题不是同一个）
+    缓存命中时流式输出的首块延迟
+
+用法:
+    python bench_answer_cache.py
+    python bench_answer_cache.py --requests 500 --threshold 0.9 --history-ratio 0.3
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from bench_hybrid_search import QUERIES, _hashed_embedding, _percentile
+from bench_query_pipeline import SHORT_HISTORY, _SimulatedRetriever
+from modules.answer_cache import AnswerCache, stream_cached_answer
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BOOK_FILTER = "book_id = 'bench-book'"
+
+# 同义问法（文本不同，语义相同）
+VARIANTS = [
+    lambda q: q,
+    lambda q: q + "？",
+    lambda q: q + "?",
+    lambda q: " " + q + " 。",
+    lambda q: q.upper(),
+    lambda q: "请问" + q,
+    lambda q: q + "是什么",
+]
+
+
+class _CachedRetriever(_SimulatedRetriever):
+    """模拟检索器 + 语义回答缓存（回答文本记录原问题，用于检查错误命中）"""
+
+    def __init__(self, args, answer_cache):
+        super().__init__(args, {})
+        self.answer_cache = answer_cache
+        self._embed_query = _hashed_embedding
+
+    async def generate_answer(self, query, context, system_prompt=None, history=None, summary=None):
+        await asyncio.sleep(self.generate_delay)
+        return f"{query} 的回答 [来源1]"
+
+
+def _workload(args) -> list:
+    rng = random.Random(args.seed)
+    questions = [query for query, _ in QUERIES]
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(questions))]
+    requests = []
+    for _ in range(args.requests):
+        base = rng.choices(questions, weights)[0]
+        asked = rng.choice(VARIANTS)(base)
+        history = SHORT_HISTORY if rng.random() < args.history_ratio else None
+        requests.append((base, asked, history))
+    return requests
+
+
+async def run(args) -> None:
+    requests = _workload(args)
+    print(
+        f"requests={args.requests} questions={len(QUERIES)} zipf={args.zipf} history_ratio={args.history_ratio} "
+        f"threshold={args.threshold} rewrite={args.rewrite_ms:.0f}ms retrieve={args.retrieve_ms:.0f}ms "
+        f"generate={args.generate_ms:.0f}ms embedding=offline-hash"
+    )
+
+    for mode in ("no-cache", "cache"):
+        cache = AnswerCache(threshold=args.threshold) if mode == "cache" else None
+        retriever = _CachedRetriever(args, cache)
+        latencies, wrong = [], 0
+        for base, asked, history in requests:
+            t0 = time.perf_counter()
+            result = await retriever.query(asked, args.top_k, filter_expr=BOOK_FILTER, history=history, enable_rerank=False)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if result.get("cached"):
+                # 命中的回答来自另一个问题：回答开头的原问题与本次的 base 问题不一致
+                source = result["answer"].rsplit(" 的回答", 1)[0]
+                wrong += not any(variant(base) == source for variant in VARIANTS)
+
+        line = f"  [{mode:>8}] p50={_percentile(latencies, 50):.0f}ms p95={_percentile(latencies, 95):.0f}ms"
+        if cache is not None:
+            stats = cache.stats()
+            line += (
+                f"  命中率={stats['hit_rate']:.3f} 命中={stats['hits']} 未命中={stats['misses']} "
+                f"绕过={stats['bypasses']} 错误命中={wrong} 条目={stats['entries']}"
+            )
+        print(line)
+
+    answer = "牛顿第二定律：物体加速度的大小与所受合力成正比，与质量成反比，F=ma。[来源1]"
+    t0 = time.perf_counter()
+    async for _ in stream_cached_answer(answer):
+        first_chunk = (time.perf_counter() - t0) * 1000
+        break
+    print(f"  缓存命中流式输出首块延迟: {first_chunk:.3f}ms（生成首 token 需要完整的改写 + 检索 + 生成）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语义回答缓存基准（离线）")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--zipf", type=float, default=1.1, help="问题热度分布的 Zipf 指数")
+    parser.add_argument("--history-ratio", type=float, default=0.2, help="带对话历史（绕过缓存）的请求比例")
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--summary-ms", type=float, default=1200)
+    parser.add_argument("--rewrite-ms", type=float, default=50)
+    parser.add_argument("--retrieve-ms", type=float, default=15)
+    parser.add_argument("--generate-ms", type=float, default=80)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+章节范围检索基准（离线）
+
+语料同 bench_context_packing.py：每个学科作为一章，再按 --fillers 生成干扰分块
+（从全书随机抽取字符拼成，均匀分配到各章）。每个问题的范围取相关条目所在的章，对比：
+    flat    整本书检索（book_id 过滤）
+    scoped  章节范围检索（book_id + chapter_id 过滤）
+输出召回率（top_k 中出现相关条目的比例）和本地检索延迟；向量用离线哈希向量。
+
+DashVector 的标量过滤在服务端执行，范围检索减少的是候选集合；这里用 LocalVectorStore 近似。
+
+用法:
+    python bench_chapter_scope.py
+    python bench_chapter_scope.py --fillers 50000 --top-k 3 --rounds 20
+"""
+
+import argparse
+import logging
+import random
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from bench_context_packing import DOCUMENTS
+from bench_hybrid_search import BOOK_ID, CORPUS, QUERIES, _hashed_embedding, _percentile
+from modules.local_vector_store import LocalVectorStore
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BOOK_FILTER = f"book_id = '{BOOK_ID}'"
+
+
+def _build_nodes(fillers: int, seed: int) -> list:
+    rng = random.Random(seed)
+    chapters = list(DOCUMENTS)
+    alphabet = "".join(CORPUS.values())
+    nodes = [
+        TextNode(id_=entry_id, text=CORPUS[entry_id], embedding=_hashed_embedding(CORPUS[entry_id]),
+                 metadata={"book_id": BOOK_ID, "chapter_id": chapter})
+        for chapter, entry_ids in DOCUMENTS.items() for entry_id in entry_ids
+    ]
+    for i in range(fillers):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(20, 60)))
+        nodes.append(TextNode(id_=f"filler-{i}", text=text, embedding=_hashed_embedding(text),
+                              metadata={"book_id": BOOK_ID, "chapter_id": chapters[i % len(chapters)]}))
+    return nodes
+
+
+def run(args) -> None:
+    nodes = _build_nodes(args.fillers, args.seed)
+    chapter_of = {entry_id: chapter for chapter, entry_ids in DOCUMENTS.items() for entry_id in entry_ids}
+    print(
+        f"chunks={len(nodes)} chapters={len(DOCUMENTS)} queries={len(QUERIES)} top_k={args.top_k} "
+        f"rounds={args.rounds} embedding=offline-hash"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalVectorStore(base_dir=tmp, dtype=args.dtype, dimension=len(nodes[0].embedding))
+        store.insert(nodes)
+        queries = [(_hashed_embedding(query), relevant, chapter_of[sorted(relevant)[0]]) for query, relevant in QUERIES]
+        store.search(queries[0][0], top_k=args.top_k, filter_expr=BOOK_FILTER)  # 预热（加载内存映射）
+
+        for mode in ("flat", "scoped"):
+            latencies, recalls = [], []
+            for _ in range(args.rounds):
+                for embedding, relevant, chapter in queries:
+                    chapter_ids = [chapter] if mode == "scoped" else None
+                    t0 = time.perf_counter()
+                    hits = store.search(embedding, top_k=args.top_k, filter_expr=BOOK_FILTER, chapter_ids=chapter_ids)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    recalls.append(float(any(hit["id"] in relevant for hit in hits)))
+            print(
+                f"  [{mode:>6}] recall@{args.top_k}={np.mean(recalls):.3f} "
+                f"p50={_percentile(latencies, 50):.3f}ms p95={_percentile(latencies, 95):.3f}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="章节范围检索基准（离线）")
+    parser.add_argument("--fillers", type=int, default=20000, help="干扰分块数量")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+上下文压缩基准测试
+
+复用 bench_context_packing.py 的文档和分块方式（分块更长，每块多句），rrf 混合检索取 top_k 后
+按 build_context 的格式拼接上下文，对比压缩前后的：
+    prompt 上下文 token 数（估算）、相关条目覆盖率、压缩耗时（冷缓存 / 热缓存）
+开启 --llm 时对每个问题分别用原上下文和压缩后的上下文流式生成，统计首 token 延迟（TTFT）；
+压缩后的 TTFT 从压缩开始计时（与 generate_answer_stream 内的顺序一致），包含句子 embedding 请求。
+
+句子打分方式（--scoring）:
+    lexical  只按词项覆盖率（默认配置，纯本地计算）
+    hashed   词项 + 离线哈希向量余弦（只反映计算开销，没有网络往返）
+    model    词项 + 配置的 embedding 模型（真实的网络往返，需要可用的 embedding 服务）
+
+用法:
+    python bench_context_compression.py                                  # 词项打分
+    python bench_context_compression.py --scoring hashed
+    python bench_context_compression.py --scoring model --ratio 0.3 --llm  # 需要可用的 embedding 和 Chat 模型
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from config import settings
+from bench_context_packing import DOCUMENTS, _chunk, _coverage
+from bench_hybrid_search import BOOK_ID, CORPUS, QUERIES, _hashed_embedding, _percentile
+from modules.context_compressor import ContextCompressor
+from modules.context_packer import estimate_tokens
+from modules.hybrid_search import hybrid_search
+from modules.keyword_index import KeywordIndex
+from modules.local_vector_store import LocalVectorStore
+from modules.rag_retriever import RAGRetriever
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def _build_contexts(top_k: int, chunk_chars: int, overlap_chars: int) -> list:
+    nodes = []
+    for resource_id, entry_ids in DOCUMENTS.items():
+        text = "".join(CORPUS[i] for i in entry_ids)
+        for n, chunk in enumerate(_chunk(text, chunk_chars, overlap_chars)):
+            nodes.append(TextNode(
+                id_=f"{resource_id}-{n}", text=chunk, embedding=_hashed_embedding(chunk),
+                metadata={"book_id": BOOK_ID, "resource_id": resource_id},
+            ))
+
+    contexts = []
+    with tempfile.TemporaryDirectory() as vec_dir, tempfile.TemporaryDirectory() as kw_dir:
+        store = LocalVectorStore(base_dir=vec_dir, dtype="float32", dimension=len(nodes[0].embedding))
+        store.insert(nodes)
+        keyword_index = KeywordIndex(base_dir=kw_dir)
+        keyword_index.insert(nodes)
+        for query, relevant in QUERIES:
+            results = hybrid_search(
+                query, embed=_hashed_embedding, vector_store=store, keyword_index=keyword_index,
+                top_k=top_k, filter_expr=f"book_id = '{BOOK_ID}'", fusion="rrf"
+            )
+            context = "\n\n---\n\n".join(
+                f"[来源{i}] (相关度: {r.get('score', 0):.3f})\n{r['text']}" for i, r in enumerate(results, 1)
+            )
+            contexts.append((query, relevant, context))
+    return contexts
+
+
+async def _ttft(retriever: RAGRetriever, query: str, context: str, compressor=None) -> float:
+    """首 token 延迟；传入 compressor 时先在线程中压缩（计入延迟）"""
+    t0 = time.perf_counter()
+    if compressor is not None:
+        context = await asyncio.to_thread(compressor.compress_context, query, context)
+    async for _ in retriever.generate_answer_stream(query, context):
+        return (time.perf_counter() - t0) * 1000
+    return (time.perf_counter() - t0) * 1000
+
+
+def _embed_batch(scoring: str):
+    if scoring == "lexical":
+        return None
+    if scoring == "hashed":
+        return lambda texts: [_hashed_embedding(t) for t in texts]
+    from modules.document_processor import get_embedding_model
+    return get_embedding_model().get_text_embedding_batch
+
+
+async def run(args) -> None:
+    contexts = _build_contexts(args.top_k, args.chunk_chars, args.overlap_chars)
+    compressor = ContextCompressor(
+        embed_batch=_embed_batch(args.scoring),
+        ratio=args.ratio,
+        neighbours=args.neighbours,
+    )
+
+    before, after, covered_before, covered_after, latencies, warm = [], [], [], [], [], []
+    for query, relevant, context in contexts:
+        t0 = time.perf_counter()
+        compressed = compressor.compress_context(query, context)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        compressor.compress_context(query, context)
+        warm.append((time.perf_counter() - t0) * 1000)
+        before.append(estimate_tokens(context))
+        after.append(estimate_tokens(compressed))
+        covered_before.append(np.mean([_coverage(context, CORPUS[i]) >= 0.5 for i in relevant]))
+        covered_after.append(np.mean([_coverage(compressed, CORPUS[i]) >= 0.5 for i in relevant]))
+
+    print(
+        f"queries={len(contexts)} top_k={args.top_k} chunk_chars={args.chunk_chars} "
+        f"ratio={args.ratio} neighbours={args.neighbours} scoring={args.scoring}"
+    )
+    print(
+        f"  tokens: {np.mean(before):.0f} -> {np.mean(after):.0f} "
+        f"(-{(1 - np.sum(after) / np.sum(before)) * 100:.0f}%)"
+    )
+    print(f"  覆盖率: {np.mean(covered_before):.3f} -> {np.mean(covered_after):.3f}")
+    print(
+        f"  压缩耗时: 冷缓存 p50={_percentile(latencies, 50):.2f}ms p95={_percentile(latencies, 95):.2f}ms  "
+        f"热缓存 p50={_percentile(warm, 50):.2f}ms p95={_percentile(warm, 95):.2f}ms"
+    )
+
+    if not args.llm:
+        return
+
+    # 只用到流式生成，不初始化向量存储和记忆模块；关闭 generate_answer_stream 内的压缩，由 _ttft 显式压缩
+    retriever = RAGRetriever.__new__(RAGRetriever)
+    retriever.chat_model = settings.CHAT_MODEL
+    enabled = settings.CONTEXT_COMPRESSION_ENABLED
+    settings.CONTEXT_COMPRESSION_ENABLED = False
+    # 新的压缩器（冷缓存），句子向量请求计入 TTFT
+    cold = ContextCompressor(embed_batch=_embed_batch(args.scoring), ratio=args.ratio, neighbours=args.neighbours)
+    try:
+        original = [await _ttft(retriever, q, c) for q, _, c in contexts]
+        compressed = [await _ttft(retriever, q, c, compressor=cold) for q, _, c in contexts]
+    finally:
+        settings.CONTEXT_COMPRESSION_ENABLED = enabled
+    print(
+        f"  TTFT p50: {_percentile(original, 50):.0f}ms -> {_percentile(compressed, 50):.0f}ms  "
+        f"p95: {_percentile(original, 95):.0f}ms -> {_percentile(compressed, 95):.0f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上下文压缩基准测试")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--chunk-chars", type=int, default=240)
+    parser.add_argument("--overlap-chars", type=int, default=40)
+    parser.add_argument("--ratio", type=float, default=0.4)
+    parser.add_argument("--neighbours", type=int, default=1)
+    parser.add_argument("--scoring", choices=("lexical", "hashed", "model"), default="lexical")
+    parser.add_argument("--llm", action="store_true", help="流式调用 Chat 模型，对比首 token 延迟")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+上下文打包基准测试
+
+把 bench_hybrid_search.py 的语料按学科拼成 5 篇文档，按固定字符数切成带重叠的分块，
+rrf 混合检索取候选后对比：
+    chars   旧 build_context（按字符数截断，遇到第一个放不下的片段就停止）
+    packed  token 预算打包（去重、去相邻重叠、背包、句子截断）
+输出每个问题的平均 prompt 上下文 token 数（估算）和相关条目覆盖率。
+
+chars 的字符上限按 预算 x 1.5（中文约 1.5 字符/token）换算，与 packed 的预算大致相当。
+
+用法:
+    python bench_context_packing.py
+    python bench_context_packing.py --budgets 150,300,600 --chunk-chars 120 --overlap-chars 30
+"""
+
+import argparse
+import logging
+import tempfile
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from config import settings
+from bench_hybrid_search import BOOK_ID, CORPUS, QUERIES, _hashed_embedding
+from modules.context_packer import estimate_tokens
+from modules.hybrid_search import hybrid_search
+from modules.keyword_index import KeywordIndex
+from modules.local_vector_store import LocalVectorStore
+from modules.rag_retriever import CONTEXT_CHAR_LIMIT, RAGRetriever
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+DOCUMENTS = {
+    "mechanics": ["c01", "c02", "c03", "c04", "c05", "c27"],
+    "electricity": ["c06", "c07", "c08", "c09", "c28"],
+    "math": ["c10", "c11", "c12", "c13", "c14", "c15", "c16", "c17", "c18", "c30"],
+    "biology": ["c19", "c20", "c21", "c22", "c29"],
+    "chemistry": ["c23", "c24", "c25", "c26"],
+}
+
+
+def _chunk(text: str, size: int, overlap: int) -> list:
+    chunks, start = [], 0
+    while start < len(text):
+        chunks.append(text[start:start + size])
+        if start + size >= len(text):
+            break
+        start += size - overlap
+    return chunks
+
+
+def _coverage(context: str, entry: str, shingle: int = 8) -> float:
+    """条目的 8 字符片段出现在上下文中的比例"""
+    grams = [entry[i:i + shingle] for i in range(0, max(len(entry) - shingle, 0) + 1, shingle // 2)]
+    return sum(1 for g in grams if g in context) / len(grams)
+
+
+def run(budgets: list, chunk_chars: int, overlap_chars: int, candidates: int) -> None:
+    nodes = []
+    for resource_id, entry_ids in DOCUMENTS.items():
+        text = "".join(CORPUS[i] for i in entry_ids)
+        for n, chunk in enumerate(_chunk(text, chunk_chars, overlap_chars)):
+            nodes.append(TextNode(
+                id_=f"{resource_id}-{n}", text=chunk, embedding=_hashed_embedding(chunk),
+                metadata={"book_id": BOOK_ID, "resource_id": resource_id},
+            ))
+
+    # 只用到 build_context，不初始化向量存储和记忆模块
+    retriever = RAGRetriever.__new__(RAGRetriever)
+    retriever.chat_model = settings.CHAT_MODEL
+    retriever.window_store = None
+
+    with tempfile.TemporaryDirectory() as vec_dir, tempfile.TemporaryDirectory() as kw_dir:
+        store = LocalVectorStore(base_dir=vec_dir, dtype="float32", dimension=len(nodes[0].embedding))
+        store.insert(nodes)
+        keyword_index = KeywordIndex(base_dir=kw_dir)
+        keyword_index.insert(nodes)
+        candidate_lists = [
+            (hybrid_search(
+                query, embed=_hashed_embedding, vector_store=store, keyword_index=keyword_index,
+                top_k=candidates, filter_expr=f"book_id = '{BOOK_ID}'", fusion="rrf"
+            ), relevant)
+            for query, relevant in QUERIES
+        ]
+
+    print(
+        f"chunks={len(nodes)} chunk_chars={chunk_chars} overlap_chars={overlap_chars} "
+        f"candidates={candidates} queries={len(QUERIES)}"
+    )
+
+    def _measure(build) -> tuple:
+        tokens, recalls, parts = [], [], []
+        for results, relevant in candidate_lists:
+            context, used = build(results)
+            tokens.append(estimate_tokens(context))
+            parts.append(len(used))
+            recalls.append(np.mean([_coverage(context, CORPUS[i]) >= 0.5 for i in relevant]))
+        return np.mean(tokens), np.mean(recalls), np.mean(parts)
+
+    packing = settings.CONTEXT_PACKING_ENABLED
+    try:
+        settings.CONTEXT_PACKING_ENABLED = False
+        tokens, recall, parts = _measure(lambda r: retriever.build_context(r, max_chars=CONTEXT_CHAR_LIMIT))
+        print(f"  [chars {CONTEXT_CHAR_LIMIT}] tokens={tokens:.0f} 覆盖率={recall:.3f} 片段={parts:.1f}")
+        for budget in budgets:
+            settings.CONTEXT_PACKING_ENABLED = False
+            chars = _measure(lambda r: retriever.build_context(r, max_chars=int(budget * 1.5)))
+            settings.CONTEXT_PACKING_ENABLED = True
+            packed = _measure(lambda r: retriever.build_context(r, max_tokens=budget))
+            print(
+                f"  [budget {budget:>4}] chars: tokens={chars[0]:.0f} 覆盖率={chars[1]:.3f} 片段={chars[2]:.1f}  |  "
+                f"packed: tokens={packed[0]:.0f} 覆盖率={packed[1]:.3f} 片段={packed[2]:.1f}"
+            )
+    finally:
+        settings.CONTEXT_PACKING_ENABLED = packing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上下文打包基准测试")
+    parser.add_argument("--budgets", default="150,250,400", help="逗号分隔的 token 预算")
+    parser.add_argument("--chunk-chars", type=int, default=90)
+    parser.add_argument("--overlap-chars", type=int, default=25)
+    parser.add_argument("--candidates", type=int, default=10)
+    args = parser.parse_args()
+
+    run([int(b) for b in args.budgets.split(",")], args.chunk_chars, args.overlap_chars, args.candidates)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+分层检索（章节摘要路由）基准（离线）
+
+语料同 bench_chapter_scope.py：每个学科作为一章，章内每 --section-size 个条目作为一节，
+再按 --fillers 生成干扰分块（均匀分配到各节）。章节摘要向量由 ChapterIndex.build 生成，对比：
+    flat          整本书检索（book_id 过滤）
+    hierarchical  先按章节摘要向量选出 --top-n 个章节子树，再在子树内检索分块（结果不足 top_k 时回退整本书）
+输出召回率（top_k 中出现相关条目的比例）、路由命中率（相关条目所在章节被选中的比例）和延迟；向量用离线哈希向量。
+
+用法:
+    python bench_hierarchical_retrieval.py
+    python bench_hierarchical_retrieval.py --fillers 50000 --top-n 2 --rounds 20
+"""
+
+import argparse
+import logging
+import random
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from bench_context_packing import DOCUMENTS
+from bench_hybrid_search import BOOK_ID, CORPUS, QUERIES, _hashed_embedding, _percentile
+from modules.chapter_index import ChapterIndex
+from modules.local_vector_store import LocalVectorStore, parse_filter
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BOOK_FILTER = f"book_id = '{BOOK_ID}'"
+
+
+def _build_book(fillers: int, section_size: int, seed: int):
+    """返回 (章节树, 分块, 条目 -> 所在节)"""
+    rng = random.Random(seed)
+    chapters, section_of = [], {}
+    for n, (subject, entry_ids) in enumerate(DOCUMENTS.items(), 1):
+        chapters.append({"id": subject, "title": f"第{n}章 {subject}", "level": 1, "parent_id": None})
+        for m, start in enumerate(range(0, len(entry_ids), section_size), 1):
+            section_id = f"{subject}-{m}"
+            chapters.append({"id": section_id, "title": f"{n}.{m}", "level": 2, "parent_id": subject})
+            for entry_id in entry_ids[start:start + section_size]:
+                section_of[entry_id] = section_id
+
+    nodes = [
+        TextNode(id_=entry_id, text=CORPUS[entry_id], embedding=_hashed_embedding(CORPUS[entry_id]),
+                 metadata={"book_id": BOOK_ID, "chapter_id": section_id})
+        for entry_id, section_id in section_of.items()
+    ]
+    sections = sorted(set(section_of.values()))
+    alphabet = "".join(CORPUS.values())
+    for i in range(fillers):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(20, 60))) + "。"
+        nodes.append(TextNode(id_=f"filler-{i}", text=text, embedding=_hashed_embedding(text),
+                              metadata={"book_id": BOOK_ID, "chapter_id": sections[i % len(sections)]}))
+    return chapters, nodes, section_of
+
+
+def run(args) -> None:
+    chapters, nodes, section_of = _build_book(args.fillers, args.section_size, args.seed)
+    print(
+        f"chunks={len(nodes)} chapters={len(chapters)} queries={len(QUERIES)} top_k={args.top_k} "
+        f"top_n={args.top_n} rounds={args.rounds} embedding=offline-hash"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalVectorStore(base_dir=f"{tmp}/vectors", dtype=args.dtype, dimension=len(nodes[0].embedding))
+        store.insert(nodes)
+        index = ChapterIndex(base_dir=f"{tmp}/chapters")
+        t0 = time.perf_counter()
+        index.build(BOOK_ID, nodes, chapters, lambda texts: [_hashed_embedding(t) for t in texts])
+        print(f"  章节摘要索引: {index.count(BOOK_ID)} 个章节, 构建 {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+        queries = [(_hashed_embedding(query), relevant) for query, relevant in QUERIES]
+        store.search(queries[0][0], top_k=args.top_k, filter_expr=BOOK_FILTER)  # 预热（加载内存映射）
+
+        for mode in ("flat", "hierarchical"):
+            latencies, route_latencies, recalls, routed_hits = [], [], [], []
+            for _ in range(args.rounds):
+                for embedding, relevant in queries:
+                    t0 = time.perf_counter()
+                    filter_expr = BOOK_FILTER
+                    if mode == "hierarchical":
+                        filter_expr = index.route(BOOK_FILTER, embedding, top_n=args.top_n, min_chunks=args.top_k)
+                        route_latencies.append((time.perf_counter() - t0) * 1000)
+                    hits = store.search(embedding, top_k=args.top_k, filter_expr=filter_expr)
+                    if len(hits) < args.top_k and filter_expr != BOOK_FILTER:
+                        hits = store.search(embedding, top_k=args.top_k, filter_expr=BOOK_FILTER)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    recalls.append(float(any(hit["id"] in relevant for hit in hits)))
+                    if mode == "hierarchical":
+                        selected = parse_filter(filter_expr).get("chapter_id", ())
+                        routed_hits.append(float(any(section_of[i] in selected for i in relevant)))
+
+            line = (
+                f"  [{mode:>12}] recall@{args.top_k}={np.mean(recalls):.3f} "
+                f"p50={_percentile(latencies, 50):.3f}ms p95={_percentile(latencies, 95):.3f}ms"
+            )
+            if route_latencies:
+                line += (
+                    f" 路由命中率={np.mean(routed_hits):.3f} "
+                    f"路由 p50={_percentile(route_latencies, 50) * 1000:.0f}µs"
+                )
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分层检索基准（离线）")
+    parser.add_argument("--fillers", type=int, default=20000, help="干扰分块数量")
+    parser.add_argument("--section-size", type=int, default=2, help="每节包含的条目数")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--top-n", type=int, default=3, help="路由选取的章节数（对应 CHAPTER_ROUTE_TOP_N）")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+混合检索基准测试
+
+在固定语料上对比各融合方式（vector / boost / weighted / rrf）的 recall@k 和延迟。
+语料和标注内置在本文件中（术语精确查询 + 语义改写查询），向量存储和关键词索引均写入临时目录。
+
+用法:
+    python bench_hybrid_search.py                          # 使用配置的 embedding 模型
+    python bench_hybrid_search.py --offline                # 离线哈希向量（只用于验证流程和延迟，召回率无参考意义）
+    python bench_hybrid_search.py --vector-latency-ms 40   # 模拟远程向量库延迟，观察并发带来的收益
+"""
+
+import argparse
+import hashlib
+import logging
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from modules.hybrid_search import FUSION_MODES, hybrid_search
+from modules.keyword_index import KeywordIndex
+from modules.local_vector_store import LocalVectorStore
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BOOK_ID = "bench"
+
+CORPUS = {
+    "c01": "牛顿第二定律：物体的加速度跟作用力成正比，跟物体的质量成反比，表达式为 F=ma。",
+    "c02": "牛顿第一定律又称惯性定律：一切物体在没有受到外力作用时，总保持静止或匀速直线运动状态。",
+    "c03": "牛顿第三定律：两个物体之间的作用力和反作用力总是大小相等、方向相反，作用在同一条直线上。",
+    "c04": "动量守恒定律：系统不受外力或所受合外力为零时，系统的总动量保持不变。",
+    "c05": "机械能守恒：只有重力或弹力做功时，物体的动能和势能相互转化，总机械能保持不变。",
+    "c06": "欧姆定律：导体中的电流 I 与导体两端的电压 U 成正比，与导体的电阻 R 成反比，即 I=U/R。",
+    "c07": "焦耳定律：电流通过导体产生的热量 Q 与电流的平方、导体的电阻和通电时间成正比，Q=I²Rt。",
+    "c08": "楞次定律：感应电流的磁场总要阻碍引起感应电流的磁通量的变化。",
+    "c09": "法拉第电磁感应定律：感应电动势的大小与穿过回路的磁通量的变化率成正比。",
+    "c10": "勾股定理：直角三角形两条直角边的平方和等于斜边的平方，a²+b²=c²。",
+    "c11": "余弦定理：三角形任一边的平方等于另两边平方和减去这两边与夹角余弦乘积的两倍。",
+    "c12": "正弦定理：在任意三角形中，各边和它所对角的正弦值之比相等，都等于外接圆直径。",
+    "c13": "一元二次方程 ax²+bx+c=0 的求根公式为 x=(-b±√(b²-4ac))/2a，判别式 Δ=b²-4ac 决定根的个数。",
+    "c14": "韦达定理：一元二次方程两根之和等于 -b/a，两根之积等于 c/a。",
+    "c15": "等差数列的前 n 项和公式为 Sn=n(a1+an)/2，相邻两项的差是一个常数。",
+    "c16": "等比数列中每一项与前一项的比值为常数 q，前 n 项和为 Sn=a1(1-qⁿ)/(1-q)。",
+    "c17": "导数描述函数在某一点的瞬时变化率，几何意义是曲线在该点切线的斜率。",
+    "c18": "牛顿-莱布尼茨公式把定积分的计算转化为求原函数在区间端点的差值。",
+    "c19": "光合作用：绿色植物利用光能，把二氧化碳和水合成储存能量的有机物，并释放氧气。",
+    "c20": "细胞呼吸把有机物氧化分解，释放能量，为生命活动提供 ATP。",
+    "c21": "孟德尔通过豌豆杂交实验提出了分离定律和自由组合定律，奠定了遗传学基础。",
+    "c22": "DNA 的双螺旋结构由沃森和克里克提出，两条链上的碱基通过氢键互补配对。",
+    "c23": "阿伏加德罗常数 NA 约为 6.02×10²³ mol⁻¹，表示 1 mol 任何粒子所含的粒子数。",
+    "c24": "质量守恒定律：参加化学反应的各物质的质量总和等于反应后生成的各物质的质量总和。",
+    "c25": "元素周期表按原子序数排列，同一主族元素最外层电子数相同，化学性质相似。",
+    "c26": "氧化还原反应的本质是电子的转移，失去电子的物质被氧化，得到电子的物质被还原。",
+    "c27": "物体受力越大，速度改变得越快；同样的力作用在质量更大的物体上，速度变化更慢。",
+    "c28": "电阻一定时，加在导体两端的电压越高，通过导体的电流就越大。",
+    "c29": "植物叶片中的叶绿体吸收阳光，制造养料并放出氧气。",
+    "c30": "两根之和与两根之积可以直接由一元二次方程的系数求出，不需要先解方程。",
+}
+
+# (查询, 相关分块)：前半为术语精确查询，后半为语义改写查询
+QUERIES = [
+    ("F=ma 是哪个定律", {"c01"}),
+    ("欧姆定律", {"c06", "c28"}),
+    ("焦耳定律的公式", {"c07"}),
+    ("楞次定律", {"c08"}),
+    ("韦达定理", {"c14", "c30"}),
+    ("勾股定理 a²+b²=c²", {"c10"}),
+    ("阿伏加德罗常数是多少", {"c23"}),
+    ("牛顿-莱布尼茨公式", {"c18"}),
+    ("孟德尔", {"c21"}),
+    ("沃森和克里克", {"c22"}),
+    ("力越大速度变化越快是什么规律", {"c01", "c27"}),
+    ("电压越高电流越大", {"c06", "c28"}),
+    ("植物怎样利用阳光制造养料", {"c19", "c29"}),
+    ("不解方程怎么求两个根的和", {"c14", "c30"}),
+    ("没有外力时物体怎么运动", {"c02"}),
+    ("化学反应前后总质量会变吗", {"c24"}),
+    ("切线斜率和函数变化快慢", {"c17"}),
+    ("三角形的边和对角正弦的关系", {"c12"}),
+    ("得失电子和被氧化被还原", {"c26"}),
+    ("碰撞前后系统总动量", {"c04"}),
+]
+
+
+def _hashed_embedding(text: str, dim: int = 256) -> list:
+    """离线哈希向量：字符一元 / 二元组哈希到固定维度（只反映字面重合）"""
+    vector = np.zeros(dim, dtype=np.float32)
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    for gram in grams:
+        digest = hashlib.md5(gram.encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % dim] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm > 0 else vector).tolist()
+
+
+def _percentile(latencies_ms: list, q: float) -> float:
+    return float(np.percentile(np.asarray(latencies_ms), q))
+
+
+class _DelayedStore:
+    """在向量检索前加固定延迟，模拟远程向量库"""
+
+    def __init__(self, store, delay_ms: float):
+        self.store = store
+        self.delay = delay_ms / 1000
+
+    def search(self, **kwargs):
+        time.sleep(self.delay)
+        return self.store.search(**kwargs)
+
+
+def run(offline: bool, top_k: int, rounds: int, vector_latency_ms: float) -> None:
+    ids = list(CORPUS)
+    texts = [CORPUS[i] for i in ids]
+    if offline:
+        embed = _hashed_embedding
+        vectors = [embed(text) for text in texts]
+    else:
+        from modules.document_processor import get_embedding_model
+
+        model = get_embedding_model()
+        vectors = model.get_text_embedding_batch(texts)
+        cache = {}
+
+        def embed(text: str) -> list:
+            if text not in cache:
+                cache[text] = model.get_text_embedding(text)
+            return cache[text]
+
+    nodes = [
+        TextNode(id_=doc_id, text=text, embedding=vector, metadata={"book_id": BOOK_ID})
+        for doc_id, text, vector in zip(ids, texts, vectors)
+    ]
+
+    with tempfile.TemporaryDirectory() as vec_dir, tempfile.TemporaryDirectory() as kw_dir:
+        store = LocalVectorStore(base_dir=vec_dir, dtype="float32", dimension=len(vectors[0]))
+        store.insert(nodes)
+        keyword_index = KeywordIndex(base_dir=kw_dir)
+        keyword_index.insert(nodes)
+        vector_store = _DelayedStore(store, vector_latency_ms) if vector_latency_ms else store
+
+        # 预热（查询向量缓存、加载索引）
+        for query, _ in QUERIES:
+            embed(query)
+        filter_expr = f"book_id = '{BOOK_ID}'"
+
+        print(
+            f"corpus={len(CORPUS)} queries={len(QUERIES)} top_k={top_k} "
+            f"embedding={'offline-hash' if offline else 'model'} vector_latency={vector_latency_ms:.0f}ms"
+        )
+        for fusion in ("vector", "boost", "weighted", "rrf"):
+            assert fusion in FUSION_MODES
+            latencies, recalls = [], []
+            for _ in range(rounds):
+                for query, relevant in QUERIES:
+                    t0 = time.perf_counter()
+                    results = hybrid_search(
+                        query, embed=embed, vector_store=vector_store, keyword_index=keyword_index,
+                        top_k=top_k, filter_expr=filter_expr, fusion=fusion
+                    )
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    recalls.append(len({r["id"] for r in results} & relevant) / len(relevant))
+            exact = np.mean(recalls[:len(QUERIES) // 2])
+            semantic = np.mean(recalls[len(QUERIES) // 2:len(QUERIES)])
+            print(
+                f"  [{fusion:<8}] recall@{top_k}={np.mean(recalls):.3f} (术语 {exact:.3f} / 语义 {semantic:.3f})  "
+                f"p50={_percentile(latencies, 50):.2f}ms  p95={_percentile(latencies, 95):.2f}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="混合检索基准测试")
+    parser.add_argument("--offline", action="store_true", help="使用离线哈希向量代替 embedding 模型")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=5, help="每种融合方式重复的轮数（用于延迟统计）")
+    parser.add_argument("--vector-latency-ms", type=float, default=0.0, help="模拟的向量检索延迟")
+    args = parser.parse_args()
+
+    run(args.offline, args.top_k, args.rounds, args.vector_latency_ms)
+
+
+if __name__ == "__main__":
+    main()
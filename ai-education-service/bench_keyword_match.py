@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+关键词匹配微基准
+
+1000 个候选分块 x 50 个关键词，对比：
+    legacy    旧实现（每次调用时对文本和每个关键词分别 lower，再逐个子串查找）
+    matcher   KeywordMatcher（关键词预先归一化，分块归一化文本缓存命中；安装 pyahocorasick 时单遍自动机扫描）
+    cold      KeywordMatcher，归一化文本缓存为空（分块首次出现）
+
+用法:
+    python bench_keyword_match.py
+    python bench_keyword_match.py --candidates 5000 --keywords 100
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from modules.hybrid_search import KeywordMatcher, normalize_text
+
+# 常用汉字范围内取 500 个字构造文本，关键词从文本中截取以保证有命中
+_CHARS = [chr(c) for c in range(0x4e00, 0x4e00 + 500)]
+
+
+def _legacy_score(text: str, keywords: list) -> float:
+    text_lower = text.lower()
+    matched = sum(1 for kw in keywords if kw.lower() in text_lower)
+    return matched / len(keywords)
+
+
+def _matcher_scores(texts: list, keywords: list) -> list:
+    matcher = KeywordMatcher(keywords)  # 每个查询构建一次
+    return [matcher.score(t) for t in texts]
+
+
+def _make_corpus(candidates: int, keywords: int, seed: int = 0):
+    rng = random.Random(seed)
+    texts = [
+        "".join(rng.choice(_CHARS) for _ in range(400)) + f" Newton F=ma 第{i}节"
+        for i in range(candidates)
+    ]
+    words = ["Newton", "F=ma", "ATP", "DNA"]
+    while len(words) < keywords:
+        text = rng.choice(texts)
+        start = rng.randrange(0, 380)
+        words.append(text[start:start + rng.choice([2, 3, 4])])
+    return texts, words[:keywords]
+
+
+def _time(fn, texts: list, rounds: int) -> list:
+    latencies = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn(texts)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词匹配微基准")
+    parser.add_argument("--candidates", type=int, default=1000)
+    parser.add_argument("--keywords", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    texts, keywords = _make_corpus(args.candidates, args.keywords)
+    matcher = KeywordMatcher(keywords)
+
+    legacy = [_legacy_score(t, keywords) for t in texts]
+    assert np.allclose(legacy, [matcher.score(t) for t in texts]), "匹配结果与旧实现不一致"
+
+    results = {
+        "legacy": _time(lambda ts: [_legacy_score(t, keywords) for t in ts], texts, args.rounds),
+        "matcher": _time(lambda ts: _matcher_scores(ts, keywords), texts, args.rounds),
+    }
+
+    cold = []
+    for _ in range(args.rounds):
+        normalize_text.cache_clear()
+        cold.extend(_time(lambda ts: _matcher_scores(ts, keywords), texts, 1))
+    results["cold"] = cold
+
+    print(f"candidates={args.candidates} keywords={args.keywords} backend={matcher.backend}")
+    for name, latencies in results.items():
+        arr = np.asarray(latencies)
+        print(f"  [{name:<7}] p50={np.percentile(arr, 50):.2f}ms  p95={np.percentile(arr, 95):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
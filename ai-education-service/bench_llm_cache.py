@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+LLM 响应缓存基准（离线）
+
+LLM 接口用 httpx.MockTransport 按固定延迟模拟，对比两类负载在启用 / 不启用响应缓存时的耗时：
+    reingest  同一批分块的实体抽取跑两遍（重复入库），第二遍全部命中
+    route     按 Zipf 分布抽样的问题做路由分类（重复 / 热门问题）
+
+用法:
+    python bench_llm_cache.py
+    python bench_llm_cache.py --llm-ms 800 --chunks 50 --questions 200
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+import numpy as np
+
+from modules.llm_cache import LLMResponseCache
+from modules.llm_client import LLMClient, LLMMetrics
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def _client(llm_ms: float, cache) -> LLMClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(llm_ms / 1000)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": '{"type": "simple"}'}, "finish_reason": "stop"}]
+        })
+
+    return LLMClient("dashscope", max_retries=0, metrics=LLMMetrics(), cache=cache,
+                     transport=httpx.MockTransport(handler))
+
+
+async def _run(client: LLMClient, prompts: list, site: str, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(prompt: str) -> None:
+        async with semaphore:
+            await client.complete(prompt, site=site, temperature=0.1, cache_ttl=3600)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(call(p) for p in prompts))
+    return (time.perf_counter() - t0) * 1000
+
+
+async def run(args) -> None:
+    rng = np.random.default_rng(0)
+    chunks = [f"抽取实体：第{i}段教材正文" for i in range(args.chunks)]
+    ranks = np.minimum(rng.zipf(1.3, args.questions), args.question_pool)
+    questions = [f"第{r}个问题属于哪种类型" for r in ranks]
+    print(f"llm={args.llm_ms:.0f}ms chunks={args.chunks} questions={args.questions} concurrency={args.concurrency}")
+
+    for name, prompts in (("reingest", chunks + chunks), ("route", questions)):
+        elapsed = {}
+        for mode, cache in (("no-cache", LLMResponseCache(max_temperature=-1.0)), ("cache", LLMResponseCache())):
+            client = _client(args.llm_ms, cache)
+            elapsed[mode] = await _run(client, prompts, name, args.concurrency)
+            await client.aclose()
+            stats = cache.stats()
+            print(
+                f"  [{name:<8}] {mode:<8} 耗时 {elapsed[mode]:.0f}ms  LLM 请求 "
+                f"{client.metrics.stats().get(name, {}).get('calls', 0)}  命中率 {stats['hit_rate']:.2f}  "
+                f"估算节省 {stats['saved_ms']:.0f}ms"
+            )
+        saved = elapsed["no-cache"] - elapsed["cache"]
+        print(f"  [{name:<8}] 缓存节省 {saved:.0f}ms（-{saved / elapsed['no-cache'] * 100:.0f}%）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 响应缓存基准（离线）")
+    parser.add_argument("--llm-ms", type=float, default=500)
+    parser.add_argument("--chunks", type=int, default=40, help="重复入库的分块数")
+    parser.add_argument("--questions", type=int, default=200, help="路由分类的问题数")
+    parser.add_argument("--question-pool", type=int, default=100, help="不同问题的数量上限")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
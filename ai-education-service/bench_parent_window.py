@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+父窗口检索（small-to-big）基准（离线）
+
+语料同 bench_context_packing.py（5 篇文档），对比：
+    large   按 --large-chars 切块直接向量化，命中分块即上下文
+    window  按 --child-chars 切小分块向量化，命中后扩展并合并为约 --window-chars 的父窗口
+两种模式取相同的 top_k，向量用离线哈希向量，输出：
+    向量化 token 数（入库成本）、检索精度（命中分块覆盖相关条目的比例）、上下文覆盖率、上下文 token 数
+以及单次扩展（本地读取 + 合并）的耗时。
+
+用法:
+    python bench_parent_window.py
+    python bench_parent_window.py --child-chars 40 --large-chars 160 --window-chars 160 --top-k 3
+"""
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from bench_context_packing import DOCUMENTS, _chunk, _coverage
+from bench_hybrid_search import BOOK_ID, CORPUS, QUERIES, _hashed_embedding, _percentile
+from modules.context_packer import estimate_tokens
+from modules.local_vector_store import LocalVectorStore
+from modules.window_store import WindowStore, window_bounds
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def _nodes(texts: dict, chunk_chars: int, overlap_chars: int, window_chars: int = 0) -> list:
+    nodes = []
+    for doc_key, text in texts.items():
+        start = 0
+        for n, chunk in enumerate(_chunk(text, chunk_chars, overlap_chars)):
+            metadata = {"book_id": BOOK_ID, "resource_id": doc_key.split(":")[0]}
+            if window_chars:
+                left, right = window_bounds(text, start, start + len(chunk), window_chars)
+                metadata.update({"window_doc": doc_key, "window_start": left, "window_end": right})
+            nodes.append(TextNode(
+                id_=f"{doc_key}-{n}", text=chunk, embedding=_hashed_embedding(chunk), metadata=metadata,
+            ))
+            start += chunk_chars - overlap_chars
+    return nodes
+
+
+def _measure(store, expand, top_k: int) -> dict:
+    precision, coverage, tokens = [], [], []
+    for query, relevant in QUERIES:
+        hits = store.search(query_embedding=_hashed_embedding(query), top_k=top_k,
+                            filter_expr=f"book_id = '{BOOK_ID}'")
+        # 精度：命中分块中与相关条目重合（覆盖相关条目一半以上或被相关条目包含）的比例
+        precision.append(np.mean([
+            any(_coverage(hit["text"], CORPUS[i]) >= 0.5 or hit["text"] in CORPUS[i] for i in relevant)
+            for hit in hits
+        ]) if hits else 0.0)
+        context = "\n\n".join(result["text"] for result in expand(hits))
+        coverage.append(np.mean([_coverage(context, CORPUS[i]) >= 0.5 for i in relevant]))
+        tokens.append(estimate_tokens(context))
+    return {"precision": np.mean(precision), "coverage": np.mean(coverage), "tokens": np.mean(tokens)}
+
+
+def run(args) -> None:
+    texts = {f"{resource_id}:0": "".join(CORPUS[i] for i in ids) for resource_id, ids in DOCUMENTS.items()}
+    print(
+        f"documents={len(texts)} queries={len(QUERIES)} top_k={args.top_k} large_chars={args.large_chars} "
+        f"child_chars={args.child_chars} window_chars={args.window_chars} embedding=offline-hash"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("large", "window"):
+            if mode == "large":
+                nodes = _nodes(texts, args.large_chars, args.large_chars // 8)
+                expand = lambda hits: hits
+            else:
+                nodes = _nodes(texts, args.child_chars, args.child_chars // 8, args.window_chars)
+                window_store = WindowStore(base_dir=f"{tmp}/windows", block_chars=args.block_chars)
+                window_store.put_documents(BOOK_ID, texts)
+                expand = lambda hits: window_store.expand(hits, gap=args.merge_gap)
+
+            store = LocalVectorStore(base_dir=f"{tmp}/{mode}", dtype="float32", dimension=len(nodes[0].embedding))
+            store.insert(nodes)
+            embedded = sum(estimate_tokens(node.text) for node in nodes)
+            result = _measure(store, expand, args.top_k)
+            print(
+                f"  [{mode:>6}] chunks={len(nodes)} 向量化 tokens={embedded} 检索精度={result['precision']:.3f} "
+                f"覆盖率={result['coverage']:.3f} 上下文 tokens={result['tokens']:.0f} "
+                f"覆盖率/千向量化 token={result['coverage'] / embedded * 1000:.3f}"
+            )
+
+        hits = [
+            {"id": node.node_id, "text": node.text, "score": 1.0, "book_id": BOOK_ID,
+             "metadata": json.dumps(node.metadata, ensure_ascii=False)}
+            for node in nodes[:args.top_k * 2]
+        ]
+        latencies = []
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            window_store.expand(hits, gap=args.merge_gap)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        print(
+            f"  扩展耗时（{len(hits)} 个子分块，块缓存已预热）: p50={_percentile(latencies, 50):.3f}ms "
+            f"p95={_percentile(latencies, 95):.3f}ms 压缩={window_store.codec.name}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="父窗口检索基准（离线）")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--large-chars", type=int, default=160, help="大分块字符数（对应 CHUNK_SIZE）")
+    parser.add_argument("--child-chars", type=int, default=48, help="子分块字符数（对应 PARENT_CHILD_CHUNK_SIZE）")
+    parser.add_argument("--window-chars", type=int, default=160, help="父窗口字符数")
+    parser.add_argument("--merge-gap", type=int, default=20)
+    parser.add_argument("--block-chars", type=int, default=256)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+RAG 查询流程编排基准（离线）
+
+LLM 调用（摘要、改写、生成）和检索用固定延迟模拟，只比较流程编排本身的耗时：
+    sequential  旧流程：记忆压缩（同步生成摘要）-> 改写 -> 检索 -> 生成
+    concurrent  RAGRetriever.query：记忆读取与改写并发、改写期间预检索、摘要生成放到后台
+
+场景：无历史 / 短历史且改写不变 / 短历史且改写变化 / 长历史（超过摘要阈值）且改写不变
+
+用法:
+    python bench_query_pipeline.py
+    python bench_query_pipeline.py --summary-ms 1500 --rewrite-ms 600 --retrieve-ms 200 --generate-ms 1000
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from config import settings
+from modules.conversation_memory import ConversationMemory
+from modules.rag_retriever import RAGRetriever
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+SHORT_HISTORY = [
+    {"role": "user", "content": "牛顿第二定律是什么？"},
+    {"role": "assistant", "content": "物体的加速度与所受合力成正比，与质量成反比，F=ma。"},
+]
+# 超过 SUMMARY_CHAR_THRESHOLD，触发摘要生成
+LONG_HISTORY = [
+    {"role": "user" if i % 2 == 0 else "assistant", "content": "关于受力分析的讨论。" * 60}
+    for i in range(8)
+]
+
+# (名称, 问题, 历史, 改写结果)
+SCENARIOS = [
+    ("无历史", "牛顿第二定律的表达式", None, None),
+    ("改写不变", "牛顿第三定律的内容是什么", SHORT_HISTORY, "牛顿第三定律的内容是什么？"),
+    ("改写变化", "它的单位是什么", SHORT_HISTORY, "牛顿第二定律中力的单位是什么"),
+    ("长历史", "动量守恒的条件是什么", LONG_HISTORY, "动量守恒的条件是什么"),
+]
+
+
+class _SimulatedMemory(ConversationMemory):
+    def __init__(self, summary_ms: float):
+        super().__init__(chat_model="simulated")
+        self.summary_delay = summary_ms / 1000
+
+    async def generate_summary(self, history):
+        await asyncio.sleep(self.summary_delay)
+        return "之前讨论了受力分析。"
+
+
+class _SimulatedRetriever(RAGRetriever):
+    """只替换 LLM 调用和检索，查询编排使用 RAGRetriever 的实现"""
+
+    def __init__(self, args, rewrites: dict):
+        self.chat_model = settings.CHAT_MODEL
+        self.memory = _SimulatedMemory(args.summary_ms)
+        self.answer_cache = None
+        self.window_store = None
+        self.chapter_index = None
+        self.rewrite_delay = args.rewrite_ms / 1000
+        self.retrieve_delay = args.retrieve_ms / 1000
+        self.generate_delay = args.generate_ms / 1000
+        self.rewrites = rewrites
+
+    async def rewrite_query(self, query, history=None):
+        if not history:
+            return query
+        await asyncio.sleep(self.rewrite_delay)
+        return self.rewrites.get(query, query)
+
+    def retrieve(self, query, top_k=5, filter_expr=None, fusion=None):
+        time.sleep(self.retrieve_delay)
+        return [
+            {"id": f"c{i}", "text": f"{query} 相关片段 {i}", "score": 1 - i * 0.1, "page": i, "metadata": {}}
+            for i in range(top_k)
+        ]
+
+    async def generate_answer(self, query, context, system_prompt=None, history=None, summary=None):
+        await asyncio.sleep(self.generate_delay)
+        return "回答 [1]"
+
+
+async def _sequential_query(retriever: RAGRetriever, question, top_k, history, user_id, book_id):
+    """旧流程（逐步等待）"""
+    compressed_history, summary = history or [], None
+    if history:
+        compressed_history, summary = await retriever.memory.check_and_compress(user_id, book_id, history)
+    else:
+        summary = await retriever.memory.get_summary(user_id, book_id)
+    rewritten = await retriever.rewrite_query(question, compressed_history)
+    results = retriever.retrieve(rewritten, top_k)
+    context, _ = retriever.build_context(results)
+    return await retriever.generate_answer(question, context, None, compressed_history, summary)
+
+
+async def run(args) -> None:
+    retriever = _SimulatedRetriever(args, {question: rewritten for _, question, _, rewritten in SCENARIOS if rewritten})
+    print(
+        f"summary={args.summary_ms:.0f}ms rewrite={args.rewrite_ms:.0f}ms "
+        f"retrieve={args.retrieve_ms:.0f}ms generate={args.generate_ms:.0f}ms rounds={args.rounds}"
+    )
+
+    totals = {"sequential": [], "concurrent": []}
+    for name, question, history, _ in SCENARIOS:
+        row = []
+        for mode in ("sequential", "concurrent"):
+            latencies = []
+            for round_index in range(args.rounds):
+                # 每轮使用新的用户，避免摘要已存在影响结果
+                user_id = f"bench-{mode}-{round_index}"
+                t0 = time.perf_counter()
+                if mode == "sequential":
+                    await _sequential_query(retriever, question, args.top_k, history, user_id, "book")
+                else:
+                    await retriever.query(
+                        question, args.top_k, history=history, user_id=user_id, book_id="book", enable_rerank=False
+                    )
+                latencies.append((time.perf_counter() - t0) * 1000)
+            totals[mode].extend(latencies)
+            row.append(f"{mode} p50={np.percentile(latencies, 50):.0f}ms")
+        print(f"  [{name}] " + "  ".join(row))
+
+    # 等待后台摘要任务结束
+    pending = list(retriever.memory._pending.values())
+    if pending:
+        await asyncio.gather(*pending)
+
+    sequential = np.percentile(totals["sequential"], 50)
+    concurrent = np.percentile(totals["concurrent"], 50)
+    print(
+        f"  全部场景 p50: sequential={sequential:.0f}ms concurrent={concurrent:.0f}ms "
+        f"(-{(1 - concurrent / sequential) * 100:.0f}%)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG 查询流程编排基准（离线）")
+    parser.add_argument("--summary-ms", type=float, default=1200)
+    parser.add_argument("--rewrite-ms", type=float, default=500)
+    parser.add_argument("--retrieve-ms", type=float, default=150)
+    parser.add_argument("--generate-ms", type=float, default=800)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if not settings.SPECULATIVE_RETRIEVAL_ENABLED or not settings.SUMMARY_BACKGROUND_COMPRESS:
+        logger.warning("SPECULATIVE_RETRIEVAL_ENABLED / SUMMARY_BACKGROUND_COMPRESS 未开启，concurrent 只包含部分优化")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+假设问题索引基准
+
+语料和标注同 bench_hybrid_search.py。对比三种查询方式的 recall@k 和查询延迟：
+    raw       原问题直接检索分块
+    hyde      查询时调用 LLM 生成假设性答案（HyDE），原问题 + 假设答案多向量检索后 RRF 融合
+    question  原问题同时检索分块和假设问题索引（入库时生成），RRF 融合，查询路径不调用 LLM
+
+用法:
+    python bench_question_index.py                     # 使用配置的 embedding 模型和 LLM（HyDE、问题生成）
+    python bench_question_index.py --offline           # 离线哈希向量 + 模板问题，HyDE 用 --hyde-ms 模拟延迟
+    python bench_question_index.py --offline --hyde-ms 2000 --rounds 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from bench_hybrid_search import BOOK_ID, CORPUS, QUERIES, _hashed_embedding, _percentile
+from modules.local_vector_store import LocalVectorStore
+from modules.question_index import QuestionIndex, resolve_question_hits
+from modules.vector_store import reciprocal_rank_fusion
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+BOOK_FILTER = f"book_id = '{BOOK_ID}'"
+
+
+async def _template_complete(prompt: str) -> str:
+    """离线问题生成：取片段的前两个分句，改写成"……是什么" / "……为什么" 两个问题"""
+    questions = {}
+    for number, text in re.findall(r"\[(\d+)\] (.+)", prompt):
+        clauses = [c for c in re.split(r"[：:，,。；;]", text) if c.strip()]
+        questions[number] = [f"{clauses[0]}是什么"] + [f"为什么{c}" for c in clauses[1:2]]
+    return json.dumps(questions, ensure_ascii=False)
+
+
+def run(args) -> None:
+    ids = list(CORPUS)
+    texts = [CORPUS[i] for i in ids]
+    if args.offline:
+        embed = _hashed_embedding
+
+        def embed_batch(batch: list) -> list:
+            return [_hashed_embedding(text) for text in batch]
+
+        def hyde(query: str) -> list:
+            # 离线没有 LLM：只模拟调用延迟，检索字符串退化为原问题
+            time.sleep(args.hyde_ms / 1000)
+            return [query]
+
+        complete = _template_complete
+    else:
+        from modules.agentic_rag.query_transform import get_query_transformer
+        from modules.document_processor import get_embedding_model
+
+        model = get_embedding_model()
+        transformer = get_query_transformer()
+        embed, embed_batch = model.get_text_embedding, model.get_text_embedding_batch
+
+        def hyde(query: str) -> list:
+            return transformer.get_embedding_strings(transformer.transform_with_hyde(query))
+
+        complete = None
+
+    vectors = embed_batch(texts)
+    nodes = [
+        TextNode(id_=doc_id, text=text, embedding=vector, metadata={"book_id": BOOK_ID})
+        for doc_id, text, vector in zip(ids, texts, vectors)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalVectorStore(base_dir=f"{tmp}/chunks", dtype="float32", dimension=len(vectors[0]))
+        store.insert(nodes)
+        index = QuestionIndex(base_dir=f"{tmp}/questions", dtype="float32", dimension=len(vectors[0]))
+        t0 = time.perf_counter()
+        count = asyncio.run(index.build(nodes, embed_batch, complete=complete))
+        print(
+            f"corpus={len(CORPUS)} queries={len(QUERIES)} top_k={args.top_k} rounds={args.rounds} "
+            f"embedding={'offline-hash' if args.offline else 'model'}"
+        )
+        print(f"  问题索引: {count} 个问题, 构建 {(time.perf_counter() - t0) * 1000:.0f}ms（入库一次性开销）")
+
+        def search_raw(query: str) -> list:
+            return store.search(embed(query), top_k=args.top_k, filter_expr=BOOK_FILTER)
+
+        def search_hyde(query: str) -> list:
+            result = store.search_many([embed(text) for text in hyde(query)], top_k=args.top_k, filter_expr=BOOK_FILTER)
+            return result["fused"][:args.top_k]
+
+        def search_question(query: str) -> list:
+            embedding = embed(query)
+            chunks = store.search(embedding, top_k=args.top_k, filter_expr=BOOK_FILTER)
+            hits = index.search(embedding, top_k=args.top_k, filter_expr=BOOK_FILTER)
+            return reciprocal_rank_fusion([chunks, resolve_question_hits(store, hits, BOOK_FILTER)], args.top_k)
+
+        # HyDE 每次都调用 LLM，轮数过多时只跑一轮
+        modes = [("raw", search_raw, args.rounds), ("hyde", search_hyde, 1 if not args.offline else args.rounds),
+                 ("question", search_question, args.rounds)]
+        p50 = {}
+        for name, search, rounds in modes:
+            latencies, recalls = [], []
+            for _ in range(rounds):
+                for query, relevant in QUERIES:
+                    t0 = time.perf_counter()
+                    results = search(query)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    recalls.append(len({r["id"] for r in results} & relevant) / len(relevant))
+            exact = np.mean(recalls[:len(QUERIES) // 2])
+            semantic = np.mean(recalls[len(QUERIES) // 2:len(QUERIES)])
+            p50[name] = _percentile(latencies, 50)
+            print(
+                f"  [{name:<8}] recall@{args.top_k}={np.mean(recalls):.3f} (术语 {exact:.3f} / 语义 {semantic:.3f})  "
+                f"p50={p50[name]:.2f}ms  p95={_percentile(latencies, 95):.2f}ms"
+            )
+        print(f"  问题索引相对 HyDE 每次查询节省 p50 {p50['hyde'] - p50['question']:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="假设问题索引基准")
+    parser.add_argument("--offline", action="store_true", help="离线哈希向量 + 模板问题（召回率只反映字面重合）")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=5, help="raw / question 重复的轮数（用于延迟统计）")
+    parser.add_argument("--hyde-ms", type=float, default=1500.0, help="离线模式下模拟的 HyDE LLM 调用延迟")
+    args = parser.parse_args()
+
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
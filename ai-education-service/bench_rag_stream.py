@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+流式问答首 token 延迟基准（需要运行中的服务）
+
+对同一组问题分别请求 /rag/stream（轻量 RAG）和 /chat/stream（Deep Agent），统计：
+    TTFT        请求发出到第一个 token 事件
+    检索后 TTFT  /rag/stream 的 TTFT 减去 retrieved 事件报告的检索耗时
+    总耗时      请求发出到 done 事件
+/rag/stream 每个问题第一轮会写入回答缓存，之后的轮次统计为缓存命中（单独输出）。
+
+用法:
+    uvicorn main:app --port 8000 &
+    python bench_rag_stream.py --book-id <教材ID>
+    python bench_rag_stream.py --book-id <教材ID> --rounds 3 --skip-chat
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+
+from config import settings
+from bench_hybrid_search import _percentile
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+QUESTIONS = [
+    "牛顿第二定律的内容是什么",
+    "什么是欧姆定律",
+    "光合作用的产物有哪些",
+    "韦达定理是什么",
+    "化学平衡的特征",
+]
+
+
+async def _measure(client: httpx.AsyncClient, path: str, payload: dict) -> dict:
+    """请求一次 SSE 接口，返回各阶段耗时（毫秒）"""
+    t0 = time.perf_counter()
+    timing = {"ttft": None, "retrieval": None, "cached": False, "total": None}
+    async with client.stream("POST", path, json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event["type"] == "retrieved":
+                timing["retrieval"] = event["elapsed_ms"]
+                timing["cached"] = event["cached"]
+            elif event["type"] in ("token", "answer") and timing["ttft"] is None:
+                timing["ttft"] = (time.perf_counter() - t0) * 1000
+            elif event["type"] == "error":
+                raise RuntimeError(event.get("message"))
+            elif event["type"] == "done":
+                break
+    timing["total"] = (time.perf_counter() - t0) * 1000
+    return timing
+
+
+def _report(name: str, timings: list) -> None:
+    if not timings:
+        return
+    ttft = [t["ttft"] for t in timings if t["ttft"] is not None]
+    total = [t["total"] for t in timings]
+    line = (
+        f"  [{name}] n={len(timings)} TTFT p50={_percentile(ttft, 50):.0f}ms p95={_percentile(ttft, 95):.0f}ms  "
+        f"总耗时 p50={_percentile(total, 50):.0f}ms"
+    )
+    after = [t["ttft"] - t["retrieval"] for t in timings if t["ttft"] is not None and t["retrieval"] is not None]
+    if after:
+        line += f"  检索后 TTFT p50={_percentile(after, 50):.0f}ms"
+    print(line)
+
+
+async def run(args) -> None:
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, timeout=300.0) as client:
+        results = {"rag": [], "rag-cached": [], "chat": []}
+        for round_index in range(args.rounds):
+            for question in QUESTIONS:
+                payload = {
+                    "question": question,
+                    "book_id": args.book_id,
+                    "user_id": f"bench-{round_index}",
+                    "top_k": args.top_k,
+                }
+                timing = await _measure(client, "/rag/stream", payload)
+                results["rag-cached" if timing["cached"] else "rag"].append(timing)
+                if not args.skip_chat:
+                    results["chat"].append(await _measure(client, "/chat/stream", payload))
+
+    print(f"base_url={args.base_url} book_id={args.book_id} questions={len(QUESTIONS)} rounds={args.rounds}")
+    _report("/rag/stream", results["rag"])
+    _report("/rag/stream 缓存命中", results["rag-cached"])
+    _report("/chat/stream", results["chat"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式问答首 token 延迟基准")
+    parser.add_argument("--base-url", default=f"http://localhost:8000{settings.API_PREFIX}")
+    parser.add_argument("--api-key", default=settings.API_KEY)
+    parser.add_argument("--book-id", required=True)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--skip-chat", action="store_true", help="只测 /rag/stream")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+重排序基准测试
+
+复用 bench_hybrid_search.py 的内置语料和查询：先做 rrf 混合检索取候选，再对比
+    none   不重排，直接截取前 top_n
+    local  本地重排序（余弦 + 词项覆盖 + MMR）
+    llm    LLM 重排序（需要 --llm 和可用的 Chat 模型）
+的 recall@top_n 和延迟；开启 --llm 时另外输出 local 与 llm 的排序一致性（top-1 一致率、overlap@top_n）。
+
+用法:
+    python bench_rerank.py --offline                # 离线哈希向量，只测本地重排序
+    python bench_rerank.py --llm                    # 使用 embedding 模型，并与 LLM 重排序对比
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from config import settings
+from bench_hybrid_search import BOOK_ID, CORPUS, QUERIES, _hashed_embedding, _percentile
+from modules.hybrid_search import hybrid_search
+from modules.keyword_index import KeywordIndex
+from modules.local_reranker import LocalReranker
+from modules.local_vector_store import LocalVectorStore
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def _print_row(name: str, recalls: list, latencies: list, top_n: int) -> None:
+    row = f"  [{name:<5}] recall@{top_n}={np.mean(recalls):.3f}"
+    if latencies:
+        row += f"  p50={_percentile(latencies, 50):.2f}ms  p95={_percentile(latencies, 95):.2f}ms"
+    print(row)
+
+
+async def run(offline: bool, candidates: int, top_n: int, rounds: int, with_llm: bool) -> None:
+    ids = list(CORPUS)
+    texts = [CORPUS[i] for i in ids]
+    if offline:
+        embed = _hashed_embedding
+        vectors = [embed(text) for text in texts]
+    else:
+        from modules.document_processor import get_embedding_model
+
+        model = get_embedding_model()
+        vectors = model.get_text_embedding_batch(texts)
+        cache = {}
+
+        def embed(text: str) -> list:
+            if text not in cache:
+                cache[text] = model.get_text_embedding(text)
+            return cache[text]
+
+    nodes = [
+        TextNode(id_=doc_id, text=text, embedding=vector, metadata={"book_id": BOOK_ID})
+        for doc_id, text, vector in zip(ids, texts, vectors)
+    ]
+
+    llm = None
+    if with_llm:
+        from modules.rag_retriever import RAGRetriever
+
+        # 只用到 LLM 重排序，不初始化向量存储和记忆模块
+        llm = RAGRetriever.__new__(RAGRetriever)
+        llm.chat_model = settings.CHAT_MODEL
+
+    with tempfile.TemporaryDirectory() as vec_dir, tempfile.TemporaryDirectory() as kw_dir:
+        store = LocalVectorStore(base_dir=vec_dir, dtype="float32", dimension=len(vectors[0]))
+        store.insert(nodes)
+        keyword_index = KeywordIndex(base_dir=kw_dir)
+        keyword_index.insert(nodes)
+        reranker = LocalReranker(store, embed=embed)
+        filter_expr = f"book_id = '{BOOK_ID}'"
+
+        candidate_lists = []
+        for query, relevant in QUERIES:
+            embed(query)
+            results = hybrid_search(
+                query, embed=embed, vector_store=store, keyword_index=keyword_index,
+                top_k=candidates, filter_expr=filter_expr, fusion="rrf"
+            )
+            candidate_lists.append((query, relevant, results))
+
+        print(
+            f"corpus={len(CORPUS)} queries={len(QUERIES)} candidates={candidates} top_n={top_n} "
+            f"embedding={'offline-hash' if offline else 'model'} "
+            f"mmr_lambda={reranker.mmr_lambda} lexical_weight={reranker.lexical_weight}"
+        )
+
+        _print_row(
+            "none",
+            [len({r["id"] for r in results[:top_n]} & relevant) / len(relevant) for _, relevant, results in candidate_lists],
+            [],
+            top_n,
+        )
+
+        latencies, recalls, local_ranked = [], [], []
+        for round_index in range(rounds):
+            for query, relevant, results in candidate_lists:
+                t0 = time.perf_counter()
+                reranked = reranker.rerank(query, results, top_n, filter_expr=filter_expr)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if round_index == 0:
+                    recalls.append(len({r["id"] for r in reranked} & relevant) / len(relevant))
+                    local_ranked.append([r["id"] for r in reranked])
+        _print_row("local", recalls, latencies, top_n)
+
+        if llm is None:
+            return
+
+        latencies, recalls, top1, overlaps = [], [], [], []
+        for (query, relevant, results), local_ids in zip(candidate_lists, local_ranked):
+            t0 = time.perf_counter()
+            reranked = await llm._llm_rerank(query, results, top_n)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            llm_ids = [r["id"] for r in reranked]
+            recalls.append(len(set(llm_ids) & relevant) / len(relevant))
+            top1.append(bool(llm_ids) and bool(local_ids) and llm_ids[0] == local_ids[0])
+            overlaps.append(len(set(llm_ids) & set(local_ids)) / top_n)
+        _print_row("llm", recalls, latencies, top_n)
+        print(f"  local vs llm: top-1 一致率={np.mean(top1):.3f}  overlap@{top_n}={np.mean(overlaps):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重排序基准测试")
+    parser.add_argument("--offline", action="store_true", help="使用离线哈希向量代替 embedding 模型")
+    parser.add_argument("--candidates", type=int, default=10, help="重排序前的候选数量")
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=20, help="本地重排序重复的轮数（用于延迟统计）")
+    parser.add_argument("--llm", action="store_true", help="同时运行 LLM 重排序并对比排序一致性")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.offline, args.candidates, args.top_n, args.rounds, args.llm))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""
+向量检索延迟基准测试
+
+对比本地向量存储（LocalVectorStore）与 DashVector 的 top-k 检索延迟。
+本地存储使用随机向量构造不同规模的索引；DashVector 使用已有 collection 的真实数据。
+
+用法:
+    python bench_vector_store.py                          # 本地 10k / 100k
+    python bench_vector_store.py --sizes 10000 1000000 --dtype float16
+    python bench_vector_store.py --dashvector --book-id <book_id>
+    python bench_vector_store.py --dashvector --book-id <book_id> --projection   # 字段投影的负载与延迟
+    python bench_vector_store.py --two-stage --sizes 100000                      # 两阶段 vs 单阶段（召回率与延迟）
+    python bench_vector_store.py --two-stage --vectors data/hot_snapshots/<book_key>.npy   # 使用真实向量
+"""
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+
+import numpy as np
+
+from config import settings
+from modules.local_vector_store import LocalVectorStore, normalize_rows
+from modules.two_stage_search import TwoStageSearcher
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def _percentiles(latencies_ms: list) -> str:
+    arr = np.asarray(latencies_ms)
+    return f"p50={np.percentile(arr, 50):.2f}ms  p95={np.percentile(arr, 95):.2f}ms  mean={arr.mean():.2f}ms"
+
+
+def _build_local_index(base_dir: str, size: int, dim: int, dtype: str, blocks=None) -> LocalVectorStore:
+    """
+    直接写入 .npy + 元数据文件，避免构造百万个 TextNode
+
+    Args:
+        blocks: 可选，按 (start, end) 返回向量块的函数，默认生成随机向量
+    """
+    store = LocalVectorStore(base_dir=base_dir, dtype=dtype, dimension=dim)
+    rng = np.random.default_rng(0)
+    vec_path, meta_path = store._paths("bench")
+
+    # 分块生成，避免 1M x 2048 的 float32 中间矩阵占满内存
+    out = np.lib.format.open_memmap(vec_path, mode="w+", dtype=store.dtype, shape=(size, dim))
+    for start in range(0, size, 50000):
+        end = min(start + 50000, size)
+        block = blocks(start, end) if blocks else rng.standard_normal((end - start, dim)).astype(np.float32)
+        out[start:end] = normalize_rows(block)
+    out.flush()
+    del out
+
+    ids = [f"doc-{i}" for i in range(size)]
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "fields": [{"book_id": "bench"}] * size}, f)
+    return store
+
+
+def bench_local(sizes: list, dim: int, dtype: str, top_k: int, queries: int) -> None:
+    rng = np.random.default_rng(1)
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = _build_local_index(tmp, size, dim, dtype)
+            store.search(rng.standard_normal(dim).tolist(), top_k, "book_id = 'bench'")  # 预热（加载 mmap）
+
+            latencies = []
+            for _ in range(queries):
+                q = rng.standard_normal(dim).tolist()
+                t0 = time.perf_counter()
+                store.search(q, top_k, "book_id = 'bench'")
+                latencies.append((time.perf_counter() - t0) * 1000)
+            store.close()
+        print(f"[local/{dtype}] n={size:>9,} dim={dim} top_k={top_k}  {_percentiles(latencies)}")
+
+
+def bench_dashvector(book_id: str, dim: int, top_k: int, queries: int) -> None:
+    from modules.vector_store import VectorStore
+
+    store = VectorStore()
+    rng = np.random.default_rng(1)
+    filter_expr = f"book_id = '{book_id}'" if book_id else None
+    store.search(rng.standard_normal(dim).tolist(), top_k, filter_expr)  # 预热（建立连接）
+
+    latencies = []
+    for _ in range(queries):
+        q = rng.standard_normal(dim).tolist()
+        t0 = time.perf_counter()
+        store.search(q, top_k, filter_expr)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    print(f"[dashvector] collection={settings.DASHVECTOR_COLLECTION} filter={filter_expr} top_k={top_k}  {_percentiles(latencies)}")
+
+
+# 投影方案：全部字段 / 仅正文 / 仅列表字段
+PROJECTIONS = {
+    "all": None,
+    "text": ["text"],
+    "list": ["book_id", "resource_id", "chapter_id", "page"],
+}
+
+
+def bench_projection(book_id: str, dim: int, top_k: int, queries: int) -> None:
+    """对比不同 output_fields 的响应负载大小和延迟"""
+    from modules.vector_store import VectorStore
+
+    store = VectorStore()
+    rng = np.random.default_rng(2)
+    filter_expr = f"book_id = '{book_id}'" if book_id else None
+    query_vectors = [rng.standard_normal(dim).tolist() for _ in range(queries)]
+    store.search(query_vectors[0], top_k, filter_expr)  # 预热（建立连接）
+
+    for name, output_fields in PROJECTIONS.items():
+        latencies, payload = [], 0
+        for q in query_vectors:
+            t0 = time.perf_counter()
+            results = store.search(q, top_k, filter_expr, output_fields=output_fields)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            payload += len(json.dumps(results, ensure_ascii=False).encode("utf-8"))
+        print(f"[projection/{name:<4}] top_k={top_k}  avg_payload={payload / queries / 1024:.1f}KB  {_percentiles(latencies)}")
+
+
+def _mrl_vectors(size: int, dim: int, seed: int = 0) -> np.ndarray:
+    """
+    合成近似 Matryoshka 分布的向量：每维方差随维度衰减，信息集中在前缀
+
+    真实 embedding 模型是否满足该性质需要用 --vectors 加载真实向量验证。
+    """
+    rng = np.random.default_rng(seed)
+    scale = (1.0 / np.sqrt(1.0 + np.arange(dim) / 64.0)).astype(np.float32)
+    return normalize_rows(rng.standard_normal((size, dim)).astype(np.float32) * scale)
+
+
+def bench_two_stage(
+    sizes: list,
+    dim: int,
+    coarse_dim: int,
+    candidates: int,
+    top_k: int,
+    queries: int,
+    vectors_path: str = None
+) -> None:
+    """
+    对比两阶段检索（低维候选 + 完整维度重排）与单阶段完整维度检索
+
+    召回率以完整维度精确检索为基准；查询向量取自索引中的向量并加噪声。
+    """
+    datasets = []
+    if vectors_path:
+        real = normalize_rows(np.load(vectors_path, mmap_mode="r").astype(np.float32))
+        datasets.append((f"real:{vectors_path}", real))
+    else:
+        datasets.extend((f"synthetic-mrl n={size}", _mrl_vectors(size, dim)) for size in sizes)
+
+    rng = np.random.default_rng(3)
+    for name, matrix in datasets:
+        size, full_dim = matrix.shape
+        picks = rng.choice(size, size=min(queries, size), replace=False)
+        query_vectors = normalize_rows(matrix[picks] + rng.normal(0, 0.05, (len(picks), full_dim)).astype(np.float32))
+
+        with tempfile.TemporaryDirectory() as full_dir, tempfile.TemporaryDirectory() as coarse_dir:
+            full = _build_local_index(full_dir, size, full_dim, "float32", blocks=lambda s, e: matrix[s:e])
+            searcher = TwoStageSearcher(
+                fetch_full=full.fetch, base_dir=coarse_dir, dimension=coarse_dim, candidates=candidates
+            )
+            _build_local_index(coarse_dir, size, coarse_dim, "float16", blocks=lambda s, e: matrix[s:e, :coarse_dim])
+
+            filter_expr = "book_id = 'bench'"
+            full.search(query_vectors[0].tolist(), top_k, filter_expr)  # 预热（加载 mmap）
+            searcher.search(query_vectors[0].tolist(), top_k, filter_expr)
+
+            results = {"single": ([], []), "two-stage": ([], [])}
+            for q in query_vectors:
+                expected = {f"doc-{i}" for i in np.argsort(-(matrix @ q))[:top_k]}
+                for label, run in (("single", full.search), ("two-stage", searcher.search)):
+                    t0 = time.perf_counter()
+                    hits = run(q.tolist(), top_k, filter_expr, output_fields=[])
+                    results[label][0].append((time.perf_counter() - t0) * 1000)
+                    results[label][1].append(len({h["id"] for h in hits} & expected) / top_k)
+            full.close()
+            searcher.coarse.close()
+
+        print(
+            f"[two-stage] {name} dim={full_dim}->{coarse_dim} candidates={candidates}  "
+            f"index={size * full_dim * 4 / 2**20:.0f}MB(float32) -> {size * coarse_dim * 2 / 2**20:.0f}MB(float16)"
+        )
+        for label, (latencies, recalls) in results.items():
+            print(f"  [{label:<9}] recall@{top_k}={np.mean(recalls):.3f}  {_percentiles(latencies)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量检索延迟基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIMENSION)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dashvector", action="store_true", help="同时测试 DashVector")
+    parser.add_argument("--book-id", default=None, help="DashVector 检索使用的 book_id 过滤")
+    parser.add_argument("--projection", action="store_true", help="对比 DashVector 字段投影的负载和延迟")
+    parser.add_argument("--two-stage", action="store_true", help="对比两阶段检索与单阶段检索的召回率和延迟")
+    parser.add_argument("--coarse-dim", type=int, default=settings.TWO_STAGE_DIMENSION)
+    parser.add_argument("--candidates", type=int, default=settings.TWO_STAGE_CANDIDATES)
+    parser.add_argument("--vectors", default=None, help="两阶段测试使用的真实向量 .npy 文件（如热缓存快照）")
+    args = parser.parse_args()
+
+    if args.two_stage:
+        bench_two_stage(
+            args.sizes, args.dim, args.coarse_dim, args.candidates,
+            args.top_k, args.queries, args.vectors
+        )
+        return
+
+    bench_local(args.sizes, args.dim, args.dtype, args.top_k, args.queries)
+    if args.dashvector:
+        bench_dashvector(args.book_id, args.dim, args.top_k, args.queries)
+        if args.projection:
+            bench_projection(args.book_id, args.dim, args.top_k, args.queries)
+
+
+if __name__ == "__main__":
+    main()
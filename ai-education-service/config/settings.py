@@ -49,11 +49,135 @@ class Settings(BaseSettings):
     CHAT_MODEL: str = "qwen-flash"  # 阿里云 Qwen 模型
     OPENROUTER_CHAT_MODEL: str = "x-ai/grok-4.1-fast"  # OpenRouter 备用
 
+    # LLM 客户端（所有 chat/completions 调用共用连接池和重试策略）
+    LLM_TIMEOUT: float = 60.0  # 默认超时（秒），各调用点可单独指定
+    LLM_MAX_RETRIES: int = 2  # 连接错误、超时、408/429/5xx 的最大重试次数
+    LLM_RETRY_BACKOFF: float = 0.5  # 指数退避基数（秒）
+    LLM_MAX_CONNECTIONS: int = 20  # 每个提供方的连接池上限（keep-alive）
+    LLM_KEEPALIVE_EXPIRY: float = 30.0  # 空闲连接保留时间（秒）
+    LLM_METRICS_WINDOW: int = 500  # 每个调用点用于计算延迟分位数的最近调用数
+
+    # LLM 响应缓存（按调用点启用，配置 REDIS_URL 时使用 Redis 二级缓存）
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 5000  # 进程内 LRU 条目上限
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.2  # 只缓存 temperature 不高于此值的调用
+    LLM_CACHE_TTL_CLASSIFY: int = 3600  # 意图分析、路由分类（秒）
+    LLM_CACHE_TTL_REWRITE: int = 3600  # 查询改写（秒）
+    LLM_CACHE_TTL_CYPHER: int = 86400  # 自然语言转 Cypher（秒）
+    LLM_CACHE_TTL_EXTRACTION: int = 604800  # 入库时的实体 / 章节抽取，重复入库同一内容时复用（秒）
+
     # ==================== 阿里云 DashVector 配置 ====================
     # 华北3(张家口) 集群: Dao123_
     DASHVECTOR_API_KEY: str
     DASHVECTOR_ENDPOINT: str  # 格式: vrs-cn-xxx.dashvector.cn-zhangjiakou.aliyuncs.com
     DASHVECTOR_COLLECTION: str = "ces"  # 集合名称，2048维，Cosine度量
+    DASHVECTOR_INSERT_CONCURRENCY: int = 4  # 并发写入的批次数
+    DASHVECTOR_PARTITION_MODE: str = "none"  # 分区方式: "none"（book_id 过滤）、"book"（每本书一个分区）、"bucket"（按哈希分桶）
+    DASHVECTOR_PARTITION_BUCKETS: int = 64  # bucket 模式的分桶数量（分区数量有上限时使用）
+
+    # ==================== 向量存储后端配置 ====================
+    VECTOR_STORE_BACKEND: str = "dashvector"  # 可选: "dashvector" 或 "local"
+    LOCAL_VECTOR_DIR: str = "./data/vectors"  # 本地向量存储目录（按 book_id 分文件）
+    LOCAL_VECTOR_DTYPE: str = "float32"  # 本地向量精度: "float32" 或 "float16"
+
+    # ==================== 热门教材向量缓存 ====================
+    HOT_CACHE_ENABLED: bool = False  # 是否启用热缓存（DashVector 前置）
+    HOT_CACHE_MAX_MB: int = 512  # 热缓存内存预算（按书 LRU 淘汰）
+    HOT_CACHE_TOP_N: int = 10  # 后台预热的热门教材数量
+    HOT_CACHE_MIN_RATE: float = 1.0  # 预热门槛：每个预热周期的平滑请求数
+    HOT_CACHE_WARMUP_INTERVAL: int = 60  # 预热周期（秒）
+    HOT_CACHE_SNAPSHOT_DIR: str = "./data/hot_snapshots"  # 入库时写入的 float16 向量快照
+
+    # ==================== 检索结果缓存 ====================
+    RETRIEVAL_CACHE_ENABLED: bool = False  # 缓存 VectorStore.search 结果（配置 REDIS_URL 时使用 Redis 二级缓存）
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 5000  # 进程内 LRU 条目上限
+    RETRIEVAL_CACHE_TTL: int = 3600  # 条目过期时间（秒）
+    RETRIEVAL_CACHE_QUANT_STEP: float = 0.001  # 查询向量量化步长（归一化后）
+
+    # ==================== 语义回答缓存 ====================
+    ANSWER_CACHE_ENABLED: bool = True  # 同一本书的相同 / 近似问题直接返回缓存的回答和引用（有对话历史时绕过）
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # 问题向量余弦相似度阈值
+    ANSWER_CACHE_TTL: int = 86400  # 条目过期时间（秒）
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000  # 每本书（+ 意图 + 过滤条件）的条目上限
+    ANSWER_CACHE_STREAM_CHUNK_CHARS: int = 4  # 流式输出缓存回答时每块字符数
+    ANSWER_CACHE_STREAM_DELAY: float = 0.0  # 流式输出缓存回答时块之间的间隔（秒），0 表示不等待
+
+    # ==================== 两阶段（Matryoshka）检索 ====================
+    TWO_STAGE_ENABLED: bool = False  # 低维索引取候选 + 完整维度精确重排（未建低维索引的教材回退单阶段）
+    TWO_STAGE_DIMENSION: int = 512  # 第一阶段维度（取完整向量前缀）
+    TWO_STAGE_CANDIDATES: int = 100  # 第一阶段候选数量
+    TWO_STAGE_INDEX_DIR: str = "./data/vectors_512"  # 低维索引目录（float16）
+    TWO_STAGE_RESCORE_SOURCE: str = "dashvector"  # 重排向量来源: "dashvector"（fetch）或 "local"
+    TWO_STAGE_FULL_DIR: str = "./data/vectors_full"  # RESCORE_SOURCE=local 时的完整向量目录（float16）
+
+    # ==================== 关键词倒排索引（BM25）====================
+    KEYWORD_INDEX_ENABLED: bool = True  # 入库时按书构建倒排索引，混合检索和 keyword_search 工具直接查询
+    KEYWORD_INDEX_DIR: str = "./data/keyword_index"  # 倒排索引目录
+    BM25_K1: float = 1.2  # 词频饱和参数
+    BM25_B: float = 0.75  # 文档长度归一化参数
+
+    # ==================== 混合检索 ====================
+    HYBRID_FUSION: str = "rrf"  # 融合方式: "rrf"、"weighted"（归一化分数加权）、"boost"（旧的候选内关键词加权）、"vector"
+    HYBRID_VECTOR_WEIGHT: float = 1.0  # 向量检索的融合权重
+    HYBRID_KEYWORD_WEIGHT: float = 1.0  # BM25 检索的融合权重
+
+    # ==================== 重排序 ====================
+    RERANK_METHOD: str = "local"  # 重排序方式: "local"（向量余弦 + 词项覆盖 + MMR）或 "llm"（LLM 排序，较慢）
+    RERANK_MMR_LAMBDA: float = 0.7  # MMR 相关性权重（1.0 表示不做去冗余）
+    RERANK_LEXICAL_WEIGHT: float = 0.2  # 词项覆盖率在相关性中的权重
+    RERANK_VECTOR_CACHE_SIZE: int = 20000  # 分块向量 LRU 缓存条数
+
+    # ==================== 上下文打包 ====================
+    CONTEXT_PACKING_ENABLED: bool = True  # 按 token 预算打包上下文（去重、去相邻重叠、按分数背包）；关闭时按字符数截断
+    CONTEXT_TOKEN_BUDGET: int = 3000  # 默认上下文 token 预算
+    CONTEXT_TOKEN_BUDGETS: str = ""  # 按模型的预算，格式: "qwen-flash:6000,x-ai/grok-4.1-fast:8000"
+    CONTEXT_TRUNCATE_SENTENCES: bool = True  # 剩余预算放入一个按句子边界截断的片段
+
+    # ==================== 上下文压缩 ====================
+    CONTEXT_COMPRESSION_ENABLED: bool = True  # 生成前按查询抽取关键句（保留 [来源X] 标记）
+    CONTEXT_COMPRESSION_RATIO: float = 0.4  # 每个片段保留的字符比例
+    CONTEXT_COMPRESSION_NEIGHBOURS: int = 1  # 每个入选句子连带保留的前后句数
+    CONTEXT_COMPRESSION_MIN_CHARS: int = 120  # 短于此长度的片段不压缩
+    CONTEXT_COMPRESSION_EMBEDDING: bool = False  # 句子打分加上 embedding 余弦（需要请求 embedding 模型，增加首 token 前的网络往返）
+
+    # ==================== 父窗口检索（small-to-big）====================
+    PARENT_WINDOW_ENABLED: bool = False  # 入库按小分块向量化并保存全文，检索命中后扩展为父窗口（开启后需重新入库）
+    PARENT_CHILD_CHUNK_SIZE: int = 192  # 子分块大小（token）
+    PARENT_CHILD_CHUNK_OVERLAP: int = 20  # 子分块重叠（token）
+    PARENT_WINDOW_CHARS: int = 1000  # 父窗口字符数（以子分块为中心，边界对齐到句子）
+    PARENT_WINDOW_MERGE_GAP: int = 50  # 同一文档的窗口间隔不超过此字符数时合并为一段
+    WINDOW_STORE_DIR: str = "./data/window_store"  # 文档全文存储目录（按书分文件，zstd 分块压缩）
+    WINDOW_STORE_BLOCK_CHARS: int = 4096  # 压缩块字符数（读取窗口时只解压覆盖的块）
+
+    # ==================== 章节范围检索 ====================
+    CHAPTER_SCOPE_ENABLED: bool = True  # 入库时按页码 / 标题标注分块 chapter_id，查询范围（如"第三章"）限定到章节子树
+    CHAPTER_CACHE_TTL: int = 600  # 教材章节树的进程内缓存时间（秒）
+
+    # ==================== 分层检索（章节摘要路由）====================
+    HIERARCHICAL_RETRIEVAL_ENABLED: bool = False  # 入库时生成章节摘要向量，检索先选章节再在章节内检索分块（开启后需重新入库）
+    CHAPTER_ROUTE_TOP_N: int = 3  # 每次检索至少选取的章节数（不足 top_k 个分块时继续补充）
+    CHAPTER_SUMMARY_CHARS: int = 600  # 章节摘要字符数（标题路径 + 各分块首句）
+    CHAPTER_INDEX_DIR: str = "./data/chapter_index"  # 章节摘要向量存储目录
+
+    # ==================== 假设问题索引 ====================
+    QUESTION_INDEX_ENABLED: bool = False  # 入库时为每个分块生成假设问题并向量化，查询时用原问题匹配（替代 HyDE）
+    QUESTION_INDEX_DIR: str = "./data/question_index"  # 问题向量存储目录（本地，按书分文件）
+    QUESTIONS_PER_CHUNK: int = 3  # 每个分块生成的问题数
+    QUESTION_GEN_BATCH: int = 8  # 每次 LLM 调用处理的分块数
+    QUESTION_GEN_CONCURRENCY: int = 4  # 问题生成的并发 LLM 调用数
+    HYDE_SKIP_WITH_QUESTION_INDEX: bool = True  # 教材已有问题索引时跳过查询时的 HyDE
+
+    # ==================== HyDE ====================
+    HYDE_CACHE_MAX_ENTRIES: int = 2000  # HyDE 结果进程内 LRU 条目上限（按归一化问题缓存），0 表示不缓存
+    HYDE_CACHE_TTL: int = 3600  # HyDE 结果过期时间（秒）
+
+    # ==================== 查询准备 ====================
+    SPECULATIVE_RETRIEVAL_ENABLED: bool = True  # 查询改写期间先用原问题检索，改写结果几乎不变时直接复用
+    SPECULATIVE_REUSE_SIMILARITY: float = 0.9  # 复用阈值：原问题与改写结果归一化后的字符相似度
+
+    # ==================== 文档登记（文档级元数据）====================
+    DOCUMENT_REGISTRY_ENABLED: bool = True  # 文档级元数据存 PostgreSQL，分块只保留 doc_ref
+    DOCUMENT_REGISTRY_CACHE_SIZE: int = 2048  # 检索时关联文档元数据的进程内 LRU 缓存条数
     
     # ==================== LlamaIndex 配置 ====================
     # 文档分块配置
@@ -99,6 +223,7 @@ class Settings(BaseSettings):
     SUMMARY_TOKEN_THRESHOLD: int = 2000  # 触发压缩的 Token 阈值
     SUMMARY_CHAR_THRESHOLD: int = 3000   # 触发压缩的中文字符阈值
     SUMMARY_EXPIRE_SECONDS: int = 86400 * 7  # 摘要过期时间：7天
+    SUMMARY_BACKGROUND_COMPRESS: bool = True  # 摘要生成放到后台，本轮回答使用最近消息和已有摘要
 
     # ==================== 日志配置 ====================
     LOG_LEVEL: str = "INFO"
@@ -22,6 +22,7 @@ from modules.langgraph import (
     set_checkpointer,
     set_store,
 )
+from modules.llm_client import close_llm_clients
 
 # 配置日志
 logging.basicConfig(
@@ -86,6 +87,7 @@ async def lifespan(app: FastAPI):
         set_memory_manager(None)
         set_store(None)
         set_checkpointer(None)
+        await close_llm_clients()
 
 
 # 创建 FastAPI 应用
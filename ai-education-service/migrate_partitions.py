@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+DashVector 分区迁移工具
+
+将默认分区中按 book_id 过滤的数据迁移到分区（每本书一个分区或按哈希分桶），
+并对比迁移前后的检索延迟和召回率。
+
+迁移方式：按 book_id 从默认分区拉取一页（最多 1024 条）-> upsert 到目标分区 -> 从默认分区删除，
+循环直到该书在默认分区中没有数据。upsert 幂等，中断后可重复执行。
+
+用法:
+    python migrate_partitions.py --mode book --book-ids b1 b2
+    python migrate_partitions.py --mode bucket --book-ids-file books.txt --dry-run
+    python migrate_partitions.py --mode book --book-ids b1 --copy --compare   # 保留默认分区数据并对比
+"""
+
+import argparse
+import logging
+import time
+from typing import List, Optional
+
+import dashvector
+import numpy as np
+
+from modules.vector_store import (
+    DASHVECTOR_MAX_TOPK,
+    DEFAULT_PARTITION,
+    VectorStore,
+    partition_name,
+)
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+UPSERT_BATCH = 100
+
+
+def _fetch_page(store: VectorStore, book_id: str, partition: Optional[str] = None) -> list:
+    """从指定分区按 book_id 拉取一页数据（含向量）"""
+    kwargs = {"partition": partition} if partition and partition != DEFAULT_PARTITION else {}
+    result = store._get_collection().query(
+        filter=f"book_id = '{book_id}'",
+        topk=DASHVECTOR_MAX_TOPK,
+        include_vector=True,
+        **kwargs
+    )
+    if result.code != 0:
+        raise RuntimeError(f"拉取数据失败: book_id={book_id}, {result.message}")
+    return list(result.output or [])
+
+
+def migrate_book(store: VectorStore, book_id: str, copy: bool = False, dry_run: bool = False) -> int:
+    """
+    迁移一本书
+
+    Args:
+        copy: 保留默认分区中的数据（仅支持不超过一页的教材，用于迁移前后对比）
+        dry_run: 只统计不写入
+
+    Returns:
+        迁移的向量数量
+    """
+    partition = partition_name(book_id, store.partition_mode)
+    if partition is None:
+        raise ValueError("分区方式为 none，无需迁移")
+
+    moved = 0
+    while True:
+        docs = _fetch_page(store, book_id)
+        if not docs:
+            break
+        if dry_run:
+            more = "+" if len(docs) >= DASHVECTOR_MAX_TOPK else ""
+            logger.info(f"[dry-run] {book_id} -> {partition}: {len(docs)}{more} 条")
+            return len(docs)
+        if copy and len(docs) >= DASHVECTOR_MAX_TOPK:
+            raise RuntimeError(f"教材 {book_id} 超过 {DASHVECTOR_MAX_TOPK} 条，--copy 只能处理单页，请直接迁移")
+
+        store._ensure_partition(partition)
+        new_docs = [dashvector.Doc(id=doc.id, vector=doc.vector, fields=doc.fields) for doc in docs]
+        for i in range(0, len(new_docs), UPSERT_BATCH):
+            failed = store._upsert_batch(new_docs[i:i + UPSERT_BATCH], partition)
+            if failed:
+                raise RuntimeError(f"写入分区失败: {failed[:5]}")
+        moved += len(docs)
+
+        if copy:
+            break
+        if not store._delete_in(None, ids=[doc.id for doc in docs]):
+            raise RuntimeError(f"从默认分区删除失败: book_id={book_id}")
+        logger.info(f"{book_id} -> {partition}: 已迁移 {moved} 条")
+
+    logger.info(f"教材 {book_id} 迁移完成: {moved} 条 -> {partition}")
+    return moved
+
+
+def _recall(found: List[str], expected: List[str]) -> float:
+    return len(set(found) & set(expected)) / max(len(expected), 1)
+
+
+def compare_book(store: VectorStore, book_id: str, queries: int, top_k: int) -> None:
+    """
+    对比 book_id 过滤（默认分区）与分区检索的延迟和召回率
+
+    需要两份数据同时存在（先用 --copy 迁移）。查询向量取自教材分块向量并加噪声，
+    召回率以本地精确检索结果为基准。
+    """
+    docs = _fetch_page(store, book_id)
+    if not docs:
+        logger.warning(f"默认分区中没有教材 {book_id} 的数据，无法对比（请使用 --copy 迁移）")
+        return
+
+    ids = [doc.id for doc in docs]
+    matrix = np.asarray([doc.vector for doc in docs], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(docs), size=min(queries, len(docs)), replace=False)
+    query_vectors = matrix[picks] + rng.normal(0, 0.02, size=(len(picks), matrix.shape[1])).astype(np.float32)
+
+    partition = partition_name(book_id, store.partition_mode)
+    scoped_filter = None if store.partition_mode == "book" else f"book_id = '{book_id}'"
+    collection = store._get_collection()
+    variants = {
+        "filter": lambda q: collection.query(vector=q, topk=top_k, filter=f"book_id = '{book_id}'", output_fields=[]),
+        "partition": lambda q: collection.query(vector=q, topk=top_k, filter=scoped_filter,
+                                                partition=partition, output_fields=[]),
+    }
+
+    for name, run in variants.items():
+        latencies, recalls = [], []
+        for q in query_vectors:
+            expected = [ids[i] for i in np.argsort(-(matrix @ q))[:top_k]]
+            t0 = time.perf_counter()
+            result = run(q.tolist())
+            latencies.append((time.perf_counter() - t0) * 1000)
+            recalls.append(_recall([doc.id for doc in (result.output or [])], expected))
+        arr = np.asarray(latencies)
+        print(
+            f"[{name:<9}] book={book_id} n={len(docs)} top_k={top_k}  "
+            f"p50={np.percentile(arr, 50):.1f}ms  p95={np.percentile(arr, 95):.1f}ms  "
+            f"recall@{top_k}={np.mean(recalls):.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DashVector 分区迁移工具")
+    parser.add_argument("--mode", choices=["book", "bucket"], required=True, help="分区方式")
+    parser.add_argument("--book-ids", nargs="*", default=[], help="要迁移的 book_id")
+    parser.add_argument("--book-ids-file", default=None, help="每行一个 book_id 的文件")
+    parser.add_argument("--copy", action="store_true", help="保留默认分区数据（用于对比）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计不写入")
+    parser.add_argument("--compare", action="store_true", help="迁移后对比延迟和召回率")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    book_ids = list(args.book_ids)
+    if args.book_ids_file:
+        with open(args.book_ids_file, "r", encoding="utf-8") as f:
+            book_ids.extend(line.strip() for line in f if line.strip())
+    if not book_ids:
+        parser.error("需要 --book-ids 或 --book-ids-file")
+
+    store = VectorStore()
+    store.partition_mode = args.mode
+
+    total = 0
+    for book_id in book_ids:
+        try:
+            total += migrate_book(store, book_id, copy=args.copy, dry_run=args.dry_run)
+        except Exception as e:
+            logger.error(f"教材 {book_id} 迁移失败: {e}")
+            continue
+        if args.compare and not args.dry_run:
+            compare_book(store, book_id, args.queries, args.top_k)
+
+    logger.info(f"迁移结束: {len(book_ids)} 本教材, {total} 条向量")
+
+
+if __name__ == "__main__":
+    main()
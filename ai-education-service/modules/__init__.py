@@ -11,7 +11,8 @@ from .document_processor import (
     Qwen25VLEmbedding,
     get_embedding_model,
 )
-from .vector_store import VectorStore
+from .vector_store import VectorStore, get_vector_store
+from .local_vector_store import LocalVectorStore
 from .pipeline import ProcessingPipeline
 from .rag_retriever import RAGRetriever
 
@@ -21,6 +22,7 @@ from .rag_workflow import (
     RAGStreamWorkflow,
     get_rag_workflow,
     get_rag_stream_workflow,
+    run_rag_stream,
     generate_workflow_diagram,
     generate_execution_trace,
 )
@@ -38,6 +40,8 @@ __all__ = [
     "Qwen25VLEmbedding",
     "get_embedding_model",
     "VectorStore",
+    "LocalVectorStore",
+    "get_vector_store",
     "ProcessingPipeline",
     "RAGRetriever",
     # Workflow 模块
@@ -45,6 +49,7 @@ __all__ = [
     "RAGStreamWorkflow",
     "get_rag_workflow",
     "get_rag_stream_workflow",
+    "run_rag_stream",
     "generate_workflow_diagram",
     "generate_execution_trace",
     "DocumentProcessingWorkflow",
@@ -4,9 +4,11 @@ Query Transformation 模块
 """
 
 import logging
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional, List, Any
 
-import httpx
 from llama_index.core.indices.query.query_transform.base import HyDEQueryTransform
 from llama_index.core.prompts import PromptTemplate
 from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
@@ -14,6 +16,8 @@ from llama_index.core.schema import QueryBundle
 from pydantic import Field
 
 from config import settings
+from ..answer_cache import normalize_question
+from ..llm_client import get_llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -40,73 +44,109 @@ class OpenRouterLLM(CustomLLM):
 
     def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
         """同步完成"""
-        with httpx.Client(timeout=60.0) as client:
-            response = client.post(
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": self.temperature
-                }
-            )
-            response.raise_for_status()
-            text = response.json()["choices"][0]["message"]["content"]
-            return CompletionResponse(text=text)
+        text = get_llm_client("openrouter").complete_sync(
+            prompt, site="hyde", model=self.model, temperature=self.temperature
+        )
+        return CompletionResponse(text=text)
 
     async def acomplete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
         """异步完成"""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": self.temperature
-                }
-            )
-            response.raise_for_status()
-            text = response.json()["choices"][0]["message"]["content"]
-            return CompletionResponse(text=text)
+        text = await get_llm_client("openrouter").complete(
+            prompt, site="hyde", model=self.model, temperature=self.temperature
+        )
+        return CompletionResponse(text=text)
 
     def stream_complete(self, prompt: str, **kwargs: Any):
         raise NotImplementedError("流式完成暂不支持")
 
 
+class HyDECache:
+    """
+    HyDE 检索字符串的进程内 LRU 缓存
+
+    按归一化后的问题缓存（"什么是光合作用？" 与 "什么是光合作用" 共用一条），条目超过 ttl 秒过期。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[int] = None):
+        self.max_entries = settings.HYDE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = settings.HYDE_CACHE_TTL if ttl is None else ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[List[str]]:
+        key = normalize_question(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, strings = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return list(strings)
+
+    def put(self, query: str, strings: List[str]) -> None:
+        if self.max_entries <= 0:
+            return
+        key = normalize_question(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, list(strings))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 class QueryTransformer:
     """
     查询转换器
 
     支持:
-    - HyDE: 生成假设性文档，提高语义检索效果
+    - HyDE: 生成假设性文档，提高语义检索效果（结果按归一化问题缓存）
     """
 
-    def __init__(self):
-        """初始化查询转换器"""
-        self.llm = OpenRouterLLM()
+    def __init__(self, llm: Optional[CustomLLM] = None, cache: Optional[HyDECache] = None):
+        """
+        初始化查询转换器
+
+        Args:
+            llm: 生成假设性文档的 LLM，默认 OpenRouterLLM
+            cache: HyDE 结果缓存，默认按 HYDE_CACHE_MAX_ENTRIES / HYDE_CACHE_TTL 新建
+        """
+        self.llm = llm or OpenRouterLLM()
+        self.cache = cache if cache is not None else HyDECache()
 
         # 初始化 HyDE 转换器
-        hyde_prompt = PromptTemplate(HYDE_PROMPT_TEMPLATE)
+        self.hyde_prompt = PromptTemplate(HYDE_PROMPT_TEMPLATE)
         self.hyde_transform = HyDEQueryTransform(
             llm=self.llm,
-            hyde_prompt=hyde_prompt,
+            hyde_prompt=self.hyde_prompt,
             include_original=True  # 同时保留原始查询
         )
 
         logger.info("QueryTransformer 初始化完成 (HyDE)")
-    
+
+    def _cached(self, query: str) -> Optional[QueryBundle]:
+        """读取缓存，原始查询替换为当前问题（近似问题共用缓存条目）"""
+        cached = self.cache.get(query)
+        if cached is None:
+            return None
+        return QueryBundle(query_str=query, custom_embedding_strs=[query] + cached[1:])
+
+    def _store(self, query: str, hypothetical: str) -> List[str]:
+        """检索字符串统一为 [原始查询, 假设性文档] 并写入缓存（同步 / 异步路径共用缓存，顺序必须一致）"""
+        strings = [query, hypothetical] if hypothetical else [query]
+        self.cache.put(query, strings)
+        return strings
+
     def transform_with_hyde(self, query: str) -> QueryBundle:
         """
-        使用 HyDE 转换查询（同步版本）
+        使用 HyDE 转换查询（同步版本，会阻塞事件循环；异步代码中使用 atransform_with_hyde）
 
-        生成假设性答案，用于提高向量检索的召回率
+        生成假设性答案，用于提高向量检索的召回率。检索字符串顺序同 atransform_with_hyde。
 
         Args:
             query: 原始查询
@@ -114,19 +154,46 @@ class QueryTransformer:
         Returns:
             QueryBundle: 包含原始查询和假设性文档的查询包
         """
+        cached = self._cached(query)
+        if cached is not None:
+            return cached
         try:
             query_bundle = QueryBundle(query_str=query)
             transformed = self.hyde_transform(query_bundle)
+        except Exception as e:
+            logger.error(f"HyDE 转换失败: {e}")
+            return QueryBundle(query_str=query)
 
-            logger.info(f"HyDE 转换完成: '{query[:30]}...'")
-            if transformed.embedding_strs:
-                logger.debug(f"假设性文档: {transformed.embedding_strs[0][:100]}...")
+        # HyDEQueryTransform 的顺序是 [假设性文档, 原始查询]，统一为原始查询在前
+        hypothetical = next((text for text in transformed.embedding_strs if text != query), "").strip()
+        strings = self._store(query, hypothetical)
+        logger.info(f"HyDE 转换完成: '{query[:30]}...'")
+        logger.debug(f"假设性文档: {hypothetical[:100]}...")
+        return QueryBundle(query_str=query, custom_embedding_strs=strings)
 
-            return transformed
+    async def atransform_with_hyde(self, query: str) -> QueryBundle:
+        """
+        使用 HyDE 转换查询（异步版本，可与路由分类等 LLM 调用并发）
+
+        检索字符串为 [原始查询, 假设性文档]，原始查询在前（向量检索工具用第一个查询匹配假设问题索引）。
+        失败时只返回原始查询，且不写入缓存。
+        """
+        cached = self._cached(query)
+        if cached is not None:
+            logger.info(f"HyDE 缓存命中: '{query[:30]}...'")
+            return cached
+        try:
+            response = await self.llm.acomplete(self.hyde_prompt.format(context_str=query))
+            hypothetical = response.text.strip()
         except Exception as e:
             logger.error(f"HyDE 转换失败: {e}")
             return QueryBundle(query_str=query)
 
+        strings = self._store(query, hypothetical)
+        logger.info(f"HyDE 转换完成: '{query[:30]}...'")
+        logger.debug(f"假设性文档: {hypothetical[:100]}...")
+        return QueryBundle(query_str=query, custom_embedding_strs=strings)
+
     def get_embedding_strings(self, transformed: QueryBundle) -> List[str]:
         """获取用于 embedding 的字符串列表"""
         if transformed.embedding_strs:
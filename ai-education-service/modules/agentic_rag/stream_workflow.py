@@ -3,6 +3,7 @@ Agentic RAG 流式工作流
 支持实时输出 Agent 思考过程
 """
 
+import asyncio
 import logging
 import json
 from typing import List, Dict, Any, Optional, AsyncGenerator
@@ -14,7 +15,6 @@ from llama_index.core.workflow import (
     step,
     Context,
 )
-import httpx
 
 from config import settings
 from .events import (
@@ -29,8 +29,13 @@ from .events import (
     RetryEvent,
     SynthesizeEvent,
 )
-from .tools import ToolRegistry, VectorSearchTool, CalculatorTool, KnowledgeGraphTool
+from .tools import (
+    ToolRegistry, VectorSearchTool, KeywordSearchTool, CalculatorTool, KnowledgeGraphTool, merge_vector_subtasks
+)
 from .query_transform import get_query_transformer
+from ..question_index import get_question_index
+from ..context_compressor import acompress_context
+from ..llm_client import get_llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -52,48 +57,46 @@ class AgenticStreamWorkflow(Workflow):
         self.tool_registry = tool_registry or ToolRegistry()
         self.chat_model = settings.CHAT_MODEL
 
-    async def _call_llm(self, messages: List[Dict], temperature: float = 0.3) -> str:
-        """调用 LLM"""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={"model": self.chat_model, "messages": messages, "temperature": temperature}
-            )
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+    async def _call_llm(
+        self, messages: List[Dict], temperature: float = 0.3, site: str = "agentic_stream",
+        cache_ttl: Optional[int] = None
+    ) -> str:
+        """调用 LLM（cache_ttl 见 LLMClient.chat）"""
+        return await get_llm_client("openrouter").complete(
+            messages, site=site, model=self.chat_model, temperature=temperature, timeout=60.0, cache_ttl=cache_ttl
+        )
 
     async def _stream_llm(self, messages: List[Dict]) -> AsyncGenerator[str, None]:
         """流式调用 LLM"""
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                "POST",
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={"model": self.chat_model, "messages": messages, "temperature": 0.7, "stream": True}
-            ) as response:
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            content = chunk.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
+        async for content in get_llm_client("openrouter").stream(
+            messages, site="agentic_stream.synthesize", model=self.chat_model, temperature=0.7, timeout=120.0
+        ):
+            yield content
+
+    async def _collect_hyde(self, ctx: Context, query: str, hyde_task: Optional[asyncio.Task]) -> None:
+        """等待与路由分类并发执行的 HyDE，写入检索字符串（失败时使用原始查询）"""
+        if hyde_task is None:
+            return
+        try:
+            query_transformer = get_query_transformer()
+            hyde_queries = query_transformer.get_embedding_strings(await hyde_task)
+
+            # 子步骤 1.3：查询优化完成
+            ctx.write_event_to_stream(ProgressEvent(
+                progress_type=ProgressType.ROUTING,
+                message=f"查询优化完成，生成 {len(hyde_queries)} 个检索向量",
+                parent_step=ProgressType.ROUTING,
+                step_level=1
+            ))
+            logger.info(f"HyDE 转换: 原始查询 -> {len(hyde_queries)} 个检索字符串")
+        except Exception as e:
+            logger.warning(f"HyDE 转换失败，使用原始查询: {e}")
+            hyde_queries = [query]
+        await ctx.store.set("hyde_queries", hyde_queries)
 
     @step
     async def route(self, ctx: Context, ev: StartEvent) -> RouteDecisionEvent | StopEvent:
-        """步骤1: 路由决策 + HyDE 查询转换"""
+        """步骤1: 路由决策 + HyDE 查询转换（两次 LLM 调用并发）"""
         query = ev.query
         history = getattr(ev, 'history', None) or []
         book_name = getattr(ev, 'book_name', None)
@@ -122,32 +125,28 @@ class AgenticStreamWorkflow(Workflow):
             step_level=1
         ))
 
-        # 子步骤 1.2：优化查询
-        ctx.write_event_to_stream(ProgressEvent(
-            progress_type=ProgressType.ROUTING,
-            message="正在优化查询（HyDE）...",
-            parent_step=ProgressType.ROUTING,
-            step_level=1
-        ))
-
-        try:
-            query_transformer = get_query_transformer()
-            hyde_result = query_transformer.transform_with_hyde(query)
-            # 获取用于检索的字符串（包含假设性文档）
-            hyde_queries = query_transformer.get_embedding_strings(hyde_result)
-            await ctx.store.set("hyde_queries", hyde_queries)
-
-            # 子步骤 1.3：查询优化完成
+        # 子步骤 1.2：优化查询（教材已有假设问题索引时直接用原问题匹配，跳过 HyDE）
+        # HyDE 在后台与路由分类并发执行，分类完成后再等待结果
+        hyde_task = None
+        question_index = get_question_index()
+        if settings.HYDE_SKIP_WITH_QUESTION_INDEX and question_index is not None \
+                and question_index.covers(getattr(ev, 'filter_expr', None)):
+            await ctx.store.set("hyde_queries", [query])
             ctx.write_event_to_stream(ProgressEvent(
                 progress_type=ProgressType.ROUTING,
-                message=f"查询优化完成，生成 {len(hyde_queries)} 个检索向量",
+                message="使用问题索引匹配，跳过查询改写",
                 parent_step=ProgressType.ROUTING,
                 step_level=1
             ))
-            logger.info(f"HyDE 转换: 原始查询 -> {len(hyde_queries)} 个检索字符串")
-        except Exception as e:
-            logger.warning(f"HyDE 转换失败，使用原始查询: {e}")
-            await ctx.store.set("hyde_queries", [query])
+            logger.info("教材已有假设问题索引，跳过 HyDE")
+        else:
+            ctx.write_event_to_stream(ProgressEvent(
+                progress_type=ProgressType.ROUTING,
+                message="正在优化查询（HyDE）...",
+                parent_step=ProgressType.ROUTING,
+                step_level=1
+            ))
+            hyde_task = asyncio.create_task(get_query_transformer().atransform_with_hyde(query))
 
         # ========== 路由决策 ==========
         route_prompt = f"""分析问题类型（返回JSON）:
@@ -155,7 +154,11 @@ class AgenticStreamWorkflow(Workflow):
 {{"type": "simple|complex|clarify|chitchat", "reasoning": "理由"}}"""
 
         try:
-            result = await self._call_llm([{"role": "user", "content": route_prompt}])
+            # 路由分类只取决于 prompt：低温度 + 响应缓存，重复问题不再调用 LLM
+            result = await self._call_llm(
+                [{"role": "user", "content": route_prompt}], temperature=0.1, site="agentic_stream.route",
+                cache_ttl=settings.LLM_CACHE_TTL_CLASSIFY
+            )
             if "```" in result:
                 result = result.split("```")[1].replace("json", "").strip()
             parsed = json.loads(result)
@@ -172,11 +175,16 @@ class AgenticStreamWorkflow(Workflow):
                 step_level=1
             ))
 
+            if query_type in (QueryType.CHITCHAT, QueryType.CLARIFY) and hyde_task is not None:
+                # 不需要检索，放弃 HyDE
+                hyde_task.cancel()
+                hyde_task = None
+
             if query_type == QueryType.CHITCHAT:
                 answer = await self._call_llm([
                     {"role": "system", "content": "你是友好的教育助手"},
                     {"role": "user", "content": query}
-                ])
+                ], site="agentic_stream.chitchat")
                 return StopEvent(result={"answer": answer, "sources": [], "query_type": "chitchat"})
 
             if query_type == QueryType.CLARIFY:
@@ -185,6 +193,7 @@ class AgenticStreamWorkflow(Workflow):
                     "sources": [], "query_type": "clarify"
                 })
 
+            await self._collect_hyde(ctx, query, hyde_task)
             return RouteDecisionEvent(
                 query=query, query_type=query_type,
                 reasoning=parsed.get("reasoning", ""),
@@ -194,6 +203,7 @@ class AgenticStreamWorkflow(Workflow):
             )
         except Exception as e:
             logger.error(f"路由失败: {e}")
+            await self._collect_hyde(ctx, query, hyde_task)
             return RouteDecisionEvent(
                 query=query, query_type=QueryType.SIMPLE,
                 reasoning=f"默认处理", rewritten_query=query,
@@ -239,11 +249,11 @@ class AgenticStreamWorkflow(Workflow):
                     parent_step=ProgressType.SEARCHING,
                     step_level=1
                 ))
-                # 使用 HyDE 查询进行检索（使用第一个假设性文档）
-                search_query = hyde_queries[0] if hyde_queries else query
+                # 使用全部 HyDE 检索字符串（原始查询 + 假设性文档）一次并发检索并融合
                 return ToolCallEvent(
                     query=query, tool_name="vector_search",
-                    tool_args={"query": search_query, "top_k": 5, "filter_expr": filter_expr},
+                    tool_args={"query": query, "queries": hyde_queries or [query],
+                               "top_k": 5, "filter_expr": filter_expr},
                     subtask_id="simple", history=history
                 )
 
@@ -266,7 +276,7 @@ class AgenticStreamWorkflow(Workflow):
             plan_prompt = f"""分解问题: {query}
 {self.tool_registry.get_tools_prompt()}
 返回: {{"subtasks": [{{"id": "1", "query": "子查询", "tool": "vector_search"}}]}}"""
-            result = await self._call_llm([{"role": "user", "content": plan_prompt}])
+            result = await self._call_llm([{"role": "user", "content": plan_prompt}], site="agentic_stream.plan")
             if "```" in result:
                 result = result.split("```")[1].replace("json", "").strip()
             parsed = json.loads(result)
@@ -275,6 +285,8 @@ class AgenticStreamWorkflow(Workflow):
                        tool=t.get("tool", "vector_search"),
                        tool_args={"query": t.get("query", query), "top_k": 5})
                 for i, t in enumerate(parsed.get("subtasks", [{"query": query}]))]
+            # 多个向量检索子任务合并为一次多查询检索
+            subtasks = merge_vector_subtasks(subtasks)
 
             # 子步骤：规划完成
             ctx.write_event_to_stream(ProgressEvent(
@@ -413,7 +425,7 @@ class AgenticStreamWorkflow(Workflow):
 内容: {context[:2000]}
 {{"decision": "sufficient|retry", "reason": "理由", "suggestions": "建议"}}"""
         try:
-            result = await self._call_llm([{"role": "user", "content": prompt}], 0.1)
+            result = await self._call_llm([{"role": "user", "content": prompt}], 0.1, site="agentic_stream.reflect")
             if "```" in result:
                 result = result.split("```")[1].replace("json", "").strip()
             return json.loads(result)
@@ -460,9 +472,11 @@ class AgenticStreamWorkflow(Workflow):
             ))
             return StopEvent(result={"answer": "抱歉，没有找到相关信息。", "sources": []})
 
+        # 抽取与问题相关的句子，[来源X] 标记不变
+        context = await acompress_context(ev.query, ev.context)
         prompt = f"""基于资料回答问题，标注来源如[来源1]。
 资料:
-{ev.context}
+{context}
 问题: {ev.query}"""
 
         messages = [{"role": "system", "content": "你是专业教育助手"}]
@@ -499,14 +513,18 @@ def get_agentic_stream_workflow() -> AgenticStreamWorkflow:
     """获取流式 AgenticRAGWorkflow 单例"""
     global _stream_workflow
     if _stream_workflow is None:
-        from ..vector_store import VectorStore
+        from ..vector_store import get_vector_store
         from ..document_processor import get_embedding_model
+        from ..keyword_index import get_keyword_index
 
         registry = ToolRegistry()
-        vector_store = VectorStore()
+        vector_store = get_vector_store()
         embedding_model = get_embedding_model()
 
         registry.register(VectorSearchTool(vector_store, embedding_model))
+        keyword_index = get_keyword_index()
+        if keyword_index is not None:
+            registry.register(KeywordSearchTool(keyword_index, vector_store))
         registry.register(CalculatorTool())
         registry.register(KnowledgeGraphTool())
 
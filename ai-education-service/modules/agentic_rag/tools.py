@@ -12,6 +12,10 @@ from typing import Dict, Any, List, Optional, Type
 from dataclasses import dataclass
 
 from config import settings
+from .events import SubTask
+from ..vector_store import reciprocal_rank_fusion
+from ..window_store import get_window_store
+from ..question_index import get_question_index, resolve_question_hits
 
 logger = logging.getLogger(__name__)
 
@@ -88,6 +92,29 @@ class VectorSearchTool(Tool):
     def __init__(self, vector_store, embedding_model):
         self.vector_store = vector_store
         self.embedding_model = embedding_model
+        self.window_store = get_window_store()
+        self.question_index = get_question_index()
+
+    def _question_results(self, embedding: List[float], top_k: int, filter_expr: Optional[str]) -> List[Dict[str, Any]]:
+        """用原问题向量匹配假设问题索引，映射回分块（教材没有问题索引时返回空列表）"""
+        if self.question_index is None or not self.question_index.covers(filter_expr):
+            return []
+        try:
+            hits = self.question_index.search(embedding, top_k=top_k, filter_expr=filter_expr)
+            return resolve_question_hits(self.vector_store, hits, filter_expr)
+        except Exception as e:
+            logger.warning(f"假设问题索引检索失败: {e}")
+            return []
+
+    def _expand(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """父窗口模式下把子分块命中扩展为父窗口"""
+        if self.window_store is None:
+            return results
+        try:
+            return self.window_store.expand(results)
+        except Exception as e:
+            logger.warning(f"父窗口扩展失败，使用子分块: {e}")
+            return results
     
     @classmethod
     def get_parameters_schema(cls) -> Dict[str, Any]:
@@ -95,43 +122,100 @@ class VectorSearchTool(Tool):
             "type": "object",
             "properties": {
                 "query": {"type": "string", "description": "检索查询"},
+                "queries": {"type": "array", "items": {"type": "string"},
+                            "description": "多个检索查询（如 HyDE 假设性文档、多个子查询），一次并发检索后融合排序"},
                 "top_k": {"type": "integer", "description": "返回数量", "default": 5},
+                "fused_top_k": {"type": "integer", "description": "多查询融合后的返回数量，默认等于 top_k"},
                 "filter_expr": {"type": "string", "description": "过滤表达式"}
             },
             "required": ["query"]
         }
     
-    async def execute(self, query: str, top_k: int = 5, filter_expr: str = None) -> Dict[str, Any]:
-        """执行向量检索"""
+    async def execute(self, query: str, top_k: int = 5, filter_expr: str = None,
+                      queries: Optional[List[str]] = None, fused_top_k: Optional[int] = None) -> Dict[str, Any]:
+        """执行向量检索（传入多个 queries 时批量 embedding + 并发检索 + RRF 融合）"""
         try:
-            # 生成 embedding（使用 get_text_embedding）
-            embedding = self.embedding_model.get_text_embedding(query)
-            
-            # 检索
-            results = self.vector_store.search(
-                query_embedding=embedding,
+            texts = [q for q in (queries or []) if q] or [query]
+
+            if len(texts) == 1:
+                # 生成 embedding（使用 get_text_embedding）
+                embedding = self.embedding_model.get_text_embedding(texts[0])
+
+                # 检索
+                results = self.vector_store.search(
+                    query_embedding=embedding,
+                    top_k=top_k,
+                    filter_expr=filter_expr
+                )
+                matched = self._question_results(embedding, top_k, filter_expr)
+                if matched:
+                    results = reciprocal_rank_fusion([results, matched], top_k)
+                results = self._expand(results)
+                return {
+                    "success": True,
+                    "results": results,
+                    "count": len(results)
+                }
+
+            # 多查询：一次批量 embedding，一轮并发检索
+            embeddings = self.embedding_model.get_text_embedding_batch(texts)
+            searched = self.vector_store.search_many(
+                query_embeddings=embeddings,
                 top_k=top_k,
                 filter_expr=filter_expr
             )
-            
+            fused = searched["fused"]
+            # 原问题（第一个查询）同时匹配假设问题索引，作为额外一路参与融合
+            matched = self._question_results(embeddings[0], top_k, filter_expr)
+            if matched or (fused_top_k and fused_top_k != top_k):
+                fused = reciprocal_rank_fusion(searched["per_query"] + ([matched] if matched else []), fused_top_k or top_k)
+            fused = self._expand(fused)
+            logger.info(f"多向量检索: {len(texts)} 个查询 -> 融合 {len(fused)} 条")
+
             return {
                 "success": True,
-                "results": results,
-                "count": len(results)
+                "results": fused,
+                "per_query": [
+                    {"query": text, "results": results}
+                    for text, results in zip(texts, searched["per_query"])
+                ],
+                "count": len(fused)
             }
         except Exception as e:
             logger.error(f"向量检索失败: {e}")
             return {"success": False, "error": str(e), "results": []}
 
 
+def merge_vector_subtasks(subtasks: List[SubTask], top_k: int = 5) -> List[SubTask]:
+    """
+    将规划出的多个 vector_search 子任务合并为一次多查询检索
+
+    其他工具的子任务保持原顺序，排在合并任务之后。
+    """
+    vector_tasks = [t for t in subtasks if t.tool == VectorSearchTool.name]
+    if len(vector_tasks) <= 1:
+        return subtasks
+
+    queries = [t.tool_args.get("query") or t.description for t in vector_tasks]
+    merged = SubTask(
+        id="+".join(t.id for t in vector_tasks),
+        description=" | ".join(queries),
+        tool=VectorSearchTool.name,
+        tool_args={"query": queries[0], "queries": queries, "top_k": top_k,
+                   "fused_top_k": top_k * len(queries)},
+    )
+    return [merged] + [t for t in subtasks if t.tool != VectorSearchTool.name]
+
+
 class KeywordSearchTool(Tool):
     """关键词检索工具"""
     
     name = "keyword_search"
     description = "基于关键词匹配的检索，适合查找包含特定术语或名词的内容"
     
-    def __init__(self, vector_store):
-        self.vector_store = vector_store
+    def __init__(self, keyword_index, vector_store=None):
+        self.keyword_index = keyword_index
+        self.vector_store = vector_store  # 补全命中分块的正文
     
     @classmethod
     def get_parameters_schema(cls) -> Dict[str, Any]:
@@ -145,21 +229,22 @@ class KeywordSearchTool(Tool):
             "required": ["keywords"]
         }
     
-    async def execute(self, keywords: List[str], top_k: int = 5, filter_expr: str = None) -> Dict[str, Any]:
-        """执行关键词检索（基于向量存储的文本匹配）"""
+    async def execute(self, keywords: Optional[List[str]] = None, top_k: int = 5, filter_expr: str = None,
+                      query: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """执行关键词检索（BM25 倒排索引；规划器只给出 query 时以 query 作为关键词）"""
         try:
-            # 简化实现：将关键词组合成查询
-            # 实际可以扩展为 BM25 或 Elasticsearch
-            combined_query = " ".join(keywords)
-
-            # 这里复用向量检索，实际项目可以接入专门的关键词检索引擎
+            if isinstance(keywords, str):
+                keywords = [keywords]
+            keywords = keywords or ([query] if query else [])
+            combined_query = " ".join(k for k in keywords if k)
             logger.info(f"关键词检索: {keywords}")
 
+            results = self.keyword_index.search(combined_query, top_k=top_k, filter_expr=filter_expr,
+                                                vector_store=self.vector_store)
             return {
                 "success": True,
-                "results": [],  # 需要实际实现
-                "count": 0,
-                "note": "关键词检索需要接入专门的搜索引擎"
+                "results": results,
+                "count": len(results)
             }
         except Exception as e:
             logger.error(f"关键词检索失败: {e}")
@@ -15,7 +15,6 @@ from llama_index.core.workflow import (
     step,
     Context,
 )
-import httpx
 
 from config import settings
 from .events import (
@@ -30,7 +29,11 @@ from .events import (
     RetryEvent,
     SynthesizeEvent,
 )
-from .tools import ToolRegistry, VectorSearchTool, CalculatorTool, KnowledgeGraphTool
+from .tools import (
+    ToolRegistry, VectorSearchTool, KeywordSearchTool, CalculatorTool, KnowledgeGraphTool, merge_vector_subtasks
+)
+from ..context_compressor import acompress_context
+from ..llm_client import get_llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -56,23 +59,14 @@ class AgenticRAGWorkflow(Workflow):
         self.chat_model = settings.CHAT_MODEL
         logger.info("AgenticRAGWorkflow 初始化完成")
 
-    async def _call_llm(self, messages: List[Dict], temperature: float = 0.3) -> str:
-        """调用 LLM"""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.chat_model,
-                    "messages": messages,
-                    "temperature": temperature,
-                }
-            )
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+    async def _call_llm(
+        self, messages: List[Dict], temperature: float = 0.3, site: str = "agentic",
+        cache_ttl: Optional[int] = None
+    ) -> str:
+        """调用 LLM（cache_ttl 见 LLMClient.chat）"""
+        return await get_llm_client("openrouter").complete(
+            messages, site=site, model=self.chat_model, temperature=temperature, timeout=60.0, cache_ttl=cache_ttl
+        )
 
     @step
     async def route(self, ctx: Context, ev: StartEvent) -> RouteDecisionEvent | StopEvent:
@@ -102,7 +96,11 @@ class AgenticRAGWorkflow(Workflow):
 """
 
         try:
-            result = await self._call_llm([{"role": "user", "content": route_prompt}])
+            # 路由分类只取决于 prompt：低温度 + 响应缓存，重复问题不再调用 LLM
+            result = await self._call_llm(
+                [{"role": "user", "content": route_prompt}], temperature=0.1, site="agentic.route",
+                cache_ttl=settings.LLM_CACHE_TTL_CLASSIFY
+            )
             # 解析 JSON
             result = result.strip()
             if result.startswith("```"):
@@ -168,7 +166,7 @@ class AgenticRAGWorkflow(Workflow):
         return await self._call_llm([
             {"role": "system", "content": "你是一个友好的教育助手，请简短回复用户的闲聊。"},
             {"role": "user", "content": query}
-        ])
+        ], site="agentic.chitchat")
 
     @step
     async def plan(self, ctx: Context, ev: RouteDecisionEvent | RetryEvent) -> ToolCallEvent:
@@ -211,7 +209,7 @@ class AgenticRAGWorkflow(Workflow):
 返回 JSON: {{"subtasks": [{{"id": "1", "query": "子查询", "tool": "vector_search"}}]}}"""
 
         try:
-            result = await self._call_llm([{"role": "user", "content": plan_prompt}])
+            result = await self._call_llm([{"role": "user", "content": plan_prompt}], site="agentic.plan")
             if "```" in result:
                 result = result.split("```")[1].replace("json", "").strip()
             parsed = json.loads(result)
@@ -222,6 +220,8 @@ class AgenticRAGWorkflow(Workflow):
                        tool_args={"query": t.get("query", query), "top_k": 5})
                 for i, t in enumerate(parsed.get("subtasks", [{"query": query}]))
             ]
+            # 多个向量检索子任务合并为一次多查询检索
+            subtasks = merge_vector_subtasks(subtasks)
 
             logger.info(f"[Plan] 规划 {len(subtasks)} 个子任务")
 
@@ -364,7 +364,7 @@ class AgenticRAGWorkflow(Workflow):
 - give_up: 知识库中可能没有相关内容"""
 
         try:
-            result = await self._call_llm([{"role": "user", "content": eval_prompt}], temperature=0.1)
+            result = await self._call_llm([{"role": "user", "content": eval_prompt}], temperature=0.1, site="agentic.reflect")
             if "```" in result:
                 result = result.split("```")[1].replace("json", "").strip()
             parsed = json.loads(result)
@@ -399,10 +399,12 @@ class AgenticRAGWorkflow(Workflow):
         if not ev.context:
             answer = "抱歉，我没有找到相关信息来回答您的问题。"
         else:
+            # 抽取与问题相关的句子，[来源X] 标记不变
+            context = await acompress_context(ev.query, ev.context)
             prompt = f"""基于以下参考资料回答问题。请在回答中标注来源，如 [来源1]。
 
 参考资料:
-{ev.context}
+{context}
 
 问题: {ev.query}
 
@@ -413,7 +415,7 @@ class AgenticRAGWorkflow(Workflow):
                 messages.extend(ev.history[-4:])
             messages.append({"role": "user", "content": prompt})
 
-            answer = await self._call_llm(messages)
+            answer = await self._call_llm(messages, site="agentic.synthesize")
 
         logger.info(f"[Synthesize] 生成答案完成，长度: {len(answer)}")
 
@@ -434,16 +436,20 @@ def get_agentic_workflow() -> AgenticRAGWorkflow:
     """获取 AgenticRAGWorkflow 单例"""
     global _agentic_workflow
     if _agentic_workflow is None:
-        from ..vector_store import VectorStore
+        from ..vector_store import get_vector_store
         from ..document_processor import get_embedding_model
+        from ..keyword_index import get_keyword_index
 
         # 初始化工具
         registry = ToolRegistry()
-        vector_store = VectorStore()
+        vector_store = get_vector_store()
         embedding_model = get_embedding_model()
 
         # 注册所有工具
         registry.register(VectorSearchTool(vector_store, embedding_model))
+        keyword_index = get_keyword_index()
+        if keyword_index is not None:
+            registry.register(KeywordSearchTool(keyword_index, vector_store))
         registry.register(CalculatorTool())
         registry.register(KnowledgeGraphTool())
 
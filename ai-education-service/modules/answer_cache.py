@@ -0,0 +1,346 @@
+"""
+语义回答缓存模块
+缓存 (book_id, 意图, 问题向量) -> 回答 + 来源 + 引用，条目进程内存储，版本号可共享（Redis）
+
+- 查找: 归一化文本完全相同直接命中，否则与同一作用域内已缓存问题向量做余弦，超过阈值命中
+- 作用域: book_id + 意图 + 过滤条件 + top_k，只缓存能从过滤条件确定教材的查询
+- 失效: 每本书一个版本号，入库 / 删除时递增；生成期间版本变化的回答不写入。
+  配置 REDIS_URL 时版本号存 Redis（同检索结果缓存），其他进程查找时发现版本变化即丢弃旧条目
+- 统计: 命中率（查找未命中即计为 miss）、绕过次数（有对话历史等）、估算节省的延迟
+"""
+
+import asyncio
+import copy
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from .hybrid_search import normalize_text
+from .local_vector_store import parse_filter
+from .retrieval_cache import GLOBAL_SCOPE
+
+logger = logging.getLogger(__name__)
+
+# 作用域（书 + 意图 + 过滤条件）数量上限，超出时淘汰最久未使用的作用域
+MAX_SCOPES = 1000
+
+_KEY_PREFIX = "answer"
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s。．.？?！!，,；;：:~～…]+$')
+
+
+def normalize_question(question: str) -> str:
+    """NFKC + 小写 + 合并空白 + 去掉句末标点（"什么是光合作用？" 与 "什么是光合作用" 相同）"""
+    text = _WHITESPACE.sub(" ", normalize_text(question)).strip()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+@dataclass
+class AnswerCacheKey:
+    """一次查找的上下文（未命中时交给 put 写入）"""
+    book_id: str
+    scope: str
+    text: str
+    vector: Optional[np.ndarray]
+    version: str
+    started: float
+
+
+class _Scope:
+    """一个作用域内的缓存条目（问题向量矩阵 + 条目列表，下标一一对应）"""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.entries: List[Dict[str, Any]] = []
+        self.vectors: Optional[np.ndarray] = None
+
+    def remove(self, indices: List[int]) -> None:
+        drop = set(indices)
+        keep = [i for i in range(len(self.entries)) if i not in drop]
+        self.texts = [self.texts[i] for i in keep]
+        self.entries = [self.entries[i] for i in keep]
+        self.vectors = self.vectors[keep] if self.vectors is not None and keep else None
+
+
+class AnswerCache:
+    """语义回答缓存（按书版本号失效）"""
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        ttl: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        redis_client=None
+    ):
+        """
+        Args:
+            redis_client: 可选的 Redis 客户端（decode_responses=True），用于多进程共享版本号
+            threshold: 问题向量余弦相似度阈值，默认使用 ANSWER_CACHE_THRESHOLD
+            ttl: 条目过期时间（秒），默认使用 ANSWER_CACHE_TTL
+            max_entries: 每个作用域的条目上限，默认使用 ANSWER_CACHE_MAX_ENTRIES
+        """
+        self.threshold = settings.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = ttl or settings.ANSWER_CACHE_TTL
+        self.max_entries = max_entries or settings.ANSWER_CACHE_MAX_ENTRIES
+        self.redis = redis_client
+
+        self._scopes: "OrderedDict[str, _Scope]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._hit_ms = 0.0
+        self._miss_ms = 0.0
+        self._miss_timed = 0  # 写入时计时的未命中次数（用于平均未命中延迟）
+
+    # ============ 版本号 ============
+
+    def _version(self, book_id: str) -> str:
+        """全局版本 + 书版本（Redis 不可用时使用进程内版本）"""
+        scopes = [GLOBAL_SCOPE, book_id]
+        if self.redis is not None:
+            try:
+                values = self.redis.mget([f"{_KEY_PREFIX}:ver:{s}" for s in scopes])
+                return ".".join(str(int(v or 0)) for v in values)
+            except Exception as e:
+                logger.warning(f"Redis 读取回答缓存版本失败，使用进程内版本: {e}")
+        with self._lock:
+            return ".".join(str(self._versions.get(s, 0)) for s in scopes)
+
+    def bump(self, book_id: Optional[str] = None) -> None:
+        """
+        使一本书的回答缓存失效
+
+        book_id 为空时表示无法确定影响范围，使全部缓存失效。
+        """
+        scope = book_id or GLOBAL_SCOPE
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+            if book_id:
+                prefix = f"{book_id}|"
+                for key in [s for s in self._scopes if s.startswith(prefix)]:
+                    del self._scopes[key]
+            else:
+                self._scopes.clear()
+        if self.redis is not None:
+            try:
+                self.redis.incr(f"{_KEY_PREFIX}:ver:{scope}")
+            except Exception as e:
+                logger.warning(f"Redis 递增回答缓存版本失败: {e}")
+        logger.info(f"回答缓存失效: book_id={book_id or '全部'}")
+
+    def bump_by_filter(self, filter_expr: Optional[str]) -> None:
+        """按过滤条件失效（只能解析出 book_id 时精确失效，否则全部失效）"""
+        try:
+            book_id = parse_filter(filter_expr).get("book_id")
+        except ValueError:
+            book_id = None
+        self.bump(book_id)
+
+    # ============ 读写 ============
+
+    def bypass(self) -> None:
+        """记录一次绕过（有对话历史、无法确定教材等）"""
+        with self._lock:
+            self.bypasses += 1
+
+    def lookup(
+        self,
+        book_id: str,
+        scope: str,
+        question: str,
+        embed: Optional[Callable[[str], List[float]]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[AnswerCacheKey]]:
+        """
+        查找缓存的回答
+
+        Args:
+            book_id: 教材 ID
+            scope: 同一本书内的作用域（意图、过滤条件、top_k 等）
+            question: 原始问题
+            embed: 问题向量函数（None 时只做归一化文本精确匹配）；传入原问题，
+                与无历史对话时的检索共用查询向量缓存
+
+        Returns:
+            (命中的条目, None) 或 (None, 写入用的 key)；获取向量失败时返回 (None, None)
+        """
+        start = time.perf_counter()
+        text = normalize_question(question)
+        scope = f"{book_id}|{scope}"
+
+        version = self._version(book_id)
+        with self._lock:
+            entry = self._find(scope, text, None, version)
+        vector = None
+        if entry is None and embed is not None:
+            try:
+                vector = np.asarray(embed(question), dtype=np.float32)
+            except Exception as e:
+                logger.warning(f"回答缓存获取问题向量失败，跳过缓存: {e}")
+                self.bypass()
+                return None, None
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm > 0 else vector
+            with self._lock:
+                entry = self._find(scope, text, vector, version)
+
+        if entry is None:
+            # 未命中在查找时计数：生成失败、流式中断等没有写入的请求同样是未命中
+            with self._lock:
+                self.misses += 1
+            return None, AnswerCacheKey(book_id, scope, text, vector, version, time.perf_counter())
+
+        with self._lock:
+            self.hits += 1
+            self._hit_ms += (time.perf_counter() - start) * 1000
+        logger.info(f"回答缓存命中: '{question[:30]}' ~ '{entry['question'][:30]}'")
+        return copy.deepcopy(entry), None
+
+    def _find(
+        self, scope_key: str, text: str, vector: Optional[np.ndarray], version: str
+    ) -> Optional[Dict[str, Any]]:
+        """在作用域内查找（调用方持有锁），顺带清理过期和版本已变化（其他进程失效）的条目"""
+        scope = self._scopes.get(scope_key)
+        if scope is None:
+            return None
+        self._scopes.move_to_end(scope_key)
+        now = time.time()
+        expired = [
+            i for i, entry in enumerate(scope.entries)
+            if entry["expires_at"] <= now or entry["version"] != version
+        ]
+        if expired:
+            scope.remove(expired)
+
+        if text in scope.texts:
+            return scope.entries[scope.texts.index(text)]
+        if vector is None or scope.vectors is None or scope.vectors.shape[1] != vector.shape[0]:
+            return None
+        similarities = scope.vectors @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold:
+            return scope.entries[best]
+        return None
+
+    def put(
+        self,
+        key: Optional[AnswerCacheKey],
+        answer: str,
+        sources: List[Dict[str, Any]],
+        citations: List[Dict[str, Any]]
+    ) -> bool:
+        """
+        写入回答（lookup 未命中时调用）
+
+        空回答、无来源的回答，以及生成期间教材已重新入库（版本变化）的回答不写入。
+        """
+        if key is None:
+            return False
+        version = self._version(key.book_id)
+        with self._lock:
+            self._miss_timed += 1
+            self._miss_ms += (time.perf_counter() - key.started) * 1000
+            if not answer or not sources or version != key.version:
+                return False
+
+            scope = self._scopes.get(key.scope)
+            if scope is None:
+                scope = self._scopes[key.scope] = _Scope()
+                while len(self._scopes) > MAX_SCOPES:
+                    self._scopes.popitem(last=False)
+            self._scopes.move_to_end(key.scope)
+            if key.text in scope.texts:
+                scope.remove([scope.texts.index(key.text)])
+
+            scope.texts.append(key.text)
+            scope.entries.append({
+                "question": key.text,
+                "answer": answer,
+                "sources": sources,
+                "citations": citations,
+                "version": key.version,
+                "expires_at": time.time() + self.ttl,
+            })
+            vector = key.vector
+            if vector is not None and (scope.vectors is None or scope.vectors.shape[1] != vector.shape[0]):
+                # 旧条目没有向量（或维度变化）时以零向量占位，只能被精确匹配
+                scope.vectors = np.zeros((len(scope.entries) - 1, vector.shape[0]), dtype=np.float32)
+            if scope.vectors is not None:
+                if vector is None:
+                    vector = np.zeros(scope.vectors.shape[1], dtype=np.float32)
+                scope.vectors = np.vstack([scope.vectors, vector[None, :]])
+            if len(scope.entries) > self.max_entries:
+                scope.remove(list(range(len(scope.entries) - self.max_entries)))
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            avg_hit = self._hit_ms / self.hits if self.hits else 0.0
+            avg_miss = self._miss_ms / self._miss_timed if self._miss_timed else 0.0
+            return {
+                "entries": sum(len(scope.entries) for scope in self._scopes.values()),
+                "scopes": len(self._scopes),
+                "backend": "memory+redis-version" if self.redis is not None else "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "avg_hit_ms": round(avg_hit, 3),
+                "avg_miss_ms": round(avg_miss, 3),
+                "saved_ms": round(max(avg_miss - avg_hit, 0.0) * self.hits, 1),
+            }
+
+
+async def stream_cached_answer(
+    answer: str,
+    chunk_chars: Optional[int] = None,
+    delay: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    把缓存的回答按小块逐段输出（与模型流式输出的体验一致）
+
+    Args:
+        chunk_chars: 每块字符数，默认使用 ANSWER_CACHE_STREAM_CHUNK_CHARS
+        delay: 块之间的间隔（秒），默认使用 ANSWER_CACHE_STREAM_DELAY，0 表示不等待
+    """
+    chunk_chars = chunk_chars or settings.ANSWER_CACHE_STREAM_CHUNK_CHARS
+    delay = settings.ANSWER_CACHE_STREAM_DELAY if delay is None else delay
+    for start in range(0, len(answer), chunk_chars):
+        yield answer[start:start + chunk_chars]
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# ============ 工厂函数 ============
+
+_answer_cache: Optional[AnswerCache] = None
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """获取 AnswerCache 单例（未启用时返回 None）"""
+    global _answer_cache
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        redis_client = None
+        if settings.REDIS_URL:
+            try:
+                import redis
+                redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+            except Exception as e:
+                logger.warning(f"Redis 连接失败，回答缓存版本号仅在进程内生效: {e}")
+        _answer_cache = AnswerCache(redis_client=redis_client)
+        logger.info(f"语义回答缓存初始化完成，阈值: {_answer_cache.threshold}")
+    return _answer_cache
@@ -0,0 +1,287 @@
+"""
+章节摘要索引模块（分层检索：先选章节，再检索分块）
+入库时为每个章节（含子章节）生成摘要和摘要向量：摘要为标题路径 + 子树内各分块的首句（抽取式，不调用 LLM），
+向量为摘要 embedding 与子树分块向量质心的平均。查询时先在本地对几百个章节向量打分，
+只在得分最高的章节子树内检索分块（chapter_id 过滤），避免宽泛问题的命中分散在整本书。
+
+存储布局（每本书一组文件）:
+    {CHAPTER_INDEX_DIR}/{book_key}.npy   章节向量（float32，已归一化）
+    {CHAPTER_INDEX_DIR}/{book_key}.json  [{id, title, parent_id, summary, chunks}, ...]，与向量按行对应
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+import numpy as np
+
+from config import settings
+from .chapter_scope import subtree_ids
+from .local_vector_store import DEFAULT_BOOK_KEY, DELETE_FILTER_FIELDS, parse_filter
+from .vector_store import chapter_scope_filter, extract_book_id, strip_chapter_clause
+
+logger = logging.getLogger(__name__)
+
+# 摘要中每个分块取的首句最大字符数
+LEAD_SENTENCE_CHARS = 80
+
+_SENTENCE = re.compile(r"[^。！？；!?;\n]+[。！？；!?;]?")
+
+
+def _lead_sentence(text: str) -> str:
+    """分块的首个完整句子（跳过过短的标题行）"""
+    for match in _SENTENCE.finditer(text or ""):
+        sentence = match.group(0).strip()
+        if len(sentence) >= 6:
+            return sentence[:LEAD_SENTENCE_CHARS]
+    return ""
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def chapter_summaries(nodes: list, chapters: List[Dict[str, Any]], max_chars: int) -> Dict[str, Dict[str, Any]]:
+    """
+    为含有分块的章节生成抽取式摘要
+
+    摘要 = 标题路径 + 子树内各分块首句（按子章节轮流取，不超过 max_chars）。
+
+    Returns:
+        {chapter_id: {"title", "parent_id", "summary", "chunks": 直接标注的分块数, "nodes": 子树分块}}
+    """
+    by_id = {c["id"]: c for c in chapters}
+    tagged: Dict[str, list] = {}
+    for node in nodes:
+        chapter_id = node.metadata.get("chapter_id")
+        if chapter_id in by_id:
+            tagged.setdefault(chapter_id, []).append(node)
+
+    result = {}
+    for chapter in chapters:
+        groups = [tagged[i] for i in subtree_ids(chapter["id"], chapters) if i in tagged]
+        if not groups:
+            continue
+
+        path, parent = [chapter.get("title", "")], by_id.get(chapter.get("parent_id"))
+        while parent is not None:
+            path.insert(0, parent.get("title", ""))
+            parent = by_id.get(parent.get("parent_id"))
+        parts, size = [" / ".join(p for p in path if p)], 0
+        # 各子章节轮流取首句，摘要覆盖整个子树而不是只覆盖第一节
+        for row in range(max(len(group) for group in groups)):
+            for group in groups:
+                sentence = _lead_sentence(group[row].get_content()) if row < len(group) else ""
+                if sentence and size + len(sentence) <= max_chars:
+                    parts.append(sentence)
+                    size += len(sentence)
+            if size >= max_chars:
+                break
+
+        result[chapter["id"]] = {
+            "title": chapter.get("title", ""),
+            "parent_id": chapter.get("parent_id"),
+            "summary": "\n".join(parts),
+            "chunks": len(tagged.get(chapter["id"], [])),
+            "nodes": [node for group in groups for node in group],
+        }
+    return result
+
+
+class _BookChapters:
+    """一本书的章节向量（查询侧常驻内存）"""
+
+    def __init__(self, entries: List[Dict[str, Any]], vectors: np.ndarray):
+        self.entries = entries
+        self.vectors = vectors
+        self.tree = [{"id": e["id"], "parent_id": e.get("parent_id")} for e in entries]
+        self.chunks = {e["id"]: e.get("chunks", 0) for e in entries}
+
+
+class ChapterIndex:
+    """按书存储的章节摘要向量"""
+
+    def __init__(self, base_dir: Optional[str] = None):
+        """
+        Args:
+            base_dir: 存储目录，默认使用 CHAPTER_INDEX_DIR
+        """
+        self.base_dir = Path(base_dir or settings.CHAPTER_INDEX_DIR)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self._books: Dict[str, Optional[_BookChapters]] = {}
+        self._lock = threading.RLock()
+        logger.info(f"章节摘要索引初始化完成，目录: {self.base_dir}")
+
+    # ============ 文件读写 ============
+
+    @staticmethod
+    def _book_key(book_id: Optional[str]) -> str:
+        return re.sub(r"[^\w\-]", "_", book_id) if book_id else DEFAULT_BOOK_KEY
+
+    def _paths(self, book_key: str) -> Tuple[Path, Path]:
+        return self.base_dir / f"{book_key}.npy", self.base_dir / f"{book_key}.json"
+
+    def _load_book(self, book_key: str) -> Optional[_BookChapters]:
+        with self._lock:
+            if book_key in self._books:
+                return self._books[book_key]
+            vec_path, meta_path = self._paths(book_key)
+            book = None
+            if vec_path.exists() and meta_path.exists():
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+                book = _BookChapters(entries, np.load(vec_path))
+            self._books[book_key] = book
+            return book
+
+    def _write_book(self, book_key: str, entries: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        vec_path, meta_path = self._paths(book_key)
+        tmp_vec = vec_path.with_suffix(".tmp.npy")
+        tmp_meta = meta_path.with_suffix(".tmp")
+        np.save(tmp_vec, np.ascontiguousarray(vectors, dtype=np.float32))
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_vec, vec_path)
+        os.replace(tmp_meta, meta_path)
+        self._books[book_key] = _BookChapters(entries, vectors)
+
+    def _drop_book(self, book_key: str) -> None:
+        for path in self._paths(book_key):
+            path.unlink(missing_ok=True)
+        self._books.pop(book_key, None)
+
+    # ============ 写入 / 删除 ============
+
+    def build(
+        self,
+        book_id: str,
+        nodes: list,
+        chapters: List[Dict[str, Any]],
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        max_chars: Optional[int] = None
+    ) -> int:
+        """
+        为已标注 chapter_id 的分块生成章节摘要向量并写入（同一章节覆盖，其他章节保留）
+
+        Args:
+            embed_batch: 批量文本向量化函数（如 embedding 模型的 get_text_embedding_batch）
+
+        Returns:
+            写入的章节数
+        """
+        summaries = chapter_summaries(nodes, chapters, max_chars or settings.CHAPTER_SUMMARY_CHARS)
+        if not summaries:
+            return 0
+
+        ids = list(summaries)
+        vectors = _normalize(np.asarray(embed_batch([summaries[i]["summary"] for i in ids]), dtype=np.float32))
+        for row, chapter_id in enumerate(ids):
+            embedded = [node.embedding for node in summaries[chapter_id]["nodes"] if node.embedding]
+            if embedded:
+                # 摘要只覆盖首句，叠加分块向量质心补充正文内容
+                centroid = _normalize(np.mean(_normalize(np.asarray(embedded, dtype=np.float32)), axis=0))
+                vectors[row] = _normalize(vectors[row] + centroid)
+
+        entries = [{"id": i, **{k: v for k, v in summaries[i].items() if k != "nodes"}} for i in ids]
+        book_key = self._book_key(book_id)
+        with self._lock:
+            book = self._load_book(book_key)
+            if book is not None:
+                keep = [row for row, entry in enumerate(book.entries) if entry["id"] not in summaries]
+                entries = [book.entries[row] for row in keep] + entries
+                vectors = np.vstack([book.vectors[keep], vectors])
+            self._write_book(book_key, entries, vectors)
+        logger.info(f"章节摘要索引写入完成: book_id={book_id}, {len(ids)} 个章节")
+        return len(ids)
+
+    def delete_by_filter(self, filter_expr: str) -> bool:
+        """
+        根据过滤条件删除（支持 book_id；章节属于整本书，按 resource_id 删除时保留）
+        """
+        try:
+            conditions = parse_filter(filter_expr, DELETE_FILTER_FIELDS)
+        except ValueError as e:
+            logger.error(f"章节摘要索引条件删除失败: {e}")
+            return False
+        if not conditions:
+            logger.error("章节摘要索引条件删除失败: 过滤条件为空")
+            return False
+
+        if "book_id" in conditions and "resource_id" not in conditions:
+            with self._lock:
+                self._drop_book(self._book_key(conditions["book_id"]))
+        return True
+
+    def count(self, book_id: str) -> int:
+        book = self._load_book(self._book_key(book_id))
+        return len(book.entries) if book is not None else 0
+
+    # ============ 查询 ============
+
+    def rank(self, book_id: str, query_embedding: List[float], top_n: int = 5) -> List[Tuple[str, float]]:
+        """章节按与查询的余弦相似度排序，返回前 top_n 个 (chapter_id, score)"""
+        book = self._load_book(self._book_key(book_id))
+        if book is None or not book.entries:
+            return []
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        scores = book.vectors @ query
+        top = np.argsort(-scores)[:top_n]
+        return [(book.entries[row]["id"], float(scores[row])) for row in top]
+
+    def route(
+        self,
+        filter_expr: Optional[str],
+        query_embedding: List[float],
+        top_n: Optional[int] = None,
+        min_chunks: int = 0
+    ) -> Optional[str]:
+        """
+        在过滤表达式上追加得分最高的章节子树
+
+        至少取 top_n 个章节，并继续补充直到子树内的分块数不少于 min_chunks；
+        过滤条件已限定章节、无法确定教材或章节数不超过 top_n（路由没有意义）时原样返回。
+        """
+        top_n = top_n or settings.CHAPTER_ROUTE_TOP_N
+        book_id = extract_book_id(filter_expr)
+        if not book_id or strip_chapter_clause(filter_expr) != filter_expr:
+            return filter_expr
+        book = self._load_book(self._book_key(book_id))
+        if book is None or len(book.entries) <= top_n:
+            return filter_expr
+
+        selected: Dict[str, None] = {}
+        chunks, picked = 0, []
+        for chapter_id, score in self.rank(book_id, query_embedding, top_n=len(book.entries)):
+            if chapter_id in selected:
+                continue
+            picked.append(f"{chapter_id}:{score:.3f}")
+            for sub_id in subtree_ids(chapter_id, book.tree):
+                if sub_id not in selected:
+                    selected[sub_id] = None
+                    chunks += book.chunks.get(sub_id, 0)
+            if len(picked) >= top_n and chunks >= min_chunks:
+                break
+
+        if len(selected) >= len(book.entries):
+            return filter_expr
+        logger.info(f"章节路由: {', '.join(picked)}（{chunks} 个分块）")
+        return chapter_scope_filter(filter_expr, list(selected))
+
+
+# 全局实例
+_chapter_index: Optional[ChapterIndex] = None
+
+
+def get_chapter_index() -> Optional[ChapterIndex]:
+    """获取 ChapterIndex 单例（HIERARCHICAL_RETRIEVAL_ENABLED=False 时返回 None）"""
+    global _chapter_index
+    if not settings.HIERARCHICAL_RETRIEVAL_ENABLED or not settings.CHAPTER_SCOPE_ENABLED:
+        return None
+    if _chapter_index is None:
+        _chapter_index = ChapterIndex()
+    return _chapter_index
@@ -0,0 +1,339 @@
+"""
+章节范围检索模块
+入库时把分块映射到知识图谱的章节（按页码落入章节页码区间，没有页码时按章节标题），写入 chapter_id；
+查询时把"第三章"等范围解析为章节及其子章节，转换为 chapter_id 过滤条件，只检索这些章节的分块。
+
+章节树来自知识图谱（Chapter 节点的 start_page / end_page / level / parent_id），查询侧按书缓存。
+"""
+
+import asyncio
+import logging
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+from config import settings
+from .vector_store import chapter_scope_filter, extract_book_id, parse_page
+
+logger = logging.getLogger(__name__)
+
+# 学习资源的文档类型（页码与教材不对应，不标注章节）
+RESOURCE_DOC_TYPES = ("resource", "user_resource")
+
+# 表示整本书的范围
+WHOLE_BOOK_SCOPES = frozenset({"全书", "全部", "整本书", "全册", "all"})
+
+# 从知识图谱读取章节树的超时（秒）
+CHAPTER_LOAD_TIMEOUT = 10.0
+
+_CN_NUMERALS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_NUMERAL = r"[0-9零〇一二两三四五六七八九十百]+"
+# 问题 / 范围中的章节引用：第三章、第3单元、第二章第一节
+_SCOPE_REF = re.compile(rf"第\s*({_NUMERAL})\s*(章|单元|篇|部分)(?:\s*第\s*({_NUMERAL})\s*节)?")
+_SCOPE_ALIAS = re.compile(r"^chapter[\s_\-]*(\d+)$", re.IGNORECASE)
+# 章节标题开头的编号：第三章 / 第3单元 / 3.1 / 3 绪论
+_TITLE_NO = re.compile(rf"^\s*(?:第\s*({_NUMERAL})\s*(?:章|单元|篇|部分|节)|(\d+)(?:\.(\d+))?(?=[\s.、:：]|$))")
+
+
+def chinese_to_int(text: str) -> Optional[int]:
+    """中文 / 阿拉伯数字转整数（支持到"九百九十九"）"""
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    if not text or any(ch not in _CN_NUMERALS and ch not in "十百" for ch in text):
+        return None
+    total, current = 0, 0
+    for ch in text:
+        if ch == "百":
+            total += (current or 1) * 100
+            current = 0
+        elif ch == "十":
+            total += (current or 1) * 10
+            current = 0
+        else:
+            current = _CN_NUMERALS[ch]
+    return total + current
+
+
+def _compact(text: str) -> str:
+    return re.sub(r"\s+", "", text or "")
+
+
+def _title_number(title: str) -> Optional[int]:
+    """章节标题开头的编号（"第三章 力" -> 3，"3.2 摩擦力" -> 2）"""
+    match = _TITLE_NO.match(title or "")
+    if not match:
+        return None
+    if match.group(1):
+        return chinese_to_int(match.group(1))
+    return int(match.group(3) or match.group(2))
+
+
+# ============ 页码区间 ============
+
+def chapter_ranges(chapters: List[Dict[str, Any]]) -> Dict[str, Tuple[int, float]]:
+    """
+    计算每个章节的页码区间 [start, end]
+
+    end_page 缺失时取下一个同级或更高级章节的起始页 - 1（最后一章到全书结束）；
+    没有 start_page 的章节不参与页码映射。
+    """
+    ordered = sorted(chapters, key=lambda c: c.get("order_index") or 0)
+    ranges: Dict[str, Tuple[int, float]] = {}
+    for i, chapter in enumerate(ordered):
+        start = chapter.get("start_page")
+        if start is None:
+            continue
+        end = chapter.get("end_page")
+        if end is None:
+            level = chapter.get("level") or 1
+            following = (
+                c.get("start_page") for c in ordered[i + 1:]
+                if (c.get("level") or 1) <= level and c.get("start_page") is not None
+            )
+            next_start = next(following, None)
+            end = max(start, next_start - 1) if next_start is not None else float("inf")
+        ranges[chapter["id"]] = (int(start), end)
+    return ranges
+
+
+def fill_end_pages(chapters: list) -> list:
+    """为缺少 end_page 的 Chapter 对象补全结束页（保存到知识图谱前调用）"""
+    ranges = chapter_ranges([vars(c) for c in chapters])
+    for chapter in chapters:
+        span = ranges.get(chapter.id)
+        if chapter.end_page is None and span is not None and span[1] != float("inf"):
+            chapter.end_page = int(span[1])
+    return chapters
+
+
+def page_to_chapter(page: int, ranges: Dict[str, Tuple[int, float]], levels: Dict[str, int]) -> Optional[str]:
+    """页码所在的最深一级章节"""
+    best, best_key = None, None
+    for chapter_id, (start, end) in ranges.items():
+        if start <= page <= end:
+            key = (levels.get(chapter_id, 1), start)
+            if best_key is None or key > best_key:
+                best, best_key = chapter_id, key
+    return best
+
+
+# ============ 入库标注 ============
+
+def _heading_matches(text: str, titles: Dict[str, str]) -> List[str]:
+    """分块中以章节标题开头的行对应的章节"""
+    lines = {_compact(line) for line in (text or "").splitlines() if line.strip()}
+    return [
+        chapter_id for chapter_id, title in titles.items()
+        if title and any(line.startswith(title) for line in lines)
+    ]
+
+
+def estimate_page_offset(nodes: list, chapters: List[Dict[str, Any]]) -> int:
+    """
+    估计目录页码与文件页码的偏移（封面、前言等使文件页码大于目录页码）
+
+    以章节标题出现的分块页码减去目录起始页，取中位数；目录分块（同时出现多个标题）不参与。
+    """
+    titles = {c["id"]: _compact(c.get("title")) for c in chapters if c.get("start_page") is not None}
+    starts = {c["id"]: int(c["start_page"]) for c in chapters if c.get("start_page") is not None}
+    offsets, seen = [], set()
+    for node in nodes:
+        page = parse_page(node.metadata)
+        if not page:
+            continue
+        matches = _heading_matches(node.get_content(), titles)
+        if len(matches) > 2:
+            continue
+        for chapter_id in matches:
+            if chapter_id not in seen:
+                seen.add(chapter_id)
+                offsets.append(page - starts[chapter_id])
+    return int(statistics.median(offsets)) if offsets else 0
+
+
+def assign_chapters(nodes: list, chapters: List[Dict[str, Any]], page_offset: Optional[int] = None) -> int:
+    """
+    为分块标注 chapter_id（写入 node.metadata）
+
+    有页码的分块映射到页码所在的最深一级章节；没有页码时按分块中出现的章节标题，
+    沿文档顺序延续到下一个标题。目录分块（同时出现多个标题）不改变当前章节。
+
+    Args:
+        page_offset: 文件页码 - 目录页码，默认由 estimate_page_offset 估计
+
+    Returns:
+        标注的分块数量
+    """
+    if not chapters or not nodes:
+        return 0
+
+    ranges = chapter_ranges(chapters)
+    levels = {c["id"]: c.get("level") or 1 for c in chapters}
+    titles = {c["id"]: _compact(c.get("title")) for c in chapters}
+    offset = estimate_page_offset(nodes, chapters) if page_offset is None else page_offset
+
+    tagged, current = 0, None
+    for node in nodes:
+        page = parse_page(node.metadata)
+        chapter_id = page_to_chapter(page - offset, ranges, levels) if page and ranges else None
+        if chapter_id is None and not page:
+            matches = _heading_matches(node.get_content(), titles)
+            if 0 < len(matches) <= 2:
+                current = max(matches, key=lambda c: levels.get(c, 1))
+            chapter_id = current
+        if chapter_id:
+            node.metadata["chapter_id"] = chapter_id
+            tagged += 1
+
+    logger.info(f"章节标注完成: {tagged}/{len(nodes)} 个分块, 页码偏移 {offset}")
+    return tagged
+
+
+# ============ 查询范围 ============
+
+def detect_scope(question: str) -> Optional[str]:
+    """从问题中识别章节引用（如"第三章讲了什么" -> "第三章"）"""
+    match = _SCOPE_REF.search(question or "")
+    return match.group(0) if match else None
+
+
+def subtree_ids(chapter_id: str, chapters: List[Dict[str, Any]]) -> List[str]:
+    """章节及其全部子章节的 ID"""
+    children: Dict[str, List[str]] = {}
+    for chapter in chapters:
+        if chapter.get("parent_id"):
+            children.setdefault(chapter["parent_id"], []).append(chapter["id"])
+    ids, stack = [], [chapter_id]
+    while stack:
+        current = stack.pop()
+        ids.append(current)
+        stack.extend(reversed(children.get(current, [])))
+    return ids
+
+
+def _numbered(candidates: List[Dict[str, Any]], number: int) -> Optional[Dict[str, Any]]:
+    """按标题编号查找章节，标题没有编号时按顺序取第 number 个"""
+    ordered = sorted(candidates, key=lambda c: c.get("order_index") or 0)
+    for chapter in ordered:
+        if _title_number(chapter.get("title", "")) == number:
+            return chapter
+    if ordered and all(_title_number(c.get("title", "")) is None for c in ordered) and 0 < number <= len(ordered):
+        return ordered[number - 1]
+    return None
+
+
+def resolve_scope(scope: Optional[str], chapters: List[Dict[str, Any]]) -> Optional[List[str]]:
+    """
+    把范围解析为章节子树的 ID 列表
+
+    支持章节 ID、"第三章" / "第3单元" / "第二章第一节" / "chapter_3"、章节标题（包含匹配）；
+    "全书"、空范围或无法解析时返回 None（不限定章节）。
+    """
+    scope = (scope or "").strip()
+    if not scope or scope.lower() in WHOLE_BOOK_SCOPES or not chapters:
+        return None
+
+    by_id = {c["id"]: c for c in chapters}
+    if scope in by_id:
+        return subtree_ids(scope, chapters)
+
+    chapter = None
+    ref, alias = _SCOPE_REF.search(scope), _SCOPE_ALIAS.match(scope)
+    if ref or alias:
+        number = chinese_to_int(ref.group(1)) if ref else int(alias.group(1))
+        top_level = min(c.get("level") or 1 for c in chapters)
+        chapter = _numbered([c for c in chapters if (c.get("level") or 1) == top_level], number)
+        if chapter is not None and ref and ref.group(3):
+            section = _numbered([c for c in chapters if c.get("parent_id") == chapter["id"]],
+                                chinese_to_int(ref.group(3)))
+            chapter = section or chapter
+
+    if chapter is None:
+        target = _compact(scope)
+        matches = [
+            c for c in chapters
+            if len(_compact(c.get("title"))) >= 2 and (target in _compact(c.get("title")) or _compact(c.get("title")) in target)
+        ]
+        if matches:
+            chapter = min(matches, key=lambda c: (c.get("level") or 1, c.get("order_index") or 0))
+
+    return subtree_ids(chapter["id"], chapters) if chapter is not None else None
+
+
+# ============ 章节树缓存 ============
+
+_chapter_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+_cache_lock = threading.Lock()
+# Neo4j 异步驱动不能跨事件循环共享：在独立线程的新事件循环中读取
+_loader = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chapter-loader")
+
+
+async def _fetch_chapters(book_id: str) -> List[Dict[str, Any]]:
+    from .knowledge_graph import get_kg_store
+
+    store = await get_kg_store()
+    try:
+        return await store.get_book_chapters(book_id)
+    finally:
+        await store.close()
+
+
+def load_book_chapters(book_id: str) -> List[Dict[str, Any]]:
+    """读取教材章节树（进程内缓存 CHAPTER_CACHE_TTL 秒，读取失败时返回空列表）"""
+    now = time.time()
+    with _cache_lock:
+        cached = _chapter_cache.get(book_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+    try:
+        chapters = _loader.submit(asyncio.run, _fetch_chapters(book_id)).result(timeout=CHAPTER_LOAD_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"读取章节树失败: book_id={book_id}, 错误: {e}")
+        chapters = []
+
+    with _cache_lock:
+        _chapter_cache[book_id] = (now + settings.CHAPTER_CACHE_TTL, chapters)
+    return chapters
+
+
+def invalidate_chapters(book_id: Optional[str] = None) -> None:
+    """章节树变化（重新提取 / 删除教材）时清除缓存"""
+    with _cache_lock:
+        if book_id is None:
+            _chapter_cache.clear()
+        else:
+            _chapter_cache.pop(book_id, None)
+
+
+def scoped_filter(
+    filter_expr: Optional[str],
+    scope: Optional[str] = None,
+    question: Optional[str] = None,
+    loader=load_book_chapters
+) -> Optional[str]:
+    """
+    在过滤表达式上追加章节范围
+
+    范围优先使用 scope（如意图参数中的 scope），否则从问题中识别；
+    CHAPTER_SCOPE_ENABLED=False、无法确定教材或无法解析范围时原样返回。
+    """
+    if not settings.CHAPTER_SCOPE_ENABLED:
+        return filter_expr
+    scope = scope or detect_scope(question or "")
+    if not scope or scope.strip().lower() in WHOLE_BOOK_SCOPES:
+        return filter_expr
+    book_id = extract_book_id(filter_expr)
+    if not book_id:
+        return filter_expr
+
+    chapter_ids = resolve_scope(scope, loader(book_id))
+    if not chapter_ids:
+        logger.info(f"章节范围未解析: scope={scope}, book_id={book_id}")
+        return filter_expr
+    logger.info(f"章节范围: scope={scope}, {len(chapter_ids)} 个章节")
+    return chapter_scope_filter(filter_expr, chapter_ids)
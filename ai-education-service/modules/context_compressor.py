@@ -0,0 +1,233 @@
+"""
+上下文压缩模块
+生成前的抽取式压缩：把检索片段切成句子，按 查询-句子 余弦 + 词项覆盖率 打分，
+每个片段保留得分最高的句子及其相邻句，直到达到保留比例
+
+[来源X] 引用标记原样保留，每个来源至少保留一句，来源编号与 sources 的对应关系不变。
+
+默认只按词项覆盖率打分（纯本地计算，不增加首 token 前的网络往返）；CONTEXT_COMPRESSION_EMBEDDING
+开启时句子向量需要请求 embedding 模型，异步调用方使用 acompress_context 在线程中执行。
+"""
+
+import asyncio
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any, Optional
+
+import numpy as np
+
+from config import settings
+from .keyword_index import tokenize
+from .local_reranker import lexical_coverage
+
+logger = logging.getLogger(__name__)
+
+# 不连续句子之间的省略标记
+GAP_MARKER = "……"
+# 句子向量 LRU 缓存条数
+SENTENCE_CACHE_SIZE = 20000
+
+_SENTENCE_PATTERN = re.compile(r'[^。！？；!?;\n]+(?:[。！？；!?;]+|\n|$)|[。！？；!?;]+')
+# [来源X] 标记（可带 "(相关度: 0.123)" 和换行）
+_SOURCE_MARKER = re.compile(r'(\[来源\d+\](?:[ \t]*\(相关度: -?[\d.]+\))?[ \t]*\n?)')
+# 片段结尾的分隔符（build_context 使用 ---）
+_TRAILING_SEPARATOR = re.compile(r'(\s*(?:---\s*)?)$')
+
+
+def split_sentences(text: str) -> List[str]:
+    """切分句子（保留句末标点，去掉空白句）"""
+    return [s.strip() for s in _SENTENCE_PATTERN.findall(text) if s.strip()]
+
+
+def select_sentences(scores: np.ndarray, lengths: List[int], ratio: float, neighbours: int) -> List[int]:
+    """
+    按得分从高到低加入句子及其相邻句，直到保留长度达到 ratio
+
+    Returns:
+        保留句子的下标（升序）
+    """
+    total = sum(lengths)
+    target = total * ratio
+    kept = set()
+    kept_chars = 0
+    for i in np.argsort(-scores, kind="stable"):
+        if kept and kept_chars >= target:
+            break
+        for j in range(max(0, i - neighbours), min(len(lengths), i + neighbours + 1)):
+            if j not in kept:
+                kept.add(j)
+                kept_chars += lengths[j]
+    return sorted(kept)
+
+
+class ContextCompressor:
+    """
+    抽取式上下文压缩器
+
+    句子向量通过 embed_batch 批量获取并按句子文本做 LRU 缓存（同一分块的句子在不同查询中复用）；
+    embed_batch 为 None 或调用失败时只按词项覆盖率打分。
+    """
+
+    def __init__(
+        self,
+        embed_batch: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        ratio: float = None,
+        neighbours: int = None,
+        lexical_weight: float = None,
+        min_chars: int = None
+    ):
+        self.embed_batch = embed_batch
+        self.ratio = settings.CONTEXT_COMPRESSION_RATIO if ratio is None else ratio
+        self.neighbours = settings.CONTEXT_COMPRESSION_NEIGHBOURS if neighbours is None else neighbours
+        self.lexical_weight = settings.RERANK_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+        self.min_chars = settings.CONTEXT_COMPRESSION_MIN_CHARS if min_chars is None else min_chars
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: List[str]) -> Optional[Dict[str, np.ndarray]]:
+        """批量获取归一化向量（未命中缓存的文本一次请求）"""
+        if self.embed_batch is None:
+            return None
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for text in texts:
+                vector = self._vectors.get(text)
+                if vector is not None:
+                    self._vectors.move_to_end(text)
+                    found[text] = vector
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+        if missing:
+            try:
+                vectors = self.embed_batch(missing)
+            except Exception as e:
+                logger.warning(f"上下文压缩获取句子向量失败，只按词项打分: {e}")
+                return None
+            with self._lock:
+                for text, vector in zip(missing, vectors):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    norm = np.linalg.norm(vector)
+                    found[text] = self._vectors[text] = vector / norm if norm > 0 else vector
+                while len(self._vectors) > SENTENCE_CACHE_SIZE:
+                    self._vectors.popitem(last=False)
+        return found
+
+    def _compress_texts(self, query: str, texts: List[str]) -> List[str]:
+        """压缩多段文本（所有句子一次批量获取向量）"""
+        sentence_lists = [
+            split_sentences(text) if len(text) >= self.min_chars else []
+            for text in texts
+        ]
+        all_sentences = [s for sentences in sentence_lists for s in sentences]
+        if not all_sentences:
+            return texts
+
+        vectors = self._embed([query] + all_sentences)
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        compressed = []
+        for text, sentences in zip(texts, sentence_lists):
+            if len(sentences) <= 2:
+                compressed.append(text)
+                continue
+            scores = np.array([lexical_coverage(query_tokens, s) for s in sentences], dtype=np.float32)
+            scores *= self.lexical_weight
+            if vectors is not None:
+                scores += np.stack([vectors[s] for s in sentences]) @ vectors[query]
+
+            kept = select_sentences(scores, [len(s) for s in sentences], self.ratio, self.neighbours)
+            parts = []
+            for position, i in enumerate(kept):
+                if (position == 0 and i > 0) or (position > 0 and i != kept[position - 1] + 1):
+                    parts.append(GAP_MARKER)
+                elif parts and sentences[i - 1][-1].isascii():
+                    parts.append(" ")  # 英文句子之间保留空格
+                parts.append(sentences[i])
+            if kept[-1] < len(sentences) - 1:
+                parts.append(GAP_MARKER)
+            compressed.append("".join(parts))
+        return compressed
+
+    def compress_results(self, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """压缩检索结果的 text（返回新字典，原文保存在 original_text）"""
+        texts = [result.get("text", "") for result in results]
+        compressed = self._compress_texts(query, texts)
+        return [
+            {**result, "text": new, "original_text": old} if new != old else result
+            for result, old, new in zip(results, texts, compressed)
+        ]
+
+    def compress_context(self, query: str, context: str) -> str:
+        """
+        压缩带 [来源X] 标记的上下文字符串
+
+        标记行和片段之间的分隔符原样保留，只压缩标记后的正文；没有标记的部分和【工具名】段落不变。
+        """
+        if not context:
+            return context
+        pieces = _SOURCE_MARKER.split(context)
+        # pieces: [标记前文本, 标记1, 正文1, 标记2, 正文2, ...]
+        bodies, separators = [], []
+        for body in pieces[2::2]:
+            # 其他工具的输出（【工具名】开头）接在最后一个来源之后，不参与压缩
+            tail = ""
+            boundary = body.find("\n【")
+            if boundary != -1:
+                body, tail = body[:boundary], body[boundary:]
+            match = _TRAILING_SEPARATOR.search(body)
+            bodies.append(body[:match.start()])
+            separators.append(match.group(1) + tail)
+        if not bodies:
+            return context
+
+        compressed = self._compress_texts(query, bodies)
+        result = [pieces[0]]
+        for marker, body, separator in zip(pieces[1::2], compressed, separators):
+            result.extend([marker, body, separator])
+        new_context = "".join(result)
+        logger.info(f"上下文压缩：{len(context)} -> {len(new_context)} 字符")
+        return new_context
+
+
+_compressor: Optional[ContextCompressor] = None
+
+
+def get_context_compressor() -> Optional[ContextCompressor]:
+    """获取上下文压缩器单例（CONTEXT_COMPRESSION_ENABLED=False 时返回 None）"""
+    global _compressor
+    if not settings.CONTEXT_COMPRESSION_ENABLED:
+        return None
+    if _compressor is None:
+        embed_batch = None
+        if settings.CONTEXT_COMPRESSION_EMBEDDING:
+            from .document_processor import get_embedding_model
+            embed_batch = get_embedding_model().get_text_embedding_batch
+        _compressor = ContextCompressor(embed_batch=embed_batch)
+    return _compressor
+
+
+def compress_context(query: str, context: str) -> str:
+    """按配置压缩上下文（未启用或失败时返回原上下文）"""
+    compressor = get_context_compressor()
+    if compressor is None or not context:
+        return context
+    try:
+        return compressor.compress_context(query, context)
+    except Exception as e:
+        logger.warning(f"上下文压缩失败，使用原上下文: {e}")
+        return context
+
+
+async def acompress_context(query: str, context: str) -> str:
+    """
+    compress_context 的异步版本
+
+    只按词项打分时直接在事件循环中计算（毫秒级）；使用句子向量时 embedding 请求是同步网络调用，
+    放到线程中执行，不阻塞事件循环。
+    """
+    compressor = get_context_compressor()
+    if compressor is None or not context:
+        return context
+    if compressor.embed_batch is None:
+        return compress_context(query, context)
+    return await asyncio.to_thread(compress_context, query, context)
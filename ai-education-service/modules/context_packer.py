@@ -0,0 +1,211 @@
+"""
+上下文打包模块
+在 token 预算内挑选检索片段：去除重复 / 相邻分块的重叠部分，按分数（带排名折扣）做 0-1 背包，
+剩余预算可放入一个按句子边界截断的片段
+
+token 数按字符类别估算（中文约 1.5 字符/token，其他约 4 字符/token），不调用分词器。
+"""
+
+import logging
+import math
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# 每个片段引用标记和分隔符的 token 开销
+PART_OVERHEAD_TOKENS = 12
+# 背包的 token 粒度（降低 DP 表规模）
+KNAPSACK_GRANULARITY = 8
+# 相邻分块重叠部分的最小长度（字符）
+MIN_OVERLAP_CHARS = 16
+# 截断片段的最小 token 数（更短的片段信息量太少，不放入）
+MIN_TRUNCATED_TOKENS = 48
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;])|(?<=\.)\s|\n')
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 数（中文及全角标点约 1.5 字符/token，其他约 4 字符/token）"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return int(cjk / 1.5 + (len(text) - cjk) / 4) + 1
+
+
+def token_budget_for(model: Optional[str]) -> int:
+    """按模型取上下文 token 预算（CONTEXT_TOKEN_BUDGETS 未配置该模型时使用 CONTEXT_TOKEN_BUDGET）"""
+    for item in settings.CONTEXT_TOKEN_BUDGETS.split(","):
+        name, _, budget = item.strip().rpartition(":")
+        if name and name == model and budget.isdigit():
+            return int(budget)
+    return settings.CONTEXT_TOKEN_BUDGET
+
+
+# 打包价值依次取的分数字段（重排序分数 > 融合分数 > 原始分数），同一批结果的量纲一致
+_VALUE_KEYS = ("rerank_score", "rrf_score", "fused_score", "score")
+
+
+def _score_of(result: Dict[str, Any]) -> float:
+    """打包价值"""
+    for key in _VALUE_KEYS:
+        if key in result:
+            return float(result[key] or 0)
+    return 0.0
+
+
+def _group_of(result: Dict[str, Any]) -> str:
+    """同一文档的分块才判断相邻重叠"""
+    return result.get("resource_id") or result.get("doc_ref") or result.get("book_id") or ""
+
+
+def overlap_length(head: str, tail: str, max_chars: int) -> int:
+    """head 的结尾与 tail 的开头重合的最长长度（不足 MIN_OVERLAP_CHARS 返回 0）"""
+    if len(head) < MIN_OVERLAP_CHARS or len(tail) < MIN_OVERLAP_CHARS:
+        return 0
+    window = head[-max_chars:]
+    probe = tail[:MIN_OVERLAP_CHARS]
+    start = window.find(probe)
+    while start != -1:
+        if tail.startswith(window[start:]):
+            return len(window) - start
+        start = window.find(probe, start + 1)
+    return 0
+
+
+def truncate_to_sentences(text: str, max_tokens: int) -> str:
+    """截断到预算内的最后一个句子边界（没有完整句子时返回空字符串）"""
+    kept = ""
+    last = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+        candidate = text[:end]
+        if estimate_tokens(candidate) > max_tokens:
+            break
+        kept, last = candidate, end
+    if last == 0:
+        return ""
+    return kept.rstrip()
+
+
+def _knapsack(costs: List[int], values: List[float], budget: int) -> List[int]:
+    """0-1 背包（numpy 逐物品更新 DP 表），返回选中下标"""
+    capacity = budget // KNAPSACK_GRANULARITY
+    weights = [-(-cost // KNAPSACK_GRANULARITY) for cost in costs]
+    dp = np.zeros(capacity + 1, dtype=np.float64)
+    taken = np.zeros((len(costs), capacity + 1), dtype=bool)
+    for i, (weight, value) in enumerate(zip(weights, values)):
+        if weight > capacity:
+            continue
+        candidate = dp[:capacity + 1 - weight] + value
+        better = candidate > dp[weight:]
+        taken[i, weight:] = better
+        dp[weight:] = np.where(better, candidate, dp[weight:])
+
+    selected = []
+    remaining = capacity
+    for i in range(len(costs) - 1, -1, -1):
+        if taken[i, remaining]:
+            selected.append(i)
+            remaining -= weights[i]
+    return sorted(selected)
+
+
+def _dedupe(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """去除完全重复或被其他片段包含的片段（保留分数较高的）"""
+    kept: List[Dict[str, Any]] = []
+    for result in sorted(results, key=_score_of, reverse=True):
+        text = " ".join(result.get("text", "").split())
+        if not text or any(text in " ".join(other.get("text", "").split()) for other in kept):
+            continue
+        kept.append(result)
+    order = {id(result): i for i, result in enumerate(results)}
+    return sorted(kept, key=lambda r: order[id(r)])
+
+
+def _trim_overlaps(selected: List[Dict[str, Any]], max_chars: int) -> List[Dict[str, Any]]:
+    """同一文档的相邻分块：从分数较低的一方去掉与另一方重合的部分"""
+    texts = [result.get("text", "") for result in selected]
+    for i in range(len(selected)):
+        for j in range(len(selected)):
+            if i == j or _group_of(selected[i]) != _group_of(selected[j]):
+                continue
+            length = overlap_length(texts[i], texts[j], max_chars)
+            if not length:
+                continue
+            # texts[i] 的结尾 == texts[j] 的开头
+            if _score_of(selected[j]) <= _score_of(selected[i]):
+                texts[j] = texts[j][length:].lstrip()
+            else:
+                texts[i] = texts[i][:-length].rstrip()
+    return [
+        {**result, "text": text, "overlap_trimmed": True} if text != result.get("text", "") else result
+        for result, text in zip(selected, texts)
+    ]
+
+
+def pack_context(
+    results: List[Dict[str, Any]],
+    max_tokens: int,
+    truncate: Optional[bool] = None
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    在 token 预算内挑选片段
+
+    Args:
+        results: 检索结果（按相关性排序）
+        max_tokens: 上下文 token 预算
+        truncate: 剩余预算是否放入按句子截断的片段，默认使用 CONTEXT_TRUNCATE_SENTENCES
+
+    Returns:
+        (选中的片段（保持原有顺序），估算 token 数)
+    """
+    truncate = settings.CONTEXT_TRUNCATE_SENTENCES if truncate is None else truncate
+    candidates = _dedupe(results)
+    if not candidates:
+        return [], 0
+
+    # 重叠部分最多为 CHUNK_OVERLAP 个 token，按每 token 4 个字符取上限
+    max_overlap_chars = settings.CHUNK_OVERLAP * 4
+    costs = [estimate_tokens(r.get("text", "")) + PART_OVERHEAD_TOKENS for r in candidates]
+    # 价值 = 分数 x 排名折扣（1 / log2(rank + 2)），避免分数接近时背包只追求片段数量
+    values = [max(_score_of(r), 1e-6) / math.log2(rank + 2) for rank, r in enumerate(candidates)]
+    chosen = _knapsack(costs, values, max_tokens)
+    selected = _trim_overlaps([candidates[i] for i in chosen], max_overlap_chars)
+    used = sum(estimate_tokens(r.get("text", "")) + PART_OVERHEAD_TOKENS for r in selected)
+
+    # 去重叠后空出的预算：按分数依次补入放得下的片段
+    chosen_set = set(chosen)
+    rest = sorted((i for i in range(len(candidates)) if i not in chosen_set), key=lambda i: -values[i])
+    added = []
+    for i in rest:
+        if used + costs[i] <= max_tokens:
+            added.append(i)
+            used += costs[i]
+    if added:
+        chosen = sorted(chosen + added)
+        selected = _trim_overlaps([candidates[i] for i in chosen], max_overlap_chars)
+        used = sum(estimate_tokens(r.get("text", "")) + PART_OVERHEAD_TOKENS for r in selected)
+        chosen_set = set(chosen)
+
+    # 剩余预算放入分数最高的未选片段的前几句
+    if truncate:
+        remaining = max_tokens - used - PART_OVERHEAD_TOKENS
+        leftovers = [i for i in range(len(candidates)) if i not in chosen_set]
+        if remaining >= MIN_TRUNCATED_TOKENS and leftovers:
+            best = max(leftovers, key=lambda i: values[i])
+            text = truncate_to_sentences(candidates[best].get("text", ""), remaining)
+            if text:
+                position = sum(1 for i in chosen if i < best)
+                selected.insert(position, {**candidates[best], "text": text, "truncated": True})
+                used += estimate_tokens(text) + PART_OVERHEAD_TOKENS
+
+    dropped = len(results) - len(selected)
+    if dropped:
+        logger.info(f"上下文打包：{len(results)} -> {len(selected)} 个片段，约 {used}/{max_tokens} tokens")
+    return selected, used
@@ -4,13 +4,14 @@
 Key 设计: summary_{user_id}_{book_id}
 """
 
+import asyncio
 import logging
 import json
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import httpx
 
 from config import settings
+from .llm_client import get_llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,7 @@ class ConversationMemory:
         self.token_threshold = settings.SUMMARY_TOKEN_THRESHOLD
         self.char_threshold = settings.SUMMARY_CHAR_THRESHOLD
         self.expire_seconds = settings.SUMMARY_EXPIRE_SECONDS
+        self._pending: Dict[str, asyncio.Task] = {}  # 后台压缩任务（每个 Key 最多一个）
 
     def _get_key(self, user_id: str, book_id: str) -> str:
         """生成存储 Key"""
@@ -107,25 +109,12 @@ class ConversationMemory:
 摘要："""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.chat_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.3,
-                        "max_tokens": 300,
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
-                summary = data["choices"][0]["message"]["content"].strip()
-                logger.info(f"生成摘要成功，长度: {len(summary)}")
-                return summary
+            summary = (await get_llm_client("openrouter").complete(
+                prompt, site="memory.summary", model=self.chat_model,
+                temperature=0.3, max_tokens=300, timeout=30.0
+            )).strip()
+            logger.info(f"生成摘要成功，长度: {len(summary)}")
+            return summary
         except Exception as e:
             logger.error(f"生成摘要失败: {e}")
             return ""
@@ -134,11 +123,15 @@ class ConversationMemory:
         self,
         user_id: str,
         book_id: str,
-        history: List[Dict[str, str]]
+        history: List[Dict[str, str]],
+        background: bool = False
     ) -> tuple[List[Dict[str, str]], Optional[str]]:
         """
         检查并压缩对话历史（懒惰模式）
 
+        Args:
+            background: 超过阈值时在后台生成摘要，本次直接返回最近消息和已有摘要（不等待 LLM）
+
         Returns:
             (压缩后的历史, 摘要文本)
         """
@@ -169,13 +162,40 @@ class ConversationMemory:
             if existing_summary:
                 to_compress.insert(0, {"role": "system", "content": f"[之前的对话摘要]: {existing_summary}"})
 
-            new_summary = await self.generate_summary(to_compress)
+            if background:
+                self._compress_in_background(user_id, book_id, to_compress)
+                return to_keep, existing_summary
+
+            new_summary = await self._compress(user_id, book_id, to_compress)
             if new_summary:
-                await self.save_summary(user_id, book_id, new_summary)
                 return to_keep, new_summary
 
         return to_keep, existing_summary
 
+    async def _compress(self, user_id: str, book_id: str, to_compress: List[Dict[str, str]]) -> str:
+        """生成并保存摘要"""
+        new_summary = await self.generate_summary(to_compress)
+        if new_summary:
+            await self.save_summary(user_id, book_id, new_summary)
+        return new_summary
+
+    def _compress_in_background(self, user_id: str, book_id: str, to_compress: List[Dict[str, str]]):
+        """后台压缩（同一 Key 已有任务在执行时跳过，下一轮对话会再次触发）"""
+        key = self._get_key(user_id, book_id)
+        task = self._pending.get(key)
+        if task is not None and not task.done():
+            logger.info(f"后台压缩进行中，跳过: {key}")
+            return
+
+        def _done(finished: asyncio.Task):
+            if self._pending.get(key) is finished:
+                del self._pending[key]
+
+        task = asyncio.create_task(self._compress(user_id, book_id, to_compress))
+        self._pending[key] = task
+        task.add_done_callback(_done)
+        logger.info(f"已提交后台压缩: {key}")
+
 
 # 全局实例
 _memory_instance: Optional[ConversationMemory] = None
@@ -8,7 +8,7 @@
 import logging
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 import httpx
 
 from llama_index.core import Document, Settings as LlamaSettings
@@ -21,6 +21,8 @@ from llama_index.readers.file import (
 )
 
 from config import settings
+from .document_registry import CHUNK_METADATA_KEYS, document_ref, split_document_metadata
+from .window_store import get_window_store, window_bounds
 
 logger = logging.getLogger(__name__)
 
@@ -423,9 +425,12 @@ class DocumentProcessor:
         """初始化文档处理器"""
         # 使用工厂函数获取嵌入模型（支持 OpenRouter 和 DashScope）
         self.embedding = get_embedding_model()
+        # 父窗口模式下只向量化小分块，上下文由检索后扩展的父窗口提供
+        self.window_store = get_window_store()
+        self.chunk_size = settings.PARENT_CHILD_CHUNK_SIZE if self.window_store else settings.CHUNK_SIZE
         self.node_parser = SentenceSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP,
+            chunk_size=self.chunk_size,
+            chunk_overlap=settings.PARENT_CHILD_CHUNK_OVERLAP if self.window_store else settings.CHUNK_OVERLAP,
         )
 
         # 初始化 LlamaParse（用于 PDF）
@@ -443,7 +448,7 @@ class DocumentProcessor:
         else:
             logger.warning("LlamaParse 未配置，PDF 解析可能效果不佳")
 
-        logger.info(f"文档处理器初始化完成，chunk_size={settings.CHUNK_SIZE}")
+        logger.info(f"文档处理器初始化完成，chunk_size={self.chunk_size}, 父窗口: {'开启' if self.window_store else '关闭'}")
 
     def _get_reader(self, file_path: Path):
         """根据文件类型获取对应的Reader"""
@@ -469,6 +474,9 @@ class DocumentProcessor:
             if self.llama_parser:
                 logger.info("使用 LlamaParse 解析 PDF...")
                 documents = self.llama_parser.load_data(str(file_path))
+                # LlamaParse 按页返回文档，记录页码（写入向量库的 page 字段）
+                for page, doc in enumerate(documents, 1):
+                    doc.metadata.setdefault("page", page)
                 # 过滤空文档
                 documents = [doc for doc in documents if doc.text and doc.text.strip()]
                 logger.info(f"LlamaParse 成功解析 {len(documents)} 个文档片段")
@@ -502,6 +510,31 @@ class DocumentProcessor:
         logger.info(f"分块完成，生成 {len(nodes)} 个节点")
         return nodes
 
+    def attach_parent_windows(
+        self,
+        documents: List[Document],
+        nodes: List[TextNode],
+        metadata: dict
+    ) -> Dict[str, str]:
+        """
+        为分块记录父窗口（window_doc + 全文字符偏移 window_start / window_end）
+
+        Returns:
+            {window_doc: 文档全文}，写入 WindowStore
+        """
+        doc_ref = document_ref(metadata)
+        keys = {doc.doc_id: f"{doc_ref}:{i}" for i, doc in enumerate(documents)}
+        texts = {doc.doc_id: doc.text for doc in documents}
+        for node in nodes:
+            doc_id = node.ref_doc_id
+            if doc_id not in keys or node.start_char_idx is None:
+                continue
+            start, end = window_bounds(
+                texts[doc_id], node.start_char_idx, node.end_char_idx, settings.PARENT_WINDOW_CHARS
+            )
+            node.metadata = {**node.metadata, "window_doc": keys[doc_id], "window_start": start, "window_end": end}
+        return {keys[doc_id]: text for doc_id, text in texts.items()}
+
     def generate_embeddings(self, nodes: List[TextNode]) -> List[TextNode]:
         """为节点生成向量"""
         logger.info(f"开始生成向量，共 {len(nodes)} 个节点")
@@ -549,7 +582,16 @@ class DocumentProcessor:
         documents = self.load_document(file_path)
 
         # 2. 添加元数据
-        if metadata:
+        if settings.DOCUMENT_REGISTRY_ENABLED:
+            # 文档级元数据由调用方登记到文档表，分块只保留 doc_ref、页码等
+            # （同时去掉 Reader 附带的临时文件路径等字段，避免参与分块长度计算）
+            chunk_metadata = split_document_metadata(metadata or {})[1]
+            for doc in documents:
+                doc.metadata = {
+                    **{k: v for k, v in doc.metadata.items() if k in CHUNK_METADATA_KEYS},
+                    **chunk_metadata,
+                }
+        elif metadata:
             for doc in documents:
                 doc.metadata.update(metadata)
 
@@ -557,11 +599,21 @@ class DocumentProcessor:
         nodes = self.parse_to_nodes(documents)
 
         # 4. 添加元数据到节点
-        if metadata:
+        if settings.DOCUMENT_REGISTRY_ENABLED:
+            # 记录分块在所属文档（页）中的字符偏移
+            for node in nodes:
+                if node.start_char_idx is not None:
+                    node.metadata = {**node.metadata, "start": node.start_char_idx, "end": node.end_char_idx}
+        elif metadata:
             for node in nodes:
                 node.metadata.update(metadata)
 
-        # 5. 生成向量
+        # 5. 父窗口：记录窗口偏移，保存文档全文（检索时按偏移读取，不重复写入向量库）
+        if self.window_store is not None:
+            texts = self.attach_parent_windows(documents, nodes, metadata or {})
+            self.window_store.put_documents((metadata or {}).get("book_id"), texts)
+
+        # 6. 生成向量
         nodes = self.generate_embeddings(nodes)
 
         return nodes
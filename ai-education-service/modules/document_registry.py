@@ -0,0 +1,232 @@
+"""
+文档登记模块
+文档级元数据（oss_key、bucket、file_name、book_name、document_type 等）按 resource_id 在 PostgreSQL 中只存一份，
+分块只保留 doc_ref、偏移量和页码；检索层通过进程内 LRU 缓存关联文档元数据
+表: rag_documents
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import Json, RealDictCursor
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# 保留在分块上的元数据键，其余均视为文档级元数据
+CHUNK_METADATA_KEYS = frozenset({
+    "book_id", "resource_id", "doc_ref", "doc_type", "chapter_id",
+    "page", "page_label", "page_number", "start", "end",
+})
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS rag_documents (
+    resource_id TEXT PRIMARY KEY,
+    book_id TEXT,
+    metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_rag_documents_book_id ON rag_documents (book_id);
+"""
+
+
+def document_ref(metadata: Dict[str, Any]) -> str:
+    """
+    文档引用键：优先使用 resource_id，没有时由 oss_key 派生
+    """
+    if metadata.get("resource_id"):
+        return str(metadata["resource_id"])
+    source = metadata.get("oss_key") or metadata.get("file_name") or ""
+    return "oss-" + hashlib.md5(str(source).encode("utf-8")).hexdigest()[:16]
+
+
+def split_document_metadata(metadata: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    拆分文档级和分块级元数据
+
+    Returns:
+        (document_metadata, chunk_metadata)，chunk_metadata 附带 doc_ref 和 doc_type
+    """
+    document = {k: v for k, v in metadata.items() if k not in CHUNK_METADATA_KEYS}
+    chunk = {k: v for k, v in metadata.items() if k in CHUNK_METADATA_KEYS}
+    chunk["doc_ref"] = document_ref(metadata)
+    doc_type = metadata.get("doc_type") or metadata.get("document_type") or metadata.get("type")
+    if doc_type:
+        chunk["doc_type"] = doc_type
+    return document, chunk
+
+
+class DocumentRegistry:
+    """
+    文档登记表
+    写入 PostgreSQL，读取时经过进程内 LRU 缓存
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        self.db_config = {
+            "host": settings.POSTGRES_HOST,
+            "port": settings.POSTGRES_PORT,
+            "database": settings.POSTGRES_DB,
+            "user": settings.POSTGRES_USER,
+            "password": settings.POSTGRES_PASSWORD,
+        }
+        self.cache_size = cache_size or settings.DOCUMENT_REGISTRY_CACHE_SIZE
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._table_ready = False
+        logger.info(f"DocumentRegistry 初始化: {self.db_config['host']}:{self.db_config['port']}")
+
+    def _get_connection(self):
+        """获取数据库连接"""
+        return psycopg2.connect(**self.db_config)
+
+    def _ensure_table(self, conn) -> None:
+        if self._table_ready:
+            return
+        with conn.cursor() as cur:
+            cur.execute(_CREATE_TABLE_SQL)
+        conn.commit()
+        self._table_ready = True
+
+    # ============ 写入 ============
+
+    def register(self, metadata: Dict[str, Any], chunk_count: int = 0) -> Optional[str]:
+        """
+        登记（或更新）一个文档的元数据
+
+        Args:
+            metadata: 入库时的完整文件元数据（只保存文档级部分）
+            chunk_count: 分块数量
+
+        Returns:
+            doc_ref，失败时返回 None
+        """
+        document, chunk = split_document_metadata(metadata)
+        doc_ref = chunk["doc_ref"]
+        sql = """
+        INSERT INTO rag_documents (resource_id, book_id, metadata, chunk_count, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, NOW(), NOW())
+        ON CONFLICT (resource_id) DO UPDATE SET
+            book_id = EXCLUDED.book_id,
+            metadata = EXCLUDED.metadata,
+            chunk_count = EXCLUDED.chunk_count,
+            updated_at = NOW()
+        """
+        try:
+            with self._get_connection() as conn:
+                self._ensure_table(conn)
+                with conn.cursor() as cur:
+                    cur.execute(sql, (doc_ref, metadata.get("book_id"), Json(document, dumps=_dumps), chunk_count))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"文档登记失败: doc_ref={doc_ref}, 错误: {e}")
+            return None
+
+        self._evict(doc_ref)
+        logger.info(f"文档登记成功: doc_ref={doc_ref}, chunks={chunk_count}")
+        return doc_ref
+
+    def delete_by_book(self, book_id: str) -> int:
+        """删除一本书的全部文档登记"""
+        try:
+            with self._get_connection() as conn:
+                self._ensure_table(conn)
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM rag_documents WHERE book_id = %s RETURNING resource_id", (book_id,))
+                    deleted = [row[0] for row in cur.fetchall()]
+                conn.commit()
+        except Exception as e:
+            logger.error(f"删除文档登记失败: book_id={book_id}, 错误: {e}")
+            return 0
+
+        for doc_ref in deleted:
+            self._evict(doc_ref)
+        logger.info(f"删除文档登记: book_id={book_id}, {len(deleted)} 个文档")
+        return len(deleted)
+
+    # ============ 读取 ============
+
+    def get_many(self, doc_refs: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取文档元数据（缓存未命中的一次查询补齐）"""
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        with self._lock:
+            for doc_ref in dict.fromkeys(doc_refs):
+                if doc_ref in self._cache:
+                    self._cache.move_to_end(doc_ref)
+                    found[doc_ref] = self._cache[doc_ref]
+                else:
+                    missing.append(doc_ref)
+
+        if not missing:
+            return found
+
+        try:
+            with self._get_connection() as conn:
+                self._ensure_table(conn)
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(
+                        "SELECT resource_id, book_id, metadata FROM rag_documents WHERE resource_id = ANY(%s)",
+                        (missing,)
+                    )
+                    rows = cur.fetchall()
+        except Exception as e:
+            logger.warning(f"查询文档登记失败: {e}")
+            return found
+
+        with self._lock:
+            for row in rows:
+                document = {**(row["metadata"] or {}), "book_id": row["book_id"]}
+                found[row["resource_id"]] = document
+                self._cache[row["resource_id"]] = document
+                self._cache.move_to_end(row["resource_id"])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return found
+
+    def get(self, doc_ref: str) -> Optional[Dict[str, Any]]:
+        """获取单个文档元数据"""
+        return self.get_many([doc_ref]).get(doc_ref)
+
+    def attach(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        为检索结果关联文档元数据（写入 result["document"]）
+
+        分块的 doc_ref 缺失时使用 resource_id；查询失败时原样返回。
+        """
+        refs = [r.get("doc_ref") or r.get("resource_id") for r in results]
+        documents = self.get_many([ref for ref in refs if ref])
+        for result, ref in zip(results, refs):
+            if ref in documents:
+                result["document"] = documents[ref]
+        return results
+
+    def _evict(self, doc_ref: str) -> None:
+        with self._lock:
+            self._cache.pop(doc_ref, None)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+# 全局实例
+_document_registry: Optional[DocumentRegistry] = None
+
+
+def get_document_registry() -> Optional[DocumentRegistry]:
+    """获取文档登记单例（未启用时返回 None）"""
+    global _document_registry
+    if not settings.DOCUMENT_REGISTRY_ENABLED:
+        return None
+    if _document_registry is None:
+        _document_registry = DocumentRegistry()
+    return _document_registry
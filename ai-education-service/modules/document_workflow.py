@@ -3,9 +3,10 @@
 使用 LlamaIndex Workflows 实现事件驱动的文档处理流程
 """
 
+import asyncio
 import logging
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 from llama_index.core.workflow import (
     Event,
@@ -19,7 +20,12 @@ from llama_index.core.workflow import (
 from config import settings
 from .oss_downloader import OSSDownloader
 from .document_processor import DocumentProcessor
-from .vector_store import VectorStore
+from .vector_store import get_vector_store
+from .document_registry import get_document_registry
+from .keyword_index import get_keyword_index
+from .chapter_index import get_chapter_index
+from .question_index import get_question_index
+from .chapter_scope import RESOURCE_DOC_TYPES, assign_chapters, invalidate_chapters, load_book_chapters
 from .pipeline import ProcessingStatus, ProcessingResult
 
 logger = logging.getLogger(__name__)
@@ -58,7 +64,10 @@ class StoreEvent(Event):
     local_path: Path
     nodes_count: int
     vectors_stored: int
+    vectors_failed: int = 0
     nodes: Optional[list] = None  # 传递给知识图谱提取
+    metadata: Optional[Dict[str, Any]] = None  # 文档级元数据（分块上不再携带）
+    chapters_ready: bool = False  # 入库前已读取 / 提取章节树（知识图谱步骤不再重复提取）
 
 
 class KGExtractEvent(Event):
@@ -67,6 +76,7 @@ class KGExtractEvent(Event):
     local_path: Path
     nodes_count: int
     vectors_stored: int
+    vectors_failed: int = 0
     kg_entities: int = 0
     kg_relations: int = 0
 
@@ -79,6 +89,10 @@ class FailedEvent(Event):
     local_path: Optional[Path] = None
 
 
+# 提取章节目录时使用的前几个分块
+TOC_CHUNKS = 10
+
+
 # ============ 文档处理 Workflow ============
 
 class DocumentProcessingWorkflow(Workflow):
@@ -94,7 +108,7 @@ class DocumentProcessingWorkflow(Workflow):
         super().__init__(**kwargs)
         self.downloader = OSSDownloader()
         self.processor = DocumentProcessor()
-        self.vector_store = VectorStore()
+        self.vector_store = get_vector_store()
         logger.info("DocumentProcessingWorkflow 初始化完成")
     
     @step
@@ -183,19 +197,101 @@ class DocumentProcessingWorkflow(Workflow):
                 local_path=ev.local_path
             )
 
+    async def _tag_chapters(self, nodes: list, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        为教材分块标注 chapter_id（章节范围检索，失败不影响入库）
+
+        知识图谱中还没有章节树时先从前几页的目录提取并保存。
+
+        Returns:
+            章节树（未读取或提取到时为空列表）
+        """
+        book_id = metadata.get("book_id")
+        doc_type = metadata.get("document_type") or metadata.get("type")
+        if not settings.CHAPTER_SCOPE_ENABLED or not book_id or doc_type in RESOURCE_DOC_TYPES:
+            return []
+
+        try:
+            from .entity_extractor import extract_book_chapters, save_book_chapters
+
+            invalidate_chapters(book_id)
+            chapters = await asyncio.to_thread(load_book_chapters, book_id)
+            if not chapters:
+                toc_text = "\n".join(node.get_content()[:2000] for node in nodes[:TOC_CHUNKS])
+                extracted = await extract_book_chapters(toc_text, book_id)
+                if not extracted:
+                    return []
+                result = await save_book_chapters(extracted, book_id)
+                logger.info(f"[Workflow] 章节结构提取完成: {result.get('chapters', 0)} 个章节")
+                chapters = [vars(chapter) for chapter in extracted]
+
+            assign_chapters(nodes, chapters)
+            return chapters
+        except Exception as e:
+            logger.warning(f"[Workflow] 章节标注失败（不影响入库）: {e}")
+            return []
+
+    async def _build_chapter_index(self, chapter_index, nodes: list, chapters: List[Dict[str, Any]], metadata: Dict[str, Any]) -> None:
+        """生成章节摘要向量（失败不影响入库，检索回退到整本书）"""
+        try:
+            count = await asyncio.to_thread(
+                chapter_index.build, metadata.get("book_id"), nodes, chapters, self.processor.embedding.get_text_embedding_batch
+            )
+            logger.info(f"[Workflow] 章节摘要索引完成: {count} 个章节")
+        except Exception as e:
+            logger.warning(f"[Workflow] 章节摘要索引失败（不影响入库）: {e}")
+
+    async def _build_question_index(self, question_index, nodes: list, failed: set) -> None:
+        """生成假设问题索引（失败不影响入库，查询时使用 HyDE）"""
+        try:
+            count = await question_index.build(
+                [node for node in nodes if node.node_id not in failed], self.processor.embedding.get_text_embedding_batch
+            )
+            logger.info(f"[Workflow] 假设问题索引完成: {count} 个问题")
+        except Exception as e:
+            logger.warning(f"[Workflow] 假设问题索引失败（不影响入库）: {e}")
+
     @step
     async def store_vectors(self, ctx: Context, ev: ProcessEvent) -> StoreEvent | FailedEvent:
         """步骤4: 存储向量"""
         try:
-            vectors_stored = self.vector_store.insert(ev.nodes)
+            chapters = await self._tag_chapters(ev.nodes, ev.metadata or {})
+            report = self.vector_store.insert(ev.nodes)
+            if report.failed_ids:
+                logger.error(f"[Workflow] {len(report.failed_ids)} 个向量写入失败: {report.failed_ids[:10]}")
+
+            logger.info(f"[Workflow] 向量存储完成: {report.inserted} 个向量")
+
+            # 登记文档级元数据（分块只保留 doc_ref）
+            registry = get_document_registry()
+            if registry is not None:
+                registry.register(ev.metadata, chunk_count=len(ev.nodes))
+
+            # 写入关键词倒排索引（BM25）
+            keyword_index = get_keyword_index()
+            if keyword_index is not None:
+                failed = set(report.failed_ids)
+                keyword_index.insert([node for node in ev.nodes if node.node_id not in failed])
+
+            # 生成假设问题索引（替代查询时的 HyDE）
+            question_index = get_question_index()
+            if question_index is not None:
+                await self._build_question_index(question_index, ev.nodes, set(report.failed_ids))
+
+            # 生成章节摘要向量（分层检索）
+            chapter_index = get_chapter_index()
+            if chapter_index is not None and chapters:
+                await self._build_chapter_index(chapter_index, ev.nodes, chapters, ev.metadata or {})
 
-            logger.info(f"[Workflow] 向量存储完成: {vectors_stored} 个向量")
             return StoreEvent(
                 oss_key=ev.oss_key,
                 local_path=ev.local_path,
                 nodes_count=len(ev.nodes),
-                vectors_stored=vectors_stored,
-                nodes=ev.nodes  # 传递给知识图谱提取
+                vectors_stored=report.inserted,
+                vectors_failed=len(report.failed_ids),
+                nodes=ev.nodes,  # 传递给知识图谱提取
+                metadata=ev.metadata,
+                chapters_ready=bool(chapters)
             )
         except Exception as e:
             logger.error(f"[Workflow] 向量存储失败: {e}")
@@ -212,14 +308,13 @@ class DocumentProcessingWorkflow(Workflow):
         kg_entities, kg_relations = 0, 0
 
         try:
-            # 从 nodes 提取 metadata
-            metadata = {}
-            book_id = None
-            if ev.nodes:
+            # 文档级 metadata（旧流程从 nodes 提取）
+            metadata = ev.metadata or {}
+            if not metadata and ev.nodes:
                 first_node = ev.nodes[0]
                 if hasattr(first_node, 'metadata'):
                     metadata = first_node.metadata
-                    book_id = metadata.get("book_id")
+            book_id = metadata.get("book_id")
 
             # 兼容两种字段名: type/document_type, name/document_name
             doc_type = metadata.get("document_type") or metadata.get("type")
@@ -231,7 +326,7 @@ class DocumentProcessingWorkflow(Workflow):
             logger.info(f"[Workflow] KG metadata: type={doc_type}, book_id={book_id}, resource_id={resource_id}")
 
             # 处理学习资源：提取结构并关联到章节
-            if doc_type in ["resource", "user_resource"] and book_id and resource_id:
+            if doc_type in RESOURCE_DOC_TYPES and book_id and resource_id:
                 from .entity_extractor import (
                     analyze_resource_to_chapters,
                     extract_resource_sections,
@@ -293,9 +388,11 @@ class DocumentProcessingWorkflow(Workflow):
                 chunks = [{"text": n.get_content(), "metadata": n.metadata} for n in ev.nodes if hasattr(n, 'get_content')]
 
                 if chunks:
-                    # 1. 尝试从前几页提取章节结构（目录通常在前面）
-                    toc_text = "\n".join([c.get("text", "")[:2000] for c in chunks[:10]])
-                    chapters = await extract_book_chapters(toc_text, book_id)
+                    # 1. 尝试从前几页提取章节结构（目录通常在前面；入库前已提取时跳过）
+                    chapters = None
+                    if not ev.chapters_ready:
+                        toc_text = "\n".join([c.get("text", "")[:2000] for c in chunks[:TOC_CHUNKS]])
+                        chapters = await extract_book_chapters(toc_text, book_id)
 
                     if chapters:
                         chapter_result = await save_book_chapters(chapters, book_id)
@@ -315,6 +412,7 @@ class DocumentProcessingWorkflow(Workflow):
             local_path=ev.local_path,
             nodes_count=ev.nodes_count,
             vectors_stored=ev.vectors_stored,
+            vectors_failed=ev.vectors_failed,
             kg_entities=kg_entities,
             kg_relations=kg_relations
         )
@@ -325,11 +423,9 @@ class DocumentProcessingWorkflow(Workflow):
         self.downloader.cleanup(ev.local_path)
         logger.info(f"[Workflow] 处理完成: {ev.oss_key}")
 
-        result = ProcessingResult(
-            success=True,
-            status=ProcessingStatus.COMPLETED,
-            message="文档处理成功",
-            file_key=ev.oss_key,
+        result = ProcessingResult.completed(
+            ev.oss_key,
+            vectors_failed=ev.vectors_failed,
             chunks_count=ev.nodes_count,
             vectors_stored=ev.vectors_stored,
             nodes_count=ev.nodes_count,
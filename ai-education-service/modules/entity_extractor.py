@@ -10,11 +10,11 @@ import hashlib
 from typing import List, Dict, Any, Tuple
 from dataclasses import dataclass
 
-import httpx
-
 from config import settings
 from .knowledge_graph import Entity, Relation, Chapter, ResourceSection, get_kg_store
+from .chapter_scope import fill_end_pages, invalidate_chapters
 from .document_processor import get_embedding_model
+from .llm_client import get_llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -123,60 +123,53 @@ class EntityExtractor:
 - 每个文本块最多提取 10 个实体和 15 个关系"""
 
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"{settings.DASHSCOPE_BASE_URL}/chat/completions",
-                    headers={"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"},
-                    json={
-                        "model": self.chat_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.1
-                    }
-                )
-                result = response.json()["choices"][0]["message"]["content"]
-
-                # 解析 JSON
-                if "```" in result:
-                    result = result.split("```")[1].replace("json", "").strip()
-                parsed = json.loads(result)
-
-                # 转换为 Entity 和 Relation 对象
-                entities = []
-                name_to_id = {}
-
-                for e in parsed.get("entities", []):
-                    name = e.get("name", "").strip()
-                    if not name:
-                        continue
-
-                    # 生成稳定的 ID
-                    entity_id = self._generate_id(book_id, name)
-                    name_to_id[name] = entity_id
-
-                    entities.append(Entity(
-                        id=entity_id,
-                        name=name,
-                        type=e.get("type", "Concept"),
-                        book_id=book_id,
-                        properties={"chunk_idx": chunk_idx}
-                    ))
-
-                relations = []
-                for r in parsed.get("relations", []):
-                    source = r.get("source", "").strip()
-                    target = r.get("target", "").strip()
-
-                    if source not in name_to_id or target not in name_to_id:
-                        continue
-
-                    relations.append(Relation(
-                        source_id=name_to_id[source],
-                        target_id=name_to_id[target],
-                        type=r.get("type", "RELATES_TO"),
-                        properties={"book_id": book_id}
-                    ))
-
-                return entities, relations
+            result = await get_llm_client("dashscope").complete(
+                prompt, site="entity.extract", model=self.chat_model, temperature=0.1, timeout=60.0,
+                cache_ttl=settings.LLM_CACHE_TTL_EXTRACTION
+            )
+
+            # 解析 JSON
+            if "```" in result:
+                result = result.split("```")[1].replace("json", "").strip()
+            parsed = json.loads(result)
+
+            # 转换为 Entity 和 Relation 对象
+            entities = []
+            name_to_id = {}
+
+            for e in parsed.get("entities", []):
+                name = e.get("name", "").strip()
+                if not name:
+                    continue
+
+                # 生成稳定的 ID
+                entity_id = self._generate_id(book_id, name)
+                name_to_id[name] = entity_id
+
+                entities.append(Entity(
+                    id=entity_id,
+                    name=name,
+                    type=e.get("type", "Concept"),
+                    book_id=book_id,
+                    properties={"chunk_idx": chunk_idx}
+                ))
+
+            relations = []
+            for r in parsed.get("relations", []):
+                source = r.get("source", "").strip()
+                target = r.get("target", "").strip()
+
+                if source not in name_to_id or target not in name_to_id:
+                    continue
+
+                relations.append(Relation(
+                    source_id=name_to_id[source],
+                    target_id=name_to_id[target],
+                    type=r.get("type", "RELATES_TO"),
+                    properties={"book_id": book_id}
+                ))
+
+            return entities, relations
 
         except Exception as e:
             logger.error(f"LLM 提取失败: {e}")
@@ -313,43 +306,36 @@ async def analyze_resource_chapter_relations(chunks: List[Dict], book_id: str,
 只返回确实相关的章节，不要强行关联。"""
 
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"{settings.DASHSCOPE_BASE_URL}/chat/completions",
-                    headers={"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"},
-                    json={
-                        "model": settings.CHAT_MODEL,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.1
-                    }
-                )
-                llm_result = response.json()["choices"][0]["message"]["content"]
-
-                if "```" in llm_result:
-                    llm_result = llm_result.split("```")[1].replace("json", "").strip()
-                parsed = json.loads(llm_result)
-                
-                # 4. 建立关联关系
-                for rel in parsed.get("related_chapters", []):
-                    chapter_name = rel.get("chapter_name", "")
-                    # 找到对应的章节实体
-                    matching = [e for e in chapter_entities if chapter_name in e.get("name", "")]
-                    if matching:
-                        chapter_entity = matching[0]
-                        success = await store.link_resource_to_chapter(
-                            resource_id=resource_id,
-                            chapter_entity_id=chapter_entity.get("id"),
-                            relation_type=f"RELATES_TO_{rel.get('relevance', 'medium').upper()}"
-                        )
-                        if success:
-                            result["chapter_relations"].append({
-                                "chapter": chapter_name,
-                                "relevance": rel.get("relevance"),
-                                "reason": rel.get("reason")
-                            })
-                
-                logger.info(f"资源-章节关联分析完成: {len(result['chapter_relations'])} 个关联")
-                
+            llm_result = await get_llm_client("dashscope").complete(
+                prompt, site="entity.resource_chapter_relations", model=settings.CHAT_MODEL, temperature=0.1, timeout=60.0,
+                cache_ttl=settings.LLM_CACHE_TTL_EXTRACTION
+            )
+
+            if "```" in llm_result:
+                llm_result = llm_result.split("```")[1].replace("json", "").strip()
+            parsed = json.loads(llm_result)
+            
+            # 4. 建立关联关系
+            for rel in parsed.get("related_chapters", []):
+                chapter_name = rel.get("chapter_name", "")
+                # 找到对应的章节实体
+                matching = [e for e in chapter_entities if chapter_name in e.get("name", "")]
+                if matching:
+                    chapter_entity = matching[0]
+                    success = await store.link_resource_to_chapter(
+                        resource_id=resource_id,
+                        chapter_entity_id=chapter_entity.get("id"),
+                        relation_type=f"RELATES_TO_{rel.get('relevance', 'medium').upper()}"
+                    )
+                    if success:
+                        result["chapter_relations"].append({
+                            "chapter": chapter_name,
+                            "relevance": rel.get("relevance"),
+                            "reason": rel.get("reason")
+                        })
+            
+            logger.info(f"资源-章节关联分析完成: {len(result['chapter_relations'])} 个关联")
+            
         except Exception as e:
             logger.warning(f"LLM 关联分析失败: {e}")
         
@@ -411,53 +397,46 @@ async def extract_book_chapters(toc_text: str, book_id: str) -> List[Chapter]:
 - children: 子章节列表"""
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{settings.DASHSCOPE_BASE_URL}/chat/completions",
-                headers={"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"},
-                json={
-                    "model": settings.CHAT_MODEL,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1
-                }
-            )
-            result = response.json()["choices"][0]["message"]["content"]
-
-            if "```" in result:
-                result = result.split("```")[1].replace("json", "").strip()
-            parsed = json.loads(result)
-
-            # 递归转换为 Chapter 对象
-            chapters = []
-
-            def process_chapter(ch_data: Dict, parent_id: str = None, global_order: List[int] = None):
-                if global_order is None:
-                    global_order = [0]
-
-                global_order[0] += 1
-                chapter_id = hashlib.md5(f"{book_id}:{ch_data['title']}".encode()).hexdigest()[:16]
+        result = await get_llm_client("dashscope").complete(
+            prompt, site="entity.book_chapters", model=settings.CHAT_MODEL, temperature=0.1, timeout=60.0,
+            cache_ttl=settings.LLM_CACHE_TTL_EXTRACTION
+        )
 
-                chapter = Chapter(
-                    id=chapter_id,
-                    book_id=book_id,
-                    title=ch_data.get("title", ""),
-                    order_index=global_order[0],
-                    level=ch_data.get("level", 1),
-                    parent_id=parent_id,
-                    start_page=ch_data.get("start_page"),
-                    end_page=None
-                )
-                chapters.append(chapter)
+        if "```" in result:
+            result = result.split("```")[1].replace("json", "").strip()
+        parsed = json.loads(result)
+
+        # 递归转换为 Chapter 对象
+        chapters = []
+
+        def process_chapter(ch_data: Dict, parent_id: str = None, global_order: List[int] = None):
+            if global_order is None:
+                global_order = [0]
+
+            global_order[0] += 1
+            chapter_id = hashlib.md5(f"{book_id}:{ch_data['title']}".encode()).hexdigest()[:16]
+
+            chapter = Chapter(
+                id=chapter_id,
+                book_id=book_id,
+                title=ch_data.get("title", ""),
+                order_index=global_order[0],
+                level=ch_data.get("level", 1),
+                parent_id=parent_id,
+                start_page=ch_data.get("start_page"),
+                end_page=None
+            )
+            chapters.append(chapter)
 
-                # 处理子章节
-                for child in ch_data.get("children", []):
-                    process_chapter(child, chapter_id, global_order)
+            # 处理子章节
+            for child in ch_data.get("children", []):
+                process_chapter(child, chapter_id, global_order)
 
-            for ch in parsed.get("chapters", []):
-                process_chapter(ch)
+        for ch in parsed.get("chapters", []):
+            process_chapter(ch)
 
-            logger.info(f"从目录提取了 {len(chapters)} 个章节")
-            return chapters
+        logger.info(f"从目录提取了 {len(chapters)} 个章节")
+        return chapters
 
     except Exception as e:
         logger.error(f"章节提取失败: {e}")
@@ -466,14 +445,16 @@ async def extract_book_chapters(toc_text: str, book_id: str) -> List[Chapter]:
 
 async def save_book_chapters(chapters: List[Chapter], book_id: str) -> Dict[str, Any]:
     """
-    保存章节到 Neo4j 并构建层级关系
+    保存章节到 Neo4j 并构建层级关系（缺少结束页的章节按下一章起始页补全）
     """
     store = None
     try:
         store = await get_kg_store()
 
         # 1. 批量添加章节节点
+        fill_end_pages(chapters)
         count = await store.add_chapters_batch(chapters)
+        invalidate_chapters(book_id)
 
         # 2. 构建层级关系
         hierarchy_count = await store.build_chapter_hierarchy(book_id)
@@ -554,48 +535,41 @@ async def analyze_resource_to_chapters(chunks: List[Dict], book_id: str,
 - chapter_id 使用方括号中的 ID"""
 
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"{settings.DASHSCOPE_BASE_URL}/chat/completions",
-                    headers={"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"},
-                    json={
-                        "model": settings.CHAT_MODEL,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.1
-                    }
-                )
-                llm_result = response.json()["choices"][0]["message"]["content"]
-
-                if "```" in llm_result:
-                    llm_result = llm_result.split("```")[1].replace("json", "").strip()
-                parsed = json.loads(llm_result)
-
-                # 4. 建立关联关系
-                related = parsed.get("related_chapters", [])
-
-                if not related:
-                    result["unlinked"] = True
-                    logger.info(f"资源 {resource_id} 与章节无关联，保持为未关联状态")
-                else:
-                    # 找到完整的 chapter_id
-                    chapter_ids = []
-                    for rel in related:
-                        short_id = rel.get("chapter_id", "")
-                        matching = [c for c in chapters if c["id"].startswith(short_id)]
-                        if matching:
-                            chapter_ids.append(matching[0]["id"])
-                            result["chapter_relations"].append({
-                                "chapter_id": matching[0]["id"],
-                                "chapter_title": matching[0]["title"],
-                                "relevance": rel.get("relevance"),
-                                "reason": rel.get("reason")
-                            })
-
-                    # 批量建立关联
-                    if chapter_ids:
-                        await store.link_resource_to_chapters_batch(resource_id, chapter_ids)
-
-                logger.info(f"资源-章节关联分析完成: {len(result['chapter_relations'])} 个关联")
+            llm_result = await get_llm_client("dashscope").complete(
+                prompt, site="entity.resource_to_chapters", model=settings.CHAT_MODEL, temperature=0.1, timeout=60.0,
+                cache_ttl=settings.LLM_CACHE_TTL_EXTRACTION
+            )
+
+            if "```" in llm_result:
+                llm_result = llm_result.split("```")[1].replace("json", "").strip()
+            parsed = json.loads(llm_result)
+
+            # 4. 建立关联关系
+            related = parsed.get("related_chapters", [])
+
+            if not related:
+                result["unlinked"] = True
+                logger.info(f"资源 {resource_id} 与章节无关联，保持为未关联状态")
+            else:
+                # 找到完整的 chapter_id
+                chapter_ids = []
+                for rel in related:
+                    short_id = rel.get("chapter_id", "")
+                    matching = [c for c in chapters if c["id"].startswith(short_id)]
+                    if matching:
+                        chapter_ids.append(matching[0]["id"])
+                        result["chapter_relations"].append({
+                            "chapter_id": matching[0]["id"],
+                            "chapter_title": matching[0]["title"],
+                            "relevance": rel.get("relevance"),
+                            "reason": rel.get("reason")
+                        })
+
+                # 批量建立关联
+                if chapter_ids:
+                    await store.link_resource_to_chapters_batch(resource_id, chapter_ids)
+
+            logger.info(f"资源-章节关联分析完成: {len(result['chapter_relations'])} 个关联")
 
         except Exception as e:
             logger.warning(f"LLM 关联分析失败: {e}")
@@ -647,36 +621,29 @@ async def extract_resource_sections(chunks: List[Dict], resource_id: str) -> Lis
 - 如果资料没有明显结构，按内容主题划分"""
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{settings.DASHSCOPE_BASE_URL}/chat/completions",
-                headers={"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"},
-                json={
-                    "model": settings.CHAT_MODEL,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1
-                }
-            )
-            result = response.json()["choices"][0]["message"]["content"]
-
-            if "```" in result:
-                result = result.split("```")[1].replace("json", "").strip()
-            parsed = json.loads(result)
-
-            sections = []
-            for sec in parsed.get("sections", []):
-                section_id = hashlib.md5(f"{resource_id}:{sec['title']}".encode()).hexdigest()[:16]
-                sections.append(ResourceSection(
-                    id=section_id,
-                    resource_id=resource_id,
-                    title=sec.get("title", ""),
-                    order_index=sec.get("order", len(sections) + 1),
-                    content_summary=sec.get("summary"),
-                    parent_id=None
-                ))
+        result = await get_llm_client("dashscope").complete(
+            prompt, site="entity.resource_sections", model=settings.CHAT_MODEL, temperature=0.1, timeout=60.0,
+            cache_ttl=settings.LLM_CACHE_TTL_EXTRACTION
+        )
 
-            logger.info(f"从资料提取了 {len(sections)} 个结构部分")
-            return sections
+        if "```" in result:
+            result = result.split("```")[1].replace("json", "").strip()
+        parsed = json.loads(result)
+
+        sections = []
+        for sec in parsed.get("sections", []):
+            section_id = hashlib.md5(f"{resource_id}:{sec['title']}".encode()).hexdigest()[:16]
+            sections.append(ResourceSection(
+                id=section_id,
+                resource_id=resource_id,
+                title=sec.get("title", ""),
+                order_index=sec.get("order", len(sections) + 1),
+                content_summary=sec.get("summary"),
+                parent_id=None
+            ))
+
+        logger.info(f"从资料提取了 {len(sections)} 个结构部分")
+        return sections
 
     except Exception as e:
         logger.error(f"资料结构提取失败: {e}")
@@ -744,59 +711,52 @@ async def analyze_sections_to_chapters(sections: List[ResourceSection], book_id:
 - 如果某部分与所有章节都无关，不要返回该部分"""
 
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"{settings.DASHSCOPE_BASE_URL}/chat/completions",
-                    headers={"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"},
-                    json={
-                        "model": settings.CHAT_MODEL,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.1
-                    }
-                )
-                llm_result = response.json()["choices"][0]["message"]["content"]
-
-                if "```" in llm_result:
-                    llm_result = llm_result.split("```")[1].replace("json", "").strip()
-                parsed = json.loads(llm_result)
-
-                # 5. 建立关联关系
-                links = []
-                linked_section_ids = set()
-
-                for mapping in parsed.get("mappings", []):
-                    sec_short_id = mapping.get("section_id", "")
-                    ch_short_id = mapping.get("chapter_id", "")
-
-                    # 找到完整 ID
-                    matching_section = [s for s in sections if s.id.startswith(sec_short_id)]
-                    matching_chapter = [c for c in chapters if c["id"].startswith(ch_short_id)]
-
-                    if matching_section and matching_chapter:
-                        section = matching_section[0]
-                        chapter = matching_chapter[0]
-                        links.append({
-                            "section_id": section.id,
-                            "chapter_id": chapter["id"]
-                        })
-                        linked_section_ids.add(section.id)
-                        result["section_chapter_links"].append({
-                            "section_id": section.id,
-                            "section_title": section.title,
-                            "chapter_id": chapter["id"],
-                            "chapter_title": chapter["title"]
-                        })
-
-                # 批量建立关联
-                if links:
-                    await store.link_sections_to_chapters_batch(links)
-
-                # 记录未关联的部分
-                for s in sections:
-                    if s.id not in linked_section_ids:
-                        result["unlinked_sections"].append(s.title)
+            llm_result = await get_llm_client("dashscope").complete(
+                prompt, site="entity.sections_to_chapters", model=settings.CHAT_MODEL, temperature=0.1, timeout=60.0,
+                cache_ttl=settings.LLM_CACHE_TTL_EXTRACTION
+            )
 
-                logger.info(f"资料结构-章节关联完成: {len(links)} 个关联, {len(result['unlinked_sections'])} 个未关联")
+            if "```" in llm_result:
+                llm_result = llm_result.split("```")[1].replace("json", "").strip()
+            parsed = json.loads(llm_result)
+
+            # 5. 建立关联关系
+            links = []
+            linked_section_ids = set()
+
+            for mapping in parsed.get("mappings", []):
+                sec_short_id = mapping.get("section_id", "")
+                ch_short_id = mapping.get("chapter_id", "")
+
+                # 找到完整 ID
+                matching_section = [s for s in sections if s.id.startswith(sec_short_id)]
+                matching_chapter = [c for c in chapters if c["id"].startswith(ch_short_id)]
+
+                if matching_section and matching_chapter:
+                    section = matching_section[0]
+                    chapter = matching_chapter[0]
+                    links.append({
+                        "section_id": section.id,
+                        "chapter_id": chapter["id"]
+                    })
+                    linked_section_ids.add(section.id)
+                    result["section_chapter_links"].append({
+                        "section_id": section.id,
+                        "section_title": section.title,
+                        "chapter_id": chapter["id"],
+                        "chapter_title": chapter["title"]
+                    })
+
+            # 批量建立关联
+            if links:
+                await store.link_sections_to_chapters_batch(links)
+
+            # 记录未关联的部分
+            for s in sections:
+                if s.id not in linked_section_ids:
+                    result["unlinked_sections"].append(s.title)
+
+            logger.info(f"资料结构-章节关联完成: {len(links)} 个关联, {len(result['unlinked_sections'])} 个未关联")
 
         except Exception as e:
             logger.warning(f"LLM 结构关联分析失败: {e}")
@@ -0,0 +1,280 @@
+"""
+热门教材向量缓存模块
+将高频访问教材的向量和文本整体加载到内存（float16 矩阵），本地精确检索，未命中时回退到 DashVector
+
+- LRU 内存预算：按书淘汰，总占用不超过 HOT_CACHE_MAX_MB
+- 后台预热：周期性统计各书的请求速率，加载 Top-N 热门教材
+- 失效：教材重新入库或删除时清除对应缓存
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Any, Optional
+
+import numpy as np
+
+from config import settings
+from .local_vector_store import ChapterCodes, exact_top_k, normalize_rows, parse_filter
+from .vector_store import project_fields
+
+logger = logging.getLogger(__name__)
+
+# 请求速率的指数平滑系数（每个预热周期）
+RATE_DECAY = 0.5
+
+
+@dataclass
+class HotBook:
+    """单本书的热缓存数据"""
+    book_id: str
+    ids: List[str]
+    fields: List[Dict[str, Any]]  # 分块字段（text、book_id、page、metadata 等）
+    vectors: np.ndarray  # (n, d) float16，已归一化
+    _chapters: Optional[ChapterCodes] = field(default=None, repr=False)
+
+    def chapter_mask(self, chapter_ids) -> np.ndarray:
+        if self._chapters is None:
+            self._chapters = ChapterCodes(self.fields)
+        return self._chapters.mask(chapter_ids)
+
+    @property
+    def nbytes(self) -> int:
+        text_bytes = sum(len(f.get("text", "")) * 3 + len(f.get("metadata", "")) for f in self.fields)
+        return int(self.vectors.nbytes + text_bytes)
+
+
+# 加载器：book_id -> HotBook（无法完整加载时返回 None）
+BookLoader = Callable[[str], Optional[HotBook]]
+
+
+class HotVectorCache:
+    """按书组织的 LRU 热向量缓存"""
+
+    def __init__(self, loader: BookLoader, max_bytes: Optional[int] = None):
+        """
+        Args:
+            loader: 加载整本书向量的函数
+            max_bytes: 内存预算，默认使用 HOT_CACHE_MAX_MB
+        """
+        self.loader = loader
+        self.max_bytes = max_bytes or settings.HOT_CACHE_MAX_MB * 1024 * 1024
+        self._books: "OrderedDict[str, HotBook]" = OrderedDict()
+        self._used_bytes = 0
+        self._lock = threading.RLock()
+
+        # 请求统计
+        self._window_counts: Dict[str, int] = {}
+        self._rates: Dict[str, float] = {}
+        self._unloadable: Dict[str, float] = {}  # book_id -> 下次允许重试的时间
+        self._generations: Dict[str, int] = {}  # 失效计数，防止加载过程中失效的数据被写回
+        self._epoch = 0  # 全量失效计数
+        self.hits = 0
+        self.misses = 0
+
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # ============ 检索 ============
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filter_expr: Optional[str],
+        output_fields: Optional[List[str]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        在热缓存中检索
+
+        仅处理单一 book_id 等值过滤（可带 chapter_id 章节范围）的请求；未命中返回 None，由调用方回退到 DashVector。
+        """
+        try:
+            conditions = parse_filter(filter_expr)
+        except ValueError:
+            return None
+        if set(conditions) - {"chapter_id"} != {"book_id"}:
+            return None
+
+        book_id = conditions["book_id"]
+        with self._lock:
+            self._window_counts[book_id] = self._window_counts.get(book_id, 0) + 1
+            book = self._books.get(book_id)
+            if book is None:
+                self.misses += 1
+                return None
+            self._books.move_to_end(book_id)
+            self.hits += 1
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        mask = book.chapter_mask(conditions["chapter_id"]) if "chapter_id" in conditions else None
+        rows, scores = exact_top_k(book.vectors, query, top_k, mask)
+        return [
+            {"id": book.ids[row], "score": float(score), **project_fields(book.fields[row], output_fields)}
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    # ============ 加载与淘汰 ============
+
+    def load(self, book_id: str) -> bool:
+        """加载一本书到热缓存（超出预算时按 LRU 淘汰）"""
+        with self._lock:
+            if book_id in self._books:
+                return True
+            if self._unloadable.get(book_id, 0) > time.time():
+                return False
+            generation = (self._epoch, self._generations.get(book_id, 0))
+
+        start = time.perf_counter()
+        try:
+            book = self.loader(book_id)
+        except Exception as e:
+            logger.warning(f"热缓存加载失败: book_id={book_id}, 错误: {e}")
+            book = None
+
+        if book is None or not book.ids:
+            with self._lock:
+                self._unloadable[book_id] = time.time() + settings.HOT_CACHE_WARMUP_INTERVAL * 10
+            return False
+
+        size = book.nbytes
+        if size > self.max_bytes:
+            logger.warning(f"教材 {book_id} 占用 {size / 1e6:.1f}MB，超过热缓存预算，跳过")
+            return False
+
+        with self._lock:
+            if (self._epoch, self._generations.get(book_id, 0)) != generation:
+                logger.info(f"教材 {book_id} 在加载期间已失效，丢弃本次加载结果")
+                return False
+            while self._books and self._used_bytes + size > self.max_bytes:
+                evicted_id, evicted = self._books.popitem(last=False)
+                self._used_bytes -= evicted.nbytes
+                logger.info(f"热缓存淘汰: {evicted_id}")
+            self._books[book_id] = book
+            self._used_bytes += size
+
+        logger.info(
+            f"热缓存加载: book_id={book_id}, {len(book.ids)} 个向量, "
+            f"{size / 1e6:.1f}MB, 耗时 {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return True
+
+    def invalidate(self, book_id: Optional[str] = None) -> None:
+        """使缓存失效（book_id 为空时清空全部）"""
+        with self._lock:
+            if book_id is None:
+                self._epoch += 1
+                self._books.clear()
+                self._used_bytes = 0
+                self._unloadable.clear()
+                return
+            self._generations[book_id] = self._generations.get(book_id, 0) + 1
+            self._unloadable.pop(book_id, None)
+            book = self._books.pop(book_id, None)
+            if book is not None:
+                self._used_bytes -= book.nbytes
+                logger.info(f"热缓存失效: {book_id}")
+
+    # ============ 后台预热 ============
+
+    def hot_books(self, top_n: Optional[int] = None) -> List[str]:
+        """按请求速率返回 Top-N 教材"""
+        top_n = top_n or settings.HOT_CACHE_TOP_N
+        with self._lock:
+            ranked = sorted(self._rates.items(), key=lambda item: item[1], reverse=True)
+        return [
+            book_id for book_id, rate in ranked[:top_n]
+            if rate >= settings.HOT_CACHE_MIN_RATE
+        ]
+
+    def _update_rates(self) -> None:
+        with self._lock:
+            counts, self._window_counts = self._window_counts, {}
+            for book_id in set(self._rates) | set(counts):
+                rate = self._rates.get(book_id, 0.0) * RATE_DECAY + counts.get(book_id, 0) * (1 - RATE_DECAY)
+                if rate < 0.01:
+                    self._rates.pop(book_id, None)
+                else:
+                    self._rates[book_id] = rate
+
+    def warmup(self) -> None:
+        """执行一次预热：更新请求速率并加载热门教材"""
+        self._update_rates()
+        for book_id in self.hot_books():
+            if self._stop_event.is_set():
+                break
+            self.load(book_id)
+
+    def start_warmup(self) -> None:
+        """启动后台预热线程（幂等）"""
+        if self._warmup_thread and self._warmup_thread.is_alive():
+            return
+
+        def _loop():
+            while not self._stop_event.wait(settings.HOT_CACHE_WARMUP_INTERVAL):
+                try:
+                    self.warmup()
+                except Exception as e:
+                    logger.error(f"热缓存预热失败: {e}")
+
+        self._stop_event.clear()
+        self._warmup_thread = threading.Thread(target=_loop, name="hot-vector-warmup", daemon=True)
+        self._warmup_thread.start()
+        logger.info(f"热缓存预热线程已启动，间隔 {settings.HOT_CACHE_WARMUP_INTERVAL}s")
+
+    def stop_warmup(self) -> None:
+        self._stop_event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "books": list(self._books),
+                "used_mb": round(self._used_bytes / 1024 / 1024, 2),
+                "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def build_hot_book(
+    book_id: str,
+    ids: List[str],
+    fields: List[Dict[str, Any]],
+    vectors: np.ndarray
+) -> HotBook:
+    """构造 HotBook（向量归一化并转为 float16）"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return HotBook(
+        book_id=book_id,
+        ids=list(ids),
+        fields=list(fields),
+        vectors=normalize_rows(matrix).astype(np.float16),
+    )
+
+
+# ============ 工厂函数 ============
+
+_hot_cache: Optional[HotVectorCache] = None
+
+
+def get_hot_cache(loader: Optional[BookLoader] = None) -> Optional[HotVectorCache]:
+    """
+    获取 HotVectorCache 单例
+
+    首次调用时需要传入 loader，并启动后台预热线程；未启用热缓存时返回 None。
+    """
+    global _hot_cache
+    if _hot_cache is None and settings.HOT_CACHE_ENABLED and loader is not None:
+        _hot_cache = HotVectorCache(loader)
+        _hot_cache.start_warmup()
+        logger.info(f"热缓存初始化完成，预算 {settings.HOT_CACHE_MAX_MB}MB")
+    return _hot_cache
@@ -0,0 +1,248 @@
+"""
+混合检索模块
+向量检索与 BM25 关键词检索并发执行，按分块 ID 去重后融合排序
+
+融合方式（HYBRID_FUSION）:
+    rrf       倒数排名融合（可按路加权），不依赖两路分数的量纲
+    weighted  各路分数按本次最高分归一化后加权求和
+    boost     只在向量候选内做关键词子串匹配加权（旧行为，关键词索引不可用时的回退）
+    vector    只使用向量检索
+"""
+
+import logging
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, Dict, Any, Optional
+
+from .vector_store import extract_book_id, reciprocal_rank_fusion
+
+try:
+    # 可选依赖 pyahocorasick（C 实现的 Aho–Corasick 自动机）
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
+FUSION_MODES = ("rrf", "weighted", "boost", "vector")
+
+# boost 模式的关键词权重（与向量分数相加）
+KEYWORD_BOOST_WEIGHT = 0.3
+
+# 归一化文本缓存条数（同一分块在不同查询中反复出现，只归一化一次）
+NORMALIZED_TEXT_CACHE_SIZE = 8192
+
+_ENGLISH_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9_\-\.]*[A-Za-z0-9]|[A-Za-z]')
+_NUMBER_PATTERN = re.compile(r'\d+\.?\d*')
+_CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]{2,4}')
+
+
+def extract_keywords(query: str) -> List[str]:
+    """从查询中提取关键词（boost 模式使用）"""
+    keywords = []
+    # 提取英文单词和数字
+    keywords.extend([w for w in _ENGLISH_PATTERN.findall(query) if len(w) >= 2])
+    keywords.extend(_NUMBER_PATTERN.findall(query))
+    # 提取中文词组
+    keywords.extend(_CHINESE_PATTERN.findall(query))
+    return list(set(keywords))
+
+
+@lru_cache(maxsize=NORMALIZED_TEXT_CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    """NFKC 归一化 + 小写（全角字母数字与半角一致）"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+class KeywordMatcher:
+    """
+    多关键词匹配器（每个查询构建一次）
+
+    安装 pyahocorasick 时使用 Aho–Corasick 自动机，每段文本单遍扫描；
+    未安装时对归一化文本逐个做子串查找（CPython 中快于纯 Python 实现的自动机）。
+    """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(dict.fromkeys(normalize_text(kw) for kw in keywords if kw))
+        self.backend = "substring"
+        self._automaton = None
+        if ahocorasick is not None and self.keywords:
+            automaton = ahocorasick.Automaton()
+            for i, kw in enumerate(self.keywords):
+                automaton.add_word(kw, i)
+            automaton.make_automaton()
+            self._automaton = automaton
+            self.backend = "aho-corasick"
+
+    def count(self, text: str) -> int:
+        """文本中出现的不同关键词数量"""
+        if not self.keywords or not text:
+            return 0
+        normalized = normalize_text(text)
+        if self._automaton is not None:
+            return len({i for _, i in self._automaton.iter(normalized)})
+        return sum(1 for kw in self.keywords if kw in normalized)
+
+    def score(self, text: str) -> float:
+        """命中关键词比例"""
+        return self.count(text) / len(self.keywords) if self.keywords else 0.0
+
+
+def keyword_match_score(text: str, keywords: List[str]) -> float:
+    """计算文本与关键词的匹配分数（命中关键词比例）"""
+    return KeywordMatcher(keywords).score(text)
+
+
+def boost_by_keywords(query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """向量候选内的关键词匹配加权（原地修改并重新排序）"""
+    keywords = extract_keywords(query)
+    if not keywords or not results:
+        return results
+    logger.info(f"混合检索：提取关键词 {keywords}")
+    matcher = KeywordMatcher(keywords)
+    for result in results:
+        keyword_score = matcher.score(result.get("text", ""))
+        result["keyword_score"] = keyword_score
+        result["score"] = result.get("score", 0) + keyword_score * KEYWORD_BOOST_WEIGHT
+    results.sort(key=lambda x: x["score"], reverse=True)
+    return results
+
+
+def search_keywords(
+    keyword_index,
+    query: str,
+    top_k: int,
+    filter_expr: Optional[str],
+    vector_store=None
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    BM25 关键词检索
+
+    Args:
+        vector_store: 补全命中分块正文等字段的向量存储（倒排索引只保存过滤字段）
+
+    Returns:
+        结果列表；索引不可用、教材尚未建立索引或过滤条件不受支持时返回 None
+    """
+    if keyword_index is None:
+        return None
+    try:
+        hits = keyword_index.search(query, top_k=top_k, filter_expr=filter_expr, vector_store=vector_store)
+        if not hits and keyword_index.count(extract_book_id(filter_expr)) == 0:
+            return None
+        return hits
+    except ValueError as e:
+        logger.info(f"关键词索引不支持该过滤条件，回退: {e}")
+    except Exception as e:
+        logger.warning(f"关键词检索失败，回退: {e}")
+    return None
+
+
+def normalize_keyword_hits(keyword_hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    BM25 分数按本次最高分归一化到 [0, 1]
+
+    原始分数保留在 bm25_score，score / keyword_score 为归一化分数（与余弦分数量纲接近）。
+    """
+    if not keyword_hits:
+        return []
+    max_bm25 = max(hit["score"] for hit in keyword_hits) or 1.0
+    return [
+        {**hit, "bm25_score": hit["score"], "keyword_score": hit["score"] / max_bm25, "score": hit["score"] / max_bm25}
+        for hit in keyword_hits
+    ]
+
+
+def weighted_score_fusion(
+    result_lists: List[List[Dict[str, Any]]],
+    weights: List[float],
+    top_k: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    加权分数融合（按 id 去重）
+
+    每路分数先按该路最高分归一化，fused_score = Σ weight * 归一化分数；score 保留各路中的最高原始分数。
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results, weight in zip(result_lists, weights):
+        if not results:
+            continue
+        max_score = max(item.get("score", 0) for item in results) or 1.0
+        for item in results:
+            entry = fused.get(item["id"])
+            if entry is None:
+                entry = fused[item["id"]] = {**item, "fused_score": 0.0}
+            elif item.get("score", 0) > entry.get("score", 0):
+                entry["score"] = item["score"]
+            entry["fused_score"] += weight * item.get("score", 0) / max_score
+
+    ranked = sorted(fused.values(), key=lambda x: x["fused_score"], reverse=True)
+    return ranked[:top_k] if top_k else ranked
+
+
+def hybrid_search(
+    query: str,
+    embed: Callable[[str], List[float]],
+    vector_store,
+    keyword_index,
+    top_k: int,
+    filter_expr: Optional[str] = None,
+    fusion: str = "rrf",
+    vector_weight: float = 1.0,
+    keyword_weight: float = 1.0
+) -> List[Dict[str, Any]]:
+    """
+    混合检索
+
+    rrf / weighted 模式下关键词检索与（embedding + 向量检索）并发执行，融合后取 top_k；
+    关键词索引不可用时回退为 boost 模式。
+
+    Args:
+        query: 查询文本
+        embed: 查询文本 -> 向量
+        vector_store: 向量存储（VectorStore / LocalVectorStore）
+        keyword_index: 关键词索引，None 表示不可用
+        top_k: 返回数量（每路检索数量相同）
+        filter_expr: 过滤表达式
+        fusion: 融合方式，见 FUSION_MODES
+        vector_weight: 向量检索的权重
+        keyword_weight: 关键词检索的权重
+
+    Returns:
+        融合后的结果列表，每项附带 keyword_score（未被关键词命中为 0）
+    """
+    if fusion not in FUSION_MODES:
+        raise ValueError(f"不支持的融合方式: {fusion}")
+
+    def _vector_search() -> List[Dict[str, Any]]:
+        return vector_store.search(query_embedding=embed(query), top_k=top_k, filter_expr=filter_expr)
+
+    if fusion in ("rrf", "weighted") and keyword_index is not None:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            keyword_future = executor.submit(search_keywords, keyword_index, query, top_k, filter_expr, vector_store)
+            results = _vector_search()
+            keyword_hits = keyword_future.result()
+
+        if keyword_hits is not None:
+            keyword_hits = normalize_keyword_hits(keyword_hits)
+            lists, weights = [results, keyword_hits], [vector_weight, keyword_weight]
+            if fusion == "rrf":
+                fused = reciprocal_rank_fusion(lists, top_k, weights=weights)
+            else:
+                fused = weighted_score_fusion(lists, weights, top_k)
+
+            keyword_scores = {hit["id"]: hit["keyword_score"] for hit in keyword_hits}
+            for item in fused:
+                item["keyword_score"] = keyword_scores.get(item["id"], 0.0)
+            logger.info(
+                f"混合检索({fusion})：向量 {len(results)} 条 + BM25 {len(keyword_hits)} 条 -> {len(fused)} 条"
+            )
+            return fused
+        return boost_by_keywords(query, results)
+
+    results = _vector_search()
+    if fusion == "vector":
+        return results
+    return boost_by_keywords(query, results)
@@ -0,0 +1,463 @@
+"""
+关键词倒排索引模块
+按书构建 BM25 倒排索引，入库时同步写入，检索时直接查询（不依赖向量检索结果）
+
+分词: NFKC 归一化 + 小写；英文 / 数字按词切分，中文按字符二元组（单字片段保留单字）
+存储布局（每本书一组文件）:
+    {KEYWORD_INDEX_DIR}/{book_id}.postings.npz  倒排表（数组存储）
+        term_offsets  每个词项在倒排数组中的起始位置（长度 = 词项数 + 1）
+        doc_gaps      文档编号差值编码（每个词项内递增），按最大差值选择 uint16 / uint32
+        tfs           词频（uint16）
+        doc_lengths   文档长度（词元数）
+    {KEYWORD_INDEX_DIR}/{book_id}.meta.json     book_id + ids + 过滤字段（resource_id / chapter_id）+ 有序词项表
+
+正文和其余字段只存于向量存储，检索时按命中的 ID 从向量存储补全。
+写入 / 删除在已有倒排表上合并（只对新分块分词），不重建整本书。
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from config import settings
+from .local_vector_store import DEFAULT_BOOK_KEY, DELETE_FILTER_FIELDS, ChapterCodes, parse_filter
+from .vector_store import project_fields
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+_CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+")
+
+_MAX_TF = np.iinfo(np.uint16).max
+
+# meta 中保留的分块字段（过滤用）
+_FILTER_FIELDS = ("resource_id", "chapter_id")
+
+
+def _filter_fields(fields: Dict[str, Any]) -> Dict[str, str]:
+    return {name: str(fields.get(name) or "") for name in _FILTER_FIELDS}
+
+
+def tokenize(text: str) -> List[str]:
+    """英文 / 数字词元 + 中文字符二元组"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = _WORD.findall(text)
+    for run in _CJK.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def encode_postings(postings: Dict[str, List[Tuple[int, int]]]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """
+    倒排表编码为数组
+
+    Args:
+        postings: {词项: [(文档编号, 词频), ...]}
+
+    Returns:
+        (有序词项表, 数组字典)
+    """
+    terms = sorted(postings)
+    counts = np.asarray([len(postings[term]) for term in terms], dtype=np.int64)
+    term_ids = np.repeat(np.arange(len(terms), dtype=np.int64), counts)
+    docs = np.fromiter((doc for term in terms for doc, _ in postings[term]), dtype=np.int64, count=len(term_ids))
+    tfs = np.fromiter((tf for term in terms for _, tf in postings[term]), dtype=np.int64, count=len(term_ids))
+    return _pack_postings(terms, term_ids, docs, tfs)
+
+
+def _pack_postings(
+    terms: List[str],
+    term_ids: np.ndarray,
+    docs: np.ndarray,
+    tfs: np.ndarray
+) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """
+    (词项编号, 文档编号, 词频) 三元组数组编码为倒排数组
+
+    terms 需有序；三元组按 (词项, 文档) 排序，没有倒排项的词项被丢弃。
+    """
+    order = np.lexsort((docs, term_ids))
+    term_ids, docs, tfs = term_ids[order], docs[order], tfs[order]
+    counts = np.bincount(term_ids, minlength=len(terms))
+    used = np.flatnonzero(counts)
+    offsets = np.zeros(len(used) + 1, dtype=np.int64)
+    np.cumsum(counts[used], out=offsets[1:])
+
+    gaps = np.diff(docs, prepend=0)
+    # 每个词项的第一个文档存绝对编号
+    starts = offsets[:-1]
+    gaps[starts] = docs[starts]
+    gap_dtype = np.uint16 if gaps.size == 0 or gaps.max() <= np.iinfo(np.uint16).max else np.uint32
+
+    return [terms[i] for i in used], {
+        "term_offsets": offsets,
+        "doc_gaps": gaps.astype(gap_dtype),
+        "tfs": np.minimum(tfs, _MAX_TF).astype(np.uint16),
+    }
+
+
+class _BookPostings:
+    """一本书的倒排索引（读取侧）"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.ids: List[str] = meta["ids"]
+        # 旧格式的 fields 含正文等全部字段，只保留过滤字段
+        self.fields: List[Dict[str, str]] = [_filter_fields(f) for f in meta["fields"]]
+        self.book_id: str = meta.get("book_id") or (meta["fields"][0].get("book_id", "") if meta["fields"] else "")
+        self.terms: List[str] = meta["terms"]
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.term_offsets = arrays["term_offsets"]
+        self.doc_gaps = arrays["doc_gaps"]
+        self.tfs = arrays["tfs"]
+        self.doc_lengths = arrays["doc_lengths"].astype(np.float32)
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        self._resource_arr: Optional[np.ndarray] = None
+        self._chapter_arr: Optional[ChapterCodes] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """词项的 (文档编号, 词频)，不存在时返回 None"""
+        i = self.term_ids.get(term)
+        if i is None:
+            return None
+        start, end = self.term_offsets[i], self.term_offsets[i + 1]
+        return np.cumsum(self.doc_gaps[start:end], dtype=np.int64), self.tfs[start:end].astype(np.float32)
+
+    def decode(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """全部倒排项展开为 (词项编号, 文档编号, 词频)"""
+        counts = np.diff(self.term_offsets)
+        term_ids = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+        totals = np.cumsum(self.doc_gaps, dtype=np.int64)
+        # 每个词项内的差值从该词项起点重新累加
+        bases = np.concatenate(([0], totals))[self.term_offsets[:-1]]
+        return term_ids, totals - np.repeat(bases, counts), self.tfs.astype(np.int64)
+
+    def resource_mask(self, resource_id: str) -> np.ndarray:
+        if self._resource_arr is None:
+            self._resource_arr = np.asarray([f.get("resource_id", "") for f in self.fields], dtype=object)
+        return self._resource_arr == resource_id
+
+    def chapter_mask(self, chapter_ids: Tuple[str, ...]) -> np.ndarray:
+        if self._chapter_arr is None:
+            self._chapter_arr = ChapterCodes(self.fields)
+        return self._chapter_arr.mask(chapter_ids)
+
+    def score(self, terms: List[str], k1: float, b: float) -> np.ndarray:
+        """BM25 分数（每个文档一个分数，未命中的文档为 0）"""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        n = len(self.ids)
+        norm = k1 * (1 - b + b * self.doc_lengths / max(self.avg_length, 1e-6))
+        for term in terms:
+            hit = self.postings(term)
+            if hit is None:
+                continue
+            docs, tfs = hit
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (k1 + 1) / (tfs + norm[docs])
+        return scores
+
+
+class KeywordIndex:
+    """按书存储的 BM25 倒排索引"""
+
+    def __init__(self, base_dir: Optional[str] = None, k1: Optional[float] = None, b: Optional[float] = None):
+        """
+        Args:
+            base_dir: 存储目录，默认使用 KEYWORD_INDEX_DIR
+            k1: BM25 词频饱和参数，默认使用 BM25_K1
+            b: BM25 文档长度归一化参数，默认使用 BM25_B
+        """
+        self.base_dir = Path(base_dir or settings.KEYWORD_INDEX_DIR)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1 if k1 is not None else settings.BM25_K1
+        self.b = b if b is not None else settings.BM25_B
+        self._books: Dict[str, _BookPostings] = {}
+        self._lock = threading.RLock()
+        logger.info(f"关键词索引初始化完成，目录: {self.base_dir}")
+
+    # ============ 文件读写 ============
+
+    @staticmethod
+    def _book_key(book_id: Optional[str]) -> str:
+        return re.sub(r"[^\w\-]", "_", book_id) if book_id else DEFAULT_BOOK_KEY
+
+    def _paths(self, book_key: str) -> Tuple[Path, Path]:
+        return self.base_dir / f"{book_key}.postings.npz", self.base_dir / f"{book_key}.meta.json"
+
+    def _book_keys(self) -> List[str]:
+        keys = set(self._books)
+        for path in self.base_dir.glob("*.meta.json"):
+            keys.add(path.name[:-len(".meta.json")])
+        return sorted(keys)
+
+    def _load_book(self, book_key: str) -> Optional[_BookPostings]:
+        with self._lock:
+            if book_key in self._books:
+                return self._books[book_key]
+
+            post_path, meta_path = self._paths(book_key)
+            if not post_path.exists() or not meta_path.exists():
+                return None
+
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with np.load(post_path) as data:
+                arrays = {key: data[key] for key in data.files}
+            index = _BookPostings(arrays, meta)
+            self._books[book_key] = index
+            return index
+
+    def _merge_book(
+        self,
+        book_key: str,
+        existing: Optional[_BookPostings],
+        keep: Optional[np.ndarray] = None,
+        nodes: Optional[List[TextNode]] = None
+    ) -> None:
+        """
+        在已有倒排表上合并并原子写入
+
+        keep 为 False 的文档被移除（其后的文档编号前移），nodes 追加在末尾；
+        只对新分块分词，已有文档的倒排项直接从数组解码后重新编号。
+
+        Args:
+            book_key: 书的文件名 key
+            existing: 已有的倒排索引，None 表示新书
+            keep: 已有文档的保留掩码，None 表示全部保留
+            nodes: 追加的分块
+        """
+        ids: List[str] = []
+        fields: List[Dict[str, str]] = []
+        lengths = [np.zeros(0, dtype=np.uint32)]
+        term_ids = docs = tfs = np.zeros(0, dtype=np.int64)
+        old_terms: List[str] = []
+        book_id = ""
+        if existing is not None:
+            keep = np.ones(len(existing), dtype=bool) if keep is None else keep
+            ids = [doc_id for doc_id, k in zip(existing.ids, keep) if k]
+            fields = [chunk_fields for chunk_fields, k in zip(existing.fields, keep) if k]
+            lengths.append(existing.doc_lengths[keep].astype(np.uint32))
+            term_ids, docs, tfs = existing.decode()
+            kept = keep[docs]
+            renumber = np.cumsum(keep) - 1
+            term_ids, docs, tfs = term_ids[kept], renumber[docs[kept]], tfs[kept]
+            old_terms = existing.terms
+            book_id = existing.book_id
+
+        new_postings: Dict[str, List[Tuple[int, int]]] = {}
+        new_lengths = np.zeros(len(nodes or []), dtype=np.uint32)
+        for i, node in enumerate(nodes or []):
+            tokens = tokenize(node.get_content())
+            new_lengths[i] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                new_postings.setdefault(term, []).append((len(ids), tf))
+            ids.append(node.node_id)
+            fields.append(_filter_fields(node.metadata))
+            book_id = book_id or str(node.metadata.get("book_id") or "")
+        lengths.append(new_lengths)
+
+        if not ids:
+            self._drop_book(book_key)
+            return
+
+        terms = sorted(set(old_terms).union(new_postings))
+        positions = {term: i for i, term in enumerate(terms)}
+        if old_terms:
+            term_ids = np.fromiter((positions[t] for t in old_terms), dtype=np.int64, count=len(old_terms))[term_ids]
+        new_entries = [(positions[term], doc, tf) for term, entries in new_postings.items() for doc, tf in entries]
+        if new_entries:
+            added = np.asarray(new_entries, dtype=np.int64)
+            term_ids = np.concatenate([term_ids, added[:, 0]])
+            docs = np.concatenate([docs, added[:, 1]])
+            tfs = np.concatenate([tfs, added[:, 2]])
+
+        terms, arrays = _pack_postings(terms, term_ids, docs, tfs)
+        arrays["doc_lengths"] = np.concatenate(lengths)
+        self._write_book(book_key, arrays, {"book_id": book_id, "ids": ids, "fields": fields, "terms": terms})
+
+    def _write_book(self, book_key: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        """原子写入一本书的倒排数组和元数据"""
+        post_path, meta_path = self._paths(book_key)
+        tmp_post = post_path.with_suffix(".tmp.npz")
+        tmp_meta = meta_path.with_suffix(".tmp")
+        np.savez(tmp_post, **arrays)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        self._books.pop(book_key, None)
+        os.replace(tmp_post, post_path)
+        os.replace(tmp_meta, meta_path)
+        self._books[book_key] = _BookPostings(arrays, meta)
+
+    def _drop_book(self, book_key: str) -> None:
+        self._books.pop(book_key, None)
+        for path in self._paths(book_key):
+            if path.exists():
+                path.unlink()
+
+    # ============ 写入 / 删除 ============
+
+    def insert(self, nodes: List[TextNode]) -> int:
+        """
+        写入分块（upsert 语义，相同 ID 覆盖旧数据）
+
+        只对新分块分词，与已有倒排表合并（相同 ID 的旧文档被移除）。
+
+        Returns:
+            写入的分块数量
+        """
+        grouped: Dict[str, List[TextNode]] = {}
+        for node in nodes:
+            grouped.setdefault(self._book_key(node.metadata.get("book_id")), []).append(node)
+
+        inserted = 0
+        with self._lock:
+            for book_key, book_nodes in grouped.items():
+                # 同一批内重复的 ID 保留最后一个
+                book_nodes = list({node.node_id: node for node in book_nodes}.values())
+                new_ids = {node.node_id for node in book_nodes}
+                existing = self._load_book(book_key)
+                keep = None
+                if existing is not None:
+                    keep = np.fromiter((doc_id not in new_ids for doc_id in existing.ids),
+                                       dtype=bool, count=len(existing))
+                try:
+                    self._merge_book(book_key, existing, keep, book_nodes)
+                    inserted += len(book_nodes)
+                except Exception as e:
+                    logger.error(f"关键词索引写入失败: book={book_key}, 错误: {e}")
+
+        logger.info(f"关键词索引写入完成: {inserted}/{len(nodes)}")
+        return inserted
+
+    def delete_by_filter(self, filter_expr: str) -> bool:
+        """根据过滤条件删除（支持 book_id / resource_id）"""
+        try:
+            conditions = parse_filter(filter_expr, DELETE_FILTER_FIELDS)
+        except ValueError as e:
+            logger.error(f"关键词索引条件删除失败: {e}")
+            return False
+        if not conditions:
+            logger.error("关键词索引条件删除失败: 过滤条件为空")
+            return False
+
+        with self._lock:
+            book_keys = [self._book_key(conditions["book_id"])] if "book_id" in conditions else self._book_keys()
+            for book_key in book_keys:
+                if "resource_id" not in conditions:
+                    self._drop_book(book_key)
+                    continue
+                index = self._load_book(book_key)
+                if index is None:
+                    continue
+                keep = ~index.resource_mask(conditions["resource_id"])
+                if not keep.all():
+                    self._merge_book(book_key, index, keep)
+        return True
+
+    # ============ 检索 ============
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filter_expr: Optional[str] = None,
+        output_fields: Optional[List[str]] = None,
+        vector_store=None
+    ) -> List[Dict[str, Any]]:
+        """
+        BM25 检索
+
+        Args:
+            query: 查询文本（或空格拼接的关键词）
+            top_k: 返回数量
+            filter_expr: 过滤表达式（支持 book_id / resource_id 等值条件和 chapter_id 章节范围）
+            output_fields: 返回字段投影，默认返回全部字段
+            vector_store: 按 ID 补全正文等字段的向量存储；None 时只返回 book_id 和过滤字段
+
+        Returns:
+            与 VectorStore.search 相同格式的结果列表，score 为 BM25 分数（不跨书归一化）
+
+        Raises:
+            ValueError: 过滤表达式不受支持
+        """
+        conditions = parse_filter(filter_expr)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        book_keys = [self._book_key(conditions["book_id"])] if "book_id" in conditions else self._book_keys()
+        resource_id = conditions.get("resource_id")
+        chapter_ids = conditions.get("chapter_id")
+
+        candidates = []
+        for book_key in book_keys:
+            index = self._load_book(book_key)
+            if index is None or not len(index):
+                continue
+            scores = index.score(terms, self.k1, self.b)
+            if resource_id is not None:
+                scores[~index.resource_mask(resource_id)] = 0.0
+            if chapter_ids is not None:
+                scores[~index.chapter_mask(chapter_ids)] = 0.0
+            hits = np.flatnonzero(scores > 0)
+            if len(hits) > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            candidates.extend((float(scores[row]), index, int(row)) for row in hits)
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        candidates = candidates[:top_k]
+        fetched = self._fetch_fields(vector_store, [index.ids[row] for _, index, row in candidates], filter_expr)
+        results = []
+        for score, index, row in candidates:
+            doc_id = index.ids[row]
+            chunk_fields = fetched.get(doc_id) or {"book_id": index.book_id, **index.fields[row]}
+            results.append({"id": doc_id, "score": score, **project_fields(chunk_fields, output_fields)})
+        return results
+
+    @staticmethod
+    def _fetch_fields(vector_store, ids: List[str], filter_expr: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        """从向量存储按 ID 读取分块字段（失败时返回空，结果只带过滤字段）"""
+        if vector_store is None or not ids:
+            return {}
+        try:
+            return {doc_id: doc["fields"] for doc_id, doc in vector_store.fetch(ids, filter_expr=filter_expr).items()}
+        except Exception as e:
+            logger.warning(f"关键词检索补全分块字段失败: {e}")
+            return {}
+
+    def count(self, book_id: Optional[str] = None) -> int:
+        """统计已索引的分块数量"""
+        keys = [self._book_key(book_id)] if book_id else self._book_keys()
+        return sum(len(index) for index in map(self._load_book, keys) if index is not None)
+
+
+# ============ 工厂函数 ============
+
+_keyword_index: Optional[KeywordIndex] = None
+
+
+def get_keyword_index() -> Optional[KeywordIndex]:
+    """获取 KeywordIndex 单例（未启用时返回 None）"""
+    global _keyword_index
+    if not settings.KEYWORD_INDEX_ENABLED:
+        return None
+    if _keyword_index is None:
+        _keyword_index = KeywordIndex()
+    return _keyword_index
@@ -9,9 +9,9 @@ from dataclasses import dataclass
 from contextlib import asynccontextmanager
 
 from neo4j import AsyncGraphDatabase, AsyncDriver
-import httpx
 
 from config import settings
+from .llm_client import get_llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -773,29 +773,22 @@ class KnowledgeGraphStore:
 - "A和B的关系" -> MATCH (a:Entity)-[r]-(b:Entity) WHERE a.name CONTAINS 'A' AND b.name CONTAINS 'B' RETURN a,r,b
 """
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{settings.DASHSCOPE_BASE_URL}/chat/completions",
-                    headers={"Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}"},
-                    json={
-                        "model": settings.CHAT_MODEL,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.1
-                    }
-                )
-                result = response.json()["choices"][0]["message"]["content"].strip()
-
-                # 清理结果
-                if result.startswith("```"):
-                    result = result.split("```")[1].replace("cypher", "").strip()
-
-                # 安全检查
-                dangerous = ["DELETE", "REMOVE", "DROP", "CREATE INDEX", "SET"]
-                if any(d in result.upper() for d in dangerous):
-                    logger.warning(f"危险 Cypher 被拦截: {result}")
-                    return None
-
-                return result if result and "MATCH" in result.upper() else None
+            result = (await get_llm_client("dashscope").complete(
+                prompt, site="kg.cypher", model=settings.CHAT_MODEL, temperature=0.1, timeout=30.0,
+                cache_ttl=settings.LLM_CACHE_TTL_CYPHER
+            )).strip()
+
+            # 清理结果
+            if result.startswith("```"):
+                result = result.split("```")[1].replace("cypher", "").strip()
+
+            # 安全检查
+            dangerous = ["DELETE", "REMOVE", "DROP", "CREATE INDEX", "SET"]
+            if any(d in result.upper() for d in dangerous):
+                logger.warning(f"危险 Cypher 被拦截: {result}")
+                return None
+
+            return result if result and "MATCH" in result.upper() else None
         except Exception as e:
             logger.error(f"Cypher 生成失败: {e}")
             return None
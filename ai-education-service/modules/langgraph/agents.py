@@ -6,9 +6,8 @@
 import logging
 from typing import Dict, Any
 
-import httpx
-
 from config import settings
+from ..llm_client import get_llm_client
 from .state import AgentState
 
 logger = logging.getLogger(__name__)
@@ -27,28 +26,15 @@ async def placeholder_agent(state: AgentState) -> AgentState:
         system_prompt = _build_system_prompt(state)
         user_prompt = _build_user_prompt(state)
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": settings.CHAT_MODEL,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 2000,
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            answer = data["choices"][0]["message"]["content"]
-            state["agent_response"] = answer
-            logger.info(f"智能体回答生成完成: {len(answer)} 字符")
+        answer = await get_llm_client("openrouter").complete(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            site="placeholder_agent", model=settings.CHAT_MODEL, temperature=0.7, max_tokens=2000, timeout=120.0
+        )
+        state["agent_response"] = answer
+        logger.info(f"智能体回答生成完成: {len(answer)} 字符")
             
     except Exception as e:
         logger.error(f"智能体处理失败: {e}")
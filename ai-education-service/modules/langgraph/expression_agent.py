@@ -10,9 +10,9 @@
 import logging
 from typing import Dict, Any
 
-import httpx
-
 from config import settings
+from ..llm_client import get_llm_client
+from ..context_compressor import acompress_context
 from .state import AgentState
 from .message_utils import get_recent_context
 
@@ -26,12 +26,10 @@ class ExpressionAgent:
         # 根据 CHAT_PROVIDER 选择模型和 API
         if settings.CHAT_PROVIDER == "dashscope":
             self.chat_model = settings.CHAT_MODEL
-            self.api_base_url = settings.DASHSCOPE_BASE_URL
-            self.api_key = settings.DASHSCOPE_API_KEY
+            self.llm = get_llm_client("dashscope")
         else:
             self.chat_model = settings.OPENROUTER_CHAT_MODEL
-            self.api_base_url = settings.OPENROUTER_BASE_URL
-            self.api_key = settings.OPENROUTER_API_KEY
+            self.llm = get_llm_client("openrouter")
     
     async def run(self, state: AgentState) -> AgentState:
         """
@@ -117,8 +115,8 @@ class ExpressionAgent:
     async def _explain(self, state: AgentState) -> Dict[str, Any]:
         """解释概念"""
         
-        context = state.get("context", "")
         query = state.get("query", "")
+        context = await acompress_context(query, state.get("context", ""))
         style = self._get_expression_style(state)
         style_instruction = self._build_style_instruction(style)
         
@@ -150,8 +148,8 @@ class ExpressionAgent:
     async def _summarize(self, state: AgentState) -> Dict[str, Any]:
         """总结内容"""
         
-        context = state.get("context", "")
         query = state.get("query", "")
+        context = await acompress_context(query, state.get("context", ""))
         intent_params = state.get("intent_params", {})
         style = self._get_expression_style(state)
         style_instruction = self._build_style_instruction(style)
@@ -197,8 +195,8 @@ class ExpressionAgent:
     async def _answer(self, state: AgentState) -> Dict[str, Any]:
         """回答问题"""
 
-        context = state.get("context", "")
         query = state.get("query", "")
+        context = await acompress_context(query, state.get("context", ""))
         style = self._get_expression_style(state)
         style_instruction = self._build_style_instruction(style)
         book_name = state.get("book_name", "")
@@ -292,23 +290,10 @@ class ExpressionAgent:
     
     async def _call_llm(self, prompt: str) -> str:
         """调用 LLM"""
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.api_base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.chat_model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7,
-                    "max_tokens": 2000,
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data["choices"][0]["message"]["content"].strip()
+        content = await self.llm.complete(
+            prompt, site="expression_agent", model=self.chat_model, temperature=0.7, max_tokens=2000, timeout=120.0
+        )
+        return content.strip()
     
     def _get_current_action(self, state: AgentState) -> str:
         """获取当前任务的动作"""
@@ -10,9 +10,9 @@
 import logging
 from typing import Dict, Any
 
-import httpx
 
 from config import settings
+from ..llm_client import get_llm_client
 from .state import AgentState
 
 logger = logging.getLogger(__name__)
@@ -223,23 +223,10 @@ class GenerationAgent:
     
     async def _call_llm(self, prompt: str) -> str:
         """调用 LLM"""
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.chat_model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7,
-                    "max_tokens": 2000,
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data["choices"][0]["message"]["content"].strip()
+        content = await get_llm_client("openrouter").complete(
+            prompt, site="generation_agent", model=self.chat_model, temperature=0.7, max_tokens=2000, timeout=120.0
+        )
+        return content.strip()
     
     def _get_current_action(self, state: AgentState) -> str:
         """获取当前任务的动作"""
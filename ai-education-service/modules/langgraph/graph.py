@@ -134,8 +134,8 @@ def create_graph() -> StateGraph:
 
         摘要会保留关键信息（用户姓名、偏好、讨论话题等）
         """
-        import httpx
         from config import settings
+        from ..llm_client import get_llm_client
 
         state["current_node"] = "manage_messages"
         messages = state.get("messages", [])
@@ -150,23 +150,10 @@ def create_graph() -> StateGraph:
                 summary_prompt = build_summary_prompt(messages, existing_summary)
 
                 # 调用 LLM 生成摘要
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(
-                        f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                            "Content-Type": "application/json",
-                        },
-                        json={
-                            "model": settings.CHAT_MODEL,
-                            "messages": [{"role": "user", "content": summary_prompt}],
-                            "temperature": 0.3,
-                            "max_tokens": 300,
-                        }
-                    )
-                    response.raise_for_status()
-                    data = response.json()
-                    new_summary = data["choices"][0]["message"]["content"].strip()
+                new_summary = (await get_llm_client("openrouter").complete(
+                    summary_prompt, site="graph.summary", model=settings.CHAT_MODEL,
+                    temperature=0.3, max_tokens=300, timeout=30.0
+                )).strip()
 
                 # 获取需要删除的消息
                 remove_messages = get_messages_to_remove_after_summary(messages, keep=SUMMARY_KEEP)
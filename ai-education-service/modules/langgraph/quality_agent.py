@@ -10,9 +10,9 @@
 import logging
 from typing import Dict, Any
 
-import httpx
 
 from config import settings
+from ..llm_client import get_llm_client
 from .state import AgentState
 
 logger = logging.getLogger(__name__)
@@ -180,23 +180,10 @@ class QualityAgent:
     
     async def _call_llm(self, prompt: str) -> str:
         """调用 LLM"""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.chat_model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1,
-                    "max_tokens": 500,
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data["choices"][0]["message"]["content"].strip()
+        content = await get_llm_client("openrouter").complete(
+            prompt, site="quality_agent", model=self.chat_model, temperature=0.1, max_tokens=500, timeout=60.0
+        )
+        return content.strip()
 
 
 # 全局实例
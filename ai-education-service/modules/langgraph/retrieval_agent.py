@@ -14,10 +14,10 @@
 import logging
 from typing import Dict, Any, List, Literal
 
-import httpx
 from langchain_core.messages import AIMessage, ToolMessage, HumanMessage
 
 from config import settings
+from ..llm_client import get_llm_client
 from .state import AgentState, MemoryType, EvidenceSource
 from .tools import retrieve_from_textbook, search_knowledge_graph, retrieval_tools
 
@@ -128,6 +128,10 @@ class RetrievalAgent:
                             "book_id": {
                                 "type": "string",
                                 "description": "教材ID"
+                            },
+                            "scope": {
+                                "type": "string",
+                                "description": "章节范围（如 第三章），问题限定在某一章节时填写"
                             }
                         },
                         "required": ["query", "book_id"]
@@ -169,53 +173,35 @@ class RetrievalAgent:
 
         try:
             # 根据配置选择 API
-            if settings.CHAT_PROVIDER == "dashscope":
-                api_url = f"{settings.DASHSCOPE_BASE_URL}/chat/completions"
-                api_key = settings.DASHSCOPE_API_KEY
+            provider = "dashscope" if settings.CHAT_PROVIDER == "dashscope" else "openrouter"
+            data = await get_llm_client(provider).chat(
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": query}
+                ],
+                site="retrieval_agent.decide", model=settings.CHAT_MODEL, temperature=0.1, timeout=60.0,
+                tools=tools_schema, tool_choice="auto"
+            )
+
+            message = data["choices"][0]["message"]
+            tool_calls = message.get("tool_calls", [])
+
+            if tool_calls:
+                # 解析工具调用
+                parsed_calls = []
+                for tc in tool_calls:
+                    import json
+                    func = tc.get("function", {})
+                    parsed_calls.append({
+                        "id": tc.get("id"),
+                        "name": func.get("name"),
+                        "arguments": json.loads(func.get("arguments", "{}"))
+                    })
+                logger.info(f"LLM 决定调用工具: {[c['name'] for c in parsed_calls]}")
+                return True, parsed_calls
             else:
-                api_url = f"{settings.OPENROUTER_BASE_URL}/chat/completions"
-                api_key = settings.OPENROUTER_API_KEY
-
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    api_url,
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": settings.CHAT_MODEL,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": query}
-                        ],
-                        "tools": tools_schema,
-                        "tool_choice": "auto",
-                        "temperature": 0.1,
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
-
-                message = data["choices"][0]["message"]
-                tool_calls = message.get("tool_calls", [])
-
-                if tool_calls:
-                    # 解析工具调用
-                    parsed_calls = []
-                    for tc in tool_calls:
-                        import json
-                        func = tc.get("function", {})
-                        parsed_calls.append({
-                            "id": tc.get("id"),
-                            "name": func.get("name"),
-                            "arguments": json.loads(func.get("arguments", "{}"))
-                        })
-                    logger.info(f"LLM 决定调用工具: {[c['name'] for c in parsed_calls]}")
-                    return True, parsed_calls
-                else:
-                    logger.info("LLM 决定不需要检索")
-                    return False, []
+                logger.info("LLM 决定不需要检索")
+                return False, []
 
         except Exception as e:
             logger.error(f"LLM 决策失败: {e}")
@@ -242,6 +228,10 @@ class RetrievalAgent:
 
             try:
                 if tool_name == "retrieve_from_textbook":
+                    # 意图参数中的范围（如复习总结的"第三章"）限定检索章节
+                    scope = state.get("intent_params", {}).get("scope")
+                    if scope and not args.get("scope"):
+                        args["scope"] = scope
                     result = retrieve_from_textbook.invoke(args)
                 elif tool_name == "search_knowledge_graph":
                     result = await search_knowledge_graph.ainvoke(args)
@@ -33,7 +33,7 @@ RETRIEVAL_EXPERT_PROMPT = """你是一个专业的检索专家，专门从教材
 ### 1. retrieve_from_textbook
 从教材向量库中检索相关内容。
 - 用于：教材内容查询、知识点解释、例题查找
-- 参数：query（问题）、book_id（教材ID）
+- 参数：query（问题）、book_id（教材ID）、scope（可选，章节范围，如"第三章"）
 
 ### 2. search_knowledge_graph
 从知识图谱中搜索实体和关系。
@@ -10,11 +10,11 @@ import json
 import re
 from typing import Dict, Any, List, Optional
 
-import httpx
-
 from config import settings
+from ..llm_client import get_llm_client
 from .state import AgentState, IntentType, TaskType, MemoryType, EvidenceSource
 from .message_utils import get_recent_context, trim_conversation_history
+from modules.vector_store import parse_chunk_metadata
 
 logger = logging.getLogger(__name__)
 
@@ -37,12 +37,10 @@ class SupervisorAgent:
         # 根据 CHAT_PROVIDER 选择模型和 API
         if settings.CHAT_PROVIDER == "dashscope":
             self.chat_model = settings.CHAT_MODEL
-            self.api_base_url = settings.DASHSCOPE_BASE_URL
-            self.api_key = settings.DASHSCOPE_API_KEY
+            self.llm = get_llm_client("dashscope")
         else:
             self.chat_model = settings.OPENROUTER_CHAT_MODEL
-            self.api_base_url = settings.OPENROUTER_BASE_URL
-            self.api_key = settings.OPENROUTER_API_KEY
+            self.llm = get_llm_client("openrouter")
 
     # ==================== 入口阶段 ====================
 
@@ -171,28 +169,15 @@ class SupervisorAgent:
 只返回 JSON。"""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.api_base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.chat_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.1,
-                        "max_tokens": 500,
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
-                content = data["choices"][0]["message"]["content"].strip()
-
-                # 清理 markdown
-                content = self._clean_json(content)
-                result = json.loads(content)
-                return result
+            content = (await self.llm.complete(
+                prompt, site="supervisor.intent", model=self.chat_model,
+                temperature=0.1, max_tokens=500, timeout=30.0, cache_ttl=settings.LLM_CACHE_TTL_CLASSIFY
+            )).strip()
+
+            # 清理 markdown
+            content = self._clean_json(content)
+            result = json.loads(content)
+            return result
 
         except Exception as e:
             logger.error(f"意图分析失败: {e}")
@@ -391,7 +376,8 @@ class SupervisorAgent:
                     "citation_id": citation_id,
                     "text_preview": source.get("text", "")[:200] + "...",
                     "score": source.get("score", 0),
-                    "metadata": source.get("metadata", {})
+                    "page": source.get("page", 0),
+                    "metadata": parse_chunk_metadata(source.get("metadata"))
                 })
 
         return citations
@@ -12,7 +12,9 @@ from typing import List, Dict, Any
 from langchain_core.tools import tool
 
 from config import settings
-from modules.vector_store import VectorStore
+from modules.vector_store import VectorStore, get_vector_store, strip_chapter_clause
+from modules.chapter_scope import scoped_filter
+from modules.chapter_index import get_chapter_index
 from modules.document_processor import get_embedding_model
 
 logger = logging.getLogger(__name__)
@@ -26,7 +28,7 @@ def _get_vector_store() -> VectorStore:
     """获取向量存储单例"""
     global _vector_store
     if _vector_store is None:
-        _vector_store = VectorStore()
+        _vector_store = get_vector_store()
         logger.info("VectorStore 初始化完成")
     return _vector_store
 
@@ -41,7 +43,7 @@ def _get_embedding_model():
 
 
 @tool
-def retrieve_from_textbook(query: str, book_id: str) -> str:
+def retrieve_from_textbook(query: str, book_id: str, scope: str = "") -> str:
     """
     从教材中检索相关内容。
     
@@ -51,11 +53,12 @@ def retrieve_from_textbook(query: str, book_id: str) -> str:
     Args:
         query: 用户的问题或查询
         book_id: 教材ID，用于过滤检索范围
+        scope: 章节范围（如"第三章"、章节标题；"全书"或留空时从问题中识别），只检索该章节及其子章节
     
     Returns:
         检索到的相关教材内容，包含来源标注
     """
-    logger.info(f"检索教材: query={query[:50]}..., book_id={book_id}")
+    logger.info(f"检索教材: query={query[:50]}..., book_id={book_id}, scope={scope or '-'}")
     
     try:
         vector_store = _get_vector_store()
@@ -64,15 +67,29 @@ def retrieve_from_textbook(query: str, book_id: str) -> str:
         # 生成查询向量
         query_embedding = embedding_model.get_text_embedding(query)
         
-        # 构建过滤条件
-        filter_expr = f"book_id = '{book_id}'" if book_id else None
+        # 构建过滤条件（章节范围限定到章节子树）
+        book_filter = f"book_id = '{book_id}'" if book_id else None
+        filter_expr = scoped_filter(book_filter, scope=scope, question=query)
+        chapter_index = get_chapter_index()
+        if chapter_index is not None:
+            # 未指定范围时按章节摘要选出最相关的章节（分层检索）
+            filter_expr = chapter_index.route(filter_expr, query_embedding, min_chunks=5)
         
-        # 执行向量检索
+        # 执行向量检索（只需要正文，不拉取元数据）
         results = vector_store.search(
             query_embedding=query_embedding,
             top_k=5,
-            filter_expr=filter_expr
+            filter_expr=filter_expr,
+            output_fields=["text"]
         )
+        if not results and filter_expr != book_filter:
+            # 章节范围内没有结果（如分块尚未标注章节）时回退到整本书
+            results = vector_store.search(
+                query_embedding=query_embedding,
+                top_k=5,
+                filter_expr=strip_chapter_clause(filter_expr),
+                output_fields=["text"]
+            )
         
         if not results:
             logger.info("未找到相关教材内容")
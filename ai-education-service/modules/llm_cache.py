@@ -0,0 +1,201 @@
+"""
+LLM 响应缓存模块
+缓存低温度、结果只取决于 prompt 的 LLM 调用（意图分析、路由分类、查询改写、NL→Cypher、入库时的实体/章节抽取），
+进程内 LRU + 可选 Redis 二级缓存
+
+- Key: 提供方 + 请求体（model、temperature、max_tokens、messages 及 tools 等其他字段）的哈希
+- 按调用点启用：调用方传入 cache_ttl 才读写缓存，TTL 也由调用点决定
+- 只缓存 temperature <= LLM_CACHE_MAX_TEMPERATURE 的调用，高温度的生成类调用即使传入 cache_ttl 也不缓存
+- 统计: 按调用点的命中率、估算节省的延迟
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "llm:v1"
+
+
+class _SiteCacheStats:
+    __slots__ = ("hits", "misses", "hit_ms", "miss_ms")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.hit_ms = 0.0
+        self.miss_ms = 0.0
+
+
+class LLMResponseCache:
+    """LLM 响应缓存（按调用点 TTL）"""
+
+    def __init__(
+        self,
+        redis_client=None,
+        max_entries: Optional[int] = None,
+        max_temperature: Optional[float] = None
+    ):
+        """
+        Args:
+            redis_client: 可选的 Redis 客户端（decode_responses=True），None 时仅使用进程内缓存
+            max_entries: 进程内 LRU 条目上限，默认使用 LLM_CACHE_MAX_ENTRIES
+            max_temperature: 允许缓存的最高 temperature，默认使用 LLM_CACHE_MAX_TEMPERATURE
+        """
+        self.redis = redis_client
+        self.max_entries = max_entries or settings.LLM_CACHE_MAX_ENTRIES
+        self.max_temperature = settings.LLM_CACHE_MAX_TEMPERATURE if max_temperature is None else max_temperature
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (过期时间, JSON)
+        self._sites: Dict[str, _SiteCacheStats] = {}
+        self._lock = threading.Lock()
+
+    def cacheable(self, payload: Dict[str, Any]) -> bool:
+        """请求是否可以缓存（流式和高温度调用不缓存）"""
+        return not payload.get("stream") and float(payload.get("temperature", 1.0)) <= self.max_temperature
+
+    def make_key(self, provider: str, payload: Dict[str, Any]) -> str:
+        """生成缓存 key（请求体按键排序后序列化，字段顺序不影响 key）"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        return f"{_KEY_PREFIX}:{provider}:{payload.get('model', '')}:{digest.hexdigest()}"
+
+    def _site(self, site: str) -> _SiteCacheStats:
+        stats = self._sites.get(site)
+        if stats is None:
+            stats = self._sites[site] = _SiteCacheStats()
+        return stats
+
+    def get(self, key: str, site: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的响应 JSON（返回新的对象，调用方可以修改）"""
+        start = time.perf_counter()
+        payload = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._entries.move_to_end(key)
+                    payload = entry[1]
+                else:
+                    del self._entries[key]
+
+        if payload is None and self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.get(key)
+                pipe.ttl(key)
+                payload, ttl = pipe.execute()
+                if payload is not None:
+                    # 本地副本不超过 Redis 剩余的有效期
+                    self._put_local(key, payload, ttl if ttl and ttl > 0 else 1)
+            except Exception as e:
+                logger.warning(f"Redis 读取 LLM 缓存失败: {e}")
+
+        if payload is None:
+            return None
+
+        with self._lock:
+            stats = self._site(site)
+            stats.hits += 1
+            stats.hit_ms += (time.perf_counter() - start) * 1000
+        return json.loads(payload)
+
+    def set(self, key: str, data: Dict[str, Any], ttl: int, site: str, elapsed_ms: float) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: make_key 生成的 key
+            data: 响应 JSON
+            ttl: 过期时间（秒），由调用点决定
+            site: 调用点名称（统计用）
+            elapsed_ms: 本次未命中的实际调用耗时（用于估算节省的延迟）
+        """
+        with self._lock:
+            stats = self._site(site)
+            stats.misses += 1
+            stats.miss_ms += elapsed_ms
+
+        # 空回答和被截断的回答不缓存
+        choice = (data.get("choices") or [{}])[0]
+        if not (choice.get("message") or {}).get("content") or choice.get("finish_reason") == "length":
+            return
+
+        payload = json.dumps(data, ensure_ascii=False)
+        self._put_local(key, payload, ttl)
+        if self.redis is not None:
+            try:
+                self.redis.setex(key, ttl, payload)
+            except Exception as e:
+                logger.warning(f"Redis 写入 LLM 缓存失败: {e}")
+
+    def _put_local(self, key: str, payload: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计（总计 + 各调用点）"""
+        with self._lock:
+            sites = {}
+            hits = misses = 0
+            saved = 0.0
+            for site, stats in sorted(self._sites.items()):
+                total = stats.hits + stats.misses
+                avg_hit = stats.hit_ms / stats.hits if stats.hits else 0.0
+                avg_miss = stats.miss_ms / stats.misses if stats.misses else 0.0
+                site_saved = max(avg_miss - avg_hit, 0.0) * stats.hits
+                sites[site] = {
+                    "hits": stats.hits,
+                    "misses": stats.misses,
+                    "hit_rate": round(stats.hits / total, 4) if total else 0.0,
+                    "avg_hit_ms": round(avg_hit, 3),
+                    "avg_miss_ms": round(avg_miss, 1),
+                    "saved_ms": round(site_saved, 1),
+                }
+                hits += stats.hits
+                misses += stats.misses
+                saved += site_saved
+            return {
+                "entries": len(self._entries),
+                "backend": "redis+memory" if self.redis is not None else "memory",
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "saved_ms": round(saved, 1),
+                "sites": sites,
+            }
+
+
+# ============ 工厂函数 ============
+
+_llm_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """获取 LLMResponseCache 单例（未启用时返回 None）"""
+    global _llm_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _llm_cache is None:
+            redis_client = None
+            if settings.REDIS_URL:
+                try:
+                    import redis
+                    redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+                except Exception as e:
+                    logger.warning(f"Redis 连接失败，LLM 缓存仅使用内存: {e}")
+            _llm_cache = LLMResponseCache(redis_client=redis_client)
+            logger.info(f"LLM 响应缓存初始化完成，后端: {'redis+memory' if redis_client else 'memory'}")
+    return _llm_cache
@@ -0,0 +1,453 @@
+"""
+LLM 客户端模块
+所有 /chat/completions 调用的统一入口：
+
+- 按提供方（DashScope / OpenRouter）复用 keep-alive 连接池，不再每次调用新建 httpx 客户端。
+  异步客户端按事件循环分别创建（入库流程在独立的 asyncio.run 中调用 LLM，客户端不能跨事件循环复用）。
+- 非流式（chat / complete / complete_sync）和流式（stream）接口，请求格式和响应解析只写一处。
+- 连接错误、超时和 408/429/5xx 响应按指数退避重试（流式只在收到第一个片段前重试），优先遵循 Retry-After。
+- 按调用点（site）统计调用次数、失败、重试、延迟分位数、首字延迟和 token 用量。
+- 非流式调用传入 cache_ttl 时读写 LLM 响应缓存（见 llm_cache），命中时不发请求、不计入调用统计。
+"""
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from config import settings
+from .llm_cache import LLMResponseCache, get_llm_cache
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("dashscope", "openrouter")
+
+# 可重试的 HTTP 状态码
+RETRY_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Retry-After 最长等待（秒）
+MAX_RETRY_AFTER = 10.0
+
+Messages = Union[str, List[Dict[str, Any]]]
+
+
+def _as_messages(messages: Messages) -> List[Dict[str, Any]]:
+    """字符串 prompt 转为单条 user 消息"""
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return messages
+
+
+def _provider_config(provider: str) -> Tuple[str, Dict[str, str]]:
+    """提供方 -> (base_url, 请求头)"""
+    if provider == "dashscope":
+        return settings.DASHSCOPE_BASE_URL, {
+            "Authorization": f"Bearer {settings.DASHSCOPE_API_KEY}",
+            "Content-Type": "application/json",
+        }
+    if provider == "openrouter":
+        headers = {
+            "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
+            "Content-Type": "application/json",
+        }
+        if settings.OPENROUTER_SITE_URL:
+            headers["HTTP-Referer"] = settings.OPENROUTER_SITE_URL
+        if settings.OPENROUTER_SITE_NAME:
+            headers["X-Title"] = settings.OPENROUTER_SITE_NAME
+        return settings.OPENROUTER_BASE_URL, headers
+    raise ValueError(f"不支持的 LLM 提供方: {provider}")
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+def _retry_delay(error: Exception, attempt: int, backoff: float) -> float:
+    """Retry-After（秒数）优先，否则指数退避 + 抖动"""
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+    return backoff * (2 ** attempt) + random.uniform(0, backoff)
+
+
+# ============ 调用点统计 ============
+
+class _SiteStats:
+    __slots__ = ("calls", "errors", "retries", "total_ms", "latencies", "first_token", "prompt_tokens",
+                 "completion_tokens")
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.latencies: deque = deque(maxlen=window)
+        self.first_token: deque = deque(maxlen=window)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class LLMMetrics:
+    """按调用点统计 LLM 调用（延迟分位数基于最近 window 次调用）"""
+
+    def __init__(self, window: Optional[int] = None):
+        self.window = window or settings.LLM_METRICS_WINDOW
+        self._sites: Dict[str, _SiteStats] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        site: str,
+        latency_ms: float,
+        usage: Optional[Dict[str, Any]] = None,
+        retries: int = 0,
+        error: bool = False,
+        first_token_ms: Optional[float] = None
+    ) -> None:
+        with self._lock:
+            stats = self._sites.get(site)
+            if stats is None:
+                stats = self._sites[site] = _SiteStats(self.window)
+            stats.calls += 1
+            stats.retries += retries
+            stats.total_ms += latency_ms
+            stats.latencies.append(latency_ms)
+            if error:
+                stats.errors += 1
+            if first_token_ms is not None:
+                stats.first_token.append(first_token_ms)
+            if usage:
+                stats.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+                stats.completion_tokens += int(usage.get("completion_tokens") or 0)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各调用点的统计"""
+        with self._lock:
+            result = {}
+            for site, stats in sorted(self._sites.items()):
+                result[site] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                    "avg_ms": round(stats.total_ms / stats.calls, 1) if stats.calls else 0.0,
+                    "p50_ms": round(_percentile(stats.latencies, 50), 1),
+                    "p95_ms": round(_percentile(stats.latencies, 95), 1),
+                    "prompt_tokens": stats.prompt_tokens,
+                    "completion_tokens": stats.completion_tokens,
+                }
+                if stats.first_token:
+                    result[site]["first_token_p50_ms"] = round(_percentile(stats.first_token, 50), 1)
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sites.clear()
+
+
+_metrics: Optional[LLMMetrics] = None
+
+
+def get_llm_metrics() -> LLMMetrics:
+    """获取全局 LLM 调用统计"""
+    global _metrics
+    if _metrics is None:
+        _metrics = LLMMetrics()
+    return _metrics
+
+
+# ============ 客户端 ============
+
+class LLMClient:
+    """
+    单个提供方的 chat/completions 客户端
+
+    连接池按事件循环缓存；complete_sync 使用共享的同步连接池（线程安全）。
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        metrics: Optional[LLMMetrics] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache: Optional[LLMResponseCache] = None
+    ):
+        """
+        Args:
+            provider: "dashscope" 或 "openrouter"
+            timeout: 默认超时（秒），单次调用可覆盖，默认 LLM_TIMEOUT
+            max_retries: 最大重试次数，默认 LLM_MAX_RETRIES
+            backoff: 退避基数（秒），默认 LLM_RETRY_BACKOFF
+            metrics: 调用统计，默认全局实例
+            transport: 可选的 httpx 异步传输层（测试时注入）
+            cache: LLM 响应缓存，默认全局实例（LLM_CACHE_ENABLED 关闭时不缓存）
+        """
+        self.provider = provider
+        self.base_url, self.headers = _provider_config(provider)
+        self.timeout = timeout or settings.LLM_TIMEOUT
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.LLM_RETRY_BACKOFF if backoff is None else backoff
+        self.metrics = metrics or get_llm_metrics()
+        self.transport = transport
+        self.cache = cache
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+            weakref.WeakKeyDictionary()
+        self._sync_client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        )
+
+    def _client(self) -> httpx.AsyncClient:
+        """当前事件循环的连接池"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    base_url=self.base_url, headers=self.headers, timeout=self.timeout,
+                    limits=self._limits(), transport=self.transport,
+                )
+                self._clients[loop] = client
+            return client
+
+    def _payload(self, messages: Messages, model: Optional[str], temperature: float,
+                 max_tokens: Optional[int], extra: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {
+            "model": model or settings.CHAT_MODEL,
+            "messages": _as_messages(messages),
+            "temperature": temperature,
+            **extra,
+        }
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        return payload
+
+    def _cache_key(self, payload: Dict[str, Any], cache_ttl: Optional[int]
+                   ) -> Tuple[Optional[LLMResponseCache], Optional[str]]:
+        """调用点启用缓存且请求可缓存时返回 (缓存, key)，否则 (None, None)"""
+        if not cache_ttl:
+            return None, None
+        cache = self.cache if self.cache is not None else get_llm_cache()
+        if cache is None or not cache.cacheable(payload):
+            return None, None
+        return cache, cache.make_key(self.provider, payload)
+
+    async def chat(
+        self,
+        messages: Messages,
+        *,
+        site: str,
+        model: Optional[str] = None,
+        temperature: float = 0.3,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache_ttl: Optional[int] = None,
+        **extra: Any
+    ) -> Dict[str, Any]:
+        """
+        非流式调用，返回完整响应 JSON（需要 tool_calls 等字段时使用）
+
+        Args:
+            messages: 消息列表，或单个 user prompt 字符串
+            site: 调用点名称（统计用）
+            cache_ttl: 响应缓存时间（秒），不传则不使用缓存
+            extra: 其他请求字段（如 tools、tool_choice）
+        """
+        payload = self._payload(messages, model, temperature, max_tokens, extra)
+        cache, key = self._cache_key(payload, cache_ttl)
+        if key is not None:
+            cached = cache.get(key, site)
+            if cached is not None:
+                return cached
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response = await self._client().post(
+                    "/chat/completions", json=payload, timeout=timeout or self.timeout
+                )
+                response.raise_for_status()
+                data = response.json()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.metrics.record(site, elapsed_ms, data.get("usage"), attempt)
+                if key is not None:
+                    cache.set(key, data, cache_ttl, site, elapsed_ms)
+                return data
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    self.metrics.record(site, (time.perf_counter() - started) * 1000, None, attempt, error=True)
+                    raise
+                delay = _retry_delay(e, attempt, self.backoff)
+                logger.warning(f"LLM 调用失败，{delay:.1f}s 后重试（{site}, 第 {attempt + 1} 次）: {e}")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def complete(self, messages: Messages, *, site: str, **kwargs: Any) -> str:
+        """非流式调用，返回回答文本（参数同 chat）"""
+        data = await self.chat(messages, site=site, **kwargs)
+        return data["choices"][0]["message"]["content"] or ""
+
+    async def stream(
+        self,
+        messages: Messages,
+        *,
+        site: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        **extra: Any
+    ) -> AsyncIterator[str]:
+        """流式调用，逐个产出增量文本（收到第一个片段前失败才重试）"""
+        payload = self._payload(messages, model, temperature, max_tokens, {**extra, "stream": True})
+        started = time.perf_counter()
+        first_token_ms = None
+        usage = None
+        attempt = 0
+        while True:
+            try:
+                async with self._client().stream(
+                    "POST", "/chat/completions", json=payload, timeout=timeout or self.timeout
+                ) as response:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data: "):
+                            continue
+                        data_str = line[6:].strip()
+                        if data_str == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data_str)
+                        except json.JSONDecodeError:
+                            continue
+                        usage = chunk.get("usage") or usage
+                        choices = chunk.get("choices") or [{}]
+                        content = (choices[0].get("delta") or {}).get("content")
+                        if content:
+                            if first_token_ms is None:
+                                first_token_ms = (time.perf_counter() - started) * 1000
+                            yield content
+                self.metrics.record(
+                    site, (time.perf_counter() - started) * 1000, usage, attempt, first_token_ms=first_token_ms
+                )
+                return
+            except Exception as e:
+                if first_token_ms is not None or attempt >= self.max_retries or not _is_retryable(e):
+                    self.metrics.record(
+                        site, (time.perf_counter() - started) * 1000, usage, attempt, error=True,
+                        first_token_ms=first_token_ms
+                    )
+                    raise
+                delay = _retry_delay(e, attempt, self.backoff)
+                logger.warning(f"LLM 流式调用失败，{delay:.1f}s 后重试（{site}, 第 {attempt + 1} 次）: {e}")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def complete_sync(
+        self,
+        messages: Messages,
+        *,
+        site: str,
+        model: Optional[str] = None,
+        temperature: float = 0.3,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache_ttl: Optional[int] = None,
+        **extra: Any
+    ) -> str:
+        """同步非流式调用（LlamaIndex 同步接口使用；会阻塞调用线程）"""
+        with self._lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                self._sync_client = httpx.Client(
+                    base_url=self.base_url, headers=self.headers, timeout=self.timeout, limits=self._limits()
+                )
+            client = self._sync_client
+
+        payload = self._payload(messages, model, temperature, max_tokens, extra)
+        cache, key = self._cache_key(payload, cache_ttl)
+        if key is not None:
+            cached = cache.get(key, site)
+            if cached is not None:
+                return cached["choices"][0]["message"]["content"] or ""
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response = client.post("/chat/completions", json=payload, timeout=timeout or self.timeout)
+                response.raise_for_status()
+                data = response.json()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.metrics.record(site, elapsed_ms, data.get("usage"), attempt)
+                if key is not None:
+                    cache.set(key, data, cache_ttl, site, elapsed_ms)
+                return data["choices"][0]["message"]["content"] or ""
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    self.metrics.record(site, (time.perf_counter() - started) * 1000, None, attempt, error=True)
+                    raise
+                delay = _retry_delay(e, attempt, self.backoff)
+                logger.warning(f"LLM 调用失败，{delay:.1f}s 后重试（{site}, 第 {attempt + 1} 次）: {e}")
+                attempt += 1
+                time.sleep(delay)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环的连接池和同步连接池"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.pop(loop, None)
+            sync_client, self._sync_client = self._sync_client, None
+        if client is not None:
+            await client.aclose()
+        if sync_client is not None:
+            sync_client.close()
+
+
+# ============ 工厂函数 ============
+
+_llm_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(provider: Optional[str] = None) -> LLMClient:
+    """获取提供方的 LLMClient 单例（默认 CHAT_PROVIDER）"""
+    provider = (provider or settings.CHAT_PROVIDER).lower()
+    with _clients_lock:
+        client = _llm_clients.get(provider)
+        if client is None:
+            client = _llm_clients[provider] = LLMClient(provider)
+        return client
+
+
+async def close_llm_clients() -> None:
+    """关闭所有提供方在当前事件循环的连接池（应用关闭时调用）"""
+    for client in list(_llm_clients.values()):
+        await client.aclose()
@@ -0,0 +1,189 @@
+"""
+本地重排序模块
+用查询向量与分块向量的精确余弦 + 词项覆盖率打分，再做 MMR 去冗余，替代 LLM 重排序调用
+
+    relevance = cosine + RERANK_LEXICAL_WEIGHT * lexical
+    MMR: 每步选择 λ * relevance - (1 - λ) * max(与已选分块的余弦) 最大的候选
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from .keyword_index import tokenize
+from .local_vector_store import parse_filter
+
+logger = logging.getLogger(__name__)
+
+
+def lexical_coverage(query_tokens: List[str], text: str) -> float:
+    """查询词项在文本中的覆盖比例"""
+    if not query_tokens or not text:
+        return 0.0
+    doc_tokens = set(tokenize(text))
+    return sum(1 for token in query_tokens if token in doc_tokens) / len(query_tokens)
+
+
+def mmr_select(relevance: np.ndarray, similarity: np.ndarray, top_n: int, mmr_lambda: float) -> List[int]:
+    """
+    贪心 MMR 选择（向量化，每步 O(n)）
+
+    Args:
+        relevance: (n,) 相关性分数
+        similarity: (n, n) 候选之间的余弦相似度
+        top_n: 选择数量
+        mmr_lambda: 相关性权重，1.0 等价于按相关性排序
+
+    Returns:
+        选中候选的下标（按选择顺序）
+    """
+    n = len(relevance)
+    top_n = min(top_n, n)
+    selected: List[int] = []
+    max_sim = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(top_n):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_sim
+        scores[~available] = -np.inf
+        picked = int(np.argmax(scores))
+        selected.append(picked)
+        available[picked] = False
+        np.maximum(max_sim, similarity[picked], out=max_sim)
+    return selected
+
+
+class LocalReranker:
+    """
+    基于向量的本地重排序器
+
+    查询向量由调用方提供（与检索共用缓存）；分块向量从向量存储 fetch，按 ID 做进程内 LRU 缓存。
+    取不到向量的分块余弦记为 0，只按词项覆盖率参与排序。
+    向量缓存实现与检索 / 回答缓存相同的 bump / bump_by_filter 接口，通过 register_vector_cache 注册后
+    随入库和删除失效。
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        embed: Callable[[str], List[float]],
+        mmr_lambda: float = None,
+        lexical_weight: float = None,
+        cache_size: int = None
+    ):
+        self.vector_store = vector_store
+        self.embed = embed
+        self.mmr_lambda = settings.RERANK_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        self.lexical_weight = settings.RERANK_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+        self.cache_size = cache_size or settings.RERANK_VECTOR_CACHE_SIZE
+        self._vectors: "OrderedDict[str, Tuple[str, np.ndarray]]" = OrderedDict()  # id -> (book_id, 向量)
+        self._lock = threading.Lock()
+
+    def _chunk_vectors(self, ids: List[str], filter_expr: Optional[str]) -> Dict[str, np.ndarray]:
+        """获取分块向量（已归一化），未命中缓存的 ID 批量 fetch"""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for doc_id in ids:
+                entry = self._vectors.get(doc_id)
+                if entry is not None:
+                    self._vectors.move_to_end(doc_id)
+                    found[doc_id] = entry[1]
+
+        missing = [doc_id for doc_id in ids if doc_id not in found]
+        if missing:
+            try:
+                fetched = self.vector_store.fetch(missing, filter_expr=filter_expr)
+            except Exception as e:
+                logger.warning(f"本地重排序获取分块向量失败: {e}")
+                fetched = {}
+            with self._lock:
+                for doc_id, doc in fetched.items():
+                    vector = np.asarray(doc["vector"], dtype=np.float32)
+                    norm = np.linalg.norm(vector)
+                    vector = vector / norm if norm > 0 else vector
+                    found[doc_id] = vector
+                    self._vectors[doc_id] = ((doc.get("fields") or {}).get("book_id", ""), vector)
+                while len(self._vectors) > self.cache_size:
+                    self._vectors.popitem(last=False)
+        return found
+
+    def invalidate(self, ids: Optional[List[str]] = None) -> None:
+        """清除分块向量缓存（不传 ids 时全部清除）"""
+        with self._lock:
+            if ids is None:
+                self._vectors.clear()
+            else:
+                for doc_id in ids:
+                    self._vectors.pop(doc_id, None)
+
+    def bump(self, book_id: Optional[str] = None) -> None:
+        """使一本书的分块向量缓存失效（book_id 为空时全部失效）"""
+        with self._lock:
+            if not book_id:
+                self._vectors.clear()
+                return
+            for doc_id in [doc_id for doc_id, (owner, _) in self._vectors.items() if owner == book_id]:
+                del self._vectors[doc_id]
+
+    def bump_by_filter(self, filter_expr: Optional[str]) -> None:
+        """按过滤条件失效（只能解析出 book_id 时精确失效，否则全部失效）"""
+        try:
+            book_id = parse_filter(filter_expr).get("book_id")
+        except ValueError:
+            book_id = None
+        self.bump(book_id)
+
+    def rerank(
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        top_n: int,
+        filter_expr: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        重排序
+
+        Returns:
+            前 top_n 个结果（新字典），附带 rerank_score（MMR 前的相关性）、cosine、lexical
+        """
+        if not results:
+            return results
+
+        query_vector = np.asarray(self.embed(query), dtype=np.float32)
+        query_norm = np.linalg.norm(query_vector)
+        if query_norm > 0:
+            query_vector = query_vector / query_norm
+
+        ids = [result["id"] for result in results]
+        vectors = self._chunk_vectors(ids, filter_expr)
+        matrix = np.zeros((len(results), len(query_vector)), dtype=np.float32)
+        for i, doc_id in enumerate(ids):
+            vector = vectors.get(doc_id)
+            if vector is not None and len(vector) == len(query_vector):
+                matrix[i] = vector
+        if len(vectors) < len(ids):
+            logger.info(f"本地重排序：{len(ids) - len(vectors)} 个分块没有向量，只按词项打分")
+
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        cosine = matrix @ query_vector
+        lexical = np.array(
+            [lexical_coverage(query_tokens, result.get("text", "")) for result in results],
+            dtype=np.float32
+        )
+        relevance = cosine + self.lexical_weight * lexical
+
+        order = mmr_select(relevance, matrix @ matrix.T, top_n, self.mmr_lambda)
+        reranked = [
+            {
+                **results[i],
+                "rerank_score": float(relevance[i]),
+                "cosine": float(cosine[i]),
+                "lexical": float(lexical[i]),
+            }
+            for i in order
+        ]
+        logger.info(f"本地重排序完成：{len(results)} -> {len(reranked)}")
+        return reranked
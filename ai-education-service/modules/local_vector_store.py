@@ -0,0 +1,629 @@
+"""
+本地向量存储模块
+进程内精确向量检索，与 VectorStore (DashVector) 接口一致
+适用于测试、基准测试、无 DashVector 的私有化部署以及热数据层
+
+存储布局（每本书一组文件）:
+    {LOCAL_VECTOR_DIR}/{book_id}.npy        向量矩阵（已 L2 归一化，内存映射读取）
+    {LOCAL_VECTOR_DIR}/{book_id}.meta.json  元数据表（原始 book_id + id + 分块字段，字段定义见 CHUNK_FIELDS_SCHEMA）
+
+文件名由 book_id 转换而来，不同 book_id 可能映射到同一文件名（如 "a.b" 与 "a_b"），
+因此 meta 中保存原始 book_id，读写时校验，冲突的教材写入失败。
+同一目录可能被多个实例（或进程）读写，读取前按 meta 文件的 inode / mtime 检查缓存是否过期。
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from config import settings
+from .vector_store import (
+    InsertReport, build_chunk_fields, chapter_scope_filter, project_fields, reciprocal_rank_fusion, vector_caches
+)
+
+logger = logging.getLogger(__name__)
+
+# 未指定 book_id 的节点统一存放的分区
+DEFAULT_BOOK_KEY = "_default"
+
+# float16 矩阵分块转换为 float32 再做矩阵乘法（numpy 的 float16 matmul 不走 BLAS）
+SEARCH_BLOCK_ROWS = 65536
+
+# 掩码选中的行少于此比例时只取出这些行计算分数（否则整体计算后屏蔽）
+MASK_GATHER_RATIO = 0.5
+
+# 支持的过滤表达式: field = 'value' [and field = 'value']，章节范围可写为 (chapter_id = 'a' or chapter_id = 'b')
+_FILTER_CLAUSE = re.compile(r"^\s*(\w+)\s*=\s*'([^']*)'\s*$")
+_FILTER_GROUP = re.compile(r"^\s*\((.*)\)\s*$")
+_FILTER_FIELDS = frozenset({"book_id", "resource_id", "chapter_id"})
+# 条件删除支持的字段
+DELETE_FILTER_FIELDS = frozenset({"book_id", "resource_id"})
+
+
+def parse_filter(filter_expr: Optional[str], fields: frozenset = _FILTER_FIELDS) -> Dict[str, Any]:
+    """
+    解析等值过滤表达式
+
+    支持 book_id / resource_id / chapter_id 的等值条件，多个条件用 and 连接；
+    chapter_id 可以是括号内用 or 连接的多个值（章节范围），解析为 ID 元组。
+    例如: "book_id = 'b1' and (chapter_id = 'c1' or chapter_id = 'c2')"
+
+    Args:
+        fields: 允许的字段（条件删除传入 DELETE_FILTER_FIELDS）
+    """
+    if not filter_expr or not filter_expr.strip():
+        return {}
+
+    conditions: Dict[str, Any] = {}
+    for clause in re.split(r"\s+and\s+", filter_expr.strip(), flags=re.IGNORECASE):
+        group = _FILTER_GROUP.match(clause)
+        parts = re.split(r"\s+or\s+", group.group(1).strip(), flags=re.IGNORECASE) if group else [clause]
+        matches = [_FILTER_CLAUSE.match(part) for part in parts]
+        names = {match.group(1) for match in matches if match}
+        if not all(matches) or len(names) != 1 or not names <= fields:
+            raise ValueError(f"不支持的过滤表达式: {filter_expr}")
+        name = names.pop()
+        if name == "chapter_id":
+            conditions[name] = tuple(match.group(2) for match in matches)
+        elif len(matches) > 1:
+            raise ValueError(f"不支持的过滤表达式: {filter_expr}")
+        else:
+            conditions[name] = matches[0].group(2)
+    return conditions
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """按行 L2 归一化（余弦相似度 = 归一化向量点积）"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def score_matrix(matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    计算 matrix 与查询的点积
+
+    Args:
+        matrix: (n, d) 向量矩阵（float32 或 float16）
+        queries: (d,) 或 (m, d) float32 查询
+
+    Returns:
+        (n,) 或 (n, m) float32 分数
+    """
+    rhs = queries.T if queries.ndim == 2 else queries
+    if matrix.dtype == np.float32:
+        return matrix @ rhs
+
+    n = matrix.shape[0]
+    scores = np.empty((n,) + rhs.shape[1:], dtype=np.float32)
+    for start in range(0, n, SEARCH_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        scores[start:start + len(block)] = block @ rhs
+    return scores
+
+
+def exact_top_k(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    top_k: int,
+    mask: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    精确 top-k 检索（矩阵乘法 + argpartition）
+
+    Args:
+        matrix: (n, d) 已归一化的向量矩阵
+        query: (d,) 已归一化的查询向量（float32）
+        top_k: 返回数量
+        mask: 可选的 (n,) 布尔掩码，False 的行不参与排序
+
+    Returns:
+        (行号, 分数)，按分数降序
+    """
+    n = matrix.shape[0]
+    if n == 0 or top_k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    if mask is not None:
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if len(rows) < n * MASK_GATHER_RATIO:
+            # 选中的行较少（如章节范围）：只对这些行计算分数
+            idx, scores = exact_top_k(matrix[rows], query, top_k)
+            return rows[idx], scores
+
+    scores = score_matrix(matrix, query)
+
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+        n = len(rows)
+
+    k = min(top_k, n)
+    if k < scores.shape[0]:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.shape[0])
+    idx = idx[np.argsort(-scores[idx], kind="stable")][:k]
+    return idx, scores[idx]
+
+
+class ChapterCodes:
+    """
+    分块 chapter_id 的整数编码（按章节过滤时查表生成掩码，避免逐行比较字符串）
+    """
+
+    def __init__(self, fields: List[Dict[str, Any]]):
+        self.vocab: Dict[str, int] = {}
+        self.codes = np.fromiter(
+            (self.vocab.setdefault(f.get("chapter_id", ""), len(self.vocab)) for f in fields),
+            dtype=np.int32, count=len(fields),
+        )
+
+    def mask(self, chapter_ids: Tuple[str, ...]) -> np.ndarray:
+        table = np.zeros(len(self.vocab), dtype=bool)
+        table[[self.vocab[c] for c in chapter_ids if c in self.vocab]] = True
+        return table[self.codes]
+
+
+class _BookIndex:
+    """单本书的向量矩阵和元数据表"""
+
+    def __init__(self, vectors: np.ndarray, meta: Dict[str, Any], signature: Optional[tuple] = None):
+        self.vectors = vectors
+        self.signature = signature  # 加载时 meta 文件的 (inode, mtime, size)
+        self.ids: List[str] = meta["ids"]
+        if "fields" in meta:
+            self.fields: List[Dict[str, Any]] = meta["fields"]
+        else:
+            # 旧格式: texts / resource_ids / metadata 三列
+            self.fields = [
+                {"text": text, "resource_id": resource_id, "metadata": metadata}
+                for text, resource_id, metadata in zip(meta["texts"], meta["resource_ids"], meta["metadata"])
+            ]
+        # 原始 book_id；更早写入的文件没有该项时取分块字段中的 book_id，旧格式无法确定（None，不校验）
+        self.book_id: Optional[str] = meta.get("book_id")
+        if self.book_id is None and self.fields and "book_id" in self.fields[0]:
+            self.book_id = self.fields[0]["book_id"]
+        self._resource_arr: Optional[np.ndarray] = None
+        self._chapter_arr: Optional[ChapterCodes] = None
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def matches(self, book_id: Optional[str]) -> bool:
+        """是否为 book_id 对应的教材（文件名相同的其他教材返回 False）"""
+        return self.book_id is None or self.book_id == (book_id or "")
+
+    def resource_mask(self, resource_id: str) -> np.ndarray:
+        if self._resource_arr is None:
+            self._resource_arr = np.asarray([f.get("resource_id", "") for f in self.fields], dtype=object)
+        return self._resource_arr == resource_id
+
+    def chapter_mask(self, chapter_ids: Tuple[str, ...]) -> np.ndarray:
+        if self._chapter_arr is None:
+            self._chapter_arr = ChapterCodes(self.fields)
+        return self._chapter_arr.mask(chapter_ids)
+
+    def row_mask(self, conditions: Dict[str, Any]) -> Optional[np.ndarray]:
+        """resource_id / chapter_id 条件对应的行掩码（没有行级条件时返回 None）"""
+        mask = None
+        if "resource_id" in conditions:
+            mask = self.resource_mask(conditions["resource_id"])
+        if "chapter_id" in conditions:
+            chapters = self.chapter_mask(conditions["chapter_id"])
+            mask = chapters if mask is None else mask & chapters
+        return mask
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        return self._rows.get(doc_id)
+
+    def hit(self, row: int, score: float, output_fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        return {"id": self.ids[row], "score": score, **project_fields(self.fields[row], output_fields)}
+
+    def to_meta(self) -> Dict[str, list]:
+        return {"ids": self.ids, "fields": self.fields}
+
+
+class LocalVectorStore:
+    """本地向量存储（与 VectorStore 相同的 insert / search / delete 接口）"""
+
+    def __init__(
+        self,
+        base_dir: Optional[str] = None,
+        dtype: Optional[str] = None,
+        dimension: Optional[int] = None,
+        answer_cache=None
+    ):
+        """
+        Args:
+            base_dir: 存储目录，默认使用 LOCAL_VECTOR_DIR
+            dtype: 向量存储精度 "float32" 或 "float16"，默认使用 LOCAL_VECTOR_DTYPE
+            dimension: 向量维度，默认使用 EMBEDDING_DIMENSION
+            answer_cache: 可选的 AnswerCache，写入 / 删除时使对应教材的回答缓存失效
+        """
+        self.base_dir = Path(base_dir or settings.LOCAL_VECTOR_DIR)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype or settings.LOCAL_VECTOR_DTYPE)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"不支持的向量精度: {self.dtype}")
+        self.dimension = dimension or settings.EMBEDDING_DIMENSION
+        self._books: Dict[str, _BookIndex] = {}
+        self._lock = threading.RLock()
+        self.answer_cache = answer_cache
+        logger.info(f"本地向量存储初始化完成，目录: {self.base_dir}, 精度: {self.dtype}")
+
+    # ============ 文件读写 ============
+
+    @staticmethod
+    def _book_key(book_id: Optional[str]) -> str:
+        """book_id -> 文件名安全的分区键"""
+        return re.sub(r"[^\w\-]", "_", book_id) if book_id else DEFAULT_BOOK_KEY
+
+    def _paths(self, book_key: str) -> Tuple[Path, Path]:
+        return self.base_dir / f"{book_key}.npy", self.base_dir / f"{book_key}.meta.json"
+
+    def _book_keys(self) -> List[str]:
+        """列出所有已存储的书（以元数据文件为准）"""
+        keys = set(self._books)
+        for path in self.base_dir.glob("*.meta.json"):
+            keys.add(path.name[:-len(".meta.json")])
+        return sorted(keys)
+
+    @staticmethod
+    def _signature(meta_path: Path) -> Optional[tuple]:
+        try:
+            stat = meta_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load_book(self, book_key: str) -> Optional[_BookIndex]:
+        """
+        加载（并缓存）一本书的索引，向量以内存映射方式打开
+
+        meta 文件被其他实例替换或删除后重新加载 / 丢弃缓存。
+        """
+        with self._lock:
+            vec_path, meta_path = self._paths(book_key)
+            signature = self._signature(meta_path)
+            cached = self._books.get(book_key)
+            if signature is None or not vec_path.exists():
+                self._books.pop(book_key, None)
+                return None
+            if cached is not None and cached.signature == signature:
+                return cached
+
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            vectors = np.load(vec_path, mmap_mode="r")
+            if len(vectors) != len(meta["ids"]):
+                # 其他实例正在替换文件（向量已替换、meta 尚未替换），沿用旧缓存
+                logger.debug(f"本地向量文件正在更新: book={book_key}")
+                return cached
+            index = _BookIndex(vectors, meta, signature)
+            self._books[book_key] = index
+            return index
+
+    def _book_indexes(self, book_id: Optional[str] = None, all_books: bool = False) -> List[Tuple[str, _BookIndex]]:
+        """
+        (文件名键, 索引) 列表
+
+        Args:
+            book_id: 只返回该教材（文件名相同但 book_id 不同的教材不返回）
+            all_books: 忽略 book_id，返回全部书
+        """
+        if all_books:
+            keys = self._book_keys()
+        else:
+            keys = [self._book_key(book_id)]
+        indexes = []
+        for book_key in keys:
+            index = self._load_book(book_key)
+            if index is not None and (all_books or index.matches(book_id)):
+                indexes.append((book_key, index))
+        return indexes
+
+    def _save_book(self, book_key: str, book_id: Optional[str], vectors: np.ndarray, meta: Dict[str, list]) -> None:
+        """原子写入一本书的向量和元数据，随后重新内存映射（book_id 为 None 表示旧格式，不写入）"""
+        vec_path, meta_path = self._paths(book_key)
+        tmp_vec = vec_path.with_suffix(".tmp.npy")
+        tmp_meta = meta_path.with_suffix(".tmp")
+
+        if book_id is not None:
+            meta = {"book_id": book_id, **meta}
+        np.save(tmp_vec, np.ascontiguousarray(vectors, dtype=self.dtype))
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        # 先释放旧的内存映射，再替换文件
+        self._books.pop(book_key, None)
+        os.replace(tmp_vec, vec_path)
+        os.replace(tmp_meta, meta_path)
+        self._books[book_key] = _BookIndex(np.load(vec_path, mmap_mode="r"), meta, self._signature(meta_path))
+
+    def _drop_book(self, book_key: str) -> None:
+        self._books.pop(book_key, None)
+        for path in self._paths(book_key):
+            if path.exists():
+                path.unlink()
+
+    # ============ VectorStore 接口 ============
+
+    def insert(
+        self,
+        nodes: List[TextNode],
+        batch_size: int = 100,
+        max_workers: Optional[int] = None
+    ) -> InsertReport:
+        """
+        批量写入向量（upsert 语义，相同 ID 覆盖旧数据）
+
+        batch_size / max_workers 仅为兼容 VectorStore 接口，本地写入按书一次完成。
+        """
+        report = InsertReport(total=len(nodes))
+
+        grouped: Dict[str, List[TextNode]] = {}
+        for node in nodes:
+            if node.embedding is None or len(node.embedding) != self.dimension:
+                report.failed_ids.append(node.node_id)
+                continue
+            grouped.setdefault(str(node.metadata.get("book_id") or ""), []).append(node)
+
+        if report.failed_ids:
+            report.errors.append(f"{len(report.failed_ids)} 个节点缺少 embedding 或维度不是 {self.dimension}")
+
+        with self._lock:
+            for book_id, book_nodes in grouped.items():
+                try:
+                    self._upsert_book(book_id, book_nodes)
+                    report.inserted += len(book_nodes)
+                except Exception as e:
+                    report.failed_ids.extend(node.node_id for node in book_nodes)
+                    report.errors.append(f"{book_id}: {e}")
+                    logger.error(f"本地向量写入失败: book={book_id}, 错误: {e}")
+
+        logger.info(f"本地向量写入完成，成功: {report.inserted}/{report.total}")
+        for cache in (self.answer_cache, *vector_caches()):
+            if cache is not None:
+                for book_id in {node.metadata.get("book_id", "") for node in nodes}:
+                    cache.bump(book_id or None)
+        return report
+
+    def _upsert_book(self, book_id: str, nodes: List[TextNode]) -> None:
+        new_vectors = normalize_rows(np.asarray([n.embedding for n in nodes], dtype=np.float32))
+        new_ids = {n.node_id for n in nodes}
+
+        book_key = self._book_key(book_id)
+        existing = self._load_book(book_key)
+        if existing is not None and not existing.matches(book_id):
+            raise ValueError(f"教材 {book_id} 与已有教材 {existing.book_id} 的存储文件名冲突: {book_key}")
+        if existing is not None and len(existing):
+            keep = np.asarray([i not in new_ids for i in existing.ids], dtype=bool)
+            old_vectors = np.asarray(existing.vectors[keep], dtype=np.float32)
+            meta = {
+                key: [v for v, k in zip(values, keep) if k]
+                for key, values in existing.to_meta().items()
+            }
+        else:
+            old_vectors = np.empty((0, self.dimension), dtype=np.float32)
+            meta = {"ids": [], "fields": []}
+
+        for node in nodes:
+            meta["ids"].append(node.node_id)
+            meta["fields"].append(build_chunk_fields(node.get_content(), node.metadata))
+
+        self._save_book(book_key, book_id, np.vstack([old_vectors, new_vectors]), meta)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        filter_expr: Optional[str] = None,
+        output_fields: Optional[List[str]] = None,
+        chapter_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        精确向量检索
+
+        Args:
+            chapter_ids: 章节范围（章节及其子章节的 ID），只检索这些章节的分块
+
+        Returns:
+            与 VectorStore.search 相同格式的结果列表，score 为余弦相似度
+        """
+        conditions = parse_filter(chapter_scope_filter(filter_expr, chapter_ids))
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        candidates = []
+        for _, index in self._book_indexes(conditions.get("book_id"), all_books="book_id" not in conditions):
+            if not len(index):
+                continue
+            mask = index.row_mask(conditions)
+            rows, scores = exact_top_k(index.vectors, query, top_k, mask)
+            candidates.extend((float(s), index, int(r)) for r, s in zip(rows, scores))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return [index.hit(row, score, output_fields) for score, index, row in candidates[:top_k]]
+
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filter_expr: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        output_fields: Optional[List[str]] = None
+    ) -> Dict[str, List]:
+        """
+        多向量检索：每本书只做一次 (n, d) x (d, m) 矩阵乘法
+
+        Returns:
+            {"per_query": 每个查询的结果列表, "fused": RRF 融合后的 top_k 结果}
+        """
+        if not query_embeddings:
+            return {"per_query": [], "fused": []}
+
+        conditions = parse_filter(filter_expr)
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+
+        candidates: List[list] = [[] for _ in range(len(queries))]
+        for _, index in self._book_indexes(conditions.get("book_id"), all_books="book_id" not in conditions):
+            if not len(index):
+                continue
+            scores = score_matrix(index.vectors, queries)
+            mask = index.row_mask(conditions)
+            if mask is not None:
+                scores[~mask] = -np.inf
+            valid = np.isfinite(scores[:, 0]).sum()
+            k = min(top_k, int(valid))
+            if k <= 0:
+                continue
+            for q in range(len(queries)):
+                column = scores[:, q]
+                rows = np.argpartition(-column, k - 1)[:k] if k < len(column) else np.arange(len(column))
+                candidates[q].extend((float(column[r]), index, int(r)) for r in rows)
+
+        per_query = []
+        for items in candidates:
+            items.sort(key=lambda c: c[0], reverse=True)
+            per_query.append([index.hit(row, score, output_fields) for score, index, row in items[:top_k]])
+        return {"per_query": per_query, "fused": reciprocal_rank_fusion(per_query, top_k)}
+
+    def delete(self, ids: List[str]) -> bool:
+        """删除指定的向量"""
+        targets = set(ids)
+        with self._lock:
+            for book_key, index in self._book_indexes(all_books=True):
+                keep = np.asarray([i not in targets for i in index.ids], dtype=bool)
+                if keep.all():
+                    continue
+                self._rewrite_kept(book_key, index, keep)
+        if self.answer_cache is not None:
+            self.answer_cache.bump()
+        for cache in vector_caches():
+            cache.invalidate(ids)
+        logger.info(f"成功删除 {len(ids)} 条本地向量")
+        return True
+
+    def delete_by_filter(self, filter_expr: str) -> bool:
+        """根据过滤条件删除向量（支持 book_id / resource_id）"""
+        try:
+            conditions = parse_filter(filter_expr, DELETE_FILTER_FIELDS)
+        except ValueError as e:
+            logger.error(f"条件删除失败: {e}")
+            return False
+        if not conditions:
+            logger.error("条件删除失败: 过滤条件为空")
+            return False
+
+        with self._lock:
+            for book_key, index in self._book_indexes(conditions.get("book_id"), all_books="book_id" not in conditions):
+                if "resource_id" not in conditions:
+                    self._drop_book(book_key)
+                    continue
+                keep = ~index.resource_mask(conditions["resource_id"])
+                self._rewrite_kept(book_key, index, keep)
+
+        for cache in (self.answer_cache, *vector_caches()):
+            if cache is not None:
+                cache.bump(conditions.get("book_id"))
+        logger.info(f"根据条件删除成功: {filter_expr}")
+        return True
+
+    def _rewrite_kept(self, book_key: str, index: _BookIndex, keep: np.ndarray) -> None:
+        if not keep.any():
+            self._drop_book(book_key)
+            return
+        vectors = np.asarray(index.vectors[keep])
+        meta = {
+            key: [v for v, k in zip(values, keep) if k]
+            for key, values in index.to_meta().items()
+        }
+        self._save_book(book_key, index.book_id, vectors, meta)
+
+    def fetch(self, ids: List[str], filter_expr: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        按 ID 获取向量和字段
+
+        Returns:
+            {id: {"vector": float32 向量（已归一化）, "fields": 分块字段}}，不存在的 ID 不返回
+        """
+        conditions = parse_filter(filter_expr)
+        remaining = set(ids)
+        found: Dict[str, Dict[str, Any]] = {}
+        for _, index in self._book_indexes(conditions.get("book_id"), all_books="book_id" not in conditions):
+            for doc_id in list(remaining):
+                row = index.row_of(doc_id)
+                if row is None:
+                    continue
+                found[doc_id] = {
+                    "vector": np.asarray(index.vectors[row], dtype=np.float32),
+                    "fields": index.fields[row],
+                }
+                remaining.discard(doc_id)
+            if not remaining:
+                break
+        return found
+
+    def export_book(self, book_id: str) -> Optional[Dict[str, Any]]:
+        """导出一本书的全部向量和元数据（用于热缓存加载）"""
+        indexes = self._book_indexes(book_id)
+        if not indexes:
+            return None
+        index = indexes[0][1]
+        return {
+            "ids": list(index.ids),
+            "fields": list(index.fields),
+            "vectors": np.asarray(index.vectors),
+        }
+
+    def count(self, book_id: Optional[str] = None) -> int:
+        """统计向量数量"""
+        return sum(len(index) for _, index in self._book_indexes(book_id, all_books=not book_id))
+
+    def close(self) -> None:
+        """释放内存映射"""
+        with self._lock:
+            self._books.clear()
+
+
+# ============ 共享实例 ============
+
+_shared_stores: Dict[Tuple[str, str, int], LocalVectorStore] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_local_store(
+    base_dir: str,
+    dtype: Optional[str] = None,
+    dimension: Optional[int] = None
+) -> LocalVectorStore:
+    """
+    按 (目录, 精度, 维度) 共享的 LocalVectorStore
+
+    热缓存快照、两阶段检索的低维索引和完整向量由所有 VectorStore 实例共同读写，
+    共享同一实例，写入后其他实例不会继续读取旧的内存映射。
+    """
+    key = (
+        str(Path(base_dir).resolve()),
+        np.dtype(dtype or settings.LOCAL_VECTOR_DTYPE).name,
+        dimension or settings.EMBEDDING_DIMENSION,
+    )
+    with _shared_lock:
+        store = _shared_stores.get(key)
+        if store is None:
+            store = _shared_stores[key] = LocalVectorStore(base_dir=base_dir, dtype=dtype, dimension=dimension)
+        return store
@@ -3,6 +3,7 @@
 串联各模块形成完整的文档处理流程
 """
 
+import asyncio
 import logging
 from pathlib import Path
 from typing import Optional, Dict, Any
@@ -11,7 +12,12 @@ from enum import Enum
 
 from .oss_downloader import OSSDownloader
 from .document_processor import DocumentProcessor
-from .vector_store import VectorStore
+from .vector_store import get_vector_store
+from .document_registry import get_document_registry
+from .keyword_index import get_keyword_index
+from .chapter_index import get_chapter_index
+from .question_index import get_question_index
+from .chapter_scope import RESOURCE_DOC_TYPES, assign_chapters, load_book_chapters
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -25,6 +31,7 @@ class ProcessingStatus(str, Enum):
     VECTORIZING = "vectorizing"
     STORING = "storing"
     COMPLETED = "completed"
+    PARTIAL = "partial"  # 流程完成，但部分向量写入失败
     FAILED = "failed"
 
 
@@ -37,6 +44,7 @@ class ProcessingResult:
     file_key: str
     chunks_count: int = 0
     vectors_stored: int = 0
+    vectors_failed: int = 0  # 写入失败的向量数
     nodes_count: int = 0  # 别名，与 chunks_count 相同
     kg_entities: int = 0  # 知识图谱实体数
     kg_relations: int = 0  # 知识图谱关系数
@@ -50,12 +58,34 @@ class ProcessingResult:
             "file_key": self.file_key,
             "chunks_count": self.chunks_count,
             "vectors_stored": self.vectors_stored,
+            "vectors_failed": self.vectors_failed,
             "nodes_count": self.nodes_count,
             "kg_entities": self.kg_entities,
             "kg_relations": self.kg_relations,
             "error": self.error
         }
 
+    @classmethod
+    def completed(cls, file_key: str, vectors_failed: int = 0, **fields: Any) -> "ProcessingResult":
+        """流程走完后的结果：有向量写入失败时标记为部分失败（success=False），避免调用方当作完整入库"""
+        if vectors_failed:
+            return cls(
+                success=False,
+                status=ProcessingStatus.PARTIAL,
+                message=f"文档部分处理失败：{vectors_failed} 个向量写入失败",
+                file_key=file_key,
+                vectors_failed=vectors_failed,
+                error=f"{vectors_failed} 个向量写入失败",
+                **fields
+            )
+        return cls(
+            success=True,
+            status=ProcessingStatus.COMPLETED,
+            message="文档处理成功",
+            file_key=file_key,
+            **fields
+        )
+
 
 class ProcessingPipeline:
     """文档处理管道"""
@@ -64,7 +94,7 @@ class ProcessingPipeline:
         """初始化处理管道"""
         self.downloader = OSSDownloader()
         self.processor = DocumentProcessor()
-        self.vector_store = VectorStore()
+        self.vector_store = get_vector_store()
         logger.info("处理管道初始化完成")
     
     def _validate_file_type(self, file_key: str) -> bool:
@@ -126,19 +156,58 @@ class ProcessingPipeline:
                     error="文档可能为空或格式不正确"
                 )
             
-            # 4. 存储向量
-            vectors_stored = self.vector_store.insert(nodes)
+            # 4. 标注章节（知识图谱中已有该教材的章节树时）
+            book_id = file_metadata.get("book_id")
+            doc_type = file_metadata.get("document_type") or file_metadata.get("type")
+            chapters = []
+            if settings.CHAPTER_SCOPE_ENABLED and book_id and doc_type not in RESOURCE_DOC_TYPES:
+                chapters = load_book_chapters(book_id)
+                assign_chapters(nodes, chapters)
+
+            # 5. 存储向量
+            report = self.vector_store.insert(nodes)
+            vectors_stored = report.inserted
+            if report.failed_ids:
+                logger.error(f"[Pipeline] {len(report.failed_ids)} 个向量写入失败: {report.failed_ids[:10]}")
+            
+            # 6. 登记文档级元数据（分块只保留 doc_ref）
+            registry = get_document_registry()
+            if registry is not None:
+                registry.register(file_metadata, chunk_count=len(nodes))
+
+            # 7. 写入关键词倒排索引（BM25）
+            keyword_index = get_keyword_index()
+            if keyword_index is not None:
+                failed = set(report.failed_ids)
+                keyword_index.insert([node for node in nodes if node.node_id not in failed])
+
+            # 8. 生成章节摘要向量（分层检索，失败不影响入库）
+            chapter_index = get_chapter_index()
+            if chapter_index is not None and chapters:
+                try:
+                    chapter_index.build(book_id, nodes, chapters, self.processor.embedding.get_text_embedding_batch)
+                except Exception as e:
+                    logger.warning(f"[Pipeline] 章节摘要索引失败: {e}")
             
-            # 5. 清理临时文件
+            # 9. 生成假设问题索引（同步接口内单独运行事件循环，失败不影响入库）
+            question_index = get_question_index()
+            if question_index is not None:
+                try:
+                    failed = set(report.failed_ids)
+                    asyncio.run(question_index.build(
+                        [node for node in nodes if node.node_id not in failed], self.processor.embedding.get_text_embedding_batch
+                    ))
+                except Exception as e:
+                    logger.warning(f"[Pipeline] 假设问题索引失败: {e}")
+
+            # 10. 清理临时文件
             self.downloader.cleanup(local_file)
             
-            logger.info(f"[Pipeline] 处理完成: {oss_key}, 节点: {len(nodes)}, 存储: {vectors_stored}")
+            logger.info(f"[Pipeline] 处理完成: {oss_key}, 节点: {len(nodes)}, 存储: {vectors_stored}, 失败: {len(report.failed_ids)}")
             
-            return ProcessingResult(
-                success=True,
-                status=ProcessingStatus.COMPLETED,
-                message="文档处理成功",
-                file_key=oss_key,
+            return ProcessingResult.completed(
+                oss_key,
+                vectors_failed=len(report.failed_ids),
                 chunks_count=len(nodes),
                 vectors_stored=vectors_stored
             )
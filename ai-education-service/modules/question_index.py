@@ -0,0 +1,218 @@
+"""
+假设问题索引模块（入库时生成，替代查询时的 HyDE）
+HyDE 在查询时调用 LLM 生成假设性答案，每个问题增加 1-3 秒首字延迟。这里反过来：
+入库时为每个分块生成几个学生可能提出的问题（多个分块合并为一次 LLM 调用，并发执行），
+问题向量化后写入独立的本地向量库，ID 为 "{分块ID}#q{序号}"。查询时直接用原问题匹配问题向量，
+命中的问题映射回分块，与分块向量检索结果融合，查询路径不调用 LLM。
+
+存储复用 LocalVectorStore（按书分文件，book_id / resource_id / chapter_id 字段与分块相同，过滤条件通用）。
+"""
+
+import asyncio
+import json
+import logging
+from typing import List, Dict, Any, Optional, Callable
+
+from llama_index.core.schema import TextNode
+
+from config import settings
+from .llm_client import get_llm_client
+from .local_vector_store import LocalVectorStore
+from .vector_store import extract_book_id
+
+logger = logging.getLogger(__name__)
+
+# 问题 ID 中分块 ID 与序号的分隔符
+QUESTION_ID_SEP = "#q"
+
+# 短于此长度的分块（标题、页眉等）不生成问题
+MIN_CHUNK_CHARS = 50
+
+# 每个分块送入 LLM 的最大字符数
+CHUNK_PROMPT_CHARS = 800
+
+QUESTION_PROMPT_TEMPLATE = """下面是教材中的 {count} 个片段。请为每个片段写出 {per_chunk} 个学生可能提出、且能用该片段回答的问题。
+问题要具体、口语化，覆盖片段中的不同知识点，不要出现"本段""上文"等指代。
+
+{chunks}
+
+只返回 JSON，键为片段编号，值为问题列表，例如: {{"1": ["问题1", "问题2"], "2": ["问题1", "问题2"]}}"""
+
+
+def parent_chunk_id(question_id: str) -> str:
+    """问题 ID -> 所属分块 ID"""
+    return question_id.rsplit(QUESTION_ID_SEP, 1)[0]
+
+
+def parse_questions(content: str, count: int, per_chunk: int) -> List[List[str]]:
+    """解析 LLM 返回的 {"片段编号": [问题, ...]}，缺失或格式错误的片段返回空列表"""
+    if "```" in content:
+        content = content.split("```")[1].replace("json", "").strip()
+    try:
+        parsed = json.loads(content)
+    except json.JSONDecodeError:
+        return [[] for _ in range(count)]
+    if not isinstance(parsed, dict):
+        return [[] for _ in range(count)]
+
+    result = []
+    for i in range(1, count + 1):
+        questions = parsed.get(str(i)) or []
+        if not isinstance(questions, list):
+            questions = []
+        result.append([str(q).strip() for q in questions if str(q).strip()][:per_chunk])
+    return result
+
+
+async def generate_questions(
+    texts: List[str],
+    per_chunk: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    complete: Optional[Callable] = None
+) -> List[List[str]]:
+    """
+    为每个分块生成假设问题（batch_size 个分块一次 LLM 调用，最多 concurrency 个调用并发）
+
+    Args:
+        complete: 可选的异步补全函数 complete(prompt) -> str，默认调用 CHAT_MODEL
+
+    Returns:
+        与 texts 对应的问题列表（失败的批次为空列表）
+    """
+    per_chunk = per_chunk or settings.QUESTIONS_PER_CHUNK
+    batch_size = batch_size or settings.QUESTION_GEN_BATCH
+    semaphore = asyncio.Semaphore(concurrency or settings.QUESTION_GEN_CONCURRENCY)
+    complete = complete or _complete
+
+    async def run_batch(batch: List[str]) -> List[List[str]]:
+        chunks = "\n\n".join(f"[{i}] {text[:CHUNK_PROMPT_CHARS]}" for i, text in enumerate(batch, 1))
+        prompt = QUESTION_PROMPT_TEMPLATE.format(count=len(batch), per_chunk=per_chunk, chunks=chunks)
+        async with semaphore:
+            try:
+                return parse_questions(await complete(prompt), len(batch), per_chunk)
+            except Exception as e:
+                logger.warning(f"假设问题生成失败（{len(batch)} 个分块）: {e}")
+                return [[] for _ in batch]
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results = await asyncio.gather(*(run_batch(batch) for batch in batches))
+    return [questions for batch in results for questions in batch]
+
+
+async def _complete(prompt: str) -> str:
+    return await get_llm_client("dashscope").complete(
+        prompt, site="question_index.generate", model=settings.CHAT_MODEL, temperature=0.3, timeout=60.0
+    )
+
+
+class QuestionIndex:
+    """分块假设问题的向量索引"""
+
+    def __init__(self, base_dir: Optional[str] = None, dtype: Optional[str] = None, dimension: Optional[int] = None):
+        """
+        Args:
+            base_dir: 存储目录，默认使用 QUESTION_INDEX_DIR
+            dtype / dimension: 同 LocalVectorStore
+        """
+        self.store = LocalVectorStore(
+            base_dir=base_dir or settings.QUESTION_INDEX_DIR, dtype=dtype, dimension=dimension
+        )
+
+    async def build(
+        self,
+        nodes: list,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        complete: Optional[Callable] = None
+    ) -> int:
+        """
+        为分块生成假设问题、向量化并写入
+
+        Args:
+            embed_batch: 批量文本向量化函数（如 embedding 模型的 get_text_embedding_batch）
+            complete: 可选的异步补全函数，见 generate_questions
+
+        Returns:
+            写入的问题数
+        """
+        nodes = [node for node in nodes if len(node.get_content()) >= MIN_CHUNK_CHARS]
+        if not nodes:
+            return 0
+        generated = await generate_questions([node.get_content() for node in nodes], complete=complete)
+
+        questions: List[TextNode] = []
+        for node, texts in zip(nodes, generated):
+            metadata = {k: node.metadata.get(k) for k in ("book_id", "resource_id", "chapter_id") if node.metadata.get(k)}
+            for i, text in enumerate(texts):
+                questions.append(TextNode(id_=f"{node.node_id}{QUESTION_ID_SEP}{i}", text=text, metadata=metadata))
+        if not questions:
+            return 0
+
+        embeddings = await asyncio.to_thread(embed_batch, [q.get_content() for q in questions])
+        for question, embedding in zip(questions, embeddings):
+            question.embedding = embedding
+        report = await asyncio.to_thread(self.store.insert, questions)
+        logger.info(f"假设问题索引写入完成: {len(nodes)} 个分块, {report.inserted} 个问题")
+        return report.inserted
+
+    def covers(self, filter_expr: Optional[str]) -> bool:
+        """过滤条件对应的教材是否已有问题索引（可以跳过 HyDE）"""
+        book_id = extract_book_id(filter_expr)
+        return bool(book_id) and self.store.count(book_id) > 0
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        filter_expr: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        用查询向量匹配假设问题，返回分块（按最高问题得分降序，去重）
+
+        Returns:
+            [{"id": 分块ID, "score": 问题相似度, "question": 命中的问题}]
+        """
+        hits = self.store.search(
+            query_embedding, top_k=top_k * settings.QUESTIONS_PER_CHUNK, filter_expr=filter_expr,
+            output_fields=["text"],
+        )
+        parents: Dict[str, Dict[str, Any]] = {}
+        for hit in hits:
+            chunk_id = parent_chunk_id(hit["id"])
+            if chunk_id not in parents:
+                parents[chunk_id] = {"id": chunk_id, "score": hit["score"], "question": hit["text"]}
+        return list(parents.values())[:top_k]
+
+    def delete_by_filter(self, filter_expr: str) -> bool:
+        return self.store.delete_by_filter(filter_expr)
+
+
+def resolve_question_hits(vector_store, hits: List[Dict[str, Any]], filter_expr: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    问题命中 -> 分块检索结果（按 ID 从向量库读取分块字段，与 search 结果格式相同）
+
+    分块已被删除的命中丢弃。
+    """
+    if not hits:
+        return []
+    fetched = vector_store.fetch([hit["id"] for hit in hits], filter_expr=filter_expr)
+    results = []
+    for hit in hits:
+        doc = fetched.get(hit["id"])
+        if doc is not None:
+            results.append({"id": hit["id"], "score": hit["score"], **doc["fields"], "matched_question": hit["question"]})
+    return results
+
+
+# 全局实例
+_question_index: Optional[QuestionIndex] = None
+
+
+def get_question_index() -> Optional[QuestionIndex]:
+    """获取 QuestionIndex 单例（QUESTION_INDEX_ENABLED=False 时返回 None）"""
+    global _question_index
+    if not settings.QUESTION_INDEX_ENABLED:
+        return None
+    if _question_index is None:
+        _question_index = QuestionIndex()
+    return _question_index
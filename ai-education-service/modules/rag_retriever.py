@@ -3,14 +3,28 @@ RAG 检索模块
 实现向量检索和上下文构建，支持多轮对话、查询改写、重排序和混合检索
 """
 
+import asyncio
+import difflib
 import logging
-import json
 import re
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
-import httpx
 
 from config import settings
-from .vector_store import VectorStore
+from .llm_client import get_llm_client
+from .vector_store import (
+    get_vector_store, parse_chunk_metadata, extract_book_id, register_vector_cache, strip_chapter_clause
+)
+from .document_registry import get_document_registry
+from .keyword_index import get_keyword_index
+from .hybrid_search import hybrid_search, normalize_text
+from .local_reranker import LocalReranker
+from .context_packer import pack_context, token_budget_for
+from .context_compressor import acompress_context
+from .answer_cache import AnswerCacheKey, get_answer_cache
+from .window_store import get_window_store
+from .chapter_scope import scoped_filter
+from .chapter_index import get_chapter_index
 from .document_processor import get_embedding_model
 from .conversation_memory import get_memory, ConversationMemory
 
@@ -22,10 +36,28 @@ CONTEXT_CHAR_LIMIT = 12000  # 约 3000-4000 tokens
 # Rerank 配置
 RERANK_ENABLED = True  # 是否启用重排序
 RERANK_TOP_N = 3  # 重排序后保留的数量
+RERANK_METHODS = ("local", "llm")
+
+# 查询向量缓存条数（检索和本地重排序共用）
+QUERY_EMBEDDING_CACHE_SIZE = 512
+
+# 回答缓存的默认意图（与 IntentType.QUESTION_ANSWER 一致）
+DEFAULT_INTENT = "question_answer"
 
 # 混合检索配置
-HYBRID_SEARCH_ENABLED = True  # 是否启用混合检索
-KEYWORD_BOOST_WEIGHT = 0.3  # 关键词匹配的权重提升
+HYBRID_SEARCH_ENABLED = True  # 是否启用混合检索（融合方式见 HYBRID_FUSION）
+
+
+_QUERY_PUNCTUATION = re.compile(r'[\s\W_]+')
+
+
+def is_same_query(original: str, rewritten: str, threshold: float = 0.9) -> bool:
+    """改写前后的查询是否相同或几乎相同（忽略大小写、全半角、空白和标点）"""
+    a = _QUERY_PUNCTUATION.sub("", normalize_text(original))
+    b = _QUERY_PUNCTUATION.sub("", normalize_text(rewritten))
+    if a == b:
+        return True
+    return difflib.SequenceMatcher(None, a, b).ratio() >= threshold
 
 
 class RAGRetriever:
@@ -34,9 +66,15 @@ class RAGRetriever:
     def __init__(self):
         """初始化检索器"""
         self.embedding = get_embedding_model()
-        self.vector_store = VectorStore()
+        self.vector_store = get_vector_store()
         self.chat_model = settings.CHAT_MODEL
         self.memory = get_memory()
+        self._embed_query = lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)(self.embedding.get_text_embedding)
+        self.local_reranker = LocalReranker(self.vector_store, embed=self._embed_query)
+        register_vector_cache(self.local_reranker)
+        self.answer_cache = get_answer_cache()
+        self.window_store = get_window_store()
+        self.chapter_index = get_chapter_index()
         logger.info(f"RAG 检索器初始化完成，Chat Model: {self.chat_model}")
     
     async def rewrite_query(
@@ -71,94 +109,107 @@ class RAGRetriever:
 改写后的问题："""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.chat_model,
-                        "messages": [{"role": "user", "content": rewrite_prompt}],
-                        "temperature": 0.1,
-                        "max_tokens": 200,
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
-                rewritten = data["choices"][0]["message"]["content"].strip().strip('"\'')
-                logger.info(f"查询改写: '{query}' -> '{rewritten}'")
-                return rewritten
+            content = await get_llm_client("openrouter").complete(
+                rewrite_prompt, site="rag.rewrite_query", model=self.chat_model,
+                temperature=0.1, max_tokens=200, timeout=30.0, cache_ttl=settings.LLM_CACHE_TTL_REWRITE
+            )
+            rewritten = content.strip().strip('"\'')
+            logger.info(f"查询改写: '{query}' -> '{rewritten}'")
+            return rewritten
         except Exception as e:
             logger.warning(f"查询改写失败，使用原查询: {e}")
             return query
 
-    def _extract_keywords(self, query: str) -> List[str]:
-        """从查询中提取关键词（用于混合检索）"""
-        keywords = []
-        # 提取英文单词和数字
-        english_pattern = r'[A-Za-z][A-Za-z0-9_\-\.]*[A-Za-z0-9]|[A-Za-z]'
-        english_matches = re.findall(english_pattern, query)
-        keywords.extend([w for w in english_matches if len(w) >= 2])
-        # 提取数字
-        number_pattern = r'\d+\.?\d*'
-        number_matches = re.findall(number_pattern, query)
-        keywords.extend(number_matches)
-        # 提取中文词组
-        chinese_pattern = r'[\u4e00-\u9fff]{2,4}'
-        chinese_matches = re.findall(chinese_pattern, query)
-        keywords.extend(chinese_matches)
-        return list(set(keywords))
-
-    def _keyword_match_score(self, text: str, keywords: List[str]) -> float:
-        """计算文本与关键词的匹配分数"""
-        if not keywords:
-            return 0.0
-        text_lower = text.lower()
-        matched = sum(1 for kw in keywords if kw.lower() in text_lower)
-        return matched / len(keywords)
-
     def retrieve(
         self,
         query: str,
         top_k: int = 5,
-        filter_expr: Optional[str] = None
+        filter_expr: Optional[str] = None,
+        fusion: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """检索相关文档片段（支持混合检索）"""
+        """
+        检索相关文档片段（支持混合检索）
+
+        Args:
+            fusion: 混合检索融合方式（rrf / weighted / boost / vector），默认使用 HYBRID_FUSION
+        """
         logger.info(f"开始检索，query: {query[:50]}..., top_k: {top_k}")
 
-        query_embedding = self.embedding.get_text_embedding(query)
         search_top_k = top_k * 2 if RERANK_ENABLED else top_k
-        results = self.vector_store.search(
-            query_embedding=query_embedding,
-            top_k=search_top_k,
-            filter_expr=filter_expr
-        )
+        fusion = (fusion or settings.HYBRID_FUSION).lower() if HYBRID_SEARCH_ENABLED else "vector"
+
+        def search(expr: Optional[str]) -> List[Dict[str, Any]]:
+            return hybrid_search(
+                query,
+                embed=self._embed_query,
+                vector_store=self.vector_store,
+                keyword_index=get_keyword_index(),
+                top_k=search_top_k,
+                filter_expr=expr,
+                fusion=fusion,
+                vector_weight=settings.HYBRID_VECTOR_WEIGHT,
+                keyword_weight=settings.HYBRID_KEYWORD_WEIGHT,
+            )
+
+        routed = self.route_chapters(query, filter_expr, search_top_k)
+        results = search(routed)
+        if routed != filter_expr and len(results) < top_k:
+            # 路由到的章节内结果不足（章节摘要过期或问题跨章节）时回退到整本书
+            logger.info("章节路由结果不足，回退到整本书检索")
+            results = search(filter_expr)
 
-        # 混合检索：关键词匹配加权
-        if HYBRID_SEARCH_ENABLED and results:
-            keywords = self._extract_keywords(query)
-            if keywords:
-                logger.info(f"混合检索：提取关键词 {keywords}")
-                for result in results:
-                    text = result.get("text", "")
-                    keyword_score = self._keyword_match_score(text, keywords)
-                    original_score = result.get("score", 0)
-                    result["keyword_score"] = keyword_score
-                    result["score"] = original_score + (keyword_score * KEYWORD_BOOST_WEIGHT)
-                results.sort(key=lambda x: x["score"], reverse=True)
+        unscoped = strip_chapter_clause(filter_expr)
+        if not results and unscoped != filter_expr:
+            # 章节范围内没有结果（如分块尚未标注章节）时回退到整本书
+            logger.info("章节范围内没有结果，回退到整本书检索")
+            return self.retrieve(query, top_k, unscoped, fusion)
+
+        # 关联文档级元数据（进程内缓存，未命中时批量查询）
+        registry = get_document_registry()
+        if registry is not None and results:
+            registry.attach(results)
 
         logger.info(f"检索完成，找到 {len(results)} 个相关片段")
         return results
 
     async def rerank(
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        top_n: int = RERANK_TOP_N,
+        method: Optional[str] = None,
+        filter_expr: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        对检索结果进行重排序
+
+        Args:
+            method: 重排序方式（local / llm），默认使用 RERANK_METHOD
+            filter_expr: 检索时的过滤条件（本地重排序获取分块向量时用于分区路由）
+        """
+        method = (method or settings.RERANK_METHOD).lower()
+        if method not in RERANK_METHODS:
+            raise ValueError(f"不支持的重排序方式: {method}")
+        if not results or len(results) <= top_n:
+            return results
+        if method == "llm":
+            return await self._llm_rerank(query, results, top_n)
+        try:
+            # 查询向量与检索共用 _embed_query 缓存；未缓存的分块向量需要 fetch，放到线程中执行，不阻塞事件循环
+            return await asyncio.to_thread(
+                self.local_reranker.rerank, query, results, top_n, filter_expr=filter_expr
+            )
+        except Exception as e:
+            logger.warning(f"本地重排序失败: {e}")
+            return results[:top_n]
+
+    async def _llm_rerank(
         self,
         query: str,
         results: List[Dict[str, Any]],
         top_n: int = RERANK_TOP_N
     ) -> List[Dict[str, Any]]:
-        """使用 LLM 对检索结果进行重排序"""
+        """使用 LLM 对检索结果进行重排序（慢速路径）"""
         if not results or len(results) <= top_n:
             return results
         
@@ -182,36 +233,23 @@ class RAGRetriever:
 最相关的文档编号："""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.chat_model,
-                        "messages": [{"role": "user", "content": rerank_prompt}],
-                        "temperature": 0.1,
-                        "max_tokens": 50,
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
-                ranking_str = data["choices"][0]["message"]["content"].strip()
-                
-                indices = []
-                for num in re.findall(r'\d+', ranking_str):
-                    idx = int(num) - 1
-                    if 0 <= idx < len(results) and idx not in indices:
-                        indices.append(idx)
-                
-                if indices:
-                    reranked = [results[i] for i in indices[:top_n]]
-                    logger.info(f"Rerank 完成：{len(results)} -> {len(reranked)}")
-                    return reranked
-                else:
-                    return results[:top_n]
+            ranking_str = (await get_llm_client("openrouter").complete(
+                rerank_prompt, site="rag.rerank", model=self.chat_model,
+                temperature=0.1, max_tokens=50, timeout=30.0
+            )).strip()
+
+            indices = []
+            for num in re.findall(r'\d+', ranking_str):
+                idx = int(num) - 1
+                if 0 <= idx < len(results) and idx not in indices:
+                    indices.append(idx)
+
+            if indices:
+                reranked = [results[i] for i in indices[:top_n]]
+                logger.info(f"Rerank 完成：{len(results)} -> {len(reranked)}")
+                return reranked
+            else:
+                return results[:top_n]
         except Exception as e:
             logger.warning(f"Rerank 失败: {e}")
             return results[:top_n]
@@ -219,12 +257,36 @@ class RAGRetriever:
     def build_context(
         self,
         results: List[Dict[str, Any]],
-        max_chars: int = CONTEXT_CHAR_LIMIT
+        max_chars: int = CONTEXT_CHAR_LIMIT,
+        max_tokens: Optional[int] = None
     ) -> Tuple[str, List[Dict[str, Any]]]:
-        """构建上下文（带字符数熔断器和引用标记）"""
+        """
+        构建上下文（带引用标记）
+
+        PARENT_WINDOW_ENABLED 时先把子分块命中扩展并合并为父窗口（本地读取）。
+        CONTEXT_PACKING_ENABLED 时按 token 预算打包（max_tokens 默认按 Chat 模型取 CONTEXT_TOKEN_BUDGETS），
+        否则按 max_chars 字符数熔断。
+        """
         if not results:
             return "", []
-        
+
+        window_store = self.window_store
+        if window_store is not None:
+            try:
+                results = window_store.expand(results)
+            except Exception as e:
+                logger.warning(f"父窗口扩展失败，使用子分块: {e}")
+
+        if settings.CONTEXT_PACKING_ENABLED:
+            packed, _ = pack_context(results, max_tokens or token_budget_for(self.chat_model))
+            context_parts = [
+                f"[来源{i}] (相关度: {result.get('score', 0):.3f})\n{result.get('text', '')}"
+                for i, result in enumerate(packed, 1)
+            ]
+            used_results = [{**result, "citation_id": i} for i, result in enumerate(packed, 1)]
+            logger.info(f"Context 构建完成：{len(context_parts)} 个片段")
+            return "\n\n---\n\n".join(context_parts), used_results
+
         context_parts = []
         used_results = []
         current_chars = 0
@@ -255,7 +317,7 @@ class RAGRetriever:
         history: Optional[List[Dict[str, str]]] = None,
         summary: Optional[str] = None
     ) -> list:
-        """构建消息列表，支持多轮对话、摘要注入和引用溯源"""
+        """构建消息列表，支持多轮对话、摘要注入和引用溯源（context 应已由调用方压缩）"""
         base_system_prompt = system_prompt or """你是一个专业的教育资料助手。你的主要目标是根据提供的参考资料回答用户的问题。
 
 【重要】引用规则：
@@ -304,31 +366,17 @@ class RAGRetriever:
         history: Optional[List[Dict[str, str]]] = None,
         summary: Optional[str] = None
     ) -> str:
-        """基于上下文生成回答（非流式）"""
+        """基于上下文生成回答（非流式，参考资料先按问题做抽取式压缩）"""
+        context = await acompress_context(query, context)
         messages = self._build_messages(query, context, system_prompt, history, summary)
         logger.info(f"开始生成回答，模型: {self.chat_model}")
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": settings.OPENROUTER_SITE_URL or "",
-                    "X-Title": settings.OPENROUTER_SITE_NAME or "",
-                },
-                json={
-                    "model": self.chat_model,
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": 2000,
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            answer = data["choices"][0]["message"]["content"]
-            logger.info(f"回答生成完成，长度: {len(answer)}")
-            return answer
+        answer = await get_llm_client("openrouter").complete(
+            messages, site="rag.generate_answer", model=self.chat_model,
+            temperature=0.7, max_tokens=2000, timeout=120.0
+        )
+        logger.info(f"回答生成完成，长度: {len(answer)}")
+        return answer
 
     async def generate_answer_stream(
         self,
@@ -338,7 +386,8 @@ class RAGRetriever:
         history: Optional[List[Dict[str, str]]] = None,
         summary: Optional[str] = None
     ):
-        """基于上下文生成回答（流式）"""
+        """基于上下文生成回答（流式，参考资料先按问题做抽取式压缩）"""
+        context = await acompress_context(query, context)
         messages = self._build_messages(query, context, system_prompt, history, summary)
         # 调试日志：确认引用规则是否生效
         if messages and messages[0].get("role") == "system":
@@ -346,38 +395,11 @@ class RAGRetriever:
             has_citation_rule = "[来源" in sys_content or "来源X" in sys_content
             logger.info(f"开始流式生成回答，模型: {self.chat_model}, 引用规则: {'✅' if has_citation_rule else '❌'}")
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                "POST",
-                f"{settings.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": settings.OPENROUTER_SITE_URL or "",
-                    "X-Title": settings.OPENROUTER_SITE_NAME or "",
-                },
-                json={
-                    "model": self.chat_model,
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": 2000,
-                    "stream": True,
-                }
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data_str = line[6:]
-                        if data_str.strip() == "[DONE]":
-                            break
-                        try:
-                            data = json.loads(data_str)
-                            delta = data.get("choices", [{}])[0].get("delta", {})
-                            content = delta.get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
+        async for content in get_llm_client("openrouter").stream(
+            messages, site="rag.generate_answer_stream", model=self.chat_model,
+            temperature=0.7, max_tokens=2000, timeout=120.0
+        ):
+            yield content
 
     def _extract_citations(
         self,
@@ -399,32 +421,27 @@ class RAGRetriever:
                     "citation_id": citation_id,
                     "text_preview": source.get("text", "")[:200] + "...",
                     "score": source.get("score", 0),
-                    "metadata": source.get("metadata", {})
+                    "page": source.get("page", 0),
+                    "metadata": parse_chunk_metadata(source.get("metadata")),
+                    "document": source.get("document", {})
                 })
         return citations
     
-    async def query(
+    async def load_memory(
         self,
-        question: str,
-        top_k: int = 5,
-        filter_expr: Optional[str] = None,
-        system_prompt: Optional[str] = None,
-        history: Optional[List[Dict[str, str]]] = None,
-        user_id: Optional[str] = None,
-        book_id: Optional[str] = None,
-        enable_rerank: bool = RERANK_ENABLED
-    ) -> Dict[str, Any]:
-        """
-        完整的 RAG 查询流程（支持多轮对话、长期记忆、重排序和引用溯源）
-        """
-        # 记忆模块处理
+        user_id: Optional[str],
+        book_id: Optional[str],
+        history: Optional[List[Dict[str, str]]]
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """读取长期记忆（摘要生成按 SUMMARY_BACKGROUND_COMPRESS 放到后台）"""
         compressed_history = history or []
         summary = None
-        
+
         if user_id and book_id and history:
             try:
                 compressed_history, summary = await self.memory.check_and_compress(
-                    user_id=user_id, book_id=book_id, history=history
+                    user_id=user_id, book_id=book_id, history=history,
+                    background=settings.SUMMARY_BACKGROUND_COMPRESS
                 )
                 logger.info(f"记忆处理：{len(history)} -> {len(compressed_history)} 条")
             except Exception as e:
@@ -435,19 +452,177 @@ class RAGRetriever:
                 summary = await self.memory.get_summary(user_id, book_id)
             except Exception as e:
                 logger.warning(f"获取摘要失败: {e}")
+        return compressed_history, summary
 
-        # 1. 查询改写
-        rewritten_query = await self.rewrite_query(question, compressed_history)
+    async def prepare_query(
+        self,
+        question: str,
+        top_k: int,
+        filter_expr: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        user_id: Optional[str] = None,
+        book_id: Optional[str] = None
+    ) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, str]], Optional[str]]:
+        """
+        查询准备：记忆读取与查询改写并发执行
+
+        有历史对话时，改写进行期间先用原问题检索（SPECULATIVE_RETRIEVAL_ENABLED），
+        改写结果与原问题相同或几乎相同时直接复用，否则用改写后的查询重新检索。
+
+        Returns:
+            (改写后的查询, 检索结果, 压缩后的历史, 摘要)
+        """
+        memory_task = asyncio.create_task(self.load_memory(user_id, book_id, history))
+        speculative = None
+        if history and settings.SPECULATIVE_RETRIEVAL_ENABLED:
+            speculative = asyncio.create_task(asyncio.to_thread(self.retrieve, question, top_k, filter_expr))
+
+        try:
+            rewritten_query = await self.rewrite_query(question, history)
+            if speculative is not None and is_same_query(
+                question, rewritten_query, settings.SPECULATIVE_REUSE_SIMILARITY
+            ):
+                results = await speculative
+                logger.info("改写结果与原问题一致，复用预检索结果")
+            else:
+                if speculative is not None:
+                    speculative.cancel()
+                results = await asyncio.to_thread(self.retrieve, rewritten_query, top_k, filter_expr)
+        except BaseException:
+            memory_task.cancel()
+            if speculative is not None:
+                speculative.cancel()
+            raise
+
+        compressed_history, summary = await memory_task
+        return rewritten_query, results, compressed_history, summary
+
+    def scope_filter(
+        self,
+        question: str,
+        filter_expr: Optional[str] = None,
+        scope: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        追加章节范围（scope 如"第三章"，未指定时从问题中识别）
+
+        只检索章节及其子章节的分块；无法解析范围时原样返回。
+        """
+        try:
+            return scoped_filter(filter_expr, scope=scope, question=question)
+        except Exception as e:
+            logger.warning(f"章节范围解析失败，检索整本书: {e}")
+            return filter_expr
+
+    def route_chapters(self, query: str, filter_expr: Optional[str], min_chunks: int = 0) -> Optional[str]:
+        """
+        分层检索：按章节摘要向量选出最相关的章节，只在这些章节内检索分块
+
+        未开启、过滤条件已限定章节或没有章节摘要时原样返回。
+        """
+        chapter_index = self.chapter_index
+        if chapter_index is None:
+            return filter_expr
+        try:
+            return chapter_index.route(filter_expr, self._embed_query(query), min_chunks=min_chunks)
+        except Exception as e:
+            logger.warning(f"章节路由失败，检索整本书: {e}")
+            return filter_expr
+
+    def lookup_answer(
+        self,
+        question: str,
+        filter_expr: Optional[str] = None,
+        top_k: int = 5,
+        intent: str = DEFAULT_INTENT,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[AnswerCacheKey]]:
+        """
+        查询语义回答缓存
 
-        # 2. 检索（包含混合检索）
-        results = self.retrieve(rewritten_query, top_k, filter_expr)
+        有对话历史（回答依赖上下文）或无法从过滤条件确定教材时绕过缓存。
+
+        Returns:
+            (命中时的回答结果, None) 或 (None, 未命中时 store_answer 使用的 key)
+        """
+        cache = self.answer_cache
+        if cache is None:
+            return None, None
+        book_id = extract_book_id(filter_expr)
+        if history or not book_id:
+            cache.bypass()
+            return None, None
+
+        cached, key = cache.lookup(book_id, f"{intent}|{filter_expr}|{top_k}", question, embed=self._embed_query)
+        if cached is None:
+            return None, key
+        return {
+            "answer": cached["answer"],
+            "sources": cached["sources"],
+            "citations": cached["citations"],
+            "has_context": True,
+            "cached": True
+        }, None
+
+    def store_answer(
+        self,
+        key: Optional[AnswerCacheKey],
+        answer: str,
+        sources: List[Dict[str, Any]],
+        citations: List[Dict[str, Any]],
+        summary: Optional[str] = None
+    ) -> None:
+        """写入语义回答缓存（使用了用户对话摘要的回答因人而异，不写入）"""
+        cache = self.answer_cache
+        if cache is None or key is None:
+            return
+        if summary:
+            cache.bypass()
+            return
+        cache.put(key, answer, sources, citations)
+
+    async def query(
+        self,
+        question: str,
+        top_k: int = 5,
+        filter_expr: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        user_id: Optional[str] = None,
+        book_id: Optional[str] = None,
+        enable_rerank: bool = RERANK_ENABLED,
+        rerank_method: Optional[str] = None,
+        intent: str = DEFAULT_INTENT,
+        scope: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        完整的 RAG 查询流程（支持多轮对话、长期记忆、重排序和引用溯源）
+
+        Args:
+            rerank_method: 重排序方式（local / llm），默认使用 RERANK_METHOD
+            intent: 用户意图（语义回答缓存按 教材 + 意图 区分）
+            scope: 章节范围（如"第三章"），未指定时从问题中识别
+        """
+        filter_expr = await asyncio.to_thread(self.scope_filter, question, filter_expr, scope)
+
+        # 0. 语义回答缓存（命中时跳过改写、检索和生成）
+        cached, cache_key = await asyncio.to_thread(self.lookup_answer, question, filter_expr, top_k, intent, history)
+        if cached is not None:
+            return cached
+
+        # 1-2. 记忆读取、查询改写、检索（并发执行）
+        rewritten_query, results, compressed_history, summary = await self.prepare_query(
+            question, top_k, filter_expr, history, user_id, book_id
+        )
 
         # 🚨 【修改点】删除了 if not results 的拦截块
         # 即使 results 为空，也要继续往下执行，进入 LLM 生成环节
 
         # 3. 重排序（可选）
         if enable_rerank and RERANK_ENABLED and results:  # 注意：加了 results 存在的判断防止报错
-            results = await self.rerank(rewritten_query, results, top_n=top_k)
+            results = await self.rerank(
+                rewritten_query, results, top_n=top_k, method=rerank_method, filter_expr=filter_expr
+            )
 
         # 4. 构建上下文（带引用标记）
         context, used_sources = self.build_context(results)
@@ -460,6 +635,7 @@ class RAGRetriever:
 
         # 6. 提取回答中的引用
         citations = self._extract_citations(answer, used_sources)
+        self.store_answer(cache_key, answer, used_sources, citations, summary)
 
         return {
             "answer": answer,
@@ -3,8 +3,10 @@ RAG Workflow 模块
 使用 LlamaIndex Workflows 实现事件驱动的 RAG 流程
 """
 
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import time
+from typing import AsyncIterator, List, Dict, Any, Optional, Union
 from dataclasses import dataclass
 
 from llama_index.core.workflow import (
@@ -20,7 +22,8 @@ from config import settings
 from .vector_store import VectorStore
 from .document_processor import get_embedding_model
 from .conversation_memory import get_memory
-from .rag_retriever import RAGRetriever, RERANK_ENABLED, RERANK_TOP_N, CONTEXT_CHAR_LIMIT
+from .answer_cache import AnswerCacheKey, stream_cached_answer
+from .rag_retriever import RAGRetriever, RERANK_ENABLED, RERANK_TOP_N, CONTEXT_CHAR_LIMIT, DEFAULT_INTENT
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +40,9 @@ class QueryRewriteEvent(Event):
     filter_expr: Optional[str] = None
     top_k: int = 5
     enable_rerank: bool = True
+    rerank_method: Optional[str] = None
+    results: Optional[List[Dict[str, Any]]] = None  # 查询准备阶段的检索结果
+    cache_key: Optional[AnswerCacheKey] = None  # 回答缓存未命中时用于写入
 
 
 @dataclass
@@ -47,7 +53,10 @@ class RetrievalEvent(Event):
     results: List[Dict[str, Any]]
     history: Optional[List[Dict[str, str]]] = None
     summary: Optional[str] = None
+    filter_expr: Optional[str] = None
     enable_rerank: bool = True
+    rerank_method: Optional[str] = None
+    cache_key: Optional[AnswerCacheKey] = None
 
 
 @dataclass
@@ -58,6 +67,7 @@ class RerankEvent(Event):
     results: List[Dict[str, Any]]
     history: Optional[List[Dict[str, str]]] = None
     summary: Optional[str] = None
+    cache_key: Optional[AnswerCacheKey] = None
 
 
 @dataclass
@@ -68,6 +78,7 @@ class ContextBuiltEvent(Event):
     sources: List[Dict[str, Any]]
     history: Optional[List[Dict[str, str]]] = None
     summary: Optional[str] = None
+    cache_key: Optional[AnswerCacheKey] = None
 
 
 @dataclass
@@ -93,8 +104,8 @@ class RAGWorkflow(Workflow):
         logger.info("RAGWorkflow 初始化完成")
     
     @step
-    async def rewrite_query(self, ctx: Context, ev: StartEvent) -> QueryRewriteEvent:
-        """步骤1: 查询改写"""
+    async def rewrite_query(self, ctx: Context, ev: StartEvent) -> Union[QueryRewriteEvent, StopEvent]:
+        """步骤1: 查询改写（与记忆读取、检索并发），语义回答缓存命中时直接结束"""
         query = ev.query
         history = getattr(ev, 'history', None)
         user_id = getattr(ev, 'user_id', None)
@@ -102,28 +113,24 @@ class RAGWorkflow(Workflow):
         filter_expr = getattr(ev, 'filter_expr', None)
         top_k = getattr(ev, 'top_k', 5)
         enable_rerank = getattr(ev, 'enable_rerank', RERANK_ENABLED)
+        rerank_method = getattr(ev, 'rerank_method', None)
+        intent = getattr(ev, 'intent', DEFAULT_INTENT)
+        scope = getattr(ev, 'scope', None)
+
+        # 章节范围（如"第三章"）限定到章节子树
+        filter_expr = await asyncio.to_thread(self.retriever.scope_filter, query, filter_expr, scope)
+
+        cached, cache_key = await asyncio.to_thread(
+            self.retriever.lookup_answer, query, filter_expr, top_k, intent, history
+        )
+        if cached is not None:
+            logger.info(f"[Workflow] 回答缓存命中: '{query[:30]}...'")
+            return StopEvent(result=cached)
         
-        # 处理记忆
-        compressed_history = history or []
-        summary = None
-        
-        if user_id and book_id and history:
-            try:
-                compressed_history, summary = await self.retriever.memory.check_and_compress(
-                    user_id=user_id, book_id=book_id, history=history
-                )
-                logger.info(f"[Workflow] 记忆处理：{len(history)} -> {len(compressed_history)} 条")
-            except Exception as e:
-                logger.error(f"[Workflow] 记忆处理失败: {e}")
-                compressed_history = history
-        elif user_id and book_id:
-            try:
-                summary = await self.retriever.memory.get_summary(user_id, book_id)
-            except Exception as e:
-                logger.warning(f"[Workflow] 获取摘要失败: {e}")
-        
-        # 改写查询
-        rewritten = await self.retriever.rewrite_query(query, compressed_history)
+        # 记忆读取与查询改写并发执行，改写期间用原问题预检索
+        rewritten, results, compressed_history, summary = await self.retriever.prepare_query(
+            query, top_k, filter_expr, history, user_id, book_id
+        )
         logger.info(f"[Workflow] 查询改写完成: '{query[:30]}...' -> '{rewritten[:30]}...'")
         
         return QueryRewriteEvent(
@@ -133,17 +140,22 @@ class RAGWorkflow(Workflow):
             summary=summary,
             filter_expr=filter_expr,
             top_k=top_k,
-            enable_rerank=enable_rerank
+            enable_rerank=enable_rerank,
+            rerank_method=rerank_method,
+            results=results,
+            cache_key=cache_key
         )
     
     @step
     async def retrieve(self, ctx: Context, ev: QueryRewriteEvent) -> RetrievalEvent:
-        """步骤2: 向量检索"""
-        results = self.retriever.retrieve(
-            query=ev.rewritten_query,
-            top_k=ev.top_k,
-            filter_expr=ev.filter_expr
-        )
+        """步骤2: 向量检索（查询准备阶段已检索时直接使用）"""
+        results = ev.results
+        if results is None:
+            results = self.retriever.retrieve(
+                query=ev.rewritten_query,
+                top_k=ev.top_k,
+                filter_expr=ev.filter_expr
+            )
         logger.info(f"[Workflow] 检索完成: 找到 {len(results)} 个片段")
         
         return RetrievalEvent(
@@ -152,7 +164,10 @@ class RAGWorkflow(Workflow):
             results=results,
             history=ev.history,
             summary=ev.summary,
-            enable_rerank=ev.enable_rerank
+            filter_expr=ev.filter_expr,
+            enable_rerank=ev.enable_rerank,
+            rerank_method=ev.rerank_method,
+            cache_key=ev.cache_key
         )
 
     @step
@@ -164,7 +179,9 @@ class RAGWorkflow(Workflow):
             results = await self.retriever.rerank(
                 query=ev.rewritten_query,
                 results=results,
-                top_n=RERANK_TOP_N
+                top_n=RERANK_TOP_N,
+                method=ev.rerank_method,
+                filter_expr=ev.filter_expr
             )
             logger.info(f"[Workflow] 重排序完成: {len(ev.results)} -> {len(results)}")
         else:
@@ -175,7 +192,8 @@ class RAGWorkflow(Workflow):
             rewritten_query=ev.rewritten_query,
             results=results,
             history=ev.history,
-            summary=ev.summary
+            summary=ev.summary,
+            cache_key=ev.cache_key
         )
 
     @step
@@ -192,7 +210,8 @@ class RAGWorkflow(Workflow):
             context=context,
             sources=sources,
             history=ev.history,
-            summary=ev.summary
+            summary=ev.summary,
+            cache_key=ev.cache_key
         )
 
     @step
@@ -208,6 +227,7 @@ class RAGWorkflow(Workflow):
 
         # 提取引用
         citations = self.retriever._extract_citations(answer, ev.sources)
+        self.retriever.store_answer(ev.cache_key, answer, ev.sources, citations, ev.summary)
         logger.info(f"[Workflow] 回答生成完成: {len(answer)} 字符, {len(citations)} 个引用")
 
         return StopEvent(result={
@@ -232,8 +252,8 @@ class RAGStreamWorkflow(Workflow):
         logger.info("RAGStreamWorkflow 初始化完成")
 
     @step
-    async def rewrite_query(self, ctx: Context, ev: StartEvent) -> QueryRewriteEvent:
-        """步骤1: 查询改写"""
+    async def rewrite_query(self, ctx: Context, ev: StartEvent) -> Union[QueryRewriteEvent, StopEvent]:
+        """步骤1: 查询改写（与记忆读取、检索并发），语义回答缓存命中时直接结束"""
         query = ev.query
         history = getattr(ev, 'history', None)
         user_id = getattr(ev, 'user_id', None)
@@ -241,25 +261,23 @@ class RAGStreamWorkflow(Workflow):
         filter_expr = getattr(ev, 'filter_expr', None)
         top_k = getattr(ev, 'top_k', 5)
         enable_rerank = getattr(ev, 'enable_rerank', RERANK_ENABLED)
+        rerank_method = getattr(ev, 'rerank_method', None)
+        intent = getattr(ev, 'intent', DEFAULT_INTENT)
+        scope = getattr(ev, 'scope', None)
 
-        compressed_history = history or []
-        summary = None
-
-        if user_id and book_id and history:
-            try:
-                compressed_history, summary = await self.retriever.memory.check_and_compress(
-                    user_id=user_id, book_id=book_id, history=history
-                )
-            except Exception as e:
-                logger.error(f"[StreamWorkflow] 记忆处理失败: {e}")
-                compressed_history = history
-        elif user_id and book_id:
-            try:
-                summary = await self.retriever.memory.get_summary(user_id, book_id)
-            except Exception as e:
-                logger.warning(f"[StreamWorkflow] 获取摘要失败: {e}")
-
-        rewritten = await self.retriever.rewrite_query(query, compressed_history)
+        # 章节范围（如"第三章"）限定到章节子树
+        filter_expr = await asyncio.to_thread(self.retriever.scope_filter, query, filter_expr, scope)
+
+        cached, cache_key = await asyncio.to_thread(
+            self.retriever.lookup_answer, query, filter_expr, top_k, intent, history
+        )
+        if cached is not None:
+            # 缓存的回答由路由层按小块流式输出（stream_cached_answer）
+            return StopEvent(result={**cached, "query": query, "retriever": self.retriever})
+
+        rewritten, results, compressed_history, summary = await self.retriever.prepare_query(
+            query, top_k, filter_expr, history, user_id, book_id
+        )
 
         return QueryRewriteEvent(
             original_query=query,
@@ -268,17 +286,22 @@ class RAGStreamWorkflow(Workflow):
             summary=summary,
             filter_expr=filter_expr,
             top_k=top_k,
-            enable_rerank=enable_rerank
+            enable_rerank=enable_rerank,
+            rerank_method=rerank_method,
+            results=results,
+            cache_key=cache_key
         )
 
     @step
     async def retrieve(self, ctx: Context, ev: QueryRewriteEvent) -> RetrievalEvent:
-        """步骤2: 向量检索"""
-        results = self.retriever.retrieve(
-            query=ev.rewritten_query,
-            top_k=ev.top_k,
-            filter_expr=ev.filter_expr
-        )
+        """步骤2: 向量检索（查询准备阶段已检索时直接使用）"""
+        results = ev.results
+        if results is None:
+            results = self.retriever.retrieve(
+                query=ev.rewritten_query,
+                top_k=ev.top_k,
+                filter_expr=ev.filter_expr
+            )
 
         return RetrievalEvent(
             original_query=ev.original_query,
@@ -286,7 +309,10 @@ class RAGStreamWorkflow(Workflow):
             results=results,
             history=ev.history,
             summary=ev.summary,
-            enable_rerank=ev.enable_rerank
+            filter_expr=ev.filter_expr,
+            enable_rerank=ev.enable_rerank,
+            rerank_method=ev.rerank_method,
+            cache_key=ev.cache_key
         )
 
     @step
@@ -298,7 +324,9 @@ class RAGStreamWorkflow(Workflow):
             results = await self.retriever.rerank(
                 query=ev.rewritten_query,
                 results=results,
-                top_n=RERANK_TOP_N
+                top_n=RERANK_TOP_N,
+                method=ev.rerank_method,
+                filter_expr=ev.filter_expr
             )
 
         return RerankEvent(
@@ -306,7 +334,8 @@ class RAGStreamWorkflow(Workflow):
             rewritten_query=ev.rewritten_query,
             results=results,
             history=ev.history,
-            summary=ev.summary
+            summary=ev.summary,
+            cache_key=ev.cache_key
         )
 
     @step
@@ -322,7 +351,8 @@ class RAGStreamWorkflow(Workflow):
             context=context,
             sources=sources,
             history=ev.history,
-            summary=ev.summary
+            summary=ev.summary,
+            cache_key=ev.cache_key
         )
 
     @step
@@ -335,6 +365,7 @@ class RAGStreamWorkflow(Workflow):
             "sources": ev.sources,
             "history": ev.history,
             "summary": ev.summary,
+            "cache_key": ev.cache_key,  # 流式生成结束后用于写入回答缓存
             "retriever": self.retriever  # 传递 retriever 用于流式生成
         })
 
@@ -410,3 +441,66 @@ def get_rag_stream_workflow() -> RAGStreamWorkflow:
         _rag_stream_workflow = RAGStreamWorkflow(timeout=120, verbose=False)
     return _rag_stream_workflow
 
+
+# ============ 流式问答 ============
+
+async def run_rag_stream(
+    query: str,
+    top_k: int = 5,
+    filter_expr: Optional[str] = None,
+    history: Optional[List[Dict[str, str]]] = None,
+    user_id: Optional[str] = None,
+    book_id: Optional[str] = None,
+    intent: str = DEFAULT_INTENT,
+    workflow: Optional[RAGStreamWorkflow] = None,
+    scope: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    轻量 RAG 流式问答（检索 -> 构建上下文 -> 流式生成），不经过 Deep Agent
+
+    scope 为章节范围（如"第三章"），未指定时从问题中识别。
+
+    产出的事件（event_type）：
+    - retrieved: 检索和上下文构建完成（来源数量、耗时、是否命中回答缓存）
+    - token: 回答片段
+    - citations: 回答结束后提取的引用
+    """
+    workflow = workflow or get_rag_stream_workflow()
+    start = time.perf_counter()
+    result = await workflow.run(
+        query=query,
+        top_k=top_k,
+        filter_expr=filter_expr,
+        history=history,
+        user_id=user_id,
+        book_id=book_id,
+        intent=intent,
+        scope=scope
+    )
+    retriever = result["retriever"]
+    sources = result["sources"]
+    cached = bool(result.get("cached"))
+    yield {
+        "event_type": "retrieved",
+        "sources": len(sources),
+        "cached": cached,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+    if cached:
+        async for chunk in stream_cached_answer(result["answer"]):
+            yield {"event_type": "token", "content": chunk}
+        citations = result["citations"]
+    else:
+        parts = []
+        async for chunk in retriever.generate_answer_stream(
+            query, result["context"], None, result["history"], result["summary"]
+        ):
+            parts.append(chunk)
+            yield {"event_type": "token", "content": chunk}
+        answer = "".join(parts)
+        citations = retriever._extract_citations(answer, sources)
+        retriever.store_answer(result["cache_key"], answer, sources, citations, result["summary"])
+        logger.info(f"[RAG Stream] 回答生成完成: {len(answer)} 字符, {len(citations)} 个引用")
+
+    yield {"event_type": "citations", "citations": citations}
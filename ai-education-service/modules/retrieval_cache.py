@@ -0,0 +1,234 @@
+"""
+检索结果缓存模块
+缓存 VectorStore.search 的结果，进程内 LRU + 可选 Redis 二级缓存
+
+- Key: 查询向量量化后的哈希 + filter_expr + top_k + output_fields + 版本号
+- 版本号: 每本书一个计数器，入库 / 删除时递增，旧条目自然失效（O(1) 失效，无需扫描）
+- 统计: 命中率、命中/未命中平均延迟、估算节省的延迟
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from .local_vector_store import parse_filter
+
+logger = logging.getLogger(__name__)
+
+# 版本计数器作用域
+# _global: 无法确定教材的变更（如按 ID 删除）递增，所有按书缓存的条目随之失效
+# _any: 任意变更都递增，用于不带 book_id 过滤的检索
+GLOBAL_SCOPE = "_global"
+ANY_SCOPE = "_any"
+
+_KEY_PREFIX = "retrieval"
+
+
+def quantize_embedding(query_embedding: List[float], step: float) -> bytes:
+    """归一化后按 step 量化，数值噪声级别的差异映射到同一个 key"""
+    vector = np.asarray(query_embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector = vector / norm
+    return np.round(vector / step).astype(np.int32).tobytes()
+
+
+class RetrievalCache:
+    """检索结果缓存（按书版本号失效）"""
+
+    def __init__(
+        self,
+        redis_client=None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[int] = None,
+        quant_step: Optional[float] = None
+    ):
+        """
+        Args:
+            redis_client: 可选的 Redis 客户端（decode_responses=True），None 时仅使用进程内缓存
+            max_entries: 进程内 LRU 条目上限，默认使用 RETRIEVAL_CACHE_MAX_ENTRIES
+            ttl: 条目过期时间（秒），默认使用 RETRIEVAL_CACHE_TTL
+            quant_step: 向量量化步长，默认使用 RETRIEVAL_CACHE_QUANT_STEP
+        """
+        self.redis = redis_client
+        self.max_entries = max_entries or settings.RETRIEVAL_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.RETRIEVAL_CACHE_TTL
+        self.quant_step = quant_step or settings.RETRIEVAL_CACHE_QUANT_STEP
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (过期时间, JSON)
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self._hit_ms = 0.0
+        self._miss_ms = 0.0
+
+    # ============ 版本号 ============
+
+    def _get_versions(self, scopes: List[str]) -> List[int]:
+        if self.redis is not None:
+            try:
+                values = self.redis.mget([f"{_KEY_PREFIX}:ver:{s}" for s in scopes])
+                return [int(v or 0) for v in values]
+            except Exception as e:
+                logger.warning(f"Redis 读取检索缓存版本失败，使用进程内版本: {e}")
+        with self._lock:
+            return [self._versions.get(s, 0) for s in scopes]
+
+    def bump(self, book_id: Optional[str] = None) -> None:
+        """
+        使一本书的缓存失效（递增版本号）
+
+        book_id 为空时表示无法确定影响范围，使全部缓存失效。
+        """
+        scopes = [book_id or GLOBAL_SCOPE, ANY_SCOPE]
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                for scope in scopes:
+                    pipe.incr(f"{_KEY_PREFIX}:ver:{scope}")
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Redis 递增检索缓存版本失败: {e}")
+        logger.info(f"检索缓存失效: book_id={book_id or '全部'}")
+
+    def bump_by_filter(self, filter_expr: Optional[str]) -> None:
+        """按过滤条件失效（只能解析出 book_id 时精确失效，否则全部失效）"""
+        try:
+            book_id = parse_filter(filter_expr).get("book_id")
+        except ValueError:
+            book_id = None
+        self.bump(book_id)
+
+    # ============ 读写 ============
+
+    def make_key(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filter_expr: Optional[str],
+        output_fields: Optional[List[str]] = None
+    ) -> str:
+        """生成缓存 key（包含当前版本号）"""
+        try:
+            book_id = parse_filter(filter_expr).get("book_id")
+        except ValueError:
+            book_id = None
+
+        if book_id:
+            version = ".".join(map(str, self._get_versions([GLOBAL_SCOPE, book_id])))
+        else:
+            version = str(self._get_versions([ANY_SCOPE])[0])
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(quantize_embedding(query_embedding, self.quant_step))
+        digest.update(f"|{filter_expr or ''}|{top_k}|{','.join(output_fields or ['*'])}".encode("utf-8"))
+        return f"{_KEY_PREFIX}:{book_id or ANY_SCOPE}:{version}:{digest.hexdigest()}"
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """读取缓存（返回新的对象，调用方可以修改）"""
+        start = time.perf_counter()
+        payload = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._entries.move_to_end(key)
+                    payload = entry[1]
+                else:
+                    del self._entries[key]
+
+        if payload is None and self.redis is not None:
+            try:
+                payload = self.redis.get(key)
+            except Exception as e:
+                logger.warning(f"Redis 读取检索缓存失败: {e}")
+            if payload is not None:
+                self._put_local(key, payload)
+
+        if payload is None:
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._hit_ms += (time.perf_counter() - start) * 1000
+        return json.loads(payload)
+
+    def set(self, key: str, results: List[Dict[str, Any]], elapsed_ms: float) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: make_key 生成的 key
+            results: 检索结果
+            elapsed_ms: 本次未命中的实际检索耗时（用于估算节省的延迟）
+        """
+        with self._lock:
+            self.misses += 1
+            self._miss_ms += elapsed_ms
+
+        payload = json.dumps(results, ensure_ascii=False)
+        self._put_local(key, payload)
+        if self.redis is not None:
+            try:
+                self.redis.setex(key, self.ttl, payload)
+            except Exception as e:
+                logger.warning(f"Redis 写入检索缓存失败: {e}")
+
+    def _put_local(self, key: str, payload: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            avg_hit = self._hit_ms / self.hits if self.hits else 0.0
+            avg_miss = self._miss_ms / self.misses if self.misses else 0.0
+            return {
+                "entries": len(self._entries),
+                "backend": "redis+memory" if self.redis is not None else "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "avg_hit_ms": round(avg_hit, 3),
+                "avg_miss_ms": round(avg_miss, 3),
+                "saved_ms": round(max(avg_miss - avg_hit, 0.0) * self.hits, 1),
+            }
+
+
+# ============ 工厂函数 ============
+
+_retrieval_cache: Optional[RetrievalCache] = None
+
+
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """获取 RetrievalCache 单例（未启用时返回 None）"""
+    global _retrieval_cache
+    if not settings.RETRIEVAL_CACHE_ENABLED:
+        return None
+    if _retrieval_cache is None:
+        redis_client = None
+        if settings.REDIS_URL:
+            try:
+                import redis
+                redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+            except Exception as e:
+                logger.warning(f"Redis 连接失败，检索缓存仅使用内存: {e}")
+        _retrieval_cache = RetrievalCache(redis_client=redis_client)
+        logger.info(f"检索结果缓存初始化完成，后端: {'redis+memory' if redis_client else 'memory'}")
+    return _retrieval_cache
@@ -0,0 +1,129 @@
+"""
+两阶段（Matryoshka）检索模块
+第一阶段在低维本地索引中取 top-N 候选，第二阶段用完整维度向量在 NumPy 中精确重排
+
+- 低维向量取完整向量的前 TWO_STAGE_DIMENSION 维并重新归一化（Matryoshka 表示的前缀即低维表示）
+- 低维索引为 float16 本地存储（512 维约 1KB/向量，仅为 2048 维 float32 的 1/8）
+- 完整向量来源: DashVector fetch 或本地 float16 存储（TWO_STAGE_RESCORE_SOURCE）
+"""
+
+import logging
+from typing import Callable, Dict, List, Any, Optional
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from config import settings
+from .local_vector_store import get_shared_local_store
+from .vector_store import InsertReport, project_fields
+
+logger = logging.getLogger(__name__)
+
+# 完整向量获取函数: (ids, filter_expr) -> {id: {"vector": ..., "fields": ...}}
+FullVectorFetcher = Callable[[List[str], Optional[str]], Dict[str, Dict[str, Any]]]
+
+# 低维索引保存的过滤字段（与 parse_filter 支持的字段一致，章节范围检索也能命中低维索引）
+COARSE_FIELDS = ("book_id", "resource_id", "chapter_id")
+
+
+def truncate_embedding(embedding: List[float], dimension: int) -> List[float]:
+    """截取向量前缀并 L2 归一化"""
+    prefix = np.asarray(embedding[:dimension], dtype=np.float32)
+    norm = np.linalg.norm(prefix)
+    return (prefix / norm if norm > 0 else prefix).tolist()
+
+
+class TwoStageSearcher:
+    """低维候选 + 完整维度精确重排"""
+
+    def __init__(
+        self,
+        fetch_full: FullVectorFetcher,
+        base_dir: Optional[str] = None,
+        dimension: Optional[int] = None,
+        candidates: Optional[int] = None
+    ):
+        """
+        Args:
+            fetch_full: 按 ID 获取完整维度向量和字段的函数
+            base_dir: 低维索引目录，默认使用 TWO_STAGE_INDEX_DIR
+            dimension: 第一阶段维度，默认使用 TWO_STAGE_DIMENSION
+            candidates: 第一阶段候选数量，默认使用 TWO_STAGE_CANDIDATES
+        """
+        self.fetch_full = fetch_full
+        self.dimension = dimension or settings.TWO_STAGE_DIMENSION
+        self.candidates = candidates or settings.TWO_STAGE_CANDIDATES
+        # 多个 VectorStore 实例共享同一低维索引实例
+        self.coarse = get_shared_local_store(
+            base_dir or settings.TWO_STAGE_INDEX_DIR,
+            dtype="float16",
+            dimension=self.dimension
+        )
+        logger.info(f"两阶段检索初始化完成，第一阶段 {self.dimension} 维，候选 {self.candidates} 个")
+
+    def insert(self, nodes: List[TextNode]) -> InsertReport:
+        """写入低维索引（只保存 ID 和过滤字段，不保存正文）"""
+        light_nodes = [
+            TextNode(
+                id_=node.node_id,
+                text="",
+                embedding=truncate_embedding(node.embedding, self.dimension),
+                metadata={name: node.metadata.get(name, "") for name in COARSE_FIELDS},
+            )
+            for node in nodes if node.embedding is not None
+        ]
+        return self.coarse.insert(light_nodes)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filter_expr: Optional[str] = None,
+        output_fields: Optional[List[str]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        两阶段检索
+
+        低维索引不支持该过滤条件或没有候选（教材尚未建立低维索引）时返回 None，由调用方回退到单阶段检索。
+        """
+        try:
+            coarse_hits = self.coarse.search(
+                truncate_embedding(query_embedding, self.dimension),
+                top_k=max(self.candidates, top_k),
+                filter_expr=filter_expr,
+                output_fields=[]
+            )
+        except ValueError:
+            return None
+        if not coarse_hits:
+            return None
+
+        full = self.fetch_full([hit["id"] for hit in coarse_hits], filter_expr)
+        ids = [hit["id"] for hit in coarse_hits if hit["id"] in full]
+        if not ids:
+            return None
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        matrix = np.stack([full[doc_id]["vector"] for doc_id in ids]).astype(np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        scores = matrix @ query
+        order = np.argsort(-scores, kind="stable")[:top_k]
+
+        return [
+            {
+                "id": ids[i],
+                "score": float(scores[i]),
+                **project_fields(full[ids[i]]["fields"], output_fields),
+            }
+            for i in order
+        ]
+
+    def delete(self, ids: List[str]) -> bool:
+        return self.coarse.delete(ids)
+
+    def delete_by_filter(self, filter_expr: str) -> bool:
+        return self.coarse.delete_by_filter(filter_expr)
@@ -3,10 +3,21 @@
 集成阿里云 DashVector 进行向量存储和检索
 """
 
+import ast
+import hashlib
+import json
 import logging
-from typing import List, Dict, Any, Optional
+import re
+import threading
+import time
+import weakref
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
 from tenacity import retry, stop_after_attempt, wait_exponential
 import dashvector
+import numpy as np
 
 from llama_index.core.schema import TextNode
 
@@ -14,6 +25,276 @@ from config import settings
 
 logger = logging.getLogger(__name__)
 
+# DashVector 单次查询返回的最大条数
+DASHVECTOR_MAX_TOPK = 1024
+
+# 倒数排名融合（RRF）常数
+RRF_K = 60
+
+# 进程内的分块向量缓存（如本地重排序），任意向量存储实例写入 / 删除时同步失效
+_vector_caches: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def register_vector_cache(cache) -> None:
+    """
+    注册分块向量缓存
+
+    cache 需实现 bump(book_id) / bump_by_filter(filter_expr) / invalidate(ids)。
+    入库管道和检索器使用不同的向量存储实例，因此注册到模块级集合而不是单个实例。
+    """
+    _vector_caches.add(cache)
+
+
+def vector_caches() -> List[Any]:
+    """已注册的分块向量缓存"""
+    return list(_vector_caches)
+
+
+# 分块字段 schema（DashVector 原生类型字段，可直接用于过滤和投影）
+# 创建 collection 时作为 fields_schema 传入；metadata 为其余分块级元数据的紧凑 JSON
+CHUNK_FIELDS_SCHEMA: Dict[str, type] = {
+    "text": str,
+    "book_id": str,
+    "resource_id": str,
+    "chapter_id": str,
+    "page": int,
+    "doc_type": str,
+    "doc_ref": str,
+    "metadata": str,
+}
+
+# 字段缺省值（page=0 表示页码未知）
+CHUNK_FIELD_DEFAULTS: Dict[str, Any] = {
+    "text": "",
+    "book_id": "",
+    "resource_id": "",
+    "chapter_id": "",
+    "page": 0,
+    "doc_type": "",
+    "doc_ref": "",
+    "metadata": "{}",
+}
+
+# 页码可能出现的元数据键（PDFReader 使用 page_label）
+_PAGE_KEYS = ("page", "page_number", "page_label")
+# 文档类型可能出现的元数据键（与 document_workflow 一致）
+_DOC_TYPE_KEYS = ("doc_type", "document_type", "type")
+
+
+def parse_page(metadata: Dict[str, Any]) -> int:
+    """解析分块页码（未知时返回 0）"""
+    for key in _PAGE_KEYS:
+        value = metadata.get(key)
+        if value is None:
+            continue
+        try:
+            return int(str(value).strip())
+        except ValueError:
+            continue
+    return 0
+
+
+def build_chunk_fields(text: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将节点元数据拆分为原生类型字段 + 紧凑 JSON 元数据
+
+    原生字段（book_id、resource_id、chapter_id、page、doc_type、doc_ref）不再重复写入 metadata。
+    """
+    doc_type = next((metadata[k] for k in _DOC_TYPE_KEYS if metadata.get(k)), "")
+    native_keys = {"book_id", "resource_id", "chapter_id", "doc_ref", *_PAGE_KEYS, *_DOC_TYPE_KEYS}
+    extra = {
+        key: value for key, value in metadata.items()
+        if key not in native_keys and value is not None
+    }
+    return {
+        "text": text,
+        "book_id": str(metadata.get("book_id") or ""),
+        "resource_id": str(metadata.get("resource_id") or ""),
+        "chapter_id": str(metadata.get("chapter_id") or ""),
+        "page": parse_page(metadata),
+        "doc_type": str(doc_type),
+        "doc_ref": str(metadata.get("doc_ref") or ""),
+        "metadata": json.dumps(extra, ensure_ascii=False, separators=(",", ":"), default=str),
+    }
+
+
+def project_fields(
+    fields: Dict[str, Any],
+    output_fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    按 output_fields 投影字段（None 表示返回全部字段，缺失字段使用缺省值）
+    """
+    names = CHUNK_FIELDS_SCHEMA if output_fields is None else output_fields
+    return {
+        name: fields.get(name, CHUNK_FIELD_DEFAULTS[name])
+        for name in names if name in CHUNK_FIELD_DEFAULTS
+    }
+
+
+def parse_chunk_metadata(raw: Any) -> Dict[str, Any]:
+    """
+    解析检索结果中的 metadata 字段
+
+    兼容新格式（JSON）和旧数据（str(dict) 写入的 Python repr）。
+    """
+    if isinstance(raw, dict):
+        return raw
+    if not raw:
+        return {}
+    try:
+        value = json.loads(raw)
+    except (TypeError, ValueError):
+        try:
+            value = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]],
+    top_k: Optional[int] = None,
+    k: int = RRF_K,
+    weights: Optional[List[float]] = None
+) -> List[Dict[str, Any]]:
+    """
+    倒数排名融合（按 id 去重）
+
+    每个结果的 rrf_score = Σ weight / (k + rank)，score 保留各路中的最高原始分数。
+
+    Args:
+        result_lists: 多路检索结果（每路按相关度降序）
+        top_k: 返回数量，默认返回全部
+        k: RRF 常数
+        weights: 每路的权重，默认均为 1
+
+    Returns:
+        按 rrf_score 降序的融合结果
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results, weight in zip(result_lists, weights or [1.0] * len(result_lists)):
+        for rank, item in enumerate(results, 1):
+            entry = fused.get(item["id"])
+            if entry is None:
+                entry = fused[item["id"]] = {**item, "rrf_score": 0.0}
+            elif item.get("score", 0) > entry.get("score", 0):
+                entry["score"] = item["score"]
+            entry["rrf_score"] += weight / (k + rank)
+
+    ranked = sorted(fused.values(), key=lambda x: x["rrf_score"], reverse=True)
+    return ranked[:top_k] if top_k else ranked
+
+
+# ============ 分区路由 ============
+
+# DashVector 分区名限制: 3-32 个字符（字母、数字、下划线、连字符）
+_PARTITION_NAME = re.compile(r"^[A-Za-z0-9_\-]{1,27}$")
+_BOOK_CLAUSE = re.compile(r"\bbook_id\s*=\s*'([^']*)'")
+# 章节范围条件: chapter_id = 'c1' 或 (chapter_id = 'c1' or chapter_id = 'c2' ...)
+_CHAPTER_CLAUSE = re.compile(
+    r"\(\s*chapter_id\s*=\s*'[^']*'(?:\s+or\s+chapter_id\s*=\s*'[^']*')*\s*\)|\bchapter_id\s*=\s*'[^']*'",
+    flags=re.IGNORECASE
+)
+DEFAULT_PARTITION = "default"
+
+
+def partition_name(
+    book_id: Optional[str],
+    mode: Optional[str] = None,
+    buckets: Optional[int] = None
+) -> Optional[str]:
+    """
+    计算教材所在的分区
+
+    Args:
+        book_id: 教材 ID
+        mode: "none"（不分区）、"book"（每本书一个分区）、"bucket"（按哈希分桶），默认使用配置
+        buckets: 分桶数量，默认使用 DASHVECTOR_PARTITION_BUCKETS
+
+    Returns:
+        分区名，不分区或没有 book_id 时返回 None（默认分区）
+    """
+    mode = (mode or settings.DASHVECTOR_PARTITION_MODE).lower()
+    if not book_id or mode == "none":
+        return None
+    if mode == "bucket":
+        buckets = buckets or settings.DASHVECTOR_PARTITION_BUCKETS
+        return f"bucket_{zlib.crc32(book_id.encode('utf-8')) % buckets:04d}"
+    if _PARTITION_NAME.match(book_id):
+        return f"book_{book_id}"
+    return "book_" + hashlib.md5(book_id.encode("utf-8")).hexdigest()[:24]
+
+
+def extract_book_id(filter_expr: Optional[str]) -> Optional[str]:
+    """
+    从过滤表达式中提取 book_id 等值条件
+
+    仅处理纯 and 连接的表达式（含 or / 括号时无法确定范围，返回 None）。
+    """
+    if not filter_expr:
+        return None
+    # 章节范围条件内部的 or 不影响教材范围
+    if re.search(r"\bor\b|\(", _CHAPTER_CLAUSE.sub("", filter_expr), flags=re.IGNORECASE):
+        return None
+    matches = _BOOK_CLAUSE.findall(filter_expr)
+    return matches[0] if len(set(matches)) == 1 else None
+
+
+def strip_book_clause(filter_expr: str) -> Optional[str]:
+    """去掉过滤表达式中的 book_id 条件（每本书独立分区时不再需要标量过滤）"""
+    clauses = re.split(r"\s+and\s+", filter_expr.strip(), flags=re.IGNORECASE)
+    rest = [c for c in clauses if not _BOOK_CLAUSE.fullmatch(c.strip())]
+    return " and ".join(rest) or None
+
+
+def chapter_scope_filter(filter_expr: Optional[str], chapter_ids: Optional[List[str]]) -> Optional[str]:
+    """
+    在过滤表达式上追加章节范围条件（多个章节用括号内的 or 连接，DashVector 原生支持）
+
+    chapter_ids 为空时原样返回。
+    """
+    ids = list(dict.fromkeys(c for c in chapter_ids or [] if c))
+    if not ids:
+        return filter_expr
+    clause = " or ".join(f"chapter_id = '{c}'" for c in ids)
+    clause = f"({clause})" if len(ids) > 1 else clause
+    return f"{filter_expr} and {clause}" if filter_expr else clause
+
+
+def strip_chapter_clause(filter_expr: Optional[str]) -> Optional[str]:
+    """去掉过滤表达式中的章节范围条件（章节范围内没有结果时回退到整本书）"""
+    if not filter_expr:
+        return filter_expr
+    clauses = re.split(r"\s+and\s+", filter_expr.strip(), flags=re.IGNORECASE)
+    rest = [c for c in clauses if not _CHAPTER_CLAUSE.fullmatch(c.strip())]
+    return " and ".join(rest) or None
+
+
+class VectorStoreError(Exception):
+    """向量存储操作失败"""
+
+
+@dataclass
+class InsertReport:
+    """向量写入报告"""
+    total: int = 0
+    inserted: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        return not self.failed_ids
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "inserted": self.inserted,
+            "failed_ids": self.failed_ids,
+            "errors": self.errors,
+        }
+
 
 class VectorStore:
     """DashVector 向量存储"""
@@ -27,6 +308,42 @@ class VectorStore:
         self.collection_name = settings.DASHVECTOR_COLLECTION
         self.dimension = settings.EMBEDDING_DIMENSION
         self._collection = None
+
+        # 分区（可选）：按书或按哈希分桶，检索时只查询对应分区
+        self.partition_mode = settings.DASHVECTOR_PARTITION_MODE.lower()
+        self._partitions: Optional[set] = None
+        self._partition_lock = threading.Lock()
+
+        # 热门教材缓存（可选）：入库时同步写入 float16 快照，供热缓存整本加载
+        # 热缓存是进程单例（加载函数绑定在首个实例上），快照存储在所有实例间共享
+        self.hot_cache = None
+        self._hot_snapshot = None
+        if settings.HOT_CACHE_ENABLED:
+            from .hot_vector_cache import get_hot_cache
+            from .local_vector_store import get_shared_local_store
+            self._hot_snapshot = get_shared_local_store(settings.HOT_CACHE_SNAPSHOT_DIR, dtype="float16")
+            self.hot_cache = get_hot_cache(loader=self._load_hot_book)
+
+        # 检索结果缓存（可选）：按书版本号失效
+        from .retrieval_cache import get_retrieval_cache
+        self.result_cache = get_retrieval_cache()
+
+        # 语义回答缓存（可选）：与检索结果缓存同步失效
+        from .answer_cache import get_answer_cache
+        self.answer_cache = get_answer_cache()
+
+        # 两阶段检索（可选）：低维本地索引取候选，完整维度向量精确重排
+        self.two_stage = None
+        self._full_vectors = None
+        if settings.TWO_STAGE_ENABLED:
+            from .two_stage_search import TwoStageSearcher
+            fetch_full = self.fetch
+            if settings.TWO_STAGE_RESCORE_SOURCE.lower() == "local":
+                from .local_vector_store import get_shared_local_store
+                self._full_vectors = get_shared_local_store(settings.TWO_STAGE_FULL_DIR, dtype="float16")
+                fetch_full = self._full_vectors.fetch
+            self.two_stage = TwoStageSearcher(fetch_full=fetch_full)
+
         logger.info(f"DashVector 客户端初始化完成，collection: {self.collection_name}")
     
     def _get_collection(self):
@@ -42,71 +359,260 @@ class VectorStore:
             raise ValueError(
                 f"Collection '{self.collection_name}' 不存在，"
                 f"请在 DashVector 控制台创建（维度: {self.dimension}, 度量: cosine）"
+                f"或调用 VectorStore.create_collection()"
             )
 
         logger.info(f"成功连接到 collection: {self.collection_name}")
         return self._collection
     
+    def create_collection(self) -> bool:
+        """
+        按 CHUNK_FIELDS_SCHEMA 创建 collection（已存在时不做任何操作）
+
+        预先声明的字段以原生类型存储，过滤和投影比无 schema 字段更高效。
+        """
+        if self.client.get(self.collection_name):
+            logger.info(f"Collection '{self.collection_name}' 已存在")
+            return True
+
+        result = self.client.create(
+            name=self.collection_name,
+            dimension=self.dimension,
+            metric="cosine",
+            fields_schema=CHUNK_FIELDS_SCHEMA
+        )
+        if result.code != 0:
+            logger.error(f"创建 collection 失败: {result.message}")
+            return False
+
+        logger.info(f"成功创建 collection: {self.collection_name}")
+        return True
+
+    # ============ 分区 ============
+
+    def _list_partitions(self, refresh: bool = False) -> List[str]:
+        """列出 collection 的全部分区（含默认分区，结果缓存）"""
+        with self._partition_lock:
+            if self._partitions is None or refresh:
+                result = self._get_collection().list_partitions()
+                if result.code != 0:
+                    raise VectorStoreError(f"列出分区失败: {result.message}")
+                self._partitions = set(result.output or []) | {DEFAULT_PARTITION}
+            return sorted(self._partitions)
+
+    def _ensure_partition(self, name: str, timeout: float = 60.0) -> None:
+        """确保分区存在并处于可服务状态（分区创建是异步的）"""
+        if name in self._list_partitions():
+            return
+
+        collection = self._get_collection()
+        result = collection.create_partition(name)
+        if result.code != 0 and name not in self._list_partitions(refresh=True):
+            raise VectorStoreError(f"创建分区失败: {name}, {result.message}")
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            described = collection.describe_partition(name)
+            if described.code == 0 and str(described.output).upper().endswith("SERVING"):
+                break
+            time.sleep(1)
+        else:
+            raise VectorStoreError(f"分区 {name} 在 {timeout:.0f}s 内未就绪")
+
+        with self._partition_lock:
+            if self._partitions is not None:
+                self._partitions.add(name)
+        logger.info(f"创建分区: {name}")
+
+    def _route(self, filter_expr: Optional[str]) -> Tuple[Optional[List[str]], Optional[str]]:
+        """
+        将检索请求路由到分区
+
+        Returns:
+            (分区列表, 实际使用的过滤表达式)；分区列表为 None 表示不分区（默认分区）
+        """
+        if self.partition_mode == "none":
+            return None, filter_expr
+
+        book_id = extract_book_id(filter_expr)
+        if book_id is None:
+            # 无法确定教材：扇出到全部分区
+            return self._list_partitions(), filter_expr
+
+        partition = partition_name(book_id, self.partition_mode)
+        if partition not in self._list_partitions():
+            # 尚未迁移到分区的教材仍在默认分区，按原条件检索
+            return [DEFAULT_PARTITION], filter_expr
+        if self.partition_mode == "book":
+            filter_expr = strip_book_clause(filter_expr)
+        return [partition], filter_expr
+
+    def _query(
+        self,
+        query_embedding: Optional[List[float]],
+        top_k: int,
+        filter_expr: Optional[str],
+        output_fields: Optional[List[str]] = None,
+        include_vector: bool = False
+    ) -> list:
+        """
+        执行 DashVector 查询（按分区路由，多分区时并发查询后按分数合并）
+
+        Returns:
+            DashVector Doc 列表，失败时返回空列表
+        """
+        collection = self._get_collection()
+        partitions, routed_filter = self._route(filter_expr)
+
+        def _query_one(partition: Optional[str]) -> list:
+            kwargs = {"partition": partition} if partition and partition != DEFAULT_PARTITION else {}
+            result = collection.query(
+                vector=query_embedding,
+                topk=top_k,
+                filter=routed_filter,
+                include_vector=include_vector,
+                output_fields=output_fields,
+                **kwargs
+            )
+            if result.code != 0:
+                logger.error(f"搜索失败: partition={partition}, {result.message}")
+                return []
+            return list(result.output or [])
+
+        if partitions is None:
+            return _query_one(None)
+        if len(partitions) <= 1:
+            return _query_one(partitions[0]) if partitions else []
+
+        with ThreadPoolExecutor(max_workers=min(len(partitions), 16)) as executor:
+            docs = [doc for part in executor.map(_query_one, partitions) for doc in part]
+        if query_embedding is not None:
+            docs.sort(key=lambda doc: doc.score, reverse=True)
+        return docs[:top_k]
+
+    def _build_doc(self, node: TextNode) -> "dashvector.Doc":
+        """将 TextNode 转换为 DashVector 文档（原生字段 + 紧凑 JSON 元数据）"""
+        return dashvector.Doc(
+            id=node.node_id,
+            vector=node.embedding,
+            fields=build_chunk_fields(node.get_content(), node.metadata)
+        )
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=1, max=10),
         reraise=True
     )
-    def insert(self, nodes: List[TextNode], batch_size: int = 100) -> int:
+    def _upsert_batch(self, docs: List["dashvector.Doc"], partition: Optional[str] = None) -> List[str]:
         """
-        批量插入向量
-        
+        upsert 单个批次（按批次重试）
+
+        upsert 以文档 ID 为键，重复写入是幂等的，因此重试不会产生重复数据。
+
+        Returns:
+            批次内写入失败的文档 ID（整批失败时抛出异常触发重试）
+        """
+        collection = self._get_collection()
+        result = collection.upsert(docs, partition=partition) if partition else collection.upsert(docs)
+
+        if result.code != 0:
+            raise VectorStoreError(f"批次 upsert 失败: code={result.code}, message={result.message}")
+
+        # 整批成功时仍可能存在单条失败
+        return [
+            op.id for op in (result.output or [])
+            if getattr(op, "code", 0) != 0
+        ]
+
+    def insert(
+        self,
+        nodes: List[TextNode],
+        batch_size: int = 100,
+        max_workers: Optional[int] = None
+    ) -> InsertReport:
+        """
+        并发批量写入向量
+
+        每个批次独立重试（指数退避），单个批次失败不会导致已成功的批次重新发送。
+
         Args:
             nodes: 带有 embedding 的节点列表
-            batch_size: 每批插入的数量
-            
+            batch_size: 每批写入的数量
+            max_workers: 最大并发批次数，默认使用 DASHVECTOR_INSERT_CONCURRENCY
+
         Returns:
-            成功插入的数量
+            InsertReport: 包含成功数量和失败的文档 ID
         """
-        collection = self._get_collection()
-        total_inserted = 0
-        
-        logger.info(f"开始插入向量，共 {len(nodes)} 个节点")
-        
-        for i in range(0, len(nodes), batch_size):
-            batch = nodes[i:i + batch_size]
-            docs = []
-
-            for node in batch:
-                # 提取 book_id 作为独立字段（用于过滤）
-                book_id = node.metadata.get("book_id", "")
-                resource_id = node.metadata.get("resource_id", "")
-
-                # 构建文档
-                doc = dashvector.Doc(
-                    id=node.node_id,
-                    vector=node.embedding,
-                    fields={
-                        "text": node.get_content(),
-                        "book_id": book_id,
-                        "resource_id": resource_id,
-                        "metadata": str(node.metadata)
-                    }
-                )
-                docs.append(doc)
-            
-            # 批量插入
-            result = collection.insert(docs)
-            
-            if result.code == 0:
-                total_inserted += len(batch)
-                logger.debug(f"批次 {i//batch_size + 1} 插入成功: {len(batch)} 条")
-            else:
-                logger.error(f"批次 {i//batch_size + 1} 插入失败: {result.message}")
-        
-        logger.info(f"向量插入完成，成功: {total_inserted}/{len(nodes)}")
-        return total_inserted
-    
+        # 提前获取 collection，避免并发线程重复初始化
+        self._get_collection()
+        max_workers = max_workers or settings.DASHVECTOR_INSERT_CONCURRENCY
+        report = InsertReport(total=len(nodes))
+
+        # 按分区分组后再切分批次（不分区时全部写入默认分区）
+        grouped: Dict[Optional[str], List[TextNode]] = {}
+        for node in nodes:
+            partition = partition_name(node.metadata.get("book_id"), self.partition_mode)
+            grouped.setdefault(partition, []).append(node)
+        for partition in grouped:
+            if partition:
+                self._ensure_partition(partition)
+
+        batches = [
+            (partition, [self._build_doc(node) for node in group[i:i + batch_size]])
+            for partition, group in grouped.items()
+            for i in range(0, len(group), batch_size)
+        ]
+        logger.info(f"开始写入向量，共 {len(nodes)} 个节点，{len(batches)} 个批次，并发: {max_workers}")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._upsert_batch, docs, partition): (batch_num, docs)
+                for batch_num, (partition, docs) in enumerate(batches, 1)
+            }
+            for future in as_completed(futures):
+                batch_num, docs = futures[future]
+                try:
+                    failed = future.result()
+                except Exception as e:
+                    failed = [doc.id for doc in docs]
+                    report.errors.append(f"批次 {batch_num}: {e}")
+                    logger.error(f"批次 {batch_num} 写入失败（已重试）: {e}")
+
+                report.failed_ids.extend(failed)
+                report.inserted += len(docs) - len(failed)
+                if failed:
+                    logger.warning(f"批次 {batch_num} 有 {len(failed)} 条写入失败")
+                else:
+                    logger.debug(f"批次 {batch_num} 写入成功: {len(docs)} 条")
+
+        logger.info(f"向量写入完成，成功: {report.inserted}/{report.total}，失败: {len(report.failed_ids)}")
+
+        for cache in (self.result_cache, self.answer_cache, *vector_caches()):
+            if cache is not None:
+                for book_id in {node.metadata.get("book_id", "") for node in nodes}:
+                    cache.bump(book_id or None)
+
+        failed = set(report.failed_ids)
+        stored = [node for node in nodes if node.node_id not in failed]
+        if self.hot_cache is not None:
+            self._hot_snapshot.insert(stored)
+            for book_id in {node.metadata.get("book_id", "") for node in nodes}:
+                self.hot_cache.invalidate(book_id)
+
+        if self.two_stage is not None:
+            if self._full_vectors is not None:
+                self._full_vectors.insert(stored)
+            self.two_stage.insert(stored)
+
+        return report
+
     def search(
         self,
         query_embedding: List[float],
         top_k: int = 5,
-        filter_expr: Optional[str] = None
+        filter_expr: Optional[str] = None,
+        output_fields: Optional[List[str]] = None,
+        chapter_ids: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         向量相似度搜索
@@ -115,62 +621,325 @@ class VectorStore:
             query_embedding: 查询向量
             top_k: 返回结果数量
             filter_expr: 过滤表达式
+            output_fields: 返回字段投影（如 ["book_id", "page"]），默认返回全部字段
+            chapter_ids: 章节范围（章节及其子章节的 ID），只检索这些章节的分块
 
         Returns:
-            搜索结果列表
+            搜索结果列表，每项包含 id、score 以及投影后的字段
         """
-        collection = self._get_collection()
+        filter_expr = chapter_scope_filter(filter_expr, chapter_ids)
+        if self.result_cache is None:
+            return self._search(query_embedding, top_k, filter_expr, output_fields)
+
+        cache_key = self.result_cache.make_key(query_embedding, top_k, filter_expr, output_fields)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"检索缓存命中，filter_expr: {filter_expr}")
+            return cached
+
+        start = time.perf_counter()
+        results = self._search(query_embedding, top_k, filter_expr, output_fields)
+        if results:
+            self.result_cache.set(cache_key, results, (time.perf_counter() - start) * 1000)
+        return results
+
+    def _search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filter_expr: Optional[str],
+        output_fields: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """未经结果缓存的检索（热缓存 -> DashVector）"""
+        if self.hot_cache is not None:
+            hits = self.hot_cache.search(query_embedding, top_k, filter_expr, output_fields)
+            if hits is not None:
+                logger.info(f"热缓存命中，filter_expr: {filter_expr}")
+                return hits
+
+        if self.two_stage is not None:
+            hits = self.two_stage.search(query_embedding, top_k, filter_expr, output_fields)
+            if hits is not None:
+                logger.info(f"两阶段检索完成，filter_expr: {filter_expr}")
+                return hits
 
         logger.info(f"执行向量搜索，filter_expr: {filter_expr}")
 
-        result = collection.query(
-            vector=query_embedding,
-            topk=top_k,
-            filter=filter_expr,
-            include_vector=False
-        )
+        docs = self._query(query_embedding, top_k, filter_expr, output_fields)
 
         # 打印搜索结果的 book_id 信息
-        if result.code == 0 and result.output:
-            for doc in result.output[:3]:  # 只打印前3个
-                book_id = doc.fields.get("book_id", "无")
-                logger.info(f"搜索结果 - id: {doc.id[:20]}..., book_id: {book_id}")
-        
-        if result.code != 0:
-            logger.error(f"搜索失败: {result.message}")
-            return []
-        
+        for doc in docs[:3]:  # 只打印前3个
+            book_id = (doc.fields or {}).get("book_id", "无")
+            logger.info(f"搜索结果 - id: {doc.id[:20]}..., book_id: {book_id}")
+
         return [
-            {
-                "id": doc.id,
-                "score": doc.score,
-                "text": doc.fields.get("text", ""),
-                "metadata": doc.fields.get("metadata", "{}")
-            }
-            for doc in result.output
+            {"id": doc.id, "score": doc.score, **project_fields(doc.fields or {}, output_fields)}
+            for doc in docs
         ]
     
-    def delete(self, ids: List[str]) -> bool:
-        """删除指定的向量"""
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filter_expr: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        output_fields: Optional[List[str]] = None
+    ) -> Dict[str, List]:
+        """
+        多向量并发检索（DashVector 不支持单请求多向量，按查询并发发送）
+
+        Args:
+            query_embeddings: 查询向量列表
+            top_k: 每个查询返回数量
+            filter_expr: 过滤表达式（所有查询共用）
+            max_workers: 最大并发数，默认与查询数相同
+            output_fields: 返回字段投影，默认返回全部字段
+
+        Returns:
+            {"per_query": 每个查询的结果列表, "fused": RRF 融合后的 top_k 结果}
+        """
+        if not query_embeddings:
+            return {"per_query": [], "fused": []}
+        if len(query_embeddings) == 1:
+            results = self.search(query_embeddings[0], top_k, filter_expr, output_fields)
+            return {"per_query": [results], "fused": reciprocal_rank_fusion([results], top_k)}
+
+        self._get_collection()
+        workers = max_workers or min(len(query_embeddings), settings.DASHVECTOR_INSERT_CONCURRENCY * 2)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            per_query = list(executor.map(
+                lambda embedding: self.search(embedding, top_k, filter_expr, output_fields),
+                query_embeddings
+            ))
+
+        logger.info(f"多向量检索完成: {len(query_embeddings)} 个查询")
+        return {"per_query": per_query, "fused": reciprocal_rank_fusion(per_query, top_k)}
+
+    def fetch(self, ids: List[str], filter_expr: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        按 ID 获取向量和字段（两阶段检索的精确重排使用）
+
+        Args:
+            ids: 文档 ID 列表
+            filter_expr: 检索时的过滤条件（仅用于分区路由）
+
+        Returns:
+            {id: {"vector": float32 向量, "fields": 分块字段}}，不存在的 ID 不返回
+        """
+        collection = self._get_collection()
+        partitions, _ = self._route(filter_expr)
+        found: Dict[str, Dict[str, Any]] = {}
+        for partition in partitions or [None]:
+            remaining = [doc_id for doc_id in ids if doc_id not in found]
+            if not remaining:
+                break
+            kwargs = {"partition": partition} if partition and partition != DEFAULT_PARTITION else {}
+            result = collection.fetch(ids=remaining, **kwargs)
+            if result.code != 0:
+                logger.error(f"获取向量失败: partition={partition or DEFAULT_PARTITION}, {result.message}")
+                continue
+            for doc_id, doc in (result.output or {}).items():
+                if doc is not None and doc.vector is not None:
+                    found[doc_id] = {
+                        "vector": np.asarray(doc.vector, dtype=np.float32),
+                        "fields": project_fields(doc.fields or {}),
+                    }
+        return found
+
+    def _delete_in(
+        self,
+        partition: Optional[str],
+        ids: Optional[List[str]] = None,
+        filter_expr: Optional[str] = None
+    ) -> bool:
+        """
+        在单个分区中按 ID 或条件删除
+
+        SDK 的 delete 只接受 ID：条件删除按条件分页查询出 ID 后逐页删除，
+        每页删除后重新查询（已删除的文档不再返回），直到不足一页。
+        """
+        if ids is None:
+            if not filter_expr:
+                logger.error("条件删除失败: 过滤条件为空")
+                return False
+            return self._delete_matching(partition, filter_expr)
+
+        collection = self._get_collection()
+        kwargs = {"partition": partition} if partition and partition != DEFAULT_PARTITION else {}
+        result = collection.delete(ids=ids, **kwargs)
+        if result.code != 0:
+            logger.error(f"删除失败: partition={partition or DEFAULT_PARTITION}, {result.message}")
+        return result.code == 0
+
+    def _delete_matching(self, partition: Optional[str], filter_expr: str) -> bool:
+        """删除单个分区中满足条件的全部文档"""
         collection = self._get_collection()
-        result = collection.delete(ids=ids)
+        kwargs = {"partition": partition} if partition and partition != DEFAULT_PARTITION else {}
+        deleted: set = set()
+        while True:
+            result = collection.query(
+                topk=DASHVECTOR_MAX_TOPK, filter=filter_expr, include_vector=False, output_fields=[], **kwargs
+            )
+            if result.code != 0:
+                logger.error(f"条件删除查询失败: partition={partition or DEFAULT_PARTITION}, {result.message}")
+                return False
+            docs = list(result.output or [])
+            # 删除尚未生效时同一页会被重复返回，跳过已删除的 ID 防止死循环
+            ids = [doc.id for doc in docs if doc.id not in deleted]
+            if not ids:
+                return True
+            if not self._delete_in(partition, ids=ids):
+                return False
+            deleted.update(ids)
+            if len(docs) < DASHVECTOR_MAX_TOPK:
+                logger.info(f"条件删除: partition={partition or DEFAULT_PARTITION}, {len(deleted)} 条")
+                return True
+
+    def _drop_partition(self, name: str) -> bool:
+        """删除整个分区（每本书独立分区时删除教材的最快方式）"""
+        result = self._get_collection().delete_partition(name)
+        with self._partition_lock:
+            if self._partitions is not None:
+                self._partitions.discard(name)
+        if result.code != 0:
+            logger.error(f"删除分区失败: {name}, {result.message}")
+            return False
+        logger.info(f"删除分区: {name}")
+        return True
+
+    def delete(self, ids: List[str]) -> bool:
+        """删除指定的向量（分区模式下在所有分区中删除）"""
+        partitions = self._list_partitions() if self.partition_mode != "none" else [None]
+        success = all([self._delete_in(partition, ids=ids) for partition in partitions])
+
+        for cache in (self.result_cache, self.answer_cache):
+            if cache is not None:
+                cache.bump()
+        for cache in vector_caches():
+            cache.invalidate(ids)
+
+        if self.hot_cache is not None:
+            self._hot_snapshot.delete(ids)
+            self.hot_cache.invalidate()
+
+        if self.two_stage is not None:
+            self.two_stage.delete(ids)
+            if self._full_vectors is not None:
+                self._full_vectors.delete(ids)
         
-        if result.code == 0:
+        if success:
             logger.info(f"成功删除 {len(ids)} 条向量")
-            return True
-        else:
-            logger.error(f"删除失败: {result.message}")
-            return False
+        return success
     
     def delete_by_filter(self, filter_expr: str) -> bool:
-        """根据过滤条件删除向量"""
-        collection = self._get_collection()
-        result = collection.delete(filter=filter_expr)
-        
-        if result.code == 0:
+        """
+        根据过滤条件删除向量
+
+        分区模式下只在对应分区删除；每本书独立分区且条件只有 book_id 时直接删除整个分区。
+        默认分区中迁移前遗留的数据也会按原条件删除。
+        """
+        success = False
+        try:
+            partitions, routed_filter = self._route(filter_expr)
+            if partitions is None:
+                success = self._delete_in(None, filter_expr=filter_expr)
+            else:
+                results = []
+                for partition in partitions:
+                    if partition == DEFAULT_PARTITION:
+                        continue
+                    if routed_filter is None:
+                        results.append(self._drop_partition(partition))
+                    else:
+                        results.append(self._delete_in(partition, filter_expr=routed_filter))
+                results.append(self._delete_in(None, filter_expr=filter_expr))
+                success = all(results)
+        except Exception as e:
+            logger.error(f"条件删除异常: {filter_expr}, {e}")
+        finally:
+            # 部分分区可能已删除，无论成功与否都使缓存和本地索引失效
+            for cache in (self.result_cache, self.answer_cache, *vector_caches()):
+                if cache is not None:
+                    cache.bump_by_filter(filter_expr)
+
+            if self.hot_cache is not None:
+                self._invalidate_hot_by_filter(filter_expr)
+
+            if self.two_stage is not None:
+                self.two_stage.delete_by_filter(filter_expr)
+                if self._full_vectors is not None:
+                    self._full_vectors.delete_by_filter(filter_expr)
+
+        if success:
             logger.info(f"根据条件删除成功: {filter_expr}")
-            return True
         else:
-            logger.error(f"条件删除失败: {result.message}")
-            return False
+            logger.error(f"条件删除失败: {filter_expr}")
+        return success
+
+
+
+    # ============ 热缓存 ============
+
+    def _invalidate_hot_by_filter(self, filter_expr: str) -> None:
+        """按删除条件同步快照并使热缓存失效"""
+        from .local_vector_store import parse_filter
+
+        self._hot_snapshot.delete_by_filter(filter_expr)
+        try:
+            book_id = parse_filter(filter_expr).get("book_id")
+        except ValueError:
+            book_id = None
+        # 无法确定具体教材时清空全部缓存
+        self.hot_cache.invalidate(book_id)
+
+    def _load_hot_book(self, book_id: str):
+        """
+        加载整本书的向量供热缓存使用
+
+        优先读取入库时写入的本地快照；没有快照时从 DashVector 按条件拉取，
+        结果达到单次查询上限（可能不完整）时放弃加载，避免返回不精确的检索结果。
+        """
+        from .hot_vector_cache import build_hot_book
+
+        snapshot = self._hot_snapshot.export_book(book_id)
+        if snapshot is not None:
+            return build_hot_book(book_id, **snapshot)
+
+        docs = self._query(None, DASHVECTOR_MAX_TOPK, f"book_id = '{book_id}'", include_vector=True)
+        if not docs:
+            return None
+        if len(docs) >= DASHVECTOR_MAX_TOPK:
+            logger.info(f"教材 {book_id} 超过 {DASHVECTOR_MAX_TOPK} 个向量且无本地快照，跳过热缓存")
+            return None
+
+        return build_hot_book(
+            book_id,
+            ids=[doc.id for doc in docs],
+            fields=[project_fields(doc.fields or {}) for doc in docs],
+            vectors=[doc.vector for doc in docs],
+        )
+
+
+def get_vector_store(backend: str = None):
+    """
+    根据配置获取向量存储实例（工厂函数）
+
+    Args:
+        backend: 可选，指定后端。如果不指定则使用配置文件中的 VECTOR_STORE_BACKEND
+                 可选值: "dashvector", "local"
+
+    Returns:
+        VectorStore 或 LocalVectorStore 实例
+    """
+    backend = (backend or settings.VECTOR_STORE_BACKEND).lower()
 
+    if backend == "local":
+        from .answer_cache import get_answer_cache
+        from .local_vector_store import LocalVectorStore
+        logger.info(f"使用本地向量存储: {settings.LOCAL_VECTOR_DIR}")
+        return LocalVectorStore(answer_cache=get_answer_cache())
+    elif backend == "dashvector":
+        return VectorStore()
+    else:
+        logger.warning(f"未知的向量存储后端 '{backend}'，默认使用 DashVector")
+        return VectorStore()
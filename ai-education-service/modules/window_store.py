@@ -0,0 +1,363 @@
+"""
+父窗口文本存储模块（small-to-big 检索）
+入库时按小分块写入向量库，同时保存每个文档（页）的全文；分块元数据只记录父窗口在全文中的字符偏移。
+检索命中小分块后按偏移读取父窗口文本，同一文档内重叠 / 相邻的窗口合并为一段，查询阶段没有网络请求。
+
+存储布局（每本书一组文件）:
+    {WINDOW_STORE_DIR}/{book_key}.blocks.bin  全文按 block_chars 切块后分别压缩（zstd，未安装时 zlib），顺序拼接
+    {WINDOW_STORE_DIR}/{book_key}.docs.json   压缩方式 + 块大小 + 每个文档的块表 {doc_key: [[偏移, 长度], ...]}
+读取时 mmap 块文件，只解压窗口覆盖的块（解压结果 LRU 缓存）。
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from config import settings
+from .local_vector_store import DEFAULT_BOOK_KEY, DELETE_FILTER_FIELDS, parse_filter
+from .vector_store import parse_chunk_metadata
+
+try:
+    # 可选依赖 zstandard（压缩率和解压速度优于 zlib）
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 解压后的块 LRU 缓存条数
+BLOCK_CACHE_SIZE = 512
+
+# 句子结束位置（窗口边界对齐到句子）
+_SENTENCE_END = re.compile(r'[。！？；!?;\n]')
+
+
+def window_bounds(text: str, start: int, end: int, window_chars: int) -> Tuple[int, int]:
+    """
+    以分块 [start, end) 为中心向两侧扩展到约 window_chars 个字符，边界收缩到最近的句子边界
+
+    窗口总是包含分块本身；分块已超过 window_chars 时窗口等于分块。
+    """
+    start, end = max(0, start), min(len(text), end)
+    pad = max(0, window_chars - (end - start)) // 2
+    left, right = max(0, start - pad), min(len(text), end + pad)
+
+    if left > 0:
+        ends = list(_SENTENCE_END.finditer(text, left, start))
+        left = ends[0].end() if ends else start
+    if right < len(text):
+        ends = list(_SENTENCE_END.finditer(text, end, right))
+        right = ends[-1].end() if ends else end
+    return left, right
+
+
+def merge_windows(spans: List[Tuple[int, int]], gap: int = 0) -> List[Tuple[int, int, List[int]]]:
+    """
+    合并重叠或间隔不超过 gap 的区间
+
+    Returns:
+        [(start, end, [原区间下标...]), ...]，按 start 排序
+    """
+    order = sorted(range(len(spans)), key=lambda i: spans[i])
+    merged: List[Tuple[int, int, List[int]]] = []
+    for i in order:
+        start, end = spans[i]
+        if merged and start <= merged[-1][1] + gap:
+            last_start, last_end, members = merged[-1]
+            merged[-1] = (last_start, max(last_end, end), members + [i])
+        else:
+            merged.append((start, end, [i]))
+    return merged
+
+
+class _Codec:
+    """块压缩（zstd 或 zlib）"""
+
+    def __init__(self, name: str):
+        if name == "zstd" and zstandard is None:
+            raise RuntimeError("父窗口存储使用 zstd 压缩，但未安装 zstandard")
+        self.name = name
+        if name == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=10)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        if self.name == "zstd":
+            return self._compressor.compress(data)
+        return zlib.compress(data, 6)
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.name == "zstd":
+            return self._decompressor.decompress(data)
+        return zlib.decompress(data)
+
+
+class _BookWindows:
+    """一本书的全文块（读取侧，块文件 mmap）"""
+
+    def __init__(self, path: Path, meta: Dict[str, Any]):
+        self.codec = _Codec(meta["codec"])
+        self.block_chars: int = meta["block_chars"]
+        self.docs: Dict[str, List[List[int]]] = meta["docs"]
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def raw_block(self, offset: int, length: int) -> bytes:
+        return self._map[offset:offset + length] if self._map is not None else b""
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class WindowStore:
+    """按书存储的文档全文（父窗口读取）"""
+
+    def __init__(self, base_dir: Optional[str] = None, block_chars: Optional[int] = None, codec: Optional[str] = None):
+        """
+        Args:
+            base_dir: 存储目录，默认使用 WINDOW_STORE_DIR
+            block_chars: 压缩块字符数，默认使用 WINDOW_STORE_BLOCK_CHARS
+            codec: 新写入使用的压缩方式 zstd / zlib，默认安装了 zstandard 时使用 zstd
+        """
+        self.base_dir = Path(base_dir or settings.WINDOW_STORE_DIR)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.block_chars = block_chars or settings.WINDOW_STORE_BLOCK_CHARS
+        self.codec = _Codec(codec or ("zstd" if zstandard is not None else "zlib"))
+        self._books: Dict[str, _BookWindows] = {}
+        self._blocks: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._lock = threading.RLock()
+        logger.info(f"父窗口存储初始化完成，目录: {self.base_dir}, 压缩: {self.codec.name}")
+
+    # ============ 文件读写 ============
+
+    @staticmethod
+    def _book_key(book_id: Optional[str]) -> str:
+        return re.sub(r"[^\w\-]", "_", book_id) if book_id else DEFAULT_BOOK_KEY
+
+    def _paths(self, book_key: str) -> Tuple[Path, Path]:
+        return self.base_dir / f"{book_key}.blocks.bin", self.base_dir / f"{book_key}.docs.json"
+
+    def _load_book(self, book_key: str) -> Optional[_BookWindows]:
+        with self._lock:
+            if book_key in self._books:
+                return self._books[book_key]
+            blocks_path, meta_path = self._paths(book_key)
+            if not blocks_path.exists() or not meta_path.exists():
+                return None
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            book = _BookWindows(blocks_path, meta)
+            self._books[book_key] = book
+            return book
+
+    def _evict(self, book_key: str) -> None:
+        book = self._books.pop(book_key, None)
+        if book is not None:
+            book.close()
+        for key in [key for key in self._blocks if key[0] == book_key]:
+            del self._blocks[key]
+
+    def _rewrite_book(self, book_key: str, texts: Dict[str, str], keep: Dict[str, List[List[int]]]) -> None:
+        """
+        写入一本书：texts 为新写入（压缩）的文档，keep 为沿用旧文件压缩块的文档（原样复制）
+        """
+        if not texts and not keep:
+            self._drop_book(book_key)
+            return
+
+        old = self._load_book(book_key)
+        if keep and (old.codec.name != self.codec.name or old.block_chars != self.block_chars):
+            # 压缩方式或块大小变化：沿用的文档解压后重新写入
+            texts = {**{k: self._read_doc(book_key, old, k) for k in keep}, **texts}
+            keep = {}
+
+        blocks_path, meta_path = self._paths(book_key)
+        tmp_blocks = blocks_path.with_suffix(".tmp")
+        tmp_meta = meta_path.with_suffix(".tmp")
+        docs: Dict[str, List[List[int]]] = {}
+        offset = 0
+        with open(tmp_blocks, "wb") as f:
+            for doc_key, blocks in keep.items():
+                docs[doc_key] = []
+                for block_offset, length in blocks:
+                    f.write(old.raw_block(block_offset, length))
+                    docs[doc_key].append([offset, length])
+                    offset += length
+            for doc_key, text in texts.items():
+                docs[doc_key] = []
+                for i in range(0, max(len(text), 1), self.block_chars):
+                    data = self.codec.compress(text[i:i + self.block_chars].encode("utf-8"))
+                    f.write(data)
+                    docs[doc_key].append([offset, len(data)])
+                    offset += len(data)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"codec": self.codec.name, "block_chars": self.block_chars, "docs": docs}, f, ensure_ascii=False)
+
+        self._evict(book_key)
+        os.replace(tmp_blocks, blocks_path)
+        os.replace(tmp_meta, meta_path)
+
+    def _drop_book(self, book_key: str) -> None:
+        self._evict(book_key)
+        for path in self._paths(book_key):
+            if path.exists():
+                path.unlink()
+
+    # ============ 写入 / 删除 ============
+
+    def put_documents(self, book_id: Optional[str], texts: Dict[str, str]) -> int:
+        """
+        写入一本书的文档全文（相同 doc_key 覆盖旧数据）
+
+        Args:
+            texts: {doc_key: 全文}
+
+        Returns:
+            写入的文档数量
+        """
+        if not texts:
+            return 0
+        book_key = self._book_key(book_id)
+        with self._lock:
+            old = self._load_book(book_key)
+            keep = {k: blocks for k, blocks in old.docs.items() if k not in texts} if old is not None else {}
+            self._rewrite_book(book_key, texts, keep)
+        logger.info(f"父窗口存储写入完成: book={book_key}, 文档 {len(texts)} 个")
+        return len(texts)
+
+    def delete_by_filter(self, filter_expr: str) -> bool:
+        """根据过滤条件删除（支持 book_id / resource_id；doc_key 以 resource_id 开头）"""
+        try:
+            conditions = parse_filter(filter_expr, DELETE_FILTER_FIELDS)
+        except ValueError as e:
+            logger.error(f"父窗口存储条件删除失败: {e}")
+            return False
+        if not conditions:
+            logger.error("父窗口存储条件删除失败: 过滤条件为空")
+            return False
+
+        with self._lock:
+            if "book_id" in conditions:
+                book_keys = [self._book_key(conditions["book_id"])]
+            else:
+                book_keys = [path.name[:-len(".docs.json")] for path in self.base_dir.glob("*.docs.json")]
+            for book_key in book_keys:
+                if "resource_id" not in conditions:
+                    self._drop_book(book_key)
+                    continue
+                book = self._load_book(book_key)
+                if book is None:
+                    continue
+                prefix = f"{conditions['resource_id']}:"
+                keep = {k: blocks for k, blocks in book.docs.items() if not k.startswith(prefix)}
+                if len(keep) != len(book.docs):
+                    self._rewrite_book(book_key, {}, keep)
+        return True
+
+    # ============ 读取 ============
+
+    def _block(self, book_key: str, book: _BookWindows, offset: int, length: int) -> str:
+        key = (book_key, offset)
+        text = self._blocks.get(key)
+        if text is None:
+            text = book.codec.decompress(book.raw_block(offset, length)).decode("utf-8")
+            self._blocks[key] = text
+            while len(self._blocks) > BLOCK_CACHE_SIZE:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(key)
+        return text
+
+    def _read_doc(self, book_key: str, book: _BookWindows, doc_key: str) -> str:
+        return "".join(self._block(book_key, book, offset, length) for offset, length in book.docs[doc_key])
+
+    def read(self, book_id: Optional[str], doc_key: str, start: int, end: int) -> Optional[str]:
+        """读取文档 [start, end) 字符区间（文档不存在时返回 None）"""
+        book_key = self._book_key(book_id)
+        with self._lock:
+            book = self._load_book(book_key)
+            if book is None or doc_key not in book.docs:
+                return None
+            blocks = book.docs[doc_key]
+            first = max(0, start) // book.block_chars
+            last = min(len(blocks) - 1, max(start, end - 1) // book.block_chars)
+            text = "".join(
+                self._block(book_key, book, *blocks[i]) for i in range(first, last + 1)
+            )
+        base = first * book.block_chars
+        return text[max(0, start) - base:end - base]
+
+    def expand(self, results: List[Dict[str, Any]], gap: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        把子分块命中扩展为父窗口，同一文档内重叠 / 间隔不超过 gap 的窗口合并
+
+        合并后的结果沿用得分最高的子分块的字段，text 替换为窗口文本，score 取子分块最高分，
+        child_ids 记录合并的子分块；没有窗口元数据或读取失败的结果原样保留。
+        结果按合并后得分从高到低排序。
+
+        Args:
+            gap: 窗口合并的最大间隔字符数，默认使用 PARENT_WINDOW_MERGE_GAP
+        """
+        gap = settings.PARENT_WINDOW_MERGE_GAP if gap is None else gap
+        groups: "OrderedDict[Tuple[str, str], List[Tuple[int, int, Dict[str, Any]]]]" = OrderedDict()
+        passthrough = []
+        for result in results:
+            metadata = parse_chunk_metadata(result.get("metadata"))
+            doc_key = metadata.get("window_doc")
+            if doc_key is None or metadata.get("window_start") is None:
+                passthrough.append(result)
+                continue
+            spans = groups.setdefault((result.get("book_id", ""), doc_key), [])
+            spans.append((int(metadata["window_start"]), int(metadata["window_end"]), result))
+
+        expanded = list(passthrough)
+        for (book_id, doc_key), members in groups.items():
+            for start, end, indices in merge_windows([(s, e) for s, e, _ in members], gap):
+                children = [members[i][2] for i in indices]
+                best = max(children, key=lambda r: r.get("score", 0))
+                text = self.read(book_id or None, doc_key, start, end)
+                if text is None:
+                    expanded.extend(children)
+                    continue
+                expanded.append({
+                    **best,
+                    "text": text,
+                    "child_ids": [child.get("id") for child in children],
+                    "window": [start, end],
+                })
+
+        expanded.sort(key=lambda r: r.get("score", 0), reverse=True)
+        return expanded
+
+    def count(self, book_id: Optional[str] = None) -> int:
+        """统计已存储的文档数量"""
+        if book_id:
+            book = self._load_book(self._book_key(book_id))
+            return len(book.docs) if book is not None else 0
+        keys = [path.name[:-len(".docs.json")] for path in self.base_dir.glob("*.docs.json")]
+        return sum(len(book.docs) for book in map(self._load_book, keys) if book is not None)
+
+
+# ============ 工厂函数 ============
+
+_window_store: Optional[WindowStore] = None
+
+
+def get_window_store() -> Optional[WindowStore]:
+    """获取 WindowStore 单例（PARENT_WINDOW_ENABLED=False 时返回 None）"""
+    global _window_store
+    if not settings.PARENT_WINDOW_ENABLED:
+        return None
+    if _window_store is None:
+        _window_store = WindowStore()
+    return _window_store
@@ -0,0 +1,164 @@
+"""
+测试语义回答缓存
+
+验证：
+1. 归一化文本相同直接命中，近似问题按向量余弦命中，不相关问题不命中
+2. 作用域（教材 / 意图）隔离，返回对象可被调用方修改
+3. 按书失效，生成期间教材重新入库的回答不写入
+4. 过期、统计和流式输出
+5. 未写入的查找同样计为未命中；版本号存 Redis 时一个进程失效，其他进程的旧条目随之失效
+"""
+
+import asyncio
+import logging
+import time
+
+from modules.answer_cache import AnswerCache, normalize_question, stream_cached_answer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SOURCES = [{"index": 1, "resource_id": "r1", "text": "光合作用在叶绿体中进行"}]
+CITATIONS = [{"index": 1, "resource_id": "r1"}]
+
+VECTORS = {
+    "什么是光合作用": [1.0, 0.0, 0.0],
+    "光合作用是什么": [0.99, 0.1, 0.0],
+    "什么是呼吸作用": [0.0, 1.0, 0.0],
+    "什么是蒸腾作用": [0.0, 0.0, 1.0],
+}
+
+
+def _embed(text: str) -> list:
+    return VECTORS[normalize_question(text)]
+
+
+class _FakeRedis:
+    """只实现版本号用到的 mget / incr"""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+
+def _cache(**kwargs) -> AnswerCache:
+    return AnswerCache(**{"threshold": 0.95, "ttl": 60, "max_entries": 10, **kwargs})
+
+
+def test_lookup_and_put():
+    """测试精确 / 近似命中和作用域隔离"""
+    assert normalize_question("  什么是光合作用？ ") == normalize_question("什么是光合作用") == "什么是光合作用"
+
+    cache = _cache()
+    cached, key = cache.lookup("b1", "question_answer", "什么是光合作用？", embed=_embed)
+    assert cached is None and key is not None
+    assert cache.put(key, "光合作用是……[来源1]", SOURCES, CITATIONS)
+
+    # 精确匹配不需要向量
+    cached, _ = cache.lookup("b1", "question_answer", "什么是光合作用", embed=None)
+    assert cached["answer"] == "光合作用是……[来源1]" and cached["citations"] == CITATIONS
+
+    cached["sources"][0]["text"] = ""  # 调用方修改不影响缓存
+    cached, _ = cache.lookup("b1", "question_answer", "光合作用是什么?", embed=_embed)
+    assert cached["sources"] == SOURCES
+
+    assert cache.lookup("b1", "question_answer", "什么是呼吸作用", embed=_embed)[0] is None
+    assert cache.lookup("b2", "question_answer", "什么是光合作用", embed=_embed)[0] is None
+    assert cache.lookup("b1", "review_summary", "什么是光合作用", embed=_embed)[0] is None
+
+    # 没有来源的回答不写入
+    _, key = cache.lookup("b1", "question_answer", "什么是呼吸作用", embed=_embed)
+    assert not cache.put(key, "教材中没有相关内容", [], [])
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["entries"] == 1
+    assert 0 < stats["hit_rate"] < 1
+
+
+def test_invalidation():
+    """测试按书失效和生成期间失效"""
+    cache = _cache()
+    for book_id in ("b1", "b2"):
+        _, key = cache.lookup(book_id, "qa", "什么是光合作用", embed=_embed)
+        cache.put(key, "答案", SOURCES, CITATIONS)
+
+    cache.bump("b1")
+    assert cache.lookup("b1", "qa", "什么是光合作用", embed=_embed)[0] is None
+    assert cache.lookup("b2", "qa", "什么是光合作用", embed=_embed)[0] is not None
+
+    # 查找之后、写入之前教材重新入库
+    _, key = cache.lookup("b1", "qa", "什么是光合作用", embed=_embed)
+    cache.bump_by_filter("book_id = 'b1'")
+    assert not cache.put(key, "旧答案", SOURCES, CITATIONS)
+
+    cache.bump()
+    assert cache.stats()["entries"] == 0
+
+
+def test_miss_counted_on_lookup():
+    """测试生成失败（未写入）的查找计为未命中"""
+    cache = _cache()
+    cache.lookup("b1", "qa", "什么是光合作用", embed=_embed)
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hit_rate"] == 0.0
+
+
+def test_shared_versions():
+    """测试多进程共享版本号"""
+    redis = _FakeRedis()
+    worker_a, worker_b = _cache(redis_client=redis), _cache(redis_client=redis)
+    for cache in (worker_a, worker_b):
+        _, key = cache.lookup("b1", "qa", "什么是光合作用", embed=_embed)
+        cache.put(key, "答案", SOURCES, CITATIONS)
+        _, key = cache.lookup("b2", "qa", "什么是光合作用", embed=_embed)
+        cache.put(key, "答案", SOURCES, CITATIONS)
+
+    # A 进程入库 b1，B 进程的 b1 条目失效，b2 不受影响
+    worker_a.bump("b1")
+    assert worker_b.lookup("b1", "qa", "什么是光合作用", embed=_embed)[0] is None
+    assert worker_b.lookup("b2", "qa", "什么是光合作用", embed=_embed)[0] is not None
+
+    # B 进程生成期间 A 进程全局失效，回答不写入
+    _, key = worker_b.lookup("b2", "qa", "什么是呼吸作用", embed=_embed)
+    worker_a.bump()
+    assert not worker_b.put(key, "旧答案", SOURCES, CITATIONS)
+    assert worker_b.lookup("b2", "qa", "什么是光合作用", embed=_embed)[0] is None
+
+
+def test_ttl_and_eviction():
+    """测试过期和条目上限"""
+    cache = _cache(ttl=1, max_entries=2)
+    for question in ("什么是光合作用", "什么是呼吸作用", "什么是蒸腾作用"):
+        _, key = cache.lookup("b1", "qa", question, embed=_embed)
+        cache.put(key, question, SOURCES, CITATIONS)
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("b1", "qa", "什么是光合作用", embed=None)[0] is None
+
+    time.sleep(1.1)
+    assert cache.lookup("b1", "qa", "什么是呼吸作用", embed=_embed)[0] is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_stream_cached_answer():
+    """测试缓存回答的流式输出"""
+    async def collect():
+        return [chunk async for chunk in stream_cached_answer("牛顿第二定律F=ma", chunk_chars=4, delay=0)]
+
+    chunks = asyncio.run(collect())
+    assert chunks == ["牛顿第二", "定律F=", "ma"]
+
+
+if __name__ == "__main__":
+    test_lookup_and_put()
+    test_invalidation()
+    test_miss_counted_on_lookup()
+    test_shared_versions()
+    test_ttl_and_eviction()
+    test_stream_cached_answer()
+    logger.info("✅ 语义回答缓存测试全部通过")
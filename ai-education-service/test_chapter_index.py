@@ -0,0 +1,131 @@
+"""
+测试章节摘要索引（分层检索）
+
+验证：
+1. 抽取式章节摘要：标题路径 + 子树各分块首句，不超过字符上限
+2. 章节向量写入、排序，重新入库时按章节覆盖，重新打开从磁盘加载
+3. 章节路由：取前 top_n 个章节子树，分块数不足时继续补充；已限定章节 / 章节过少时不路由
+4. 按 book_id 删除
+"""
+
+import logging
+import tempfile
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from modules.chapter_index import ChapterIndex, chapter_summaries
+from modules.local_vector_store import parse_filter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHAPTERS = [
+    {"id": "c1", "title": "第一章 运动的描述", "level": 1, "order_index": 1, "parent_id": None},
+    {"id": "c1-1", "title": "1.1 质点", "level": 2, "order_index": 2, "parent_id": "c1"},
+    {"id": "c2", "title": "第二章 相互作用", "level": 1, "order_index": 3, "parent_id": None},
+    {"id": "c2-1", "title": "2.1 重力", "level": 2, "order_index": 4, "parent_id": "c2"},
+    {"id": "c2-2", "title": "2.2 摩擦力", "level": 2, "order_index": 5, "parent_id": "c2"},
+    {"id": "c3", "title": "第三章 牛顿运动定律", "level": 1, "order_index": 6, "parent_id": None},
+]
+# 每个叶子章节一个主题方向
+TOPICS = {"c1-1": 0, "c2-1": 1, "c2-2": 2, "c3": 3}
+DIM = 8
+
+
+def _vector(topic: int, noise: float = 0.0) -> list:
+    vector = np.full(DIM, noise)
+    vector[topic] = 1.0
+    return vector.tolist()
+
+
+def _nodes(per_chapter: int = 2) -> list:
+    nodes = []
+    for chapter_id, topic in TOPICS.items():
+        for i in range(per_chapter):
+            nodes.append(TextNode(
+                id_=f"{chapter_id}-{i}", text=f"标题\n{chapter_id} 的第{i}段正文内容。后续句子不进入摘要。",
+                embedding=_vector(topic, 0.05), metadata={"book_id": "b1", "chapter_id": chapter_id},
+            ))
+    return nodes
+
+
+def _embed_batch(texts: list) -> list:
+    # 摘要向量：按摘要中出现的叶子章节 ID 叠加主题方向
+    return [np.sum([_vector(topic) for cid, topic in TOPICS.items() if f"{cid} " in text], axis=0).tolist()
+            for text in texts]
+
+
+def test_summaries():
+    """测试抽取式章节摘要"""
+    summaries = chapter_summaries(_nodes(), CHAPTERS, max_chars=200)
+    assert set(summaries) == {"c1", "c1-1", "c2", "c2-1", "c2-2", "c3"}
+
+    c2 = summaries["c2"]
+    lines = c2["summary"].split("\n")
+    assert lines[0] == "第二章 相互作用"
+    # 子章节轮流取首句，跳过过短的标题行
+    assert lines[1:3] == ["c2-1 的第0段正文内容。", "c2-2 的第0段正文内容。"]
+    assert c2["chunks"] == 0 and len(c2["nodes"]) == 4
+    assert summaries["c2-2"]["summary"].startswith("第二章 相互作用 / 2.2 摩擦力")
+    assert summaries["c2-2"]["chunks"] == 2
+
+    short = chapter_summaries(_nodes(), CHAPTERS, max_chars=20)
+    assert all(len("".join(s["summary"].split("\n")[1:])) <= 20 for s in short.values())
+
+
+def test_build_rank_route():
+    """测试章节向量写入、排序和路由"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = ChapterIndex(base_dir=tmp)
+        assert index.build("b1", _nodes(), CHAPTERS, _embed_batch) == 6
+        assert index.count("b1") == 6
+
+        ranked = index.rank("b1", _vector(2), top_n=3)
+        assert ranked[0][0] == "c2-2" and ranked[1][0] == "c2"
+
+        # top_n=1：摩擦力一节只有 2 个分块，继续补充到不少于 3 个
+        expr = index.route("book_id = 'b1'", _vector(2), top_n=1, min_chunks=3)
+        assert parse_filter(expr)["chapter_id"] == ("c2-2", "c2", "c2-1")
+        expr = index.route("book_id = 'b1'", _vector(3), top_n=1)
+        assert expr == "book_id = 'b1' and chapter_id = 'c3'"
+
+        # 已限定章节、章节数不超过 top_n、没有索引时不路由
+        scoped = "book_id = 'b1' and chapter_id = 'c1'"
+        assert index.route(scoped, _vector(2), top_n=1) == scoped
+        assert index.route("book_id = 'b1'", _vector(2), top_n=6) == "book_id = 'b1'"
+        assert index.route("book_id = 'b9'", _vector(2), top_n=1) == "book_id = 'b9'"
+        assert index.route(None, _vector(2), top_n=1) is None
+
+        # 重新入库部分章节：覆盖这些章节，其他章节保留
+        rebuilt = [node for node in _nodes() if node.metadata["chapter_id"] == "c3"]
+        for node in rebuilt:
+            node.embedding = _vector(4)
+        assert index.build("b1", rebuilt, CHAPTERS, lambda texts: [_vector(4) for _ in texts]) == 1
+        reopened = ChapterIndex(base_dir=tmp)
+        assert reopened.count("b1") == 6
+        assert reopened.rank("b1", _vector(4), top_n=1)[0][0] == "c3"
+        assert {chapter_id for chapter_id, _ in reopened.rank("b1", _vector(0), top_n=2)} == {"c1", "c1-1"}
+
+
+def test_delete_by_filter():
+    """测试按书删除"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = ChapterIndex(base_dir=tmp)
+        index.build("b1", _nodes(), CHAPTERS, _embed_batch)
+        index.build("b2", _nodes(), CHAPTERS, _embed_batch)
+
+        # 章节属于整本书：按资源删除时保留
+        assert index.delete_by_filter("resource_id = 'r1'")
+        assert index.count("b1") == 6
+        assert index.delete_by_filter("book_id = 'b1'")
+        assert index.count("b1") == 0 and index.count("b2") == 6
+        assert ChapterIndex(base_dir=tmp).count("b1") == 0
+        assert not index.delete_by_filter("chapter_id = 'c1'")
+
+
+if __name__ == "__main__":
+    test_summaries()
+    test_build_rank_route()
+    test_delete_by_filter()
+    logger.info("✅ 章节摘要索引测试全部通过")
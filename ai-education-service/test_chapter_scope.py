@@ -0,0 +1,162 @@
+"""
+测试章节范围检索
+
+验证：
+1. 章节页码区间（缺少结束页时按下一章补全）、页码偏移估计和分块章节标注
+2. 范围解析："第三章" / "第二章第一节" / chapter_3 / 章节标题 / 全书，问题中的章节引用识别
+3. chapter_id 过滤表达式的构建、解析，以及教材 ID 提取
+4. 本地向量检索和关键词检索按章节子树过滤
+"""
+
+import logging
+import tempfile
+import zlib
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from modules.chapter_scope import (
+    assign_chapters, chapter_ranges, chinese_to_int, detect_scope, resolve_scope, scoped_filter
+)
+from modules.keyword_index import KeywordIndex
+from modules.local_vector_store import LocalVectorStore, parse_filter
+from modules.vector_store import chapter_scope_filter, extract_book_id, strip_chapter_clause
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHAPTERS = [
+    {"id": "c1", "title": "第一章 运动的描述", "level": 1, "order_index": 1, "start_page": 1, "parent_id": None},
+    {"id": "c1-1", "title": "1.1 质点", "level": 2, "order_index": 2, "start_page": 1, "parent_id": "c1"},
+    {"id": "c1-2", "title": "1.2 速度", "level": 2, "order_index": 3, "start_page": 4, "parent_id": "c1"},
+    {"id": "c2", "title": "第二章 相互作用", "level": 1, "order_index": 4, "start_page": 8, "parent_id": None},
+    {"id": "c2-1", "title": "2.1 重力", "level": 2, "order_index": 5, "start_page": 8, "parent_id": "c2"},
+    {"id": "c2-2", "title": "2.2 摩擦力", "level": 2, "order_index": 6, "start_page": 11, "parent_id": "c2"},
+    {"id": "c3", "title": "第三章 牛顿运动定律", "level": 1, "order_index": 7, "start_page": 15, "parent_id": None},
+]
+
+
+def _node(node_id: str, text: str, page=None, dim: int = 8) -> TextNode:
+    metadata = {"book_id": "b1", "resource_id": "r1"}
+    if page is not None:
+        metadata["page"] = page
+    vector = np.random.default_rng(zlib.crc32(node_id.encode())).standard_normal(dim).tolist()
+    return TextNode(id_=node_id, text=text, embedding=vector, metadata=metadata)
+
+
+def test_ranges_and_assign():
+    """测试页码区间和分块标注"""
+    assert chinese_to_int("三") == 3 and chinese_to_int("十二") == 12 and chinese_to_int("二十") == 20
+    assert chinese_to_int("12") == 12 and chinese_to_int("第") is None
+
+    ranges = chapter_ranges(CHAPTERS)
+    assert ranges["c1"] == (1, 7) and ranges["c1-2"] == (4, 7)
+    assert ranges["c2-2"] == (11, 14) and ranges["c3"][1] == float("inf")
+
+    # 文件页码比目录页码多 2（封面 + 目录）
+    nodes = [
+        _node("n0", "目录\n第一章 运动的描述 1\n第二章 相互作用 8\n第三章 牛顿运动定律 15", page=2),
+        _node("n1", "第一章 运动的描述\n1.1 质点\n物体可以看作质点", page=3),
+        _node("n2", "瞬时速度是某一时刻的速度", page=7),
+        _node("n3", "第二章 相互作用\n2.1 重力", page=10),
+        _node("n4", "滑动摩擦力与压力成正比", page=14),
+        _node("n5", "第三章 牛顿运动定律\n惯性", page=17),
+    ]
+    assert assign_chapters(nodes, CHAPTERS) == 5
+    tags = {node.node_id: node.metadata.get("chapter_id") for node in nodes}
+    assert tags == {"n0": None, "n1": "c1-1", "n2": "c1-2", "n3": "c2-1", "n4": "c2-2", "n5": "c3"}
+
+    # 没有页码时按标题延续
+    nodes = [
+        _node("m0", "第二章 相互作用\n本章介绍力"),
+        _node("m1", "力是物体间的相互作用"),
+        _node("m2", "2.2 摩擦力\n静摩擦力"),
+        _node("m3", "最大静摩擦力"),
+    ]
+    assign_chapters(nodes, CHAPTERS)
+    assert [node.metadata.get("chapter_id") for node in nodes] == ["c2", "c2", "c2-2", "c2-2"]
+
+
+def test_resolve_scope():
+    """测试范围解析"""
+    assert resolve_scope("第二章", CHAPTERS) == ["c2", "c2-1", "c2-2"]
+    assert resolve_scope("第2章", CHAPTERS) == ["c2", "c2-1", "c2-2"]
+    assert resolve_scope("chapter_3", CHAPTERS) == ["c3"]
+    assert resolve_scope("第二章第二节", CHAPTERS) == ["c2-2"]
+    assert resolve_scope("摩擦力", CHAPTERS) == ["c2-2"]
+    assert resolve_scope("c1", CHAPTERS) == ["c1", "c1-1", "c1-2"]
+    assert resolve_scope("全书", CHAPTERS) is None
+    assert resolve_scope("第九章", CHAPTERS) is None
+
+    # 标题没有编号时按顺序
+    plain = [{"id": f"u{i}", "title": title, "level": 1, "order_index": i}
+             for i, title in enumerate(["绪论", "力学", "热学"], 1)]
+    assert resolve_scope("第三单元", plain) == ["u3"]
+
+    assert detect_scope("第三章讲了哪些定律？") == "第三章"
+    assert detect_scope("总结第二章第一节的重点") == "第二章第一节"
+    assert detect_scope("牛顿第二定律是什么") is None
+
+
+def test_filter_expr():
+    """测试章节过滤表达式"""
+    expr = chapter_scope_filter("book_id = 'b1'", ["c2", "c2-1"])
+    assert expr == "book_id = 'b1' and (chapter_id = 'c2' or chapter_id = 'c2-1')"
+    assert chapter_scope_filter("book_id = 'b1'", ["c3"]) == "book_id = 'b1' and chapter_id = 'c3'"
+    assert chapter_scope_filter("book_id = 'b1'", []) == "book_id = 'b1'"
+
+    assert parse_filter(expr) == {"book_id": "b1", "chapter_id": ("c2", "c2-1")}
+    assert extract_book_id(expr) == "b1"
+    assert extract_book_id("book_id = 'b1' or book_id = 'b2'") is None
+    assert strip_chapter_clause(expr) == "book_id = 'b1'"
+    for bad in ("(book_id = 'b1' or book_id = 'b2')", "(chapter_id = 'c1' or resource_id = 'r1')"):
+        try:
+            parse_filter(bad)
+            raise AssertionError(bad)
+        except ValueError:
+            pass
+
+    loader = lambda book_id: CHAPTERS if book_id == "b1" else []
+    assert scoped_filter("book_id = 'b1'", question="第三章讲了什么", loader=loader) == \
+        "book_id = 'b1' and chapter_id = 'c3'"
+    assert scoped_filter("book_id = 'b1'", scope="全书", question="第三章", loader=loader) == "book_id = 'b1'"
+    assert scoped_filter("book_id = 'b2'", scope="第三章", loader=loader) == "book_id = 'b2'"
+    assert scoped_filter(None, scope="第三章", loader=loader) is None
+
+
+def test_scoped_search():
+    """测试按章节子树检索"""
+    nodes = [_node(f"n{i}", f"第{i}段 摩擦力 速度", page=3 + i * 3) for i in range(6)]
+    assign_chapters(nodes, CHAPTERS, page_offset=2)
+    assert {node.metadata["chapter_id"] for node in nodes} == {"c1-1", "c1-2", "c2-1", "c2-2", "c3"}
+    scope = resolve_scope("第二章", CHAPTERS)
+    expected = {node.node_id for node in nodes if node.metadata["chapter_id"] in scope}
+
+    with tempfile.TemporaryDirectory() as vec_dir, tempfile.TemporaryDirectory() as kw_dir:
+        store = LocalVectorStore(base_dir=vec_dir, dtype="float32", dimension=8)
+        store.insert(nodes)
+        query = nodes[0].embedding
+        results = store.search(query, top_k=10, filter_expr="book_id = 'b1'", chapter_ids=scope)
+        assert {r["id"] for r in results} == expected
+        assert all(r["chapter_id"] in scope for r in results)
+        assert len(store.search(query, top_k=10, filter_expr="book_id = 'b1'")) == len(nodes)
+        many = store.search_many([query, nodes[1].embedding], top_k=10,
+                                 filter_expr=chapter_scope_filter("book_id = 'b1'", scope))
+        assert all({r["id"] for r in hits} == expected for hits in many["per_query"])
+
+        keyword_index = KeywordIndex(base_dir=kw_dir)
+        keyword_index.insert(nodes)
+        hits = keyword_index.search("摩擦力", top_k=10, filter_expr=chapter_scope_filter("book_id = 'b1'", scope))
+        assert {r["id"] for r in hits} == expected
+
+        # 条件删除不支持章节范围
+        assert not store.delete_by_filter("chapter_id = 'c2'")
+        assert len(store.search(query, top_k=10, filter_expr="book_id = 'b1'")) == len(nodes)
+
+
+if __name__ == "__main__":
+    test_ranges_and_assign()
+    test_resolve_scope()
+    test_filter_expr()
+    test_scoped_search()
+    logger.info("✅ 章节范围检索测试全部通过")
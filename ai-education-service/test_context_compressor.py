@@ -0,0 +1,98 @@
+"""
+测试上下文压缩
+
+验证：
+1. 句子切分、按得分 + 相邻句选择
+2. [来源X] 标记、分隔符和【工具名】段落原样保留，只压缩来源正文
+3. 与问题相关的句子被保留，无关句子以省略号代替
+4. acompress_context 使用句子向量时在线程中执行，不阻塞事件循环
+"""
+
+import asyncio
+import logging
+import threading
+
+import numpy as np
+
+from config import settings
+from modules import context_compressor
+from modules.context_compressor import (
+    GAP_MARKER, ContextCompressor, acompress_context, select_sentences, split_sentences
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNK = (
+    "光合作用发生在叶绿体中。绿色植物利用光能把二氧化碳和水合成有机物。"
+    "这个过程会释放氧气。细胞呼吸把有机物氧化分解。呼吸作用为生命活动提供能量。"
+    "孟德尔通过豌豆杂交实验提出了分离定律。沃森和克里克提出了 DNA 双螺旋结构。"
+)
+
+
+def test_split_and_select():
+    """测试句子切分和选择"""
+    sentences = split_sentences(CHUNK)
+    assert len(sentences) == 7 and sentences[0] == "光合作用发生在叶绿体中。"
+    assert split_sentences("First one. Second one!\n第三句") == ["First one. Second one!", "第三句"]
+
+    scores = np.array([0.1, 0.9, 0.2, 0.0, 0.0], dtype=np.float32)
+    assert select_sentences(scores, [10] * 5, ratio=0.2, neighbours=0) == [1]
+    assert select_sentences(scores, [10] * 5, ratio=0.2, neighbours=1) == [0, 1, 2]
+
+
+def test_compress_context():
+    """测试带引用标记的上下文压缩"""
+    compressor = ContextCompressor(embed_batch=None, ratio=0.3, neighbours=0, lexical_weight=1.0, min_chars=50)
+    context = (
+        f"[来源1] (相关度: 0.812)\n{CHUNK}\n\n---\n\n"
+        f"[来源2] (相关度: 0.700)\n短片段。\n\n"
+        f"【search_knowledge_graph】\n孟德尔 -> 分离定律"
+    )
+    compressed = compressor.compress_context("光合作用释放什么", context)
+
+    assert compressed.startswith("[来源1] (相关度: 0.812)\n")
+    assert "\n\n---\n\n[来源2] (相关度: 0.700)\n短片段。" in compressed
+    assert compressed.endswith("【search_knowledge_graph】\n孟德尔 -> 分离定律")
+    assert "光合作用发生在叶绿体中。" in compressed
+    assert "沃森和克里克" not in compressed and GAP_MARKER in compressed
+    assert len(compressed) < len(context)
+
+
+def test_compress_results():
+    """测试检索结果压缩（使用句子向量）"""
+    def embed_batch(texts):
+        return [[1.0, 0.0] if "氧气" in t or "释放" in t else [0.0, 1.0] for t in texts]
+
+    compressor = ContextCompressor(embed_batch=embed_batch, ratio=0.05, neighbours=0, lexical_weight=0.0, min_chars=50)
+    results = compressor.compress_results("释放", [{"id": "a", "text": CHUNK}, {"id": "b", "text": "短"}])
+    assert results[0]["text"] == f"{GAP_MARKER}这个过程会释放氧气。{GAP_MARKER}"
+    assert results[0]["original_text"] == CHUNK
+    assert results[1] == {"id": "b", "text": "短"}
+
+
+def test_acompress_off_event_loop():
+    """测试异步压缩：句子向量请求不在事件循环线程中执行"""
+    threads = []
+
+    def embed_batch(texts):
+        threads.append(threading.current_thread())
+        return [[1.0, 0.0] if "释放" in t or "氧气" in t else [0.0, 1.0] for t in texts]
+
+    enabled, previous = settings.CONTEXT_COMPRESSION_ENABLED, context_compressor._compressor
+    settings.CONTEXT_COMPRESSION_ENABLED = True
+    context_compressor._compressor = ContextCompressor(embed_batch=embed_batch, ratio=0.05, neighbours=0, min_chars=50)
+    try:
+        compressed = asyncio.run(acompress_context("释放", f"[来源1]\n{CHUNK}"))
+    finally:
+        settings.CONTEXT_COMPRESSION_ENABLED, context_compressor._compressor = enabled, previous
+    assert "这个过程会释放氧气。" in compressed and "沃森" not in compressed
+    assert threads and threading.main_thread() not in threads
+
+
+if __name__ == "__main__":
+    test_split_and_select()
+    test_compress_context()
+    test_compress_results()
+    test_acompress_off_event_loop()
+    logger.info("✅ 上下文压缩测试全部通过")
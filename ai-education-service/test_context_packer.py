@@ -0,0 +1,76 @@
+"""
+测试上下文打包
+
+验证：
+1. token 估算（中文 / 英文）
+2. 超出预算的大片段被跳过，后面的小片段仍可放入
+3. 重复片段去除，同一文档相邻分块的重叠部分只保留一份
+4. 剩余预算按句子边界截断放入
+"""
+
+import logging
+
+from modules.context_packer import estimate_tokens, overlap_length, pack_context, truncate_to_sentences
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def test_estimate_tokens():
+    """测试 token 估算"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("牛顿第二定律" * 10) == 41
+    assert estimate_tokens("a" * 400) == 101
+
+
+def test_knapsack_and_dedupe():
+    """测试背包选择和去重"""
+    results = [
+        {"id": "big", "text": "加速度" * 300, "score": 0.9},
+        {"id": "small1", "text": "牛顿第二定律 F=ma。", "score": 0.8},
+        {"id": "dup", "text": "牛顿第二定律  F=ma。", "score": 0.7},
+        {"id": "small2", "text": "动量守恒。", "score": 0.6},
+    ]
+    packed, used = pack_context(results, max_tokens=100, truncate=False)
+    assert [r["id"] for r in packed] == ["small1", "small2"]
+    assert used <= 100
+
+
+def test_overlap_trim():
+    """测试相邻分块去重叠"""
+    shared = "两个物体之间的作用力和反作用力总是大小相等"
+    first = {"id": "a", "text": "牛顿第三定律：" + shared, "score": 0.9, "resource_id": "r1"}
+    second = {"id": "b", "text": shared + "，方向相反。", "score": 0.8, "resource_id": "r1"}
+    assert overlap_length(first["text"], second["text"], 200) == len(shared)
+
+    packed, _ = pack_context([first, second], max_tokens=500, truncate=False)
+    assert packed[0]["text"] == first["text"]
+    assert packed[1]["text"] == "，方向相反。" and packed[1]["overlap_trimmed"]
+
+    # 不同文档不去重叠
+    other = {**second, "resource_id": "r2"}
+    packed, _ = pack_context([first, other], max_tokens=500, truncate=False)
+    assert packed[1]["text"] == other["text"]
+
+
+def test_truncate():
+    """测试句子截断"""
+    text = "第一句话。第二句话。" + "第三句很长" * 50 + "。"
+    assert truncate_to_sentences(text, 20) == "第一句话。第二句话。"
+    assert truncate_to_sentences("没有句号" * 50, 10) == ""
+
+    results = [
+        {"id": "a", "text": "牛顿第二定律 F=ma。", "score": 0.9},
+        {"id": "b", "text": text, "score": 0.8},
+    ]
+    packed, _ = pack_context(results, max_tokens=90, truncate=True)
+    assert [r["id"] for r in packed] == ["a", "b"]
+    assert packed[1]["truncated"] and packed[1]["text"] == "第一句话。第二句话。"
+
+
+if __name__ == "__main__":
+    test_estimate_tokens()
+    test_knapsack_and_dedupe()
+    test_overlap_trim()
+    test_truncate()
+    logger.info("✅ 上下文打包测试全部通过")
@@ -0,0 +1,219 @@
+"""
+测试 DashVector 向量存储（内存中的假 collection，方法签名与 dashvector SDK 1.0.x 一致）
+
+验证：
+1. 条件删除按条件分页查询出 ID 后按 ID 删除；每本书独立分区时整区删除，默认分区遗留数据按原条件删除
+2. 条件删除失败或抛出异常时返回 False，缓存仍然失效
+3. 并发批量写入：临时失败的批次单独重试（已成功的批次不重发），持续失败的批次全部计入 failed_ids，
+   单条文档 code 非 0 计为失败
+"""
+
+import logging
+import threading
+from collections import Counter
+
+from llama_index.core.schema import TextNode
+
+import modules.vector_store as vector_store_module
+from modules.local_vector_store import parse_filter
+from modules.vector_store import VectorStore, register_vector_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _Result:
+    def __init__(self, output=None, code: int = 0, message: str = ""):
+        self.output = output
+        self.code = code
+        self.message = message
+
+
+class _Doc:
+    def __init__(self, id: str, fields: dict, vector=None, code: int = 0):
+        self.id = id
+        self.fields = fields
+        self.vector = vector
+        self.score = 0.0
+        self.code = code
+
+
+class _FakeCollection:
+    """按分区保存文档的内存 collection"""
+
+    def __init__(self):
+        self.partitions = {"default": {}}
+        self.deleted_batches = []
+
+    def add(self, partition: str, book_id: str, resource_id: str, count: int) -> None:
+        docs = self.partitions.setdefault(partition, {})
+        for i in range(count):
+            doc_id = f"{partition}-{book_id}-{resource_id}-{i}"
+            docs[doc_id] = _Doc(doc_id, {"book_id": book_id, "resource_id": resource_id})
+
+    def list_partitions(self):
+        return _Result(list(self.partitions))
+
+    def create_partition(self, name):
+        self.partitions.setdefault(name, {})
+        return _Result()
+
+    def describe_partition(self, name):
+        return _Result("SERVING")
+
+    def upsert(self, docs, partition=None, async_req=False):
+        target = self.partitions[partition or "default"]
+        for doc in docs:
+            target[doc.id] = _Doc(doc.id, doc.fields, doc.vector)
+        return _Result([_Doc(doc.id, {}) for doc in docs])
+
+    def delete_partition(self, name):
+        self.partitions.pop(name, None)
+        return _Result()
+
+    def query(self, vector=None, *, topk=10, filter=None, include_vector=False, partition=None,
+              output_fields=None, async_req=False):
+        conditions = parse_filter(filter)
+        docs = [
+            doc for doc in self.partitions.get(partition or "default", {}).values()
+            if all(doc.fields.get(k) == v for k, v in conditions.items())
+        ]
+        return _Result(docs[:topk])
+
+    def delete(self, ids=None, *, delete_all=False, partition=None, async_req=False):
+        self.deleted_batches.append(list(ids))
+        docs = self.partitions.get(partition or "default", {})
+        for doc_id in ids:
+            docs.pop(doc_id, None)
+        return _Result()
+
+
+class _FakeCache:
+    def __init__(self):
+        self.filters = []
+
+    def bump(self, book_id=None):
+        pass
+
+    def bump_by_filter(self, filter_expr):
+        self.filters.append(filter_expr)
+
+    def invalidate(self, ids):
+        pass
+
+
+def _store(collection, partition_mode: str = "book") -> VectorStore:
+    """不连接 DashVector，直接使用假 collection"""
+    store = VectorStore.__new__(VectorStore)
+    store._collection = collection
+    store.collection_name = "test"
+    store.partition_mode = partition_mode
+    store._partitions = None
+    store._partition_lock = threading.Lock()
+    store.hot_cache = None
+    store._hot_snapshot = None
+    store.result_cache = None
+    store.answer_cache = None
+    store.two_stage = None
+    store._full_vectors = None
+    return store
+
+
+def test_delete_by_filter_partitioned():
+    """测试分区模式下的条件删除"""
+    collection = _FakeCollection()
+    collection.add("book_b1", "b1", "r1", 3)
+    collection.add("book_b2", "b2", "r1", 3)
+    collection.add("book_b2", "b2", "r2", 2)
+    collection.add("default", "b1", "r1", 5)  # 迁移到分区前写入的数据
+    collection.add("default", "b2", "r1", 1)
+    cache = _FakeCache()
+    register_vector_cache(cache)
+    store = _store(collection)
+
+    max_topk = vector_store_module.DASHVECTOR_MAX_TOPK
+    vector_store_module.DASHVECTOR_MAX_TOPK = 2  # 每页 2 条，验证分页
+    try:
+        assert store.delete_by_filter("book_id = 'b1'")
+        assert "book_b1" not in collection.partitions
+        assert {doc.fields["book_id"] for doc in collection.partitions["default"].values()} == {"b2"}
+        assert all(len(batch) <= 2 for batch in collection.deleted_batches)
+
+        # 条件含 resource_id：分区内按去掉 book_id 的条件删除
+        assert store.delete_by_filter("book_id = 'b2' and resource_id = 'r1'")
+        assert {doc.fields["resource_id"] for doc in collection.partitions["book_b2"].values()} == {"r2"}
+        assert len(collection.partitions["book_b2"]) == 2 and not collection.partitions["default"]
+    finally:
+        vector_store_module.DASHVECTOR_MAX_TOPK = max_topk
+
+    assert cache.filters == ["book_id = 'b1'", "book_id = 'b2' and resource_id = 'r1'"]
+
+
+def test_delete_by_filter_failure_invalidates():
+    """测试删除失败时仍然使缓存失效"""
+
+    class _FailingQuery(_FakeCollection):
+        def query(self, *args, **kwargs):
+            return _Result(code=-1, message="unavailable")
+
+    class _RaisingDrop(_FakeCollection):
+        def delete_partition(self, name):
+            raise RuntimeError("connection reset")
+
+    cache = _FakeCache()
+    register_vector_cache(cache)
+    for collection in (_FailingQuery(), _RaisingDrop()):
+        collection.add("book_b1", "b1", "r1", 2)
+        assert not _store(collection).delete_by_filter("book_id = 'b1'")
+    assert cache.filters == ["book_id = 'b1'"] * 2
+
+
+class _FlakyCollection(_FakeCollection):
+    """含 n-3 的批次第一次失败，含 n-6 的批次始终失败，n-0 单条写入失败"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = Counter()
+        self.attempts = Counter()
+        self._lock = threading.Lock()
+
+    def upsert(self, docs, partition=None, async_req=False):
+        ids = [doc.id for doc in docs]
+        with self._lock:
+            self.sent.update(ids)
+            self.attempts[ids[0]] += 1
+            attempt = self.attempts[ids[0]]
+        if "n-6" in ids or ("n-3" in ids and attempt == 1):
+            return _Result(code=-2, message="service unavailable")
+        result = super().upsert([doc for doc in docs if doc.id != "n-0"], partition)
+        if "n-0" in ids:
+            result.output.append(_Doc("n-0", {}, code=1))
+        return result
+
+
+def test_insert_batches():
+    """测试批次重试和失败统计"""
+    collection = _FlakyCollection()
+    nodes = [
+        TextNode(id_=f"n-{i}", text=f"第 {i} 段", embedding=[float(i), 1.0],
+                 metadata={"book_id": "b1", "resource_id": "r1"})
+        for i in range(10)
+    ]
+    report = _store(collection).insert(nodes, batch_size=3, max_workers=2)
+
+    # 批次: [0,1,2] [3,4,5] [6,7,8] [9]
+    assert report.total == 10 and report.inserted == 6
+    assert sorted(report.failed_ids) == ["n-0", "n-6", "n-7", "n-8"] and not report.success
+    assert len(report.errors) == 1  # 只有持续失败的批次记录错误
+
+    # 临时失败的批次单独重试一次，其他成功批次只发送一次；持续失败的批次重试到上限
+    assert collection.attempts == Counter({"n-0": 1, "n-3": 2, "n-6": 3, "n-9": 1})
+    assert all(collection.sent[f"n-{i}"] == 1 for i in (0, 1, 2, 9))
+    assert set(collection.partitions["book_b1"]) == {f"n-{i}" for i in (1, 2, 3, 4, 5, 9)}
+
+
+if __name__ == "__main__":
+    test_delete_by_filter_partitioned()
+    test_delete_by_filter_failure_invalidates()
+    test_insert_batches()
+    logger.info("✅ DashVector 向量存储测试全部通过")
@@ -0,0 +1,161 @@
+"""
+测试文档登记
+
+验证：
+1. 文档级 / 分块级元数据拆分，doc_type 映射
+2. doc_ref 优先使用 resource_id，没有时由 oss_key（再退到 file_name）派生且稳定
+3. 登记后 attach 关联文档元数据（含只有 resource_id、没有 doc_ref 的旧分块），
+   get_many 命中缓存不再查询，重新登记 / 删除时缓存失效，数据库不可用时原样返回
+"""
+
+import logging
+
+from modules.document_registry import DocumentRegistry, document_ref, split_document_metadata
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.db.statements.append(sql)
+        if sql.startswith("INSERT INTO rag_documents"):
+            resource_id, book_id, document, chunk_count = params
+            self.db.rows[resource_id] = {
+                "resource_id": resource_id, "book_id": book_id,
+                "metadata": document.adapted, "chunk_count": chunk_count,
+            }
+        elif sql.startswith("SELECT"):
+            self.rows = [dict(self.db.rows[ref]) for ref in params[0] if ref in self.db.rows]
+        elif sql.startswith("DELETE"):
+            deleted = [ref for ref, row in self.db.rows.items() if row["book_id"] == params[0]]
+            for ref in deleted:
+                del self.db.rows[ref]
+            self.rows = [(ref,) for ref in deleted]
+
+    def fetchall(self):
+        return self.rows
+
+
+class _FakeConnection:
+    """只实现 DocumentRegistry 用到的 psycopg2 连接接口"""
+
+    def __init__(self):
+        self.rows = {}
+        self.statements = []
+        self.available = True
+
+    def __enter__(self):
+        if not self.available:
+            raise ConnectionError("database unavailable")
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, cursor_factory=None):
+        return _FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def selects(self) -> int:
+        return sum(sql.startswith("SELECT") for sql in self.statements)
+
+
+def _registry(cache_size: int = 10):
+    conn = _FakeConnection()
+    registry = DocumentRegistry(cache_size=cache_size)
+    registry._get_connection = lambda: conn
+    return registry, conn
+
+
+def test_split_and_ref():
+    """测试元数据拆分和 doc_ref"""
+    metadata = {
+        "book_id": "b1", "resource_id": "r1", "page_label": "3", "chapter_id": "c1",
+        "oss_key": "books/b1/r1.pdf", "bucket": "edu", "file_name": "r1.pdf", "document_type": "textbook",
+    }
+    document, chunk = split_document_metadata(metadata)
+    assert document == {"oss_key": "books/b1/r1.pdf", "bucket": "edu", "file_name": "r1.pdf",
+                        "document_type": "textbook"}
+    assert chunk == {"book_id": "b1", "resource_id": "r1", "page_label": "3", "chapter_id": "c1",
+                     "doc_ref": "r1", "doc_type": "textbook"}
+
+    # 没有 resource_id：由 oss_key 派生，相同 oss_key 得到相同 doc_ref；再退到 file_name
+    by_key = document_ref({"oss_key": "books/b1/r1.pdf"})
+    assert by_key.startswith("oss-") and len(by_key) == 20
+    assert by_key == document_ref({"oss_key": "books/b1/r1.pdf", "file_name": "other.pdf"})
+    assert document_ref({"file_name": "r1.pdf"}) != by_key
+    assert split_document_metadata({"oss_key": "books/b1/r1.pdf"})[1]["doc_ref"] == by_key
+
+    # doc_type 按 doc_type > document_type > type 取值，都没有时不写入
+    assert split_document_metadata({"resource_id": "r1", "type": "exam"})[1]["doc_type"] == "exam"
+    assert split_document_metadata({"resource_id": "r1", "doc_type": "a", "type": "b"})[1]["doc_type"] == "a"
+    assert "doc_type" not in split_document_metadata({"resource_id": "r1"})[1]
+
+
+def test_register_and_attach():
+    """测试登记、关联和缓存"""
+    registry, conn = _registry()
+    assert registry.register({"book_id": "b1", "resource_id": "r1", "page": 1, "file_name": "r1.pdf"}, 12) == "r1"
+    oss_ref = registry.register({"book_id": "b1", "oss_key": "books/b1/x.pdf"}, 3)
+    assert conn.rows["r1"]["metadata"] == {"file_name": "r1.pdf"} and conn.rows["r1"]["chunk_count"] == 12
+
+    results = [
+        {"id": "c1", "doc_ref": "r1", "resource_id": "r1"},
+        {"id": "c2", "resource_id": "r1"},  # 旧分块：只有 resource_id
+        {"id": "c3", "doc_ref": oss_ref},
+        {"id": "c4", "resource_id": "unknown"},
+    ]
+    registry.attach(results)
+    assert results[0]["document"] == results[1]["document"] == {"file_name": "r1.pdf", "book_id": "b1"}
+    assert results[2]["document"] == {"oss_key": "books/b1/x.pdf", "book_id": "b1"}
+    assert "document" not in results[3]
+    assert conn.selects() == 1
+
+    # 命中缓存不再查询（未登记的 ID 不缓存，仍会查询）
+    assert registry.get_many(["r1", oss_ref]).keys() == {"r1", oss_ref}
+    assert conn.selects() == 1
+
+    # 重新登记使缓存失效
+    registry.register({"book_id": "b1", "resource_id": "r1", "file_name": "r1-v2.pdf"}, 12)
+    assert registry.get("r1")["file_name"] == "r1-v2.pdf" and conn.selects() == 2
+
+    # 删除整本书后缓存失效
+    assert registry.delete_by_book("b1") == 2
+    assert registry.get("r1") is None
+
+    # 数据库不可用：attach 原样返回
+    conn.available = False
+    plain = [{"id": "c1", "resource_id": "r1"}]
+    assert registry.attach(plain) == [{"id": "c1", "resource_id": "r1"}]
+
+
+def test_cache_eviction():
+    """测试 LRU 淘汰"""
+    registry, conn = _registry(cache_size=2)
+    for ref in ("r1", "r2", "r3"):
+        registry.register({"book_id": "b1", "resource_id": ref}, 1)
+    registry.get_many(["r1", "r2", "r3"])
+    assert list(registry._cache) == ["r2", "r3"]
+    registry.get("r1")
+    assert conn.selects() == 2 and list(registry._cache) == ["r3", "r1"]
+
+
+if __name__ == "__main__":
+    test_split_and_ref()
+    test_register_and_attach()
+    test_cache_eviction()
+    logger.info("✅ 文档登记测试全部通过")
@@ -0,0 +1,92 @@
+"""
+测试热门教材向量缓存
+
+验证：
+1. 未加载的教材返回 None（回退到 DashVector）
+2. 加载后本地精确检索
+3. 超出内存预算时按 LRU 淘汰
+4. 失效与按请求速率预热
+"""
+
+import logging
+
+import numpy as np
+
+from modules.hot_vector_cache import HotVectorCache, build_hot_book
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIM = 64
+BOOK_SIZE = 200
+
+
+def _vectors(book_id: str) -> np.ndarray:
+    seed = sum(ord(c) for c in book_id)
+    return np.random.default_rng(seed).standard_normal((BOOK_SIZE, DIM)).astype(np.float32)
+
+
+def _loader(book_id: str):
+    return build_hot_book(
+        book_id,
+        ids=[f"{book_id}-{i}" for i in range(BOOK_SIZE)],
+        fields=[{"text": f"{book_id} 第 {i} 段", "book_id": book_id, "page": i // 10 + 1} for i in range(BOOK_SIZE)],
+        vectors=_vectors(book_id),
+    )
+
+
+def _book_bytes() -> int:
+    return _loader("x").nbytes
+
+
+def test_miss_then_hit():
+    """测试未命中与命中"""
+    cache = HotVectorCache(_loader, max_bytes=_book_bytes() * 4)
+    query = _vectors("book_a")[7].tolist()
+
+    assert cache.search(query, 5, "book_id = 'book_a'") is None
+    assert cache.search(query, 5, "resource_id = 'r1'") is None  # 非单书过滤不走缓存
+
+    assert cache.load("book_a")
+    hits = cache.search(query, 5, "book_id = 'book_a'")
+    assert hits[0]["id"] == "book_a-7"
+    assert abs(hits[0]["score"] - 1.0) < 1e-2
+    assert hits[0]["text"] == "book_a 第 7 段" and hits[0]["metadata"] == "{}"
+    assert cache.stats()["hits"] == 1
+
+    projected = cache.search(query, 5, "book_id = 'book_a'", output_fields=["page"])
+    assert set(projected[0]) == {"id", "score", "page"} and projected[0]["page"] == 1
+
+
+def test_lru_budget_and_invalidate():
+    """测试 LRU 淘汰和失效"""
+    cache = HotVectorCache(_loader, max_bytes=int(_book_bytes() * 2.5))
+    cache.load("book_a")
+    cache.load("book_b")
+    cache.search(_vectors("book_a")[0].tolist(), 1, "book_id = 'book_a'")  # book_a 变为最近使用
+    cache.load("book_c")
+
+    books = cache.stats()["books"]
+    assert "book_b" not in books and {"book_a", "book_c"} <= set(books)
+
+    cache.invalidate("book_a")
+    assert cache.search(_vectors("book_a")[0].tolist(), 1, "book_id = 'book_a'") is None
+
+
+def test_warmup_loads_hot_books():
+    """测试按请求速率预热"""
+    cache = HotVectorCache(_loader, max_bytes=_book_bytes() * 4)
+    query = _vectors("book_hot")[0].tolist()
+    for _ in range(10):
+        cache.search(query, 1, "book_id = 'book_hot'")
+    cache.search(query, 1, "book_id = 'book_cold'")
+
+    cache.warmup()
+    assert cache.stats()["books"] == ["book_hot"]
+
+
+if __name__ == "__main__":
+    test_miss_then_hit()
+    test_lru_budget_and_invalidate()
+    test_warmup_loads_hot_books()
+    logger.info("✅ 热缓存测试全部通过")
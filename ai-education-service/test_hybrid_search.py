@@ -0,0 +1,94 @@
+"""
+测试混合检索融合
+
+验证：
+1. RRF / 加权融合按 ID 去重，关键词独有的结果可以进入 top_k
+2. 关键词索引不可用时回退为候选内关键词加权
+3. 不支持的融合方式抛出 ValueError
+4. 关键词匹配器（归一化、去重、与子串匹配结果一致）
+"""
+
+import logging
+
+from modules.hybrid_search import KeywordMatcher, hybrid_search, normalize_keyword_hits, weighted_score_fusion
+from modules.vector_store import reciprocal_rank_fusion
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VECTOR_HITS = [
+    {"id": "v1", "score": 0.82, "text": "物体的加速度与合力成正比"},
+    {"id": "both", "score": 0.80, "text": "牛顿第二定律 F=ma"},
+    {"id": "v2", "score": 0.78, "text": "动量守恒"},
+]
+KEYWORD_HITS = [
+    {"id": "k1", "score": 9.0, "text": "F=ma 的单位换算"},
+    {"id": "both", "score": 7.5, "text": "牛顿第二定律 F=ma"},
+]
+
+
+class _FakeVectorStore:
+    def search(self, query_embedding, top_k, filter_expr=None):
+        return [dict(hit) for hit in VECTOR_HITS[:top_k]]
+
+
+class _FakeKeywordIndex:
+    def search(self, query, top_k=5, filter_expr=None, vector_store=None):
+        return [dict(hit) for hit in KEYWORD_HITS[:top_k]]
+
+    def count(self, book_id=None):
+        return len(KEYWORD_HITS)
+
+
+def test_fusion_functions():
+    """测试融合函数"""
+    keyword = normalize_keyword_hits(KEYWORD_HITS)
+    assert keyword[0]["score"] == 1.0 and keyword[0]["bm25_score"] == 9.0
+
+    fused = reciprocal_rank_fusion([VECTOR_HITS, keyword], top_k=3)
+    assert fused[0]["id"] == "both"
+    assert len({item["id"] for item in fused}) == 3
+
+    weighted = weighted_score_fusion([VECTOR_HITS, keyword], [1.0, 0.0])
+    assert [item["id"] for item in weighted[:3]] == ["v1", "both", "v2"]
+
+    # 加权 RRF：关键词权重为 0 时等同于只用向量排名
+    only_vector = reciprocal_rank_fusion([VECTOR_HITS, keyword], top_k=3, weights=[1.0, 0.0])
+    assert [item["id"] for item in only_vector] == ["v1", "both", "v2"]
+
+
+def test_hybrid_search_modes():
+    """测试融合方式与回退"""
+    embed = lambda text: [1.0, 0.0]
+    kwargs = dict(embed=embed, vector_store=_FakeVectorStore(), top_k=3)
+
+    fused = hybrid_search("F=ma", keyword_index=_FakeKeywordIndex(), fusion="rrf", **kwargs)
+    assert "k1" in {item["id"] for item in fused}
+    assert next(item for item in fused if item["id"] == "both")["keyword_score"] > 0
+
+    boosted = hybrid_search("F=ma", keyword_index=None, fusion="rrf", **kwargs)
+    assert {item["id"] for item in boosted} == {"v1", "both", "v2"}
+    assert boosted[0]["id"] == "both"
+
+    try:
+        hybrid_search("F=ma", keyword_index=None, fusion="bm25", **kwargs)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("不支持的融合方式应抛出 ValueError")
+
+
+def test_keyword_matcher():
+    """测试关键词匹配器"""
+    matcher = KeywordMatcher(["牛顿", "F=ma", "f=ma", "惯性定律"])
+    assert len(matcher.keywords) == 3
+    assert matcher.count("牛顿第二定律：Ｆ＝ｍａ") == 2  # 全角字符归一化后命中
+    assert matcher.score("惯性定律与牛顿") == 2 / 3
+    assert KeywordMatcher([]).score("牛顿") == 0.0
+
+
+if __name__ == "__main__":
+    test_keyword_matcher()
+    test_fusion_functions()
+    test_hybrid_search_modes()
+    logger.info("✅ 混合检索测试全部通过")
@@ -0,0 +1,129 @@
+"""
+测试关键词倒排索引（BM25）
+
+验证：
+1. 分词：英文 / 数字词元 + 中文字符二元组，全角字符归一化
+2. 倒排表差值编码可还原
+3. BM25 检索命中精确术语，按 book_id / resource_id 过滤
+4. 相同 ID 重复写入为 upsert，条件删除
+5. 增量合并与整批写入的倒排表一致，meta 只保存过滤字段，正文从向量存储补全
+"""
+
+import json
+import logging
+import tempfile
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from modules.keyword_index import KeywordIndex, encode_postings, tokenize
+from modules.vector_store import build_chunk_fields
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TEXTS = [
+    "牛顿第二定律：物体加速度与所受合力成正比，F=ma。",
+    "勾股定理：直角三角形两直角边的平方和等于斜边的平方。",
+    "欧姆定律描述电压、电流与电阻的关系，U=IR。",
+    "能量守恒定律：能量既不会凭空产生，也不会凭空消失。",
+]
+
+
+def _make_nodes(book_id: str, resource_id: str = "r1") -> list:
+    return [
+        TextNode(id_=f"{book_id}-{i}", text=text, metadata={"book_id": book_id, "resource_id": resource_id})
+        for i, text in enumerate(TEXTS)
+    ]
+
+
+def test_tokenize():
+    """测试分词"""
+    assert tokenize("勾股定理") == ["勾股", "股定", "定理"]
+    assert tokenize("ＦＦＴ 算法 v2.0") == ["fft", "v2.0", "算法"]
+    assert tokenize("力") == ["力"]
+    assert tokenize("") == []
+
+
+def test_encode_postings():
+    """测试差值编码"""
+    terms, arrays = encode_postings({"a": [(0, 1), (3, 2), (70000, 1)], "b": [(5, 4)]})
+    assert terms == ["a", "b"]
+    assert arrays["doc_gaps"].dtype == np.uint32
+    docs = np.cumsum(arrays["doc_gaps"][0:3])
+    assert docs.tolist() == [0, 3, 70000]
+    assert arrays["doc_gaps"][3] == 5 and arrays["tfs"][3] == 4
+
+
+def test_search_and_delete():
+    """测试检索、upsert 与删除"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = KeywordIndex(base_dir=tmp)
+        index.insert(_make_nodes("b1"))
+        index.insert(_make_nodes("b2", resource_id="r2"))
+
+        hits = index.search("欧姆定律", top_k=2, filter_expr="book_id = 'b1'")
+        assert hits[0]["id"] == "b1-2" and hits[0]["book_id"] == "b1"
+        assert hits[0]["score"] > hits[1]["score"]
+
+        assert index.search("F=ma", top_k=1, filter_expr="book_id = 'b1'")[0]["id"] == "b1-0"
+        assert index.search("勾股定理", top_k=5, filter_expr="book_id = 'b1' and resource_id = 'r2'") == []
+        assert index.search("量子纠缠", top_k=5) == []
+
+        index.insert(_make_nodes("b1"))  # upsert
+        assert index.count("b1") == len(TEXTS)
+
+        # 重新打开后从磁盘读取
+        reopened = KeywordIndex(base_dir=tmp)
+        assert reopened.search("勾股定理", top_k=1, filter_expr="book_id = 'b2'")[0]["id"] == "b2-1"
+
+        reopened.delete_by_filter("book_id = 'b1'")
+        assert reopened.count("b1") == 0 and reopened.count() == len(TEXTS)
+
+
+class _FakeVectorStore:
+    """只实现 fetch"""
+
+    def __init__(self, nodes):
+        self.fields = {node.node_id: build_chunk_fields(node.text, node.metadata) for node in nodes}
+
+    def fetch(self, ids, filter_expr=None):
+        return {doc_id: {"fields": self.fields[doc_id]} for doc_id in ids if doc_id in self.fields}
+
+
+def test_incremental_merge():
+    """测试逐资源写入 / 删除与一次性写入结果一致"""
+    nodes = _make_nodes("b1", "r1") + [
+        TextNode(id_=f"b1-r2-{i}", text=text, metadata={"book_id": "b1", "resource_id": "r2", "chapter_id": "c2"})
+        for i, text in enumerate(reversed(TEXTS))
+    ]
+    with tempfile.TemporaryDirectory() as batch_dir, tempfile.TemporaryDirectory() as step_dir:
+        batch = KeywordIndex(base_dir=batch_dir)
+        batch.insert(nodes[len(TEXTS):])
+        step = KeywordIndex(base_dir=step_dir)
+        step.insert(nodes[:len(TEXTS)])
+        step.insert(nodes[len(TEXTS):])
+        step.delete_by_filter("book_id = 'b1' and resource_id = 'r1'")
+
+        for query in ("定律", "F=ma", "勾股定理", "能量守恒"):
+            expected = [(hit["id"], round(hit["score"], 4)) for hit in batch.search(query, top_k=10)]
+            assert [(hit["id"], round(hit["score"], 4)) for hit in step.search(query, top_k=10)] == expected
+        assert step.count("b1") == len(TEXTS)
+
+        with open(f"{step_dir}/b1.meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        assert meta["book_id"] == "b1" and meta["fields"][0] == {"resource_id": "r2", "chapter_id": "c2"}
+
+        # 正文从向量存储补全；未传入时只有过滤字段
+        hit = step.search("欧姆定律", top_k=1, vector_store=_FakeVectorStore(nodes))[0]
+        assert hit["text"] == TEXTS[2] and hit["resource_id"] == "r2"
+        bare = step.search("欧姆定律", top_k=1)[0]
+        assert bare["text"] == "" and bare["book_id"] == "b1" and bare["chapter_id"] == "c2"
+
+
+if __name__ == "__main__":
+    test_tokenize()
+    test_encode_postings()
+    test_search_and_delete()
+    test_incremental_merge()
+    logger.info("✅ 关键词索引测试全部通过")
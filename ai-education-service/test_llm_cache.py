@@ -0,0 +1,150 @@
+"""
+测试 LLM 响应缓存
+
+验证：
+1. 相同请求体命中缓存（字段顺序无关），model / temperature / max_tokens / prompt 不同时不命中
+2. 高温度、流式请求不可缓存；空回答和被截断的回答不写入
+3. 过期失效、LRU 淘汰，进程内未命中时从 Redis 回填
+4. LLMClient 只在调用点传入 cache_ttl 时读写缓存，命中时不发请求；按调用点统计命中率和节省的延迟
+"""
+
+import asyncio
+import logging
+import time
+
+import httpx
+
+from modules.llm_cache import LLMResponseCache
+from modules.llm_client import LLMClient, LLMMetrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _completion(content: str, finish_reason: str = "stop") -> dict:
+    return {"choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}]}
+
+
+def _payload(prompt: str = "分析意图", **overrides) -> dict:
+    payload = {"model": "qwen-flash", "messages": [{"role": "user", "content": prompt}], "temperature": 0.1,
+               "max_tokens": 500}
+    payload.update(overrides)
+    return payload
+
+
+class _FakeRedis:
+    """只实现用到的 get / setex / ttl / pipeline"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key, (None, 0))[0]
+
+    def setex(self, key, ttl, value):
+        self.data[key] = (value, ttl)
+
+    def ttl(self, key):
+        return self.data.get(key, (None, -2))[1]
+
+    def pipeline(self):
+        redis, calls = self, []
+
+        class _Pipe:
+            def get(self, key):
+                calls.append(redis.get(key))
+
+            def ttl(self, key):
+                calls.append(redis.ttl(key))
+
+            def execute(self):
+                return calls
+
+        return _Pipe()
+
+
+def test_key_and_cacheable():
+    """测试 key 和可缓存判断"""
+    cache = LLMResponseCache(max_entries=10, max_temperature=0.2)
+    key = cache.make_key("dashscope", _payload())
+    reordered = dict(reversed(list(_payload().items())))
+    assert cache.make_key("dashscope", reordered) == key
+    assert cache.make_key("openrouter", _payload()) != key
+    for overrides in ({"model": "qwen-plus"}, {"temperature": 0.0}, {"max_tokens": 200}):
+        assert cache.make_key("dashscope", _payload(**overrides)) != key
+    assert cache.make_key("dashscope", _payload("另一个问题")) != key
+
+    assert cache.cacheable(_payload())
+    assert not cache.cacheable(_payload(temperature=0.7))
+    assert not cache.cacheable(_payload(stream=True))
+
+
+def test_get_set():
+    """测试读写、过期、淘汰和 Redis 回填"""
+    cache = LLMResponseCache(max_entries=2, max_temperature=0.2)
+    cache.set("k1", _completion("simple"), ttl=60, site="route", elapsed_ms=500.0)
+    hit = cache.get("k1", "route")
+    assert hit == _completion("simple")
+    hit["choices"][0]["message"]["content"] = "修改"  # 调用方修改不影响缓存
+    assert cache.get("k1", "route") == _completion("simple")
+
+    cache.set("empty", _completion(""), ttl=60, site="route", elapsed_ms=100.0)
+    cache.set("cut", _completion("截断", "length"), ttl=60, site="route", elapsed_ms=100.0)
+    assert cache.get("empty", "route") is None and cache.get("cut", "route") is None
+
+    cache.set("k2", _completion("a"), ttl=60, site="route", elapsed_ms=100.0)
+    cache.set("k3", _completion("b"), ttl=60, site="route", elapsed_ms=100.0)
+    assert cache.get("k1", "route") is None  # LRU 淘汰
+
+    cache.set("expired", _completion("c"), ttl=0, site="route", elapsed_ms=100.0)
+    time.sleep(0.01)
+    assert cache.get("expired", "route") is None
+
+    redis = _FakeRedis()
+    writer = LLMResponseCache(redis_client=redis, max_entries=10)
+    writer.set("shared", _completion("simple"), ttl=60, site="route", elapsed_ms=300.0)
+    assert redis.ttl("shared") == 60
+    # 另一个进程：本地未命中，从 Redis 读取
+    reader = LLMResponseCache(redis_client=redis, max_entries=10)
+    assert reader.get("shared", "route") == _completion("simple")
+    assert reader.stats()["backend"] == "redis+memory" and reader.stats()["entries"] == 1
+
+
+def test_client_cache():
+    """测试 LLMClient 按调用点启用缓存"""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=_completion('{"type": "simple"}'))
+
+    cache = LLMResponseCache(max_entries=100, max_temperature=0.2)
+    client = LLMClient("dashscope", max_retries=0, metrics=LLMMetrics(window=10), cache=cache,
+                       transport=httpx.MockTransport(handler))
+
+    async def run():
+        results = []
+        for _ in range(3):
+            results.append(await client.complete("问题", site="route", temperature=0.1, cache_ttl=60))
+        # 未传 cache_ttl 的调用点、高温度调用不使用缓存
+        await client.complete("问题", site="synthesize", temperature=0.1)
+        await client.complete("问题", site="chitchat", temperature=0.7, cache_ttl=60)
+        await client.complete("问题", site="chitchat", temperature=0.7, cache_ttl=60)
+        await client.aclose()
+        return results
+
+    assert asyncio.run(run()) == ['{"type": "simple"}'] * 3
+    assert len(requests) == 4
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["hit_rate"] == round(2 / 3, 4)
+    assert set(stats["sites"]) == {"route"} and stats["sites"]["route"]["saved_ms"] >= 0
+    # 命中的调用不计入 LLM 调用统计
+    assert client.metrics.stats()["route"]["calls"] == 1
+
+
+if __name__ == "__main__":
+    test_key_and_cacheable()
+    test_get_set()
+    test_client_cache()
+    logger.info("✅ LLM 响应缓存测试全部通过")
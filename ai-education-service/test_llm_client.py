@@ -0,0 +1,139 @@
+"""
+测试统一 LLM 客户端
+
+验证：
+1. 非流式调用解析回答文本，按调用点统计调用次数和 token 用量
+2. 429 / 5xx 按退避重试，4xx（非限流）不重试，重试耗尽后记为失败
+3. 流式调用逐片段产出，首个片段前失败会重试并记录首字延迟
+4. 同一事件循环复用连接池
+"""
+
+import asyncio
+import json
+import logging
+
+import httpx
+
+from modules.llm_client import LLMClient, LLMMetrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _completion(content: str) -> dict:
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+    }
+
+
+def _client(handler, metrics: LLMMetrics, max_retries: int = 2) -> LLMClient:
+    return LLMClient(
+        "dashscope", max_retries=max_retries, backoff=0.0, metrics=metrics,
+        transport=httpx.MockTransport(handler)
+    )
+
+
+def test_complete_and_metrics():
+    """测试非流式调用和统计"""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json=_completion("答案"))
+
+    metrics = LLMMetrics(window=10)
+    client = _client(handler, metrics)
+
+    async def run():
+        first = await client.complete("问题", site="test.complete", model="m", temperature=0.1, max_tokens=50)
+        second = await client.complete([{"role": "user", "content": "问题"}], site="test.complete")
+        # 同一事件循环复用同一个连接池
+        assert client._client() is client._client()
+        await client.aclose()
+        return first, second
+
+    assert asyncio.run(run()) == ("答案", "答案")
+    assert requests[0]["messages"] == [{"role": "user", "content": "问题"}]
+    assert requests[0]["max_tokens"] == 50 and requests[0]["temperature"] == 0.1
+    assert "max_tokens" not in requests[1]
+
+    stats = metrics.stats()["test.complete"]
+    assert stats["calls"] == 2 and stats["errors"] == 0 and stats["retries"] == 0
+    assert stats["prompt_tokens"] == 20 and stats["completion_tokens"] == 10
+
+
+def test_retry():
+    """测试可重试状态码重试、不可重试状态码直接失败"""
+    statuses = [429, 503, 200]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = statuses.pop(0)
+        if status != 200:
+            return httpx.Response(status, headers={"Retry-After": "0"})
+        return httpx.Response(200, json=_completion("重试成功"))
+
+    metrics = LLMMetrics(window=10)
+    assert asyncio.run(_client(handler, metrics).complete("问题", site="test.retry")) == "重试成功"
+    assert metrics.stats()["test.retry"]["retries"] == 2
+
+    calls = []
+
+    def bad_request(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return httpx.Response(400)
+
+    try:
+        asyncio.run(_client(bad_request, metrics).complete("问题", site="test.bad"))
+        raise AssertionError("400 应直接抛出")
+    except httpx.HTTPStatusError:
+        pass
+    assert len(calls) == 1 and metrics.stats()["test.bad"]["errors"] == 1
+
+    def unavailable(request: httpx.Request) -> httpx.Response:
+        calls.append(1)
+        return httpx.Response(502)
+
+    calls.clear()
+    try:
+        asyncio.run(_client(unavailable, metrics, max_retries=1).complete("问题", site="test.exhausted"))
+        raise AssertionError("重试耗尽应抛出")
+    except httpx.HTTPStatusError:
+        pass
+    assert len(calls) == 2
+    stats = metrics.stats()["test.exhausted"]
+    assert stats["errors"] == 1 and stats["retries"] == 1
+
+
+def test_stream():
+    """测试流式调用和首个片段前的重试"""
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(1)
+        if len(attempts) == 1:
+            return httpx.Response(503)
+        lines = [
+            "data: " + json.dumps({"choices": [{"delta": {"content": piece}}]}, ensure_ascii=False)
+            for piece in ("牛顿", "第二", "定律")
+        ]
+        lines += [": keep-alive", "data: " + json.dumps({"choices": [], "usage": {"prompt_tokens": 3}}),
+                  "data: [DONE]"]
+        return httpx.Response(200, content="\n".join(lines).encode())
+
+    metrics = LLMMetrics(window=10)
+    client = _client(handler, metrics)
+
+    async def run():
+        return [piece async for piece in client.stream("问题", site="test.stream")]
+
+    assert asyncio.run(run()) == ["牛顿", "第二", "定律"]
+    stats = metrics.stats()["test.stream"]
+    assert stats["retries"] == 1 and stats["prompt_tokens"] == 3 and "first_token_p50_ms" in stats
+
+
+if __name__ == "__main__":
+    test_complete_and_metrics()
+    test_retry()
+    test_stream()
+    logger.info("✅ LLM 客户端测试全部通过")
@@ -0,0 +1,117 @@
+"""
+测试本地重排序
+
+验证：
+1. 按余弦 + 词项覆盖率排序，MMR 跳过与已选结果重复的分块
+2. 分块向量只 fetch 一次（LRU 缓存），取不到向量的分块按词项覆盖率参与排序
+3. 分块向量缓存按书失效；注册后本地向量存储写入 / 删除时同步失效
+"""
+
+import logging
+import tempfile
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from modules.local_reranker import LocalReranker, lexical_coverage, mmr_select
+from modules.local_vector_store import LocalVectorStore
+from modules.vector_store import register_vector_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VECTORS = {
+    "a": [1.0, 0.0, 0.0],
+    "a_dup": [0.99, 0.14, 0.0],
+    "b": [0.6, 0.0, 0.8],
+    "c": [0.0, 1.0, 0.0],
+}
+RESULTS = [
+    {"id": "c", "text": "动量守恒"},
+    {"id": "b", "text": "牛顿第二定律 F=ma，加速度"},
+    {"id": "a_dup", "text": "与合力成正比"},
+    {"id": "a", "text": "加速度与合力成正比"},
+]
+
+
+class _FakeVectorStore:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.fetch_calls = 0
+
+    def fetch(self, ids, filter_expr=None):
+        self.fetch_calls += 1
+        return {
+            doc_id: {"vector": np.asarray(self.vectors[doc_id]), "fields": {"book_id": "b1" if doc_id < "b" else "b2"}}
+            for doc_id in ids if doc_id in self.vectors
+        }
+
+
+def test_mmr_select():
+    """测试 MMR 选择"""
+    relevance = np.array([1.0, 0.99, 0.5], dtype=np.float32)
+    similarity = np.array([[1, 0.99, 0], [0.99, 1, 0], [0, 0, 1]], dtype=np.float32)
+    assert mmr_select(relevance, similarity, 2, mmr_lambda=1.0) == [0, 1]
+    assert mmr_select(relevance, similarity, 2, mmr_lambda=0.5) == [0, 2]
+    assert mmr_select(relevance, similarity, 5, mmr_lambda=0.5) == [0, 2, 1]
+
+    assert lexical_coverage(["牛顿", "定律"], "牛顿第二定律") == 1.0
+    assert lexical_coverage([], "牛顿") == 0.0
+
+
+def test_local_rerank():
+    """测试本地重排序"""
+    store = _FakeVectorStore(VECTORS)
+    reranker = LocalReranker(store, embed=lambda q: [1.0, 0.0, 0.0], mmr_lambda=0.5, lexical_weight=0.2)
+
+    reranked = reranker.rerank("加速度", [dict(r) for r in RESULTS], top_n=2)
+    assert [r["id"] for r in reranked] == ["a", "b"]  # a_dup 与 a 重复，被 MMR 跳过
+    assert abs(reranked[0]["cosine"] - 1.0) < 1e-5 and reranked[0]["lexical"] == 1.0
+
+    relevance_only = LocalReranker(store, embed=lambda q: [1.0, 0.0, 0.0], mmr_lambda=1.0, lexical_weight=0.0)
+    assert [r["id"] for r in relevance_only.rerank("加速度", RESULTS, top_n=2)] == ["a", "a_dup"]
+
+    # 第二次调用命中缓存，不再 fetch
+    reranker.rerank("加速度", RESULTS, top_n=2)
+    assert store.fetch_calls == 2
+
+    # 取不到向量：只按词项覆盖率排序
+    empty = LocalReranker(_FakeVectorStore({}), embed=lambda q: [1.0, 0.0, 0.0], mmr_lambda=1.0)
+    assert empty.rerank("F=ma", RESULTS, top_n=1)[0]["id"] == "b"
+
+
+def test_invalidation():
+    """测试分块向量缓存失效"""
+    store = _FakeVectorStore(VECTORS)
+    reranker = LocalReranker(store, embed=lambda q: [1.0, 0.0, 0.0])
+    reranker.rerank("加速度", RESULTS, top_n=2)
+    assert len(reranker._vectors) == 4
+
+    reranker.bump("b1")  # a、a_dup 属于 b1
+    assert set(reranker._vectors) == {"b", "c"}
+    reranker.bump_by_filter("book_id = 'b2' and chapter_id = 'ch1'")
+    assert not reranker._vectors
+
+    with tempfile.TemporaryDirectory() as tmp:
+        local = LocalVectorStore(base_dir=tmp, dtype="float32", dimension=3)
+        nodes = [
+            TextNode(id_=doc_id, text=doc_id, embedding=vector, metadata={"book_id": "b1"})
+            for doc_id, vector in VECTORS.items()
+        ]
+        local.insert(nodes)
+        local_reranker = LocalReranker(local, embed=lambda q: [1.0, 0.0, 0.0])
+        register_vector_cache(local_reranker)
+        local_reranker.rerank("加速度", RESULTS, top_n=2)
+        assert len(local_reranker._vectors) == 4
+
+        local.delete(["a"])
+        assert "a" not in local_reranker._vectors and len(local_reranker._vectors) == 3
+        local.insert(nodes[:1])  # 重新入库 b1
+        assert not local_reranker._vectors
+
+
+if __name__ == "__main__":
+    test_mmr_select()
+    test_local_rerank()
+    test_invalidation()
+    logger.info("✅ 本地重排序测试全部通过")
@@ -0,0 +1,204 @@
+"""
+测试本地向量存储
+
+验证：
+1. 写入后按 book_id / resource_id 过滤检索
+2. 精确 top-k 排序与暴力计算一致
+3. 相同 ID 重复写入为 upsert（不产生重复）
+4. 条件删除
+5. 多查询批量检索与 RRF 融合
+6. 分块字段拆分与 output_fields 投影
+7. 同一目录的多个实例：其他实例改写 / 删除后读取最新数据；文件名冲突的 book_id 写入失败
+8. 共享实例按目录 / 精度复用
+"""
+
+import logging
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from config import settings
+from modules.local_vector_store import (
+    LocalVectorStore, exact_top_k, get_shared_local_store, normalize_rows, parse_filter
+)
+from modules.vector_store import build_chunk_fields, parse_chunk_metadata
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIM = settings.EMBEDDING_DIMENSION
+
+
+def _make_nodes(count: int, book_id: str, resource_id: str = "", seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, DIM)).astype(np.float32)
+    return [
+        TextNode(
+            id_=f"{book_id}-{resource_id}-{i}",
+            text=f"{book_id} 第 {i} 段",
+            embedding=vectors[i].tolist(),
+            metadata={"book_id": book_id, "resource_id": resource_id},
+        )
+        for i in range(count)
+    ]
+
+
+def test_parse_filter():
+    """测试过滤表达式解析"""
+    assert parse_filter(None) == {}
+    assert parse_filter("book_id = 'b1'") == {"book_id": "b1"}
+    assert parse_filter("book_id = 'b1' and resource_id = 'r1'") == {"book_id": "b1", "resource_id": "r1"}
+
+    try:
+        parse_filter("page > 3")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("不支持的过滤表达式应抛出 ValueError")
+
+
+def test_exact_top_k_matches_bruteforce():
+    """测试 top-k 与完整排序一致"""
+    rng = np.random.default_rng(1)
+    matrix = normalize_rows(rng.standard_normal((500, 64)).astype(np.float32))
+    query = normalize_rows(rng.standard_normal((1, 64)).astype(np.float32))[0]
+
+    rows, scores = exact_top_k(matrix, query, 10)
+    expected = np.argsort(-(matrix @ query))[:10]
+
+    assert rows.tolist() == expected.tolist()
+    assert np.all(np.diff(scores) <= 0)
+
+    half = exact_top_k(matrix.astype(np.float16), query, 10)[0]
+    assert len(set(half.tolist()) & set(expected.tolist())) >= 8
+
+
+def test_insert_search_and_filter(tmp_path):
+    """测试写入、过滤检索和 upsert"""
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    nodes = _make_nodes(20, "book_a", "r1") + _make_nodes(10, "book_b", "r2", seed=1)
+
+    report = store.insert(nodes)
+    assert report.inserted == 30 and report.success
+
+    # 用第 3 个节点自身的向量检索，应排第一
+    hits = store.search(nodes[3].embedding, top_k=5, filter_expr="book_id = 'book_a'")
+    assert hits[0]["id"] == nodes[3].node_id
+    assert abs(hits[0]["score"] - 1.0) < 1e-4
+    assert all(h["id"].startswith("book_a") for h in hits)
+
+    hits = store.search(nodes[3].embedding, top_k=5, filter_expr="resource_id = 'r2'")
+    assert all(h["id"].startswith("book_b") for h in hits)
+
+    # 重复写入不产生重复
+    store.insert(nodes[:5])
+    assert store.count("book_a") == 20
+
+    # 重新打开（从内存映射文件加载）
+    reopened = LocalVectorStore(base_dir=str(tmp_path))
+    assert reopened.count() == 30
+
+
+def test_delete_by_filter(tmp_path):
+    """测试条件删除"""
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    store.insert(_make_nodes(5, "book_a", "r1") + _make_nodes(5, "book_a", "r2", seed=2))
+
+    assert store.delete_by_filter("book_id = 'book_a' and resource_id = 'r1'")
+    assert store.count("book_a") == 5
+
+    assert store.delete_by_filter("book_id = 'book_a'")
+    assert store.count("book_a") == 0
+    assert not store.delete_by_filter("")
+
+
+def test_search_many_fuses_queries(tmp_path):
+    """测试多查询批量检索与融合"""
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    nodes = _make_nodes(20, "book_a", "r1")
+    store.insert(nodes)
+
+    queries = [nodes[2].embedding, nodes[9].embedding]
+    result = store.search_many(queries, top_k=3, filter_expr="book_id = 'book_a'")
+
+    assert [hits[0]["id"] for hits in result["per_query"]] == [nodes[2].node_id, nodes[9].node_id]
+    for query, hits in zip(queries, result["per_query"]):
+        assert [h["id"] for h in hits] == [h["id"] for h in store.search(query, 3, "book_id = 'book_a'")]
+
+    fused_ids = [h["id"] for h in result["fused"]]
+    assert len(fused_ids) == len(set(fused_ids)) == 3
+    assert {nodes[2].node_id, nodes[9].node_id} <= set(fused_ids)
+
+
+def test_chunk_fields_and_projection(tmp_path):
+    """测试原生字段拆分和字段投影"""
+    fields = build_chunk_fields("正文", {
+        "book_id": "b1", "resource_id": "r1", "page_label": "12",
+        "document_type": "textbook", "section": "1.2",
+    })
+    assert fields["page"] == 12 and fields["doc_type"] == "textbook"
+    assert parse_chunk_metadata(fields["metadata"]) == {"section": "1.2"}
+    assert parse_chunk_metadata("{'oss_key': 'a.pdf'}") == {"oss_key": "a.pdf"}  # 旧数据
+
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    nodes = _make_nodes(5, "book_a", "r1")
+    store.insert(nodes)
+
+    full = store.search(nodes[0].embedding, top_k=1, filter_expr="book_id = 'book_a'")[0]
+    assert full["text"] == nodes[0].text and full["book_id"] == "book_a" and full["metadata"] == "{}"
+
+    listed = store.search(nodes[0].embedding, top_k=1, filter_expr="book_id = 'book_a'",
+                          output_fields=["book_id", "page"])[0]
+    assert set(listed) == {"id", "score", "book_id", "page"}
+
+
+def test_shared_directory(tmp_path):
+    """测试多个实例读写同一目录"""
+    writer = LocalVectorStore(base_dir=str(tmp_path))
+    reader = LocalVectorStore(base_dir=str(tmp_path))
+    nodes = _make_nodes(5, "book_a", "r1")
+    writer.insert(nodes)
+    assert reader.count("book_a") == 5
+
+    writer.insert(_make_nodes(3, "book_a", "r2", seed=3))
+    assert reader.count("book_a") == 8
+    hits = reader.search(nodes[0].embedding, top_k=10, filter_expr="book_id = 'book_a' and resource_id = 'r2'")
+    assert len(hits) == 3
+
+    writer.delete_by_filter("book_id = 'book_a' and resource_id = 'r1'")
+    assert reader.fetch([nodes[0].node_id], filter_expr="book_id = 'book_a'") == {}
+    writer.delete_by_filter("book_id = 'book_a'")
+    assert reader.count("book_a") == 0 and reader.search(nodes[0].embedding, top_k=5) == []
+
+    # "a.b" 与 "a_b" 映射到同一文件名：后写入的教材失败，检索不串书
+    store = LocalVectorStore(base_dir=str(tmp_path))
+    assert store.insert(_make_nodes(2, "a.b")).success
+    report = store.insert(_make_nodes(2, "a_b", seed=4))
+    assert report.inserted == 0 and len(report.failed_ids) == 2
+    assert store.count("a_b") == 0 and store.count("a.b") == 2
+    assert store.search(nodes[0].embedding, top_k=5, filter_expr="book_id = 'a_b'") == []
+    store.delete_by_filter("book_id = 'a_b'")
+    assert store.count("a.b") == 2
+
+
+def test_shared_local_store(tmp_path):
+    """测试共享实例"""
+    store = get_shared_local_store(str(tmp_path), dtype="float16")
+    assert get_shared_local_store(str(tmp_path / "."), dtype="float16") is store
+    assert get_shared_local_store(str(tmp_path), dtype="float32") is not store
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_parse_filter()
+    test_exact_top_k_matches_bruteforce()
+    with tempfile.TemporaryDirectory() as d:
+        test_insert_search_and_filter(Path(d) / "a")
+        test_delete_by_filter(Path(d) / "b")
+        test_search_many_fuses_queries(Path(d) / "c")
+        test_chunk_fields_and_projection(Path(d) / "d")
+        test_shared_directory(Path(d) / "e")
+        test_shared_local_store(Path(d) / "f")
+    logger.info("✅ 本地向量存储测试全部通过")
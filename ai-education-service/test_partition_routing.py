@@ -0,0 +1,50 @@
+"""
+测试 DashVector 分区路由
+
+验证：
+1. book / bucket 模式的分区名（合法、稳定）
+2. 从过滤表达式提取 book_id（含 or / 括号时不提取）
+3. 每本书独立分区时去掉 book_id 条件
+"""
+
+import logging
+import re
+
+from modules.vector_store import extract_book_id, partition_name, strip_book_clause
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_VALID = re.compile(r"^[A-Za-z0-9_\-]{3,32}$")
+
+
+def test_partition_name():
+    """测试分区名"""
+    assert partition_name("b1", mode="none") is None
+    assert partition_name("", mode="book") is None
+    assert partition_name("b1", mode="book") == "book_b1"
+
+    long_id = "3f2b9c1e-8d7a-4c55-9e0b-6a1d2f3e4b5c"
+    name = partition_name(long_id, mode="book")
+    assert _VALID.match(name) and name == partition_name(long_id, mode="book")
+
+    buckets = {partition_name(f"book-{i}", mode="bucket", buckets=8) for i in range(200)}
+    assert len(buckets) == 8 and all(_VALID.match(b) for b in buckets)
+
+
+def test_extract_and_strip():
+    """测试 book_id 提取与条件剥离"""
+    assert extract_book_id("book_id = 'b1'") == "b1"
+    assert extract_book_id("book_id = 'b1' and chapter_id = 'c2'") == "b1"
+    assert extract_book_id("book_id = 'b1' or book_id = 'b2'") is None
+    assert extract_book_id("resource_id = 'r1'") is None
+    assert extract_book_id(None) is None
+
+    assert strip_book_clause("book_id = 'b1'") is None
+    assert strip_book_clause("book_id = 'b1' and chapter_id = 'c2'") == "chapter_id = 'c2'"
+
+
+if __name__ == "__main__":
+    test_partition_name()
+    test_extract_and_strip()
+    logger.info("✅ 分区路由测试全部通过")
@@ -0,0 +1,78 @@
+"""
+测试查询准备（并发改写 / 预检索复用 / 后台摘要）
+
+验证：
+1. 改写结果与原问题几乎相同时复用预检索结果，否则重新检索
+2. 历史超过阈值时摘要在后台生成，不阻塞本次查询
+"""
+
+import asyncio
+import logging
+
+from modules.conversation_memory import ConversationMemory
+from modules.rag_retriever import RAGRetriever, is_same_query
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _Memory(ConversationMemory):
+    async def generate_summary(self, history):
+        await asyncio.sleep(0.05)
+        return "摘要"
+
+
+class _Retriever(RAGRetriever):
+    def __init__(self, rewrite: str):
+        self.memory = _Memory(chat_model="test")
+        self.answer_cache = None
+        self.window_store = None
+        self.chapter_index = None
+        self.rewrite = rewrite
+        self.retrieved = []
+
+    async def rewrite_query(self, query, history=None):
+        await asyncio.sleep(0.01)
+        return self.rewrite if history else query
+
+    def retrieve(self, query, top_k=5, filter_expr=None, fusion=None):
+        self.retrieved.append(query)
+        return [{"id": query, "text": query}]
+
+
+def test_is_same_query():
+    """测试改写一致性判断"""
+    assert is_same_query("牛顿第三定律是什么", "牛顿第三定律是什么？")
+    assert is_same_query("What is F=ma", "what is  F = ma")
+    assert not is_same_query("它的单位是什么", "牛顿第二定律中力的单位是什么")
+
+
+async def _prepare_query():
+    history = [{"role": "user", "content": "牛顿"}]
+
+    retriever = _Retriever("牛顿第三定律是什么？")
+    rewritten, results, _, _ = await retriever.prepare_query("牛顿第三定律是什么", 5, history=history)
+    assert retriever.retrieved == ["牛顿第三定律是什么"] and results[0]["id"] == "牛顿第三定律是什么"
+
+    retriever = _Retriever("牛顿第二定律中力的单位是什么")
+    _, results, _, _ = await retriever.prepare_query("它的单位是什么", 5, history=history)
+    assert results[0]["id"] == "牛顿第二定律中力的单位是什么"
+
+    long_history = [{"role": "user", "content": "受力分析" * 1000}] * 6
+    _, _, compressed, summary = await retriever.prepare_query(
+        "问题", 5, history=long_history, user_id="u", book_id="b"
+    )
+    assert len(compressed) == 4 and summary is None  # 摘要尚未生成，本轮不等待
+    await asyncio.gather(*retriever.memory._pending.values())
+    assert await retriever.memory.get_summary("u", "b") == "摘要"
+
+
+def test_prepare_query():
+    """测试预检索复用和后台摘要"""
+    asyncio.run(_prepare_query())
+
+
+if __name__ == "__main__":
+    test_is_same_query()
+    test_prepare_query()
+    logger.info("✅ 查询准备测试全部通过")
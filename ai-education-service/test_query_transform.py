@@ -0,0 +1,136 @@
+"""
+测试 HyDE 查询转换
+
+验证：
+1. HyDECache 按归一化问题命中，LRU 淘汰，过期失效
+2. atransform_with_hyde 返回 [原始查询, 假设性文档]，重复问题命中缓存不再调用 LLM
+3. LLM 失败时只返回原始查询，且不写入缓存
+4. 多个 HyDE 调用并发执行（不阻塞事件循环）
+5. 同步路径与异步路径共用缓存，检索字符串都是原始查询在前
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
+
+from modules.agentic_rag.query_transform import HyDECache, QueryTransformer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _FakeLLM(CustomLLM):
+    """固定延迟返回假设性文档，记录调用次数"""
+
+    calls: int = 0
+    fail: bool = False
+    delay: float = 0.0
+    allow_sync: bool = False
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="fake")
+
+    def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
+        if not self.allow_sync:
+            raise AssertionError("异步路径不应调用同步 complete")
+        self.calls += 1
+        return CompletionResponse(text=" 假设性答案：" + prompt.split("问题: ")[1].split("\n")[0] + " ")
+
+    async def acomplete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("LLM 超时")
+        return CompletionResponse(text=" 假设性答案：" + prompt.split("问题: ")[1].split("\n")[0] + " ")
+
+    def stream_complete(self, prompt: str, **kwargs: Any):
+        raise NotImplementedError
+
+
+def test_cache():
+    """测试 HyDE 缓存"""
+    cache = HyDECache(max_entries=2, ttl=60)
+    cache.put("什么是光合作用？", ["什么是光合作用？", "文档"])
+    assert cache.get("什么是光合作用") == ["什么是光合作用？", "文档"]
+    assert cache.get(" 什么是光合作用 ! ") is not None
+
+    cache.put("问题二", ["问题二"])
+    cache.get("什么是光合作用")
+    cache.put("问题三", ["问题三"])
+    # 最久未使用的 "问题二" 被淘汰
+    assert cache.get("问题二") is None and len(cache) == 2
+
+    expired = HyDECache(max_entries=10, ttl=0)
+    expired.put("问题", ["问题"])
+    time.sleep(0.01)
+    assert expired.get("问题") is None
+
+    disabled = HyDECache(max_entries=0, ttl=60)
+    disabled.put("问题", ["问题"])
+    assert disabled.get("问题") is None
+
+
+def test_atransform_cached():
+    """测试异步 HyDE 和缓存"""
+    llm = _FakeLLM()
+    transformer = QueryTransformer(llm=llm, cache=HyDECache(max_entries=10, ttl=60))
+
+    bundle = asyncio.run(transformer.atransform_with_hyde("牛顿第二定律是什么？"))
+    assert transformer.get_embedding_strings(bundle) == ["牛顿第二定律是什么？", "假设性答案：牛顿第二定律是什么？"]
+
+    again = asyncio.run(transformer.atransform_with_hyde("牛顿第二定律是什么"))
+    assert transformer.get_embedding_strings(again)[1] == "假设性答案：牛顿第二定律是什么？"
+    assert llm.calls == 1
+
+
+def test_atransform_failure_not_cached():
+    """测试 LLM 失败时回退原始查询且不缓存"""
+    llm = _FakeLLM(fail=True)
+    transformer = QueryTransformer(llm=llm, cache=HyDECache(max_entries=10, ttl=60))
+
+    bundle = asyncio.run(transformer.atransform_with_hyde("动量守恒的条件"))
+    assert transformer.get_embedding_strings(bundle) == ["动量守恒的条件"]
+    llm.fail = False
+    bundle = asyncio.run(transformer.atransform_with_hyde("动量守恒的条件"))
+    assert len(transformer.get_embedding_strings(bundle)) == 2
+    assert llm.calls == 2
+
+
+def test_atransform_concurrent():
+    """测试多个 HyDE 调用并发执行"""
+    llm = _FakeLLM(delay=0.2)
+    transformer = QueryTransformer(llm=llm, cache=HyDECache(max_entries=10, ttl=60))
+
+    async def run():
+        return await asyncio.gather(*(transformer.atransform_with_hyde(f"问题{i}") for i in range(5)))
+
+    t0 = time.perf_counter()
+    bundles = asyncio.run(run())
+    assert time.perf_counter() - t0 < 0.6
+    assert [transformer.get_embedding_strings(b)[0] for b in bundles] == [f"问题{i}" for i in range(5)]
+
+
+def test_sync_async_share_cache():
+    """测试同步路径写入的缓存条目，异步路径读取时仍是原始查询在前"""
+    llm = _FakeLLM(allow_sync=True)
+    transformer = QueryTransformer(llm=llm, cache=HyDECache(max_entries=10, ttl=60))
+
+    bundle = transformer.transform_with_hyde("欧姆定律适用的条件？")
+    assert transformer.get_embedding_strings(bundle) == ["欧姆定律适用的条件？", "假设性答案：欧姆定律适用的条件？"]
+
+    again = asyncio.run(transformer.atransform_with_hyde("欧姆定律适用的条件"))
+    assert transformer.get_embedding_strings(again) == ["欧姆定律适用的条件", "假设性答案：欧姆定律适用的条件？"]
+    assert llm.calls == 1
+
+
+if __name__ == "__main__":
+    test_cache()
+    test_atransform_cached()
+    test_atransform_failure_not_cached()
+    test_atransform_concurrent()
+    test_sync_async_share_cache()
+    logger.info("✅ HyDE 查询转换测试全部通过")
@@ -0,0 +1,116 @@
+"""
+测试假设问题索引
+
+验证：
+1. 解析 LLM 返回的问题 JSON（代码块包裹、缺失片段、超出数量）
+2. 问题生成按批合并 LLM 调用并限制并发，失败批次返回空列表
+3. 问题向量写入、按原问题匹配映射回分块（去重），映射为分块检索结果
+4. covers 判断教材是否已有问题索引，按 book_id 删除
+"""
+
+import asyncio
+import json
+import logging
+import tempfile
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from modules.local_vector_store import LocalVectorStore
+from modules.question_index import (
+    QuestionIndex, generate_questions, parent_chunk_id, parse_questions, resolve_question_hits
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIM = 8
+FILTER = "book_id = 'b1'"
+
+
+def _vector(topic: int) -> list:
+    vector = np.zeros(DIM)
+    vector[topic] = 1.0
+    return vector.tolist()
+
+
+def _nodes() -> list:
+    return [
+        TextNode(id_=f"n{i}", text=f"主题{i}：这是一段足够长的教材正文，用来生成学生可能提出的问题。" * 2,
+                 embedding=_vector(i), metadata={"book_id": "b1", "resource_id": "r1"})
+        for i in range(4)
+    ] + [TextNode(id_="title", text="第一章", embedding=_vector(5), metadata={"book_id": "b1"})]
+
+
+async def _complete(prompt: str) -> str:
+    # 每个片段两个问题，问题里带上片段的主题编号
+    count = prompt.count("\n[")
+    topics = [prompt.split(f"[{i}] 主题")[1][0] for i in range(1, count + 1)]
+    return json.dumps({str(i): [f"主题{t}问题A", f"主题{t}问题B"] for i, t in enumerate(topics, 1)})
+
+
+def _embed_batch(texts: list) -> list:
+    return [_vector(int(text[2])) for text in texts]
+
+
+def test_parse_questions():
+    """测试问题解析"""
+    content = '```json\n{"1": ["问题1", " ", "问题2", "问题3"], "3": "不是列表"}\n```'
+    assert parse_questions(content, 3, 2) == [["问题1", "问题2"], [], []]
+    assert parse_questions("不是 JSON", 2, 3) == [[], []]
+    assert parse_questions('["列表"]', 1, 3) == [[]]
+    assert parent_chunk_id("node#q1#q2") == "node#q1"
+
+
+def test_generate_questions_batched():
+    """测试按批生成问题、并发上限和失败批次"""
+    calls, active, peak = [], [0], [0]
+
+    async def complete(prompt):
+        calls.append(prompt)
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        if "主题4" in prompt:
+            raise RuntimeError("LLM 超时")
+        return await _complete(prompt)
+
+    texts = [f"主题{i}：正文" for i in range(5)]
+    result = asyncio.run(generate_questions(texts, per_chunk=1, batch_size=2, concurrency=2, complete=complete))
+    assert len(calls) == 3 and peak[0] == 2
+    assert result == [["主题0问题A"], ["主题1问题A"], ["主题2问题A"], ["主题3问题A"], []]
+
+
+def test_build_and_search():
+    """测试问题索引写入、匹配和分块映射"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = QuestionIndex(base_dir=f"{tmp}/questions", dtype="float32", dimension=DIM)
+        assert not index.covers(FILTER)
+        # 过短的标题分块不生成问题
+        assert asyncio.run(index.build(_nodes(), _embed_batch, complete=_complete)) == 8
+        assert index.covers(FILTER)
+        assert not index.covers("book_id = 'b2'") and not index.covers(None)
+
+        hits = index.search(_vector(2), top_k=2, filter_expr=FILTER)
+        # 同一分块的两个问题只返回一次
+        assert hits[0]["id"] == "n2" and hits[0]["question"].startswith("主题2问题")
+        assert len({hit["id"] for hit in hits}) == len(hits)
+
+        chunks = LocalVectorStore(base_dir=f"{tmp}/chunks", dtype="float32", dimension=DIM)
+        chunks.insert([node for node in _nodes() if node.node_id != "n3"])
+        results = resolve_question_hits(chunks, index.search(_vector(3), top_k=1, filter_expr=FILTER) + hits[:1], FILTER)
+        # n3 已从分块库删除，命中被丢弃
+        assert [r["id"] for r in results] == ["n2"]
+        assert results[0]["book_id"] == "b1" and results[0]["text"].startswith("主题2")
+        assert results[0]["matched_question"] == hits[0]["question"]
+
+        assert index.delete_by_filter(FILTER)
+        assert not index.covers(FILTER)
+
+
+if __name__ == "__main__":
+    test_parse_questions()
+    test_generate_questions_batched()
+    test_build_and_search()
+    logger.info("✅ 假设问题索引测试全部通过")
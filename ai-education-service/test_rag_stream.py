@@ -0,0 +1,86 @@
+"""
+测试 RAG 流式问答（/rag/stream 使用的 run_rag_stream）
+
+验证：
+1. 事件顺序：retrieved -> token... -> citations
+2. 生成结束后提取引用并写入回答缓存
+3. 回答缓存命中时不调用模型，按小块输出缓存的回答和引用
+"""
+
+import asyncio
+import logging
+
+from modules.answer_cache import AnswerCache
+from modules.rag_retriever import RAGRetriever
+from modules.rag_workflow import run_rag_stream
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SOURCES = [{"id": "c1", "text": "牛顿第二定律 F=ma", "score": 0.9, "page": 12, "citation_id": 1}]
+
+
+class _Retriever(RAGRetriever):
+    """只替换流式生成"""
+
+    def __init__(self):
+        self.answer_cache = AnswerCache(threshold=0.95, ttl=60, max_entries=10)
+        self.window_store = None
+        self.chapter_index = None
+        self._embed_query = lambda text: [1.0, 0.0]
+        self.generated = 0
+
+    async def generate_answer_stream(self, query, context, system_prompt=None, history=None, summary=None):
+        self.generated += 1
+        for token in ["F=ma", "，见", "[来源1]"]:
+            yield token
+
+
+class _Workflow:
+    """模拟 RAGStreamWorkflow.run 的返回（含回答缓存查找）"""
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+
+    async def run(self, query, top_k, filter_expr, history, user_id, book_id, intent, scope=None):
+        cached, cache_key = self.retriever.lookup_answer(query, filter_expr, top_k, intent, history)
+        if cached is not None:
+            return {**cached, "query": query, "retriever": self.retriever}
+        return {
+            "query": query, "context": "[来源1]\n牛顿第二定律 F=ma", "sources": SOURCES,
+            "history": history, "summary": None, "cache_key": cache_key, "retriever": self.retriever
+        }
+
+
+async def _collect(workflow, question: str) -> list:
+    return [
+        event async for event in run_rag_stream(
+            question, top_k=3, filter_expr="book_id = 'b1'", workflow=workflow
+        )
+    ]
+
+
+def test_stream_and_cache():
+    """测试流式事件和回答缓存"""
+    retriever = _Retriever()
+    workflow = _Workflow(retriever)
+
+    events = asyncio.run(_collect(workflow, "牛顿第二定律是什么？"))
+    types = [event["event_type"] for event in events]
+    assert types == ["retrieved", "token", "token", "token", "citations"]
+    assert events[0]["sources"] == 1 and not events[0]["cached"]
+    assert "".join(e["content"] for e in events if e["event_type"] == "token") == "F=ma，见[来源1]"
+    assert [c["citation_id"] for c in events[-1]["citations"]] == [1]
+    assert retriever.generated == 1
+
+    events = asyncio.run(_collect(workflow, "牛顿第二定律是什么"))
+    assert events[0]["cached"] and events[-1]["event_type"] == "citations"
+    assert "".join(e["content"] for e in events if e["event_type"] == "token") == "F=ma，见[来源1]"
+    assert events[-1]["citations"][0]["page"] == 12
+    assert retriever.generated == 1
+    assert retriever.answer_cache.stats()["hits"] == 1
+
+
+if __name__ == "__main__":
+    test_stream_and_cache()
+    logger.info("✅ RAG 流式问答测试全部通过")
@@ -0,0 +1,80 @@
+"""
+测试检索结果缓存
+
+验证：
+1. 相同（量化后）查询命中缓存，返回对象可被调用方修改
+2. filter / top_k 不同时不命中
+3. 按书递增版本号只使对应教材和无过滤的条目失效
+4. 全局失效
+"""
+
+import logging
+
+import numpy as np
+
+from modules.retrieval_cache import RetrievalCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIM = 64
+RESULTS = [{"id": "c1", "score": 0.9, "text": "微积分基本定理"}]
+
+
+def _query(seed: int = 0) -> list:
+    return np.random.default_rng(seed).standard_normal(DIM).tolist()
+
+
+def _cache() -> RetrievalCache:
+    return RetrievalCache(max_entries=100, ttl=60, quant_step=0.001)
+
+
+def test_hit_after_set():
+    """测试命中与统计"""
+    cache = _cache()
+    query = _query()
+    key = cache.make_key(query, 5, "book_id = 'b1'")
+    assert cache.get(key) is None
+
+    cache.set(key, RESULTS, elapsed_ms=80.0)
+    # 数值噪声级别的差异映射到同一个 key
+    noisy = (np.asarray(query) * (1 + 1e-7)).tolist()
+    hits = cache.get(cache.make_key(noisy, 5, "book_id = 'b1'"))
+    assert hits == RESULTS
+
+    hits[0]["score"] = 0.0  # 调用方修改不影响缓存
+    assert cache.get(key)[0]["score"] == 0.9
+
+    assert cache.get(cache.make_key(query, 10, "book_id = 'b1'")) is None
+    assert cache.get(cache.make_key(query, 5, "book_id = 'b2'")) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert stats["saved_ms"] > 0
+
+
+def test_version_invalidation():
+    """测试按书失效"""
+    cache = _cache()
+    query = _query(1)
+    keys = {
+        "b1": cache.make_key(query, 5, "book_id = 'b1'"),
+        "b2": cache.make_key(query, 5, "book_id = 'b2'"),
+        "all": cache.make_key(query, 5, None),
+    }
+    for key in keys.values():
+        cache.set(key, RESULTS, elapsed_ms=50.0)
+
+    cache.bump("b1")
+    assert cache.get(cache.make_key(query, 5, "book_id = 'b1'")) is None
+    assert cache.get(cache.make_key(query, 5, "book_id = 'b2'")) == RESULTS
+    assert cache.get(cache.make_key(query, 5, None)) is None
+
+    cache.bump_by_filter("resource_id = 'r1' and page > 3")  # 无法解析 -> 全部失效
+    assert cache.get(cache.make_key(query, 5, "book_id = 'b2'")) is None
+
+
+if __name__ == "__main__":
+    test_hit_after_set()
+    test_version_invalidation()
+    logger.info("✅ 检索缓存测试全部通过")
@@ -0,0 +1,90 @@
+"""
+测试两阶段（Matryoshka）检索
+
+验证：
+1. 截取前缀后重新归一化
+2. 候选覆盖全部数据时，重排结果与完整维度精确检索一致
+3. 没有低维索引的教材返回 None（由调用方回退单阶段）
+4. 删除同步到低维索引
+5. 低维索引保存 chapter_id，章节范围检索不回退单阶段
+"""
+
+import logging
+import tempfile
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from modules.local_vector_store import LocalVectorStore
+from modules.two_stage_search import TwoStageSearcher, truncate_embedding
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIM = 256
+COARSE_DIM = 64
+
+
+def _make_nodes(count: int, book_id: str, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, DIM)).astype(np.float32)
+    return [
+        TextNode(
+            id_=f"{book_id}-{i}",
+            text=f"{book_id} 第 {i} 段",
+            embedding=vectors[i].tolist(),
+            metadata={"book_id": book_id, "chapter_id": f"c{i % 3}"},
+        )
+        for i in range(count)
+    ]
+
+
+def test_truncate_embedding():
+    """测试前缀截取"""
+    vector = truncate_embedding([3.0, 4.0, 12.0], 2)
+    assert np.allclose(vector, [0.6, 0.8])
+
+
+def test_rescore_matches_exact():
+    """测试重排结果"""
+    with tempfile.TemporaryDirectory() as full_dir, tempfile.TemporaryDirectory() as coarse_dir:
+        full = LocalVectorStore(base_dir=full_dir, dtype="float32", dimension=DIM)
+        searcher = TwoStageSearcher(full.fetch, base_dir=coarse_dir, dimension=COARSE_DIM, candidates=200)
+        nodes = _make_nodes(150, "b1")
+        full.insert(nodes)
+        searcher.insert(nodes)
+
+        query = np.random.default_rng(9).standard_normal(DIM).tolist()
+        expected = full.search(query, 5, "book_id = 'b1'")
+        hits = searcher.search(query, 5, "book_id = 'b1'", output_fields=["text"])
+        assert [h["id"] for h in hits] == [h["id"] for h in expected]
+        assert np.allclose([h["score"] for h in hits], [h["score"] for h in expected], atol=1e-4)
+        assert set(hits[0]) == {"id", "score", "text"}
+
+        assert searcher.search(query, 5, "book_id = 'missing'") is None
+
+        searcher.delete_by_filter("book_id = 'b1'")
+        assert searcher.search(query, 5, "book_id = 'b1'") is None
+
+
+def test_chapter_scope():
+    """测试章节范围检索命中低维索引"""
+    with tempfile.TemporaryDirectory() as full_dir, tempfile.TemporaryDirectory() as coarse_dir:
+        full = LocalVectorStore(base_dir=full_dir, dtype="float32", dimension=DIM)
+        searcher = TwoStageSearcher(full.fetch, base_dir=coarse_dir, dimension=COARSE_DIM, candidates=200)
+        nodes = _make_nodes(60, "b1")
+        full.insert(nodes)
+        searcher.insert(nodes)
+
+        query = np.random.default_rng(3).standard_normal(DIM).tolist()
+        scope = "book_id = 'b1' and (chapter_id = 'c0' or chapter_id = 'c2')"
+        hits = searcher.search(query, 5, scope)
+        assert hits is not None and {h["chapter_id"] for h in hits} <= {"c0", "c2"}
+        assert [h["id"] for h in hits] == [h["id"] for h in full.search(query, 5, scope)]
+
+
+if __name__ == "__main__":
+    test_truncate_embedding()
+    test_rescore_matches_exact()
+    test_chapter_scope()
+    logger.info("✅ 两阶段检索测试全部通过")
@@ -0,0 +1,131 @@
+"""
+测试父窗口文本存储（small-to-big 检索）
+
+验证：
+1. 窗口以分块为中心扩展，边界对齐到句子；重叠 / 相邻区间合并
+2. 跨压缩块读取任意字符区间，同一 doc_key 覆盖写入
+3. 子分块命中扩展为父窗口：同一文档的窗口合并，得分取最高，没有窗口元数据的结果原样保留
+4. 按 resource_id / book_id 删除
+"""
+
+import json
+import logging
+import tempfile
+
+from modules.window_store import WindowStore, merge_windows, window_bounds
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TEXT = (
+    "牛顿第一定律：物体在不受外力时保持静止或匀速直线运动。"
+    "牛顿第二定律：物体加速度与所受合力成正比，F=ma。"
+    "牛顿第三定律：作用力与反作用力大小相等、方向相反。"
+    "动量守恒定律：系统不受外力时总动量保持不变。"
+)
+
+
+def _hit(doc_key: str, start: int, end: int, score: float, chunk_id: str, book_id: str = "b1") -> dict:
+    return {
+        "id": chunk_id, "text": TEXT[start:end], "score": score, "book_id": book_id,
+        "metadata": json.dumps({"window_doc": doc_key, "window_start": start, "window_end": end}),
+    }
+
+
+def test_window_bounds_and_merge():
+    """测试窗口边界和区间合并"""
+    start = TEXT.index("牛顿第二定律")
+    end = start + 10
+    left, right = window_bounds(TEXT, start, end, 60)
+    assert left <= start and right >= end
+    assert TEXT[left - 1] == "。" and TEXT[right - 1] == "。"
+
+    # 分块超过窗口大小时窗口等于分块
+    assert window_bounds(TEXT, 5, 50, 20) == (5, 50)
+    assert window_bounds(TEXT, 0, len(TEXT), 2000) == (0, len(TEXT))
+
+    merged = merge_windows([(50, 80), (0, 20), (10, 30), (36, 40)], gap=5)
+    assert merged == [(0, 30, [1, 2]), (36, 40, [3]), (50, 80, [0])]
+    assert merge_windows([(0, 20), (22, 30)], gap=5) == [(0, 30, [0, 1])]
+
+
+def test_put_and_read():
+    """测试跨块读取和覆盖写入"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = WindowStore(base_dir=tmp, block_chars=16, codec="zlib")
+        assert store.put_documents("b1", {"r1:0": TEXT, "r1:1": "第二页"}) == 2
+        assert store.read("b1", "r1:0", 0, len(TEXT)) == TEXT
+        assert store.read("b1", "r1:0", 10, 40) == TEXT[10:40]
+        assert store.read("b1", "r1:0", 15, 17) == TEXT[15:17]
+        assert store.read("b1", "r1:1", 0, 100) == "第二页"
+        assert store.read("b1", "r9:0", 0, 10) is None
+        assert store.read("b2", "r1:0", 0, 10) is None
+
+        store.put_documents("b1", {"r1:1": "第二页（修订）"})
+        assert store.read("b1", "r1:1", 0, 100) == "第二页（修订）"
+        assert store.read("b1", "r1:0", 10, 40) == TEXT[10:40]
+
+        # 重新打开（从磁盘加载）
+        reopened = WindowStore(base_dir=tmp, block_chars=32, codec="zlib")
+        assert reopened.count("b1") == 2
+        assert reopened.read("b1", "r1:0", 20, 60) == TEXT[20:60]
+
+        # 块大小变化后写入：沿用的文档重新切块
+        reopened.put_documents("b1", {"r2:0": "化学平衡"})
+        assert reopened.read("b1", "r1:0", 20, 60) == TEXT[20:60]
+        assert reopened.count() == 3
+
+
+def test_expand():
+    """测试子分块扩展为父窗口"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = WindowStore(base_dir=tmp, block_chars=16, codec="zlib")
+        store.put_documents("b1", {"r1:0": TEXT})
+
+        plain = {"id": "k1", "text": "关键词结果", "score": 0.5, "book_id": "b1", "metadata": "{}"}
+        results = [
+            _hit("r1:0", 0, 27, 0.6, "c1"),
+            _hit("r1:0", 20, 52, 0.9, "c2"),
+            _hit("r1:0", 78, len(TEXT), 0.7, "c3"),
+            _hit("r9:0", 0, 10, 0.4, "c4"),
+            plain,
+        ]
+        expanded = store.expand(results, gap=0)
+        assert [r["id"] for r in expanded] == ["c2", "c3", "k1", "c4"]
+
+        merged = expanded[0]
+        assert merged["text"] == TEXT[0:52] and merged["window"] == [0, 52]
+        assert merged["child_ids"] == ["c1", "c2"] and merged["score"] == 0.9
+        assert expanded[1]["text"] == TEXT[78:]
+        # 窗口文本读取失败（文档不存在）时保留子分块
+        assert expanded[3]["text"] == TEXT[0:10] and "window" not in expanded[3]
+
+        # 间隔不超过 gap 时合并
+        expanded = store.expand(results[:3], gap=30)
+        assert len(expanded) == 1 and expanded[0]["child_ids"] == ["c1", "c2", "c3"]
+
+
+def test_delete_by_filter():
+    """测试按资源 / 按书删除"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = WindowStore(base_dir=tmp, block_chars=16, codec="zlib")
+        store.put_documents("b1", {"r1:0": TEXT, "r2:0": "欧姆定律 U=IR", "r10:0": "焦耳定律"})
+        store.put_documents("b2", {"r1:0": TEXT})
+
+        assert store.delete_by_filter("resource_id = 'r1'")
+        assert store.read("b1", "r1:0", 0, 10) is None
+        assert store.read("b1", "r10:0", 0, 10) == "焦耳定律"
+        assert store.read("b1", "r2:0", 0, 100) == "欧姆定律 U=IR"
+        assert store.count("b2") == 0
+
+        assert store.delete_by_filter("book_id = 'b1'")
+        assert store.count() == 0
+        assert not store.delete_by_filter("")
+
+
+if __name__ == "__main__":
+    test_window_bounds_and_merge()
+    test_put_and_read()
+    test_expand()
+    test_delete_by_filter()
+    logger.info("✅ 父窗口存储测试全部通过")